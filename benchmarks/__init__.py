@@ -0,0 +1,7 @@
+"""
+Бенчмарки горячих путей бота на синтетических данных.
+
+  python -m benchmarks generate --size 10000 --out bench_data/10k
+  python -m benchmarks run --sizes 1000 10000 --out bench_results.json
+  python -m benchmarks compare bench_baseline.json bench_results.json
+"""
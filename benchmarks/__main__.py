@@ -0,0 +1,219 @@
+"""
+Запуск бенчмарков.
+
+Примеры:
+  python -m benchmarks generate --size 10000
+  python -m benchmarks run
+  python -m benchmarks run --sizes 1000 10000 100000 --repeat 3 --out bench_results.json
+  python -m benchmarks run --only "render_*" --baseline bench_baseline.json
+  python -m benchmarks encoding --size 1000 --out bench_encoding.json
+  python -m benchmarks compare bench_baseline.json bench_results.json --threshold 0.15
+  python -m benchmarks loadtest --size 10000 --users 100 --duration 60 --latency 0.03
+  python -m benchmarks loadtest --mode webhook --users 100 --duration 60
+  python -m benchmarks fake-api --port 8081 --rate-limit 0.01
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import date
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# config.py требует переменные бота — подставляем заглушки, если их нет
+# (токен нужного формата, иначе aiogram не создаст Bot для нагрузочного теста)
+os.environ.setdefault("TOKEN", "123456:benchmark")
+for _var in ("TOKEN", "BOT_USERNAME", "CHANNEL_ID", "SHOP_ID", "SECRET_KEY"):
+    os.environ.setdefault(_var, "test")
+# Бот внутри нагрузочного теста не должен занимать порт метрик
+os.environ.setdefault("METRICS_PORT", "0")
+
+from benchmarks.datagen import DEFAULT_SEED, META_FILE, generate_dataset, load_meta, write_dataset
+from benchmarks.report import compare_results, format_comparison, format_row, load_results, run_meta, save_results
+
+DEFAULT_DATA_DIR = Path("bench_data")
+
+
+def dataset_dir(base: Path, size: int, seed: int) -> Path:
+    return base / f"{size}_{seed}"
+
+
+def ensure_dataset(base: Path, size: int, seed: int) -> Path:
+    """Каталог с данными нужного размера; генерирует заново, если их нет или они за другой день."""
+    directory = dataset_dir(base, size, seed)
+    today = date.today()
+    if (directory / META_FILE).exists():
+        meta = load_meta(directory)
+        if meta.get("today") == today.isoformat() and meta.get("size") == size and meta.get("seed") == seed:
+            return directory
+    started = time.perf_counter()
+    write_dataset(generate_dataset(size, seed, today), directory)
+    print(f"Сгенерированы данные на {size} пользователей за {time.perf_counter() - started:.1f} с → {directory}")
+    return directory
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Бенчмарки TennisBot на синтетических данных")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="Сгенерировать набор данных")
+    gen.add_argument("--size", type=int, default=1000, help="Число пользователей")
+    gen.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    gen.add_argument("--out", type=Path, help="Каталог (по умолчанию bench_data/<size>_<seed>)")
+
+    run = sub.add_parser("run", help="Прогнать сценарии")
+    run.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="Размеры наборов данных")
+    run.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    run.add_argument("--repeat", type=int, default=5, help="Замеров на сценарий (после одного прогрева)")
+    run.add_argument("--only", nargs="+", help="Шаблоны имён сценариев, например 'render_*'")
+    run.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="Где хранить сгенерированные данные")
+    run.add_argument("--out", type=Path, default=Path("bench_results.json"), help="Файл результатов (JSON)")
+    run.add_argument("--baseline", type=Path, help="Сравнить с сохранёнными результатами")
+    run.add_argument("--threshold", type=float, default=0.1, help="Допустимый рост медианы (0.1 = 10%%)")
+
+    cmp_ = sub.add_parser("compare", help="Сравнить два файла результатов")
+    cmp_.add_argument("baseline", type=Path)
+    cmp_.add_argument("current", type=Path)
+    cmp_.add_argument("--threshold", type=float, default=0.1)
+
+    sub.add_parser("list", help="Показать сценарии")
+
+    enc = sub.add_parser("encoding", help="Размер и время кодирования картинок сеток")
+    enc.add_argument("--size", type=int, default=1000, help="Пользователей в синтетических данных")
+    enc.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    enc.add_argument("--repeat", type=int, default=3, help="Замеров на вариант")
+    enc.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    enc.add_argument("--out", type=Path, help="Сохранить результаты в JSON")
+
+    load = sub.add_parser("loadtest", help="Нагрузочный тест main() против фейкового Bot API")
+    load.add_argument("--size", type=int, default=1000, help="Пользователей в синтетических данных")
+    load.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    load.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    load.add_argument("--users", type=int, default=20, help="Одновременных симулированных пользователей")
+    load.add_argument("--duration", type=float, default=30.0, help="Длительность, с")
+    load.add_argument("--mix", help="Веса сценариев, например registration=1,search=3,score=1,tournaments=2")
+    load.add_argument("--ramp", type=float, default=5.0, help="За сколько секунд подключаются все пользователи")
+    load.add_argument("--think", type=float, default=0.5, help="Пауза пользователя между шагами, с")
+    load.add_argument("--settle", type=float, default=0.15, help="Тишина в чате, после которой шаг считается обработанным, с")
+    load.add_argument("--timeout", type=float, default=30.0, help="Ожидание ответа бота на шаг, с")
+    load.add_argument("--latency", type=float, default=0.0, help="Задержка ответа фейкового API, с")
+    load.add_argument("--jitter", type=float, default=0.0, help="Случайная добавка к задержке, с")
+    load.add_argument("--rate-limit", type=float, default=0.0, help="Доля ответов 429")
+    load.add_argument("--mode", choices=("polling", "webhook"), default="polling", help="Как бот получает апдейты")
+    load.add_argument("--out", type=Path, help="Сохранить отчёт в JSON")
+
+    fake = sub.add_parser("fake-api", help="Запустить фейковый Bot API отдельно")
+    fake.add_argument("--host", default="127.0.0.1")
+    fake.add_argument("--port", type=int, default=8081)
+    fake.add_argument("--latency", type=float, default=0.0)
+    fake.add_argument("--jitter", type=float, default=0.0)
+    fake.add_argument("--rate-limit", type=float, default=0.0)
+    return parser
+
+
+async def run(args: argparse.Namespace) -> int:
+    from benchmarks.scenarios import run_all, select
+
+    scenarios = select(args.only)
+    if not scenarios:
+        print("Нет сценариев под заданные шаблоны")
+        return 2
+    results = {"meta": {**run_meta(args.repeat), "seed": args.seed}, "sizes": {}}
+    for size in args.sizes:
+        directory = ensure_dataset(args.data_dir, size, args.seed)
+        meta = load_meta(directory)
+        print(f"Размер {size}: игр {meta['games']}, турниров {meta['tournaments']}")
+        block = await run_all(directory, meta, scenarios, args.repeat, progress=lambda name, row: print(format_row(name, row)))
+        results["sizes"][str(size)] = {"dataset": meta, "scenarios": block}
+    save_results(results, args.out)
+    print(f"Результаты сохранены в {args.out}")
+
+    if args.baseline:
+        rows = compare_results(load_results(args.baseline), results, args.threshold)
+        print(format_comparison(rows))
+        if any(r["status"] == "regression" for r in rows):
+            return 1
+    return 0
+
+
+async def loadtest(args: argparse.Namespace) -> int:
+    from benchmarks.loadtest import format_load_report, parse_mix, run_load
+
+    directory = ensure_dataset(args.data_dir, args.size, args.seed)
+    report = await run_load(
+        directory, load_meta(directory), args.users, args.duration, parse_mix(args.mix),
+        seed=args.seed, ramp=args.ramp, think=args.think, settle=args.settle, timeout=args.timeout,
+        latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit, mode=args.mode,
+    )
+    print(format_load_report(report))
+    if args.out:
+        save_results({"meta": run_meta(1), "loadtest": report}, args.out)
+        print(f"Отчёт сохранён в {args.out}")
+    return 0
+
+
+async def encoding(args: argparse.Namespace) -> int:
+    from benchmarks.encoding import format_encoding, run_encoding
+
+    directory = ensure_dataset(args.data_dir, args.size, args.seed)
+    results = await run_encoding(directory, args.repeat)
+    print(format_encoding(results))
+    if args.out:
+        save_results({"meta": run_meta(args.repeat), "encoding": results}, args.out)
+        print(f"Результаты сохранены в {args.out}")
+    return 0
+
+
+async def fake_api(args: argparse.Namespace) -> int:
+    from benchmarks.fake_bot_api import FakeBotAPI
+
+    api = FakeBotAPI(latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit)
+    url = await api.start(args.host, args.port)
+    print(f"Фейковый Bot API: {url} (TELEGRAM_API_URL={url})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+    return 0
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.WARNING)
+    args = build_parser().parse_args()
+    if args.command == "generate":
+        started = time.perf_counter()
+        directory = args.out or dataset_dir(DEFAULT_DATA_DIR, args.size, args.seed)
+        write_dataset(generate_dataset(args.size, args.seed), directory)
+        print(f"Данные записаны в {directory} за {time.perf_counter() - started:.1f} с")
+        return 0
+    if args.command == "compare":
+        rows = compare_results(load_results(args.baseline), load_results(args.current), args.threshold)
+        print(format_comparison(rows))
+        return 1 if any(r["status"] == "regression" for r in rows) else 0
+    if args.command == "list":
+        from benchmarks.scenarios import SCENARIOS
+
+        for item in SCENARIOS:
+            print(item.name + (f"  (пишет: {', '.join(item.mutates)})" if item.mutates else ""))
+        return 0
+    if args.command == "loadtest":
+        return asyncio.run(loadtest(args))
+    if args.command == "encoding":
+        return asyncio.run(encoding(args))
+    if args.command == "fake-api":
+        try:
+            return asyncio.run(fake_api(args))
+        except KeyboardInterrupt:
+            return 0
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
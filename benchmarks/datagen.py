@@ -0,0 +1,370 @@
+"""
+Генератор синтетических данных для бенчмарков.
+
+Строит users.json, games.json, tournaments.json, beauty_contest.json
+(и вспомогательные languages.json, banned_users.json) в тех же форматах,
+что пишут хендлеры бота. Генерация детерминирована: одинаковые seed, size
+и today дают одинаковые файлы.
+
+Кроме «фоновых» турниров в данные всегда попадают турниры для замеров
+отрисовки: олимпийская сетка и круговая таблица на 8/16/32/64 участника
+(ключи bench_olympic_N и bench_round_robin_N).
+"""
+
+from __future__ import annotations
+
+import json
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.profile import PLAYER_LEVELS, cities_data, moscow_districts, sport_type
+from utils.score import attach_score
+
+SIZES = (1_000, 10_000, 100_000)
+BRACKET_SIZES = (8, 16, 32, 64)
+DEFAULT_SEED = 42
+
+# Доли профилей: знакомства, тренеры, с подпиской, с предложенными играми
+DATING_SHARE = 0.05
+COACH_SHARE = 0.08
+SUBSCRIPTION_SHARE = 0.2
+OFFERS_SHARE = 0.4
+GAMES_PER_USER = 2
+DOUBLES_SHARE = 0.2
+
+DATING = "🍒Знакомства"
+DATING_GOALS = ("relationship", "communication", "friendship", "never_know")
+RACKET_SPORTS = list(sport_type[:7])
+FIRST_NAMES = {
+    "Мужской": ["Александр", "Дмитрий", "Максим", "Иван", "Артём", "Никита", "Михаил", "Егор", "Андрей", "Илья"],
+    "Женский": ["Анна", "Мария", "Елена", "Ольга", "Дарья", "Алёна", "Наталья", "Ксения", "Полина", "Юлия"],
+}
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов", "Новиков", "Морозов", "Пётров",
+              "Волков", "Фёдоров", "Михайлов", "Беляев", "Тарасов", "Белов", "Комаров", "Орлов", "Киселёв", "Макаров"]
+
+FILES = {
+    "users": "users.json",
+    "games": "games.json",
+    "tournaments": "tournaments.json",
+    "beauty_contest": "beauty_contest.json",
+    "languages": "languages.json",
+    "banned": "banned_users.json",
+    "tournament_applications": "tournament_applications.json",
+}
+META_FILE = "bench_meta.json"
+
+
+def _last_name(rng: random.Random, gender: str) -> str:
+    name = rng.choice(LAST_NAMES)
+    return name + "а" if gender == "Женский" else name
+
+
+def _random_score(rng: random.Random) -> Tuple[str, bool]:
+    """Счёт "6:4, 3:6, 10:8" и признак победы стороны A."""
+    sets: List[str] = []
+    won_a = won_b = 0
+    while won_a < 2 and won_b < 2:
+        if won_a == 1 and won_b == 1 and rng.random() < 0.3:
+            a, b = (10, rng.randint(3, 8)) if rng.random() < 0.5 else (rng.randint(3, 8), 10)
+        else:
+            loser = rng.randint(0, 6)
+            winner = 7 if loser >= 5 else 6
+            a, b = (winner, loser) if rng.random() < 0.5 else (loser, winner)
+        sets.append(f"{a}:{b}")
+        if a > b:
+            won_a += 1
+        else:
+            won_b += 1
+    return ", ".join(sets), won_a > won_b
+
+
+def _make_user(rng: random.Random, uid: str, today: date) -> Dict[str, Any]:
+    gender = rng.choice(("Мужской", "Женский"))
+    country = rng.choice(list(cities_data))
+    city = rng.choice(cities_data[country])
+    roll = rng.random()
+    sport = DATING if roll < DATING_SHARE else rng.choice(RACKET_SPORTS)
+    role = "Тренер" if sport != DATING and rng.random() < COACH_SHARE else "Игрок"
+    birth = today - timedelta(days=rng.randint(18 * 365, 65 * 365))
+    first_name = rng.choice(FIRST_NAMES[gender])
+    profile: Dict[str, Any] = {
+        "telegram_id": int(uid),
+        "username": f"user{uid}" if rng.random() < 0.8 else None,
+        "first_name": first_name,
+        "last_name": _last_name(rng, gender),
+        "phone": f"+7{rng.randint(9000000000, 9999999999)}",
+        "birth_date": birth.strftime("%d.%m.%Y"),
+        "country": country,
+        "city": city,
+        "district": rng.choice(moscow_districts) if city == "Москва" else "",
+        "role": role,
+        "sport": sport,
+        "gender": gender,
+        "player_level": rng.choice(PLAYER_LEVELS),
+        "rating_points": rng.randint(300, 2200),
+        "show_in_search": rng.random() < 0.95,
+        "profile_comment": "",
+        "photo_path": None,
+        "games": [],
+        "created_at": (datetime.combine(today, datetime.min.time()) - timedelta(days=rng.randint(0, 720))).isoformat(timespec="seconds"),
+    }
+    if role == "Тренер":
+        profile["price"] = rng.choice((1500, 2000, 3000, 5000))
+    if sport == DATING:
+        profile["dating_goal_key"] = rng.choice(DATING_GOALS)
+        profile["dating_interests"] = []
+    if rng.random() < SUBSCRIPTION_SHARE:
+        profile["subscription"] = {
+            "active": True,
+            "until": (today + timedelta(days=rng.randint(-10, 40))).strftime("%Y-%m-%d"),
+        }
+    if rng.random() < OFFERS_SHARE:
+        for n in range(rng.randint(1, 3)):
+            day = today + timedelta(days=rng.randint(-10, 20))
+            offer = {
+                "sport": sport,
+                "country": country,
+                "city": city,
+                "district": profile["district"],
+                "comment": None,
+                "date": day.strftime("%Y-%m-%d") if rng.random() < 0.5 else day.strftime("%d.%m.%Y"),
+                "time": f"{rng.randint(7, 22):02d}:{rng.choice((0, 30)):02d}",
+                "type": "Одиночная",
+                "payment_type": "💰 Пополам",
+                "competitive": rng.random() < 0.5,
+                "id": n + 1,
+                "created_at": profile["created_at"],
+                "active": True,
+            }
+            profile["games"].append(offer)
+    return profile
+
+
+def _make_games(rng: random.Random, users: Dict[str, Any], count: int, today: date) -> List[Dict[str, Any]]:
+    pools: Dict[Tuple[str, str, str], List[str]] = defaultdict(list)
+    for uid, p in users.items():
+        if p["role"] == "Игрок" and p["sport"] != DATING:
+            pools[(p["sport"], p["country"], p["city"])].append(uid)
+    pools_list = [ids for ids in pools.values() if len(ids) >= 4]
+    weights = [len(ids) for ids in pools_list]
+    if not pools_list:
+        return []
+
+    start = datetime.combine(today, datetime.min.time()) - timedelta(days=365)
+    moments = sorted(rng.randint(0, 365 * 24 * 3600) for _ in range(count))
+    games = []
+    for n, offset in enumerate(moments):
+        pool = rng.choices(pools_list, weights=weights)[0]
+        moment = start + timedelta(seconds=offset)
+        double = rng.random() < DOUBLES_SHARE
+        picked = rng.sample(pool, 4 if double else 2)
+        team1, team2 = (picked[:2], picked[2:]) if double else (picked[:1], picked[1:])
+        score, team1_won = _random_score(rng)
+        delta = float(rng.randint(1, 25))
+        winners, losers = (team1, team2) if team1_won else (team2, team1)
+        game = {
+            "id": f"{moment.strftime('%Y%m%d_%H%M%S')}_{n}",
+            "date": moment.isoformat(),
+            "type": "double" if double else "single",
+            "sets": score.split(", "),
+            "media_filename": None,
+            "players": {"team1": team1, "team2": team2},
+            "rating_changes": {**{uid: delta for uid in winners}, **{uid: -delta for uid in losers}},
+            "tournament_id": None,
+            "status": "completed",
+            "winner_id": winners[0],
+        }
+        attach_score(game, score)
+        games.append(game)
+    return games
+
+
+def _make_tournament(
+    rng: random.Random,
+    tid: str,
+    kind: str,
+    player_ids: List[str],
+    users: Dict[str, Any],
+    today: date,
+    completed_share: float,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Запущенный турнир с проведённой жеребьёвкой и частью сыгранных матчей."""
+    from utils.tournament_manager import tournament_manager
+
+    first = users[player_ids[0]]
+    started = datetime.combine(today, datetime.min.time()) - timedelta(days=rng.randint(3, 40), hours=rng.randint(0, 23))
+    participants = {
+        uid: {
+            "name": f"{users[uid]['first_name']} {users[uid]['last_name']}",
+            "phone": users[uid]["phone"],
+            "added_at": (started - timedelta(days=2)).isoformat(),
+            "added_by": 0,
+        }
+        for uid in player_ids
+    }
+    td: Dict[str, Any] = {
+        "name": f"Турнир {tid}",
+        "description": "",
+        "sport": first["sport"],
+        "country": first["country"],
+        "city": first["city"],
+        "district": "",
+        "type": kind,
+        "gender": "Мужчины",
+        "category": "1 категория",
+        "level": "Не указан",
+        "age_group": "Взрослые",
+        "duration": "Многодневный",
+        "participants_count": len(player_ids),
+        "show_in_list": True,
+        "hide_bracket": False,
+        "comment": "",
+        "created_at": (started - timedelta(days=7)).isoformat(),
+        "created_by": 0,
+        "participants": participants,
+        "seeding": list(player_ids),
+        "status": "started",
+        "started_at": started.isoformat(),
+    }
+    matches = tournament_manager._conduct_draw(participants, kind, tid, td)
+    games = []
+    for m in matches:
+        if m.get("is_bye") or rng.random() >= completed_share:
+            continue
+        score, p1_won = _random_score(rng)
+        p1, p2 = m["player1_id"], m["player2_id"]
+        winner = p1 if p1_won else p2
+        played = started + timedelta(days=rng.randint(0, 2), minutes=m["match_number"])
+        attach_score(m, score)
+        m.update({"winner_id": winner, "status": "completed", "completed_at": played.isoformat()})
+        game = {
+            "id": f"{tid}_{m['match_number']}",
+            "date": played.isoformat(),
+            "type": "tournament",
+            "sets": score.split(", "),
+            "media_filename": None,
+            "players": {"team1": [p1], "team2": [p2]},
+            "rating_changes": {},
+            "tournament_id": tid,
+            "status": "completed",
+            "winner_id": winner,
+        }
+        attach_score(game, score)
+        games.append(game)
+    td["matches"] = matches
+    return td, games
+
+
+def generate_dataset(size: int, seed: int = DEFAULT_SEED, today: Optional[date] = None) -> Dict[str, Any]:
+    """Словарь {имя файла-ключа из FILES: данные, "meta": параметры генерации}."""
+    today = today or date.today()
+    rng = random.Random(seed)
+
+    users: Dict[str, Any] = {}
+    for i in range(size):
+        uid = str(100_000_000 + i)
+        users[uid] = _make_user(rng, uid, today)
+
+    games = _make_games(rng, users, size * GAMES_PER_USER, today)
+
+    by_sport: Dict[str, List[str]] = defaultdict(list)
+    for uid, p in users.items():
+        if p["role"] == "Игрок" and p["sport"] != DATING:
+            by_sport[p["sport"]].append(uid)
+    tennis = by_sport.get(RACKET_SPORTS[0]) or next(iter(by_sport.values()))
+
+    tournaments: Dict[str, Any] = {}
+    for n in BRACKET_SIZES:
+        for kind, prefix in (("Олимпийская система", "bench_olympic"), ("Круговая", "bench_round_robin")):
+            tid = f"{prefix}_{n}"
+            td, t_games = _make_tournament(rng, tid, kind, rng.sample(tennis, min(n, len(tennis))), users, today, 0.5)
+            tournaments[tid] = td
+            games.extend(t_games)
+    # Фоновые круговые турниры для напоминаний: примерно один на 200 пользователей
+    for i in range(max(1, size // 200)):
+        sport = rng.choice([s for s in by_sport if len(by_sport[s]) >= 8] or [RACKET_SPORTS[0]])
+        pool = by_sport[sport]
+        tid = f"rr_{i}"
+        td, t_games = _make_tournament(rng, tid, "Круговая", rng.sample(pool, min(rng.randint(4, 10), len(pool))), users, today, 0.3)
+        tournaments[tid] = td
+        games.extend(t_games)
+
+    # Конкурс красоты: заявки от части пользователей, голоса от другой части
+    applicants = rng.sample(list(users), max(2, size // 20))
+    applications = {}
+    for uid in applicants:
+        p = users[uid]
+        applications[uid] = {
+            "first_name": p["first_name"],
+            "last_name": p["last_name"],
+            "gender": p["gender"],
+            "birth_date": p["birth_date"],
+            "country": p["country"],
+            "city": p["city"],
+            "comment": "",
+            "photo_path": "",
+            "applied_at": p["created_at"],
+        }
+    votes: Dict[str, Dict[str, Any]] = defaultdict(dict)
+    user_votes: Dict[str, Dict[str, List[str]]] = {}
+    for voter in rng.sample(list(users), max(1, size // 5)):
+        target = rng.choice(applicants)
+        if target == voter:
+            continue
+        stamp = rng.randint(0, 30 * 24 * 3600)
+        votes[target][f"{voter}_{stamp}"] = {
+            "voted_at": (datetime.combine(today, datetime.min.time()) - timedelta(seconds=stamp)).isoformat(),
+            "voter_id": voter,
+            "voter_name": users[voter]["first_name"],
+        }
+        key = "male_votes" if applications[target]["gender"] == "Мужской" else "female_votes"
+        user_votes.setdefault(voter, {"male_votes": [], "female_votes": []})[key].append(target)
+
+    languages = {uid: ("en" if rng.random() < 0.1 else "ru") for uid in users}
+    banned = {uid: {"banned_at": today.isoformat(), "reason": "spam"} for uid in rng.sample(list(users), max(1, size // 500))}
+
+    # Пользователь для замера истории игр — участник больше всех игр
+    counts: Dict[str, int] = defaultdict(int)
+    for g in games:
+        if g["type"] != "tournament":
+            for uid in g["players"]["team1"] + g["players"]["team2"]:
+                counts[uid] += 1
+    probe_user = max(counts, key=counts.get) if counts else next(iter(users))
+    probe = users[probe_user]
+
+    return {
+        "users": users,
+        "games": games,
+        "tournaments": tournaments,
+        "beauty_contest": {"applications": applications, "votes": dict(votes), "user_votes": user_votes},
+        "languages": languages,
+        "banned": banned,
+        "tournament_applications": {},
+        "meta": {
+            "seed": seed,
+            "size": size,
+            "today": today.isoformat(),
+            "games": len(games),
+            "tournaments": len(tournaments),
+            "probe_user": probe_user,
+            "search": {"country": probe["country"], "city": probe["city"], "sport": probe["sport"]},
+        },
+    }
+
+
+def write_dataset(dataset: Dict[str, Any], directory: Path) -> Path:
+    """Записывает набор данных в directory в формате хранилища бота."""
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "sessions").mkdir(exist_ok=True)
+    for key, filename in FILES.items():
+        payload = json.dumps(dataset[key], ensure_ascii=False, indent=2).encode("utf-8")
+        (directory / filename).write_bytes(payload)
+    (directory / META_FILE).write_text(json.dumps(dataset["meta"], ensure_ascii=False, indent=2), encoding="utf-8")
+    return directory
+
+
+def load_meta(directory: Path) -> Dict[str, Any]:
+    return json.loads((directory / META_FILE).read_text(encoding="utf-8"))
@@ -0,0 +1,109 @@
+"""
+Бенчмарк кодирования картинок сеток и таблиц.
+
+Для каждой турнирной сетки из benchmarks.datagen (олимпийская и круговая,
+BRACKET_SIZES участников) картинка рисуется настоящим кодом бота, а
+utils.bracket.encoding.encode_image на время отрисовки подменяется
+записью исходной картинки. Затем исходник прогоняется через варианты:
+
+- png_full — как раньше: PNG в исходном размере;
+- png, palette_png, jpeg, webp — уменьшенная под Telegram картинка в одном формате;
+- auto — то, что отправляет бот (encode_image).
+
+Для каждого — размер в байтах и медиана времени (уменьшение входит в время
+всех вариантов, кроме png_full).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from unittest import mock
+
+from PIL import Image
+
+from benchmarks.datagen import BRACKET_SIZES
+
+KINDS = (("olympic", "bench_olympic"), ("round_robin", "bench_round_robin"))
+
+
+def _variants() -> Dict[str, Callable[[Image.Image], bytes]]:
+    from utils.bracket import encoding
+
+    def fitted(encode: Callable[[Image.Image], bytes]) -> Callable[[Image.Image], bytes]:
+        return lambda image: encode(encoding.fit_to_telegram(image))
+
+    return {
+        "png_full": encoding.encode_png,
+        "png": fitted(encoding.encode_png),
+        "palette_png": fitted(lambda image: encoding.encode_palette_png(image)[0]),
+        "jpeg": fitted(encoding.encode_jpeg),
+        "webp": fitted(encoding.encode_webp),
+        "auto": encoding.encode_image,
+    }
+
+
+async def _render_source(tournament_id: str) -> Image.Image:
+    """Рисует турнир хендлером бота и возвращает картинку до кодирования."""
+    from handlers.tournament import build_and_render_tournament_image
+    from services.storage import storage
+
+    captured: List[Image.Image] = []
+
+    def capture(image: Image.Image, kind: str = "bracket") -> bytes:
+        captured.append(image.copy())
+        return b""
+
+    tournaments = await storage.load_tournaments()
+    with mock.patch("utils.bracket.builders.encode_image", capture), \
+            mock.patch("utils.round_robin_image_generator.encode_image", capture), \
+            contextlib.redirect_stdout(io.StringIO()):
+        await build_and_render_tournament_image(tournaments[tournament_id], tournament_id)
+    if not captured:
+        raise RuntimeError(f"{tournament_id}: картинка не отрисована")
+    return captured[-1].convert("RGB") if captured[-1].mode != "RGB" else captured[-1]
+
+
+async def run_encoding(directory: Path, repeat: int) -> Dict[str, Any]:
+    from benchmarks.scenarios import use_dataset
+
+    use_dataset(directory)
+    variants = _variants()
+    results: Dict[str, Any] = {}
+    for n in BRACKET_SIZES:
+        for kind, prefix in KINDS:
+            image = await _render_source(f"{prefix}_{n}")
+            row: Dict[str, Any] = {"width": image.size[0], "height": image.size[1], "variants": {}}
+            for name, encode in variants.items():
+                samples = []
+                data = b""
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    data = encode(image)
+                    samples.append(time.perf_counter() - started)
+                with Image.open(io.BytesIO(data)) as decoded:
+                    fmt, size = decoded.format, decoded.size
+                row["variants"][name] = {
+                    "bytes": len(data), "median": statistics.median(samples), "format": fmt,
+                    "width": size[0], "height": size[1],
+                }
+            results[f"{kind}_{n}"] = row
+    return results
+
+
+def format_encoding(results: Dict[str, Any]) -> str:
+    lines = [f"{'картинка':<16} {'исходник':>11}  {'вариант':<12} {'результат':>11} {'формат':<6} {'КиБ':>8} {'мс':>8}"]
+    for name, row in results.items():
+        source = f"{row['width']}×{row['height']}"
+        for variant, v in row["variants"].items():
+            result = f"{v['width']}×{v['height']}"
+            lines.append(
+                f"{name:<16} {source:>11}  {variant:<12} {result:>11} {v['format']:<6} "
+                f"{v['bytes'] / 1024:8.1f} {v['median'] * 1000:8.1f}"
+            )
+            name, source = "", ""
+    return "\n".join(lines)
@@ -0,0 +1,385 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов.
+
+Реализует методы, которыми пользуется бот: getMe, getUpdates (long polling),
+sendMessage, editMessageText, sendPhoto, sendMediaGroup, copyMessage,
+answerCallbackQuery, getFile и скачивание файлов. Остальные методы
+(deleteMessage, editMessageReplyMarkup, ...) просто отвечают true.
+
+Апдейты кладёт тестовый драйвер через push_message/push_callback, а каждый
+ответ бота записывается в ленту чата — по ней драйвер считает задержку
+и находит кнопки для следующего шага.
+
+Сервер умеет добавлять задержку к каждому ответу и отвечать 429
+с заданной вероятностью, как Telegram при превышении лимитов.
+
+После setWebhook апдейты не отдаются через getUpdates, а отправляются POST-ом
+на адрес вебхука (до max_connections параллельно); ответ не 200 —
+апдейт возвращается в очередь и повторяется через секунду.
+
+Отдельно:  python -m benchmarks fake-api --port 8081 --latency 0.05 --rate-limit 0.01
+Бот:       TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import itertools
+import json
+import logging
+import random
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "TennisBot", "username": "tennis_bench_bot"}
+
+# Методы, которые не задерживаются и не получают 429
+_SERVICE_METHODS = {"getupdates", "getme", "setwebhook", "deletewebhook", "close", "logout"}
+
+
+@dataclass
+class BotEvent:
+    """Один вызов Bot API, адресованный чату."""
+    seq: int
+    at: float
+    method: str
+    payload: Dict[str, Any]
+    result: Any
+
+
+@dataclass
+class ChatFeed:
+    events: List[BotEvent] = field(default_factory=list)
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    # Последнее сообщение бота с inline-клавиатурой (для нажатий кнопок)
+    last_markup: Optional[Dict[str, Any]] = None
+    last_message: Optional[Dict[str, Any]] = None
+
+
+def _parse_json(value: Any) -> Any:
+    if isinstance(value, str) and value[:1] in "[{":
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _placeholder_jpeg() -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (40, 120, 60)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_limit: float = 0.0,
+                 retry_after: int = 1, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._updates: Deque[Dict[str, Any]] = deque()
+        self._updates_ready = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self._seq = itertools.count(1)
+        self._callback_chats: Dict[str, int] = {}
+        self.feeds: Dict[int, ChatFeed] = defaultdict(ChatFeed)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.rate_limited: Dict[str, int] = defaultdict(int)
+        self.polls = 0
+        # Бот начал получать апдейты: первый getUpdates или setWebhook
+        self.polled = asyncio.Event()
+        self.webhook_deliveries = 0
+        self.webhook_rejected = 0
+        self._webhook: Optional[Dict[str, Any]] = None
+        self._deliverers: List[asyncio.Task] = []
+        self._client: Optional[aiohttp.ClientSession] = None
+        self._photo = _placeholder_jpeg()
+        self._runner: Optional[web.AppRunner] = None
+
+    # ---------- Апдейты от «пользователей» ----------
+
+    def _chat(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        chat = {"id": user["id"], "type": "private", "first_name": user.get("first_name", "")}
+        if user.get("username"):
+            chat["username"] = user["username"]
+        return chat
+
+    def _push(self, update: Dict[str, Any]) -> int:
+        update["update_id"] = next(self._update_ids)
+        self._updates.append(update)
+        self._updates_ready.set()
+        return update["update_id"]
+
+    def push_message(self, user: Dict[str, Any], text: Optional[str] = None,
+                     contact: Optional[Dict[str, Any]] = None) -> int:
+        """Сообщение пользователя боту; user — {"id", "first_name", "username"}."""
+        message: Dict[str, Any] = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": self._chat(user),
+            "from": {"is_bot": False, **user},
+        }
+        if contact is not None:
+            message["contact"] = contact
+        else:
+            message["text"] = text or ""
+            if message["text"].startswith("/"):
+                command = message["text"].split()[0]
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return self._push({"message": message})
+
+    def push_callback(self, user: Dict[str, Any], data: str) -> int:
+        """Нажатие inline-кнопки под последним сообщением бота в этом чате."""
+        feed = self.feeds[user["id"]]
+        message = feed.last_message or {
+            "message_id": next(self._message_ids), "date": int(time.time()),
+            "chat": self._chat(user), "from": BOT_USER, "text": "",
+        }
+        query_id = str(next(self._update_ids) * 7919)
+        self._callback_chats[query_id] = user["id"]
+        return self._push({"callback_query": {
+            "id": query_id,
+            "from": {"is_bot": False, **user},
+            "chat_instance": str(user["id"]),
+            "message": message,
+            "data": data,
+        }})
+
+    def mark(self, chat_id: int) -> int:
+        """Номер последнего события чата — от него драйвер ждёт новые ответы."""
+        events = self.feeds[chat_id].events
+        return events[-1].seq if events else 0
+
+    async def wait_reply(self, chat_id: int, after: int, timeout: float) -> Optional[BotEvent]:
+        """Первое событие чата с seq > after или None по таймауту."""
+        feed = self.feeds[chat_id]
+        deadline = time.perf_counter() + timeout
+        while True:
+            for event in feed.events:
+                if event.seq > after:
+                    return event
+            left = deadline - time.perf_counter()
+            if left <= 0:
+                return None
+            feed.changed.clear()
+            try:
+                await asyncio.wait_for(feed.changed.wait(), left)
+            except asyncio.TimeoutError:
+                return None
+
+    async def wait_settled(self, chat_id: int, settle: float, timeout: float) -> Optional[BotEvent]:
+        """Ждёт, пока в чате settle секунд нет новых ответов; возвращает последний."""
+        feed = self.feeds[chat_id]
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            feed.changed.clear()
+            try:
+                await asyncio.wait_for(feed.changed.wait(), min(settle, max(0.0, deadline - time.perf_counter())))
+            except asyncio.TimeoutError:
+                break
+        return feed.events[-1] if feed.events else None
+
+    def buttons(self, chat_id: int) -> List[str]:
+        markup = self.feeds[chat_id].last_markup or {}
+        return [b.get("callback_data") for row in markup.get("inline_keyboard", []) for b in row if b.get("callback_data")]
+
+    # ---------- Bot API ----------
+
+    def _message(self, chat_id: Any, payload: Dict[str, Any], **extra: Any) -> Dict[str, Any]:
+        message = {
+            "message_id": int(payload.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": BOT_USER,
+            **extra,
+        }
+        markup = _parse_json(payload.get("reply_markup"))
+        if isinstance(markup, dict) and "inline_keyboard" in markup:
+            message["reply_markup"] = markup
+        return message
+
+    def _photo_sizes(self) -> List[Dict[str, Any]]:
+        n = next(self._file_ids)
+        return [{"file_id": f"photo_{n}_{w}", "file_unique_id": f"u{n}_{w}", "width": w, "height": w, "file_size": w * 40}
+                for w in (90, 320, 800)]
+
+    def _record(self, chat_id: Optional[int], method: str, payload: Dict[str, Any], result: Any) -> None:
+        if chat_id is None:
+            return
+        feed = self.feeds[chat_id]
+        feed.events.append(BotEvent(next(self._seq), time.perf_counter(), method, payload, result))
+        messages = result if isinstance(result, list) else [result]
+        for message in messages:
+            if isinstance(message, dict) and "chat" in message:
+                feed.last_message = message
+                if "reply_markup" in message:
+                    feed.last_markup = message["reply_markup"]
+                elif method in ("sendMessage", "editMessageText", "sendPhoto"):
+                    feed.last_markup = None
+        feed.changed.set()
+
+    async def _get_updates(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self.polls += 1
+        self.polled.set()
+        offset = int(payload.get("offset") or 0)
+        limit = int(payload.get("limit") or 100)
+        timeout = float(payload.get("timeout") or 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout:
+            self._updates_ready.clear()
+            try:
+                await asyncio.wait_for(self._updates_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self._updates, limit))
+
+    async def _set_webhook(self, payload: Dict[str, Any]) -> bool:
+        await self._delete_webhook()
+        self._webhook = {"url": payload.get("url"), "secret": payload.get("secret_token")}
+        if self._client is None:
+            self._client = aiohttp.ClientSession()
+        connections = int(payload.get("max_connections") or 40)
+        self._deliverers = [asyncio.create_task(self._deliver()) for _ in range(connections)]
+        self.polled.set()
+        return True
+
+    async def _delete_webhook(self) -> bool:
+        self._webhook = None
+        for task in self._deliverers:
+            task.cancel()
+        await asyncio.gather(*self._deliverers, return_exceptions=True)
+        self._deliverers = []
+        return True
+
+    async def _deliver(self) -> None:
+        """Доставка апдейтов на вебхук; одна задача — одно соединение."""
+        while True:
+            while not self._updates:
+                self._updates_ready.clear()
+                await self._updates_ready.wait()
+            update = self._updates.popleft()
+            headers = {"X-Telegram-Bot-Api-Secret-Token": self._webhook["secret"]} if self._webhook["secret"] else {}
+            try:
+                async with self._client.post(self._webhook["url"], json=update, headers=headers) as response:
+                    ok = response.status == 200
+            except aiohttp.ClientError:
+                ok = False
+            if ok:
+                self.webhook_deliveries += 1
+                continue
+            self.webhook_rejected += 1
+            self._updates.appendleft(update)
+            await asyncio.sleep(1)
+
+    def _dispatch(self, method: str, payload: Dict[str, Any]) -> Any:
+        chat_id = payload.get("chat_id")
+        name = method.lower()
+        if name == "getme":
+            return BOT_USER
+        if name == "sendmessage":
+            result = self._message(chat_id, {**payload, "message_id": None}, text=payload.get("text", ""))
+        elif name == "editmessagetext":
+            if payload.get("inline_message_id"):
+                return True
+            result = self._message(chat_id, payload, text=payload.get("text", ""))
+        elif name == "editmessagereplymarkup" or name == "editmessagecaption":
+            result = self._message(chat_id, payload) if chat_id else True
+        elif name == "sendphoto":
+            result = self._message(chat_id, {**payload, "message_id": None}, photo=self._photo_sizes(),
+                                   caption=payload.get("caption"))
+        elif name == "sendmediagroup":
+            media = _parse_json(payload.get("media")) or []
+            result = [self._message(chat_id, {"message_id": None}, photo=self._photo_sizes()) for _ in media]
+        elif name == "copymessage":
+            result = {"message_id": next(self._message_ids)}
+        elif name == "answercallbackquery":
+            chat_id = self._callback_chats.pop(str(payload.get("callback_query_id")), None)
+            result = True
+        elif name == "getfile":
+            file_id = str(payload.get("file_id"))
+            return {"file_id": file_id, "file_unique_id": f"u_{file_id}", "file_size": len(self._photo),
+                    "file_path": f"photos/{file_id}.jpg"}
+        else:
+            result = True
+        self._record(int(chat_id) if chat_id not in (None, "") else None, method, payload, result)
+        return result
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            payload = await request.json()
+        else:
+            form = await request.post()
+            payload = {k: _parse_json(v) for k, v in form.items() if isinstance(v, str)}
+        if method.lower() == "getupdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(payload)})
+        if method.lower() == "setwebhook":
+            return web.json_response({"ok": True, "result": await self._set_webhook(payload)})
+        if method.lower() == "deletewebhook":
+            return web.json_response({"ok": True, "result": await self._delete_webhook()})
+        if method.lower() not in _SERVICE_METHODS:
+            if self.latency or self.jitter:
+                await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+            if self.rate_limit and self._rng.random() < self.rate_limit:
+                self.rate_limited[method] += 1
+                return web.json_response({
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }, status=429)
+        return web.json_response({"ok": True, "result": self._dispatch(method, payload)})
+
+    async def _download(self, request: web.Request) -> web.Response:
+        self.calls["file"] += 1
+        return web.Response(body=self._photo, content_type="image/jpeg")
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        app.router.add_get("/file/bot{token}/{path:.+}", self._download)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound = self._runner.addresses[0][1] if port == 0 else port
+        url = f"http://{host}:{bound}"
+        logger.info(f"Фейковый Bot API слушает {url}")
+        return url
+
+    async def stop(self) -> None:
+        await self._delete_webhook()
+        if self._client:
+            await self._client.close()
+            self._client = None
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": dict(self.calls),
+            "rate_limited": dict(self.rate_limited),
+            "polls": self.polls,
+            "webhook_deliveries": self.webhook_deliveries,
+            "webhook_rejected": self.webhook_rejected,
+            "pending_updates": len(self._updates),
+        }
@@ -0,0 +1,405 @@
+"""
+Сквозной нагрузочный тест: настоящий main() против фейкового Bot API.
+
+Драйвер поднимает benchmarks.fake_bot_api, запускает в том же процессе
+main(api_url=...) на копии синтетических данных и гоняет N одновременных
+«пользователей» по сценариям: регистрация, поиск партнёра, внесение счёта,
+просмотр турниров. Шаг сценария — текст, контакт или нажатие кнопки;
+кнопка ищется по префиксу callback_data в последней клавиатуре бота.
+
+Для каждого шага меряются две задержки:
+- first — от отправки апдейта до первого ответа бота в этот чат;
+- complete — до последнего ответа, после которого чат молчит settle секунд.
+
+  python -m benchmarks loadtest --users 50 --duration 60
+  python -m benchmarks loadtest --users 200 --latency 0.05 --rate-limit 0.01 --out load.json
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import logging
+import os
+import random
+import shutil
+import socket
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.datagen import DATING
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.report import summarize_latencies
+from utils.translations import t
+
+logger = logging.getLogger(__name__)
+
+NEW_USER_IDS = itertools.count(900_000_000)
+
+
+@dataclass
+class Step:
+    name: str
+    kind: str  # text | contact | press
+    value: str = ""
+    prefixes: Tuple[str, ...] = ()
+    optional: bool = False
+
+
+def Text(text: str, name: Optional[str] = None) -> Step:
+    return Step(name or f"text:{text[:20]}", "text", text)
+
+
+def Contact(phone: str) -> Step:
+    return Step("contact", "contact", phone)
+
+
+def Press(*prefixes: str, optional: bool = False) -> Step:
+    return Step(f"press:{prefixes[0].rstrip(':_')}", "press", prefixes=prefixes, optional=optional)
+
+
+@dataclass
+class SimUser:
+    id: int
+    first_name: str
+    username: Optional[str]
+    profile: Dict[str, Any] = field(default_factory=dict)
+
+    def as_telegram(self) -> Dict[str, Any]:
+        user = {"id": self.id, "first_name": self.first_name, "language_code": "ru"}
+        if self.username:
+            user["username"] = self.username
+        return user
+
+
+class Population:
+    """Кого из синтетических пользователей брать под какой сценарий."""
+
+    def __init__(self, users: Dict[str, Any]):
+        self.players: List[str] = []
+        self.subscribers: List[str] = []
+        self._by_place: Dict[Tuple[str, str, str], List[str]] = defaultdict(list)
+        for uid, p in users.items():
+            if p.get("role") != "Игрок" or p.get("sport") == DATING:
+                continue
+            self.players.append(uid)
+            self._by_place[(p["sport"], p["country"], p["city"])].append(uid)
+            if (p.get("subscription") or {}).get("active"):
+                self.subscribers.append(uid)
+        self.users = users
+
+    def sim(self, uid: str) -> SimUser:
+        p = self.users[uid]
+        return SimUser(int(uid), p.get("first_name", ""), p.get("username"), p)
+
+    def opponent_for(self, uid: str, rng: random.Random) -> Optional[str]:
+        p = self.users[uid]
+        pool = [x for x in self._by_place[(p["sport"], p["country"], p["city"])] if x != uid]
+        return rng.choice(pool) if pool else None
+
+
+# ---------- Сценарии ----------
+
+def registration_journey(pop: Population, rng: random.Random) -> Tuple[SimUser, List[Step]]:
+    uid = next(NEW_USER_IDS)
+    user = SimUser(uid, "Нагрузка", f"load{uid}")
+    return user, [
+        Text("/start"),
+        Press("lang_ru"),
+        Press("start_registration"),
+        Press("sport_🎾Большой теннис", "sport_"),
+        Text("Нагрузка", "first_name"),
+        Text(f"Тестов{uid % 1000}", "last_name"),
+        Text("15.05.1990", "birth_date"),
+        Press("country_🇷🇺", "country_"),
+        Press("city_Санкт-Петербург", "city_"),
+        Press("role_Игрок"),
+        Press("level_"),
+        Press("gender_"),
+        Text("Играю по выходным", "profile_comment"),
+        Press("photo_none"),
+        Press("defaultpay_", optional=True),
+        Press("vacation_no", optional=True),
+    ]
+
+
+def search_journey(pop: Population, rng: random.Random) -> Tuple[SimUser, List[Step]]:
+    user = pop.sim(rng.choice(pop.players))
+    return user, [
+        Text(t("menu.search_partner", "ru"), "menu_search"),
+        Press(f"partner_sport_{user.profile.get('sport')}", "partner_sport_"),
+        Press(f"partner_search_country_{user.profile.get('country')}", "partner_search_country_"),
+        Press(f"partner_search_city_{user.profile.get('city')}", "partner_search_city_"),
+        Press("partner_district_", optional=True),
+        Press("partner_gender_", optional=True),
+        Press("partner_level_", optional=True),
+    ]
+
+
+def score_journey(pop: Population, rng: random.Random) -> Tuple[SimUser, List[Step]]:
+    uid = rng.choice(pop.subscribers or pop.players)
+    user = pop.sim(uid)
+    opponent = pop.opponent_for(uid, rng)
+    if opponent is None:
+        return user, [Text(t("menu.enter_score", "ru"), "menu_score")]
+    o = pop.users[opponent]
+    return user, [
+        Text(t("menu.enter_score", "ru"), "menu_score"),
+        Press("game_type:single"),
+        Text(f"{o['first_name']} {o['last_name']}", "opponent_query"),
+        Press(f"select_opponent:{opponent}", "select_opponent:"),
+        Press("set_score:1_6:"),
+        Press("add_another_set:yes", optional=True),
+        Press("set_score:2_6:", optional=True),
+        Press("media:skip", optional=True),
+        Press("confirm:", optional=True),
+    ]
+
+
+def tournaments_journey(pop: Population, rng: random.Random) -> Tuple[SimUser, List[Step]]:
+    user = pop.sim(rng.choice(pop.players))
+    return user, [
+        Text(t("menu.tournaments", "ru"), "menu_tournaments"),
+        Press("view_tournaments_start"),
+        Press("view_tournament_sport:"),
+        Press("view_tournament_country:", optional=True),
+        Press("view_tournament_city:", optional=True),
+        Press("view_tournament_district:", optional=True),
+        Press("view_tournament_gender:", optional=True),
+        Press("view_tournament_type:", optional=True),
+        Press("view_tournament_next:", optional=True),
+    ]
+
+
+JOURNEYS: Dict[str, Callable[[Population, random.Random], Tuple[SimUser, List[Step]]]] = {
+    "registration": registration_journey,
+    "search": search_journey,
+    "score": score_journey,
+    "tournaments": tournaments_journey,
+}
+DEFAULT_MIX = {"registration": 1, "search": 3, "score": 1, "tournaments": 2}
+
+
+# ---------- Прогон ----------
+
+@dataclass
+class LoadStats:
+    first: List[float] = field(default_factory=list)
+    complete: List[float] = field(default_factory=list)
+    by_step: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    journeys: Dict[str, Dict[str, int]] = field(default_factory=lambda: defaultdict(lambda: defaultdict(int)))
+    updates: int = 0
+    timeouts: int = 0
+    missing_buttons: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+def parse_mix(text: Optional[str]) -> Dict[str, float]:
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in JOURNEYS:
+            raise ValueError(f"Неизвестный сценарий {name!r}; доступны: {', '.join(JOURNEYS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def _run_steps(api: FakeBotAPI, user: SimUser, steps: List[Step], stats: LoadStats, rng: random.Random,
+                     settle: float, timeout: float, think: float, stop_at: float) -> str:
+    tg_user = user.as_telegram()
+    for step in steps:
+        if time.perf_counter() >= stop_at:
+            return "cut"
+        if step.kind == "press":
+            buttons = api.buttons(user.id)
+            data = None
+            for prefix in step.prefixes:
+                matches = [b for b in buttons if b.startswith(prefix)]
+                if matches:
+                    data = rng.choice(matches)
+                    break
+            if data is None:
+                if step.optional:
+                    continue
+                stats.missing_buttons[step.name] += 1
+                return "no_button"
+        mark = api.mark(user.id)
+        started = time.perf_counter()
+        if step.kind == "press":
+            api.push_callback(tg_user, data)
+        elif step.kind == "contact":
+            api.push_message(tg_user, contact={"phone_number": step.value, "first_name": user.first_name, "user_id": user.id})
+        else:
+            api.push_message(tg_user, step.value)
+        stats.updates += 1
+        first = await api.wait_reply(user.id, mark, timeout)
+        if first is None:
+            stats.timeouts += 1
+            return "timeout"
+        last = await api.wait_settled(user.id, settle, timeout)
+        stats.first.append(first.at - started)
+        stats.complete.append(last.at - started)
+        stats.by_step[step.name].append(first.at - started)
+        await asyncio.sleep(think * rng.uniform(0.5, 1.5))
+    return "ok"
+
+
+async def _simulated_user(n: int, api: FakeBotAPI, pop: Population, mix: Dict[str, float], stats: LoadStats,
+                          seed: int, settle: float, timeout: float, think: float, stop_at: float) -> None:
+    rng = random.Random(seed * 100_003 + n)
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < stop_at:
+        journey = rng.choices(names, weights=weights)[0]
+        user, steps = JOURNEYS[journey](pop, rng)
+        outcome = await _run_steps(api, user, steps, stats, rng, settle, timeout, think, stop_at)
+        stats.journeys[journey][outcome] += 1
+
+
+def _handler_top(limit: int = 10) -> List[Dict[str, Any]]:
+    from utils.metrics import metrics
+
+    return [
+        {"handler": name, "count": hist.count, "p50": p50, "p95": p95, "p99": p99}
+        for name, hist, (p50, p95, p99) in metrics.top("bot_handler_seconds", "handler", limit=limit)
+    ]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_load(
+    data_dir: Path,
+    meta: Dict[str, Any],
+    users: int,
+    duration: float,
+    mix: Dict[str, float],
+    seed: int = 0,
+    ramp: float = 5.0,
+    think: float = 0.5,
+    settle: float = 0.15,
+    timeout: float = 30.0,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    rate_limit: float = 0.0,
+    mode: str = "polling",
+) -> Dict[str, Any]:
+    """Прогон на копии данных из data_dir (mode: polling или webhook); возвращает отчёт (см. format_load_report)."""
+    import json
+
+    from benchmarks.scenarios import use_dataset
+
+    workdir = Path(tempfile.mkdtemp(prefix="tennis_load_"))
+    shutil.copytree(data_dir, workdir, dirs_exist_ok=True)
+    use_dataset(workdir)
+    pop = Population(json.loads((workdir / "users.json").read_text(encoding="utf-8")))
+
+    api = FakeBotAPI(latency=latency, jitter=jitter, rate_limit=rate_limit, seed=seed)
+    url = await api.start(port=0)
+
+    import main as bot_main
+
+    stats = LoadStats()
+    sink = open(os.devnull, "w")
+    bot_task = None
+    stop = asyncio.Event()
+    # Хендлеры и фоновые задачи бота печатают отладку в stdout — на время прогона глушим
+    with contextlib.redirect_stdout(sink):
+        try:
+            webhook_port = _free_port() if mode == "webhook" else 0
+            bot_task = asyncio.create_task(bot_main.main(
+                api_url=url, stop=stop, mode=mode,
+                webhook_url=f"http://127.0.0.1:{webhook_port}", webhook_port=webhook_port,
+            ))
+            startup = time.perf_counter()
+            polled = asyncio.create_task(api.polled.wait())
+            await asyncio.wait({polled, bot_task}, timeout=120, return_when=asyncio.FIRST_COMPLETED)
+            if not polled.done():
+                polled.cancel()
+                if bot_task.done():
+                    raise RuntimeError(f"Бот завершился при запуске: {bot_task.exception()!r}")
+                raise RuntimeError("Бот не начал получать апдейты за 120 с")
+            startup = time.perf_counter() - startup
+
+            started = time.perf_counter()
+            stop_at = started + duration
+            tasks = []
+            for n in range(users):
+                tasks.append(asyncio.create_task(
+                    _simulated_user(n, api, pop, mix, stats, seed, settle, timeout, think, stop_at)
+                ))
+                if ramp and users > 1:
+                    await asyncio.sleep(ramp / users)
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+        finally:
+            if bot_task is not None:
+                stop.set()
+                try:
+                    await asyncio.wait_for(bot_task, timeout=30)
+                except Exception as e:
+                    logger.warning(f"Бот остановился с ошибкой: {e!r}")
+            await api.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+    sink.close()
+
+    return {
+        "config": {
+            "mode": mode, "users": users, "duration": duration, "mix": mix, "seed": seed, "ramp": ramp, "think": think,
+            "settle": settle, "timeout": timeout, "latency": latency, "jitter": jitter, "rate_limit": rate_limit,
+        },
+        "dataset": meta,
+        "startup_seconds": startup,
+        "elapsed_seconds": elapsed,
+        "updates": stats.updates,
+        "answered": len(stats.first),
+        "throughput": len(stats.first) / elapsed if elapsed else 0.0,
+        "timeouts": stats.timeouts,
+        "missing_buttons": dict(stats.missing_buttons),
+        "latency_first": summarize_latencies(stats.first),
+        "latency_complete": summarize_latencies(stats.complete),
+        "steps": {name: summarize_latencies(v) for name, v in sorted(stats.by_step.items())},
+        "journeys": {name: dict(outcomes) for name, outcomes in stats.journeys.items()},
+        "api": api.stats(),
+        "handlers": _handler_top(),
+    }
+
+
+def format_load_report(report: Dict[str, Any]) -> str:
+    def ms(row: Dict[str, Any], key: str) -> str:
+        return f"{row.get(key, 0) * 1000:8.1f}"
+
+    lines = [
+        f"Режим: {report['config'].get('mode', 'polling')}, пользователей: {report['config']['users']}, длительность: {report['elapsed_seconds']:.1f} с "
+        f"(запуск бота {report['startup_seconds']:.1f} с)",
+        f"Апдейтов: {report['updates']}, с ответом: {report['answered']}, "
+        f"пропускная способность: {report['throughput']:.1f} апдейтов/с, таймаутов: {report['timeouts']}",
+        f"{'задержка, мс':<22}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}",
+    ]
+    for title, key in (("до первого ответа", "latency_first"), ("до конца обработки", "latency_complete")):
+        row = report[key]
+        lines.append(f"{title:<22}{ms(row, 'p50')}{ms(row, 'p95')}{ms(row, 'p99')}{ms(row, 'max')}")
+    lines.append("Шаги (первый ответ, p95 мс):")
+    for name, row in sorted(report["steps"].items(), key=lambda kv: -kv[1].get("p95", 0))[:10]:
+        lines.append(f"  {name:<36}{ms(row, 'p95')}  ×{row['count']}")
+    lines.append("Сценарии: " + ", ".join(
+        f"{name} " + "/".join(f"{k}={v}" for k, v in sorted(outcomes.items()))
+        for name, outcomes in sorted(report["journeys"].items())
+    ))
+    if report["missing_buttons"]:
+        lines.append("Нет ожидаемой кнопки: " + ", ".join(f"{k}={v}" for k, v in report["missing_buttons"].items()))
+    api = report["api"]
+    lines.append(f"Вызовов Bot API: {sum(api['calls'].values())}, из них 429: {sum(api['rate_limited'].values())}")
+    if report["handlers"]:
+        lines.append("Самые медленные хендлеры (p95 мс):")
+        for h in report["handlers"][:5]:
+            lines.append(f"  {h['handler']:<40}{h['p95'] * 1000:8.1f}  ×{h['count']}")
+    return "\n".join(lines)
@@ -0,0 +1,108 @@
+"""
+Файл результатов бенчмарков и сравнение с базовым прогоном.
+
+Формат результатов:
+
+    {"meta": {...},
+     "sizes": {"1000": {"dataset": {...}, "scenarios": {"partner_search": {"median": 0.012, ...}}}}}
+"""
+
+from __future__ import annotations
+
+import json
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# Разница меньше этой не считается регрессией (шум таймера и планировщика)
+NOISE_FLOOR_SECONDS = 0.002
+
+
+def run_meta(repeat: int) -> Dict[str, Any]:
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+    }
+
+
+def summarize_latencies(samples: List[float]) -> Dict[str, float]:
+    """Перцентили задержек нагрузочного теста (пустой список — нули)."""
+    if not samples:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0, "mean": 0.0}
+    data = sorted(samples)
+
+    def q(p: float) -> float:
+        return data[min(len(data) - 1, int(p * len(data)))]
+
+    return {"count": len(data), "p50": q(0.5), "p95": q(0.95), "p99": q(0.99), "max": data[-1],
+            "mean": sum(data) / len(data)}
+
+
+def save_results(results: Dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def load_results(path: Path) -> Dict[str, Any]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _medians(results: Dict[str, Any]) -> Dict[Tuple[str, str], float]:
+    out = {}
+    for size, block in (results.get("sizes") or {}).items():
+        for name, row in (block.get("scenarios") or {}).items():
+            if "median" in row:
+                out[(size, name)] = row["median"]
+    return out
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.1) -> List[Dict[str, Any]]:
+    """Строки сравнения медиан по общим (размер, сценарий); status: ok/regression/improvement/new/missing."""
+    base, cur = _medians(baseline), _medians(current)
+    rows = []
+    for key in sorted(set(base) | set(cur), key=lambda k: (int(k[0]), k[1])):
+        b, c = base.get(key), cur.get(key)
+        if b is None or c is None:
+            rows.append({"size": key[0], "scenario": key[1], "baseline": b, "current": c,
+                         "ratio": None, "status": "new" if b is None else "missing"})
+            continue
+        ratio = c / b if b else float("inf")
+        status = "ok"
+        if abs(c - b) >= NOISE_FLOOR_SECONDS:
+            if ratio > 1 + threshold:
+                status = "regression"
+            elif ratio < 1 - threshold:
+                status = "improvement"
+        rows.append({"size": key[0], "scenario": key[1], "baseline": b, "current": c, "ratio": ratio, "status": status})
+    return rows
+
+
+def _ms(value: Any) -> str:
+    return f"{value * 1000:10.2f}" if isinstance(value, (int, float)) else f"{'—':>10}"
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    marks = {"regression": "▲", "improvement": "▼", "ok": " ", "new": "+", "missing": "-"}
+    lines = [f"{'размер':>7}  {'сценарий':<28} {'было, мс':>10} {'стало, мс':>10} {'×':>7}"]
+    for r in rows:
+        ratio = f"{r['ratio']:7.2f}" if r["ratio"] is not None else f"{'':>7}"
+        lines.append(f"{r['size']:>7}  {r['scenario']:<28} {_ms(r['baseline'])} {_ms(r['current'])} {ratio} {marks[r['status']]}")
+    regressions = sum(1 for r in rows if r["status"] == "regression")
+    improvements = sum(1 for r in rows if r["status"] == "improvement")
+    lines.append(f"Регрессий: {regressions}, улучшений: {improvements}")
+    return "\n".join(lines)
+
+
+def format_row(name: str, row: Dict[str, Any]) -> str:
+    if "error" in row:
+        return f"  {name:<28} ОШИБКА {row['error']}"
+    return (
+        f"  {name:<28} медиана {_ms(row['median'])} мс  p95 {_ms(row['p95'])} мс  "
+        f"чтений {row['storage_reads']:>4} ({row['storage_read_bytes'] / 1024 / 1024:.1f} МБ)  "
+        f"записей {row['storage_writes']}"
+    )
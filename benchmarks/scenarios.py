@@ -0,0 +1,323 @@
+"""
+Сценарии бенчмарков и их запуск.
+
+Каждый сценарий вызывает настоящий код бота (хендлер или фоновую задачу)
+на данных из benchmarks.datagen. Хранилище перенаправляется в каталог
+с данными через storage.config, Telegram заменяется заглушками, которые
+только считают вызовы.
+
+Сценарии, которые пишут в хранилище (проверка подписок, напоминания),
+перед каждым повтором получают исходные файлы обратно — восстановление
+в замер не входит.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import logging
+import statistics
+import time
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from benchmarks.datagen import BRACKET_SIZES, DATING, FILES
+from services.storage import StorageConfig, storage
+from utils.metrics import UpdateStats, current_update
+
+
+class _Recorder:
+    """Общая часть заглушек: любой неизвестный метод — корутина, считающая вызов."""
+
+    def __init__(self, calls: Dict[str, int]):
+        self._calls = calls
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def method(*args, **kwargs):
+            self._calls[name] = self._calls.get(name, 0) + 1
+            return self
+
+        return method
+
+
+class FakeBot(_Recorder):
+    id = 0
+
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+        self.type = "private"
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.username = None
+        self.first_name = "Bench"
+        self.is_bot = False
+
+
+class FakeMessage(_Recorder):
+    def __init__(self, chat_id: int, calls: Dict[str, int], bot: FakeBot):
+        super().__init__(calls)
+        self.chat = FakeChat(chat_id)
+        self.from_user = FakeUser(chat_id)
+        self.bot = bot
+        self.message_id = 1
+        self.text = ""
+
+
+class FakeCallback(_Recorder):
+    def __init__(self, chat_id: int, calls: Dict[str, int], bot: FakeBot):
+        super().__init__(calls)
+        self.message = FakeMessage(chat_id, calls, bot)
+        self.from_user = self.message.from_user
+        self.bot = bot
+        self.data = ""
+
+
+@dataclass
+class BenchContext:
+    directory: Path
+    meta: Dict[str, Any]
+    calls: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def bot(self) -> FakeBot:
+        return FakeBot(self.calls)
+
+    def message(self, chat_id: int) -> FakeMessage:
+        return FakeMessage(chat_id, self.calls, self.bot)
+
+    def callback(self, chat_id: int) -> FakeCallback:
+        return FakeCallback(chat_id, self.calls, self.bot)
+
+    def state(self, chat_id: int) -> FSMContext:
+        return FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=0, chat_id=chat_id, user_id=chat_id))
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[BenchContext], Awaitable[Any]]
+    # Файлы хранилища (ключи datagen.FILES), которые сценарий перезаписывает
+    mutates: Tuple[str, ...] = ()
+
+
+SCENARIOS: List[Scenario] = []
+
+
+def scenario(name: str, mutates: Tuple[str, ...] = ()):
+    def decorator(func: Callable[[BenchContext], Awaitable[Any]]):
+        SCENARIOS.append(Scenario(name, func, mutates))
+        return func
+    return decorator
+
+
+# ---------- Поиск ----------
+
+@scenario("partner_search")
+async def _partner_search(ctx: BenchContext) -> None:
+    from handlers.search_partner import perform_partner_search
+
+    search = ctx.meta["search"]
+    chat_id = int(ctx.meta["probe_user"])
+    state = ctx.state(chat_id)
+    await state.update_data(search_country=search["country"], search_city=search["city"], sport_type=search["sport"])
+    await perform_partner_search(ctx.message(chat_id), state)
+
+
+@scenario("partner_search_dating")
+async def _partner_search_dating(ctx: BenchContext) -> None:
+    from handlers.search_partner import perform_partner_search
+
+    search = ctx.meta["search"]
+    chat_id = int(ctx.meta["probe_user"])
+    state = ctx.state(chat_id)
+    await state.update_data(
+        search_country=search["country"], search_city=search["city"], sport_type=DATING,
+        age_range="26-35", dating_goal="friendship",
+    )
+    await perform_partner_search(ctx.message(chat_id), state)
+
+
+@scenario("users_by_location_countries")
+async def _locations_countries(ctx: BenchContext) -> None:
+    from utils.utils import get_users_by_location
+
+    await get_users_by_location("partner", sport_type=ctx.meta["search"]["sport"])
+
+
+@scenario("users_by_location_cities")
+async def _locations_cities(ctx: BenchContext) -> None:
+    from utils.utils import get_users_by_location
+
+    search = ctx.meta["search"]
+    await get_users_by_location("partner", country=search["country"], sport_type=search["sport"])
+
+
+@scenario("users_by_location_city")
+async def _locations_city(ctx: BenchContext) -> None:
+    from utils.utils import get_users_by_location
+
+    search = ctx.meta["search"]
+    await get_users_by_location("partner", country=search["country"], city=search["city"], sport_type=search["sport"])
+
+
+# ---------- История игр ----------
+
+@scenario("game_history")
+async def _game_history(ctx: BenchContext) -> None:
+    from handlers.enter_invoice import show_single_game_history
+
+    probe = ctx.meta["probe_user"]
+    await show_single_game_history(ctx.callback(int(probe)), probe, 0)
+
+
+# ---------- Отрисовка турниров ----------
+
+def _render_scenario(tournament_id: str, cached: bool = False):
+    """Показ картинки турнира: cached=False — полная отрисовка, True — готовая картинка из кэша."""
+    async def run(ctx: BenchContext) -> None:
+        from handlers.tournament import build_and_render_tournament_image
+        from utils.tournament_images import tournament_images
+
+        if not cached:
+            tournament_images.forget(tournament_id)
+        tournaments = await storage.load_tournaments()
+        await build_and_render_tournament_image(tournaments[tournament_id], tournament_id)
+    return run
+
+
+for _n in BRACKET_SIZES:
+    scenario(f"render_olympic_{_n}")(_render_scenario(f"bench_olympic_{_n}"))
+    scenario(f"render_round_robin_{_n}")(_render_scenario(f"bench_round_robin_{_n}"))
+    scenario(f"render_cached_olympic_{_n}")(_render_scenario(f"bench_olympic_{_n}", cached=True))
+    scenario(f"render_cached_round_robin_{_n}")(_render_scenario(f"bench_round_robin_{_n}", cached=True))
+
+
+# ---------- Фоновые задачи ----------
+
+@scenario("subscription_sweep", mutates=("users",))
+async def _subscription_sweep(ctx: BenchContext) -> None:
+    from main import run_subscription_sweep
+
+    await run_subscription_sweep(ctx.bot)
+
+
+@scenario("round_robin_reminders", mutates=("tournaments",))
+async def _round_robin_reminders(ctx: BenchContext) -> None:
+    from utils.tournament_lifecycle import process_round_robin_reminders
+
+    await process_round_robin_reminders(ctx.bot)
+
+
+# ---------- Запуск ----------
+
+def use_dataset(directory: Path) -> None:
+    """Перенаправляет хранилище бота в каталог с синтетическими данными."""
+    storage.config = StorageConfig(
+        users_file=directory / FILES["users"],
+        games_file=directory / FILES["games"],
+        banned_file=directory / FILES["banned"],
+        languages_file=directory / FILES["languages"],
+        sessions_dir=directory / "sessions",
+        tournaments_file=directory / FILES["tournaments"],
+        tournament_applications_file=directory / FILES["tournament_applications"],
+        beauty_contest_file=directory / FILES["beauty_contest"],
+        # Файлы, которых нет в наборе данных, создаются рядом с ним, а не в data/
+        payments_file=directory / "payments.json",
+        file_ids_file=directory / "file_ids.json",
+        leader_lock_file=directory / "leader.lock",
+    )
+
+
+def select(patterns: Optional[List[str]]) -> List[Scenario]:
+    if not patterns:
+        return list(SCENARIOS)
+    return [s for s in SCENARIOS if any(fnmatch(s.name, p) for p in patterns)]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    data = sorted(samples)
+    return {
+        "min": data[0],
+        "median": statistics.median(data),
+        "mean": statistics.fmean(data),
+        "p95": data[min(len(data) - 1, int(0.95 * len(data)))],
+        "max": data[-1],
+    }
+
+
+async def run_scenario(ctx: BenchContext, item: Scenario, repeat: int, warmup: int = 1) -> Dict[str, Any]:
+    """Прогоняет сценарий warmup + repeat раз; в результат идут только repeat замеров."""
+    originals = {key: (ctx.directory / FILES[key]).read_bytes() for key in item.mutates}
+    samples: List[float] = []
+    stats = UpdateStats()
+    bot_calls: Dict[str, int] = {}
+    ctx.calls.clear()
+    error = None
+    for i in range(warmup + repeat):
+        for key, content in originals.items():
+            (ctx.directory / FILES[key]).write_bytes(content)
+        run_stats = UpdateStats()
+        token = current_update.set(run_stats)
+        calls_before = dict(ctx.calls)
+        sink = io.StringIO()
+        started = time.perf_counter()
+        try:
+            # Хендлеры печатают отладку в stdout — на время замера глушим
+            with contextlib.redirect_stdout(sink):
+                await item.run(ctx)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            break
+        finally:
+            elapsed = time.perf_counter() - started
+            current_update.reset(token)
+        if i >= warmup:
+            samples.append(elapsed)
+            stats = run_stats
+            bot_calls = {k: v - calls_before.get(k, 0) for k, v in ctx.calls.items() if v != calls_before.get(k, 0)}
+    for key, content in originals.items():
+        (ctx.directory / FILES[key]).write_bytes(content)
+
+    if error is not None:
+        logging.getLogger(__name__).error(f"Сценарий {item.name} упал: {error}")
+        return {"error": error}
+    return {
+        "runs": len(samples),
+        **summarize(samples),
+        "storage_reads": stats.storage_reads,
+        "storage_read_bytes": stats.storage_read_bytes,
+        "storage_writes": stats.storage_writes,
+        "storage_write_bytes": stats.storage_write_bytes,
+        "bot_calls": bot_calls,
+    }
+
+
+async def run_all(
+    directory: Path,
+    meta: Dict[str, Any],
+    scenarios: List[Scenario],
+    repeat: int,
+    progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    use_dataset(directory)
+    ctx = BenchContext(directory, meta)
+    results = {}
+    for item in scenarios:
+        results[item.name] = await run_scenario(ctx, item, repeat)
+        if progress:
+            progress(item.name, results[item.name])
+    return results
@@ -14,21 +14,99 @@ ITEMS_PER_PAGE = 10
 TOURNAMENT_ENTRY_FEE = int(os.getenv('TOURNAMENT_ENTRY_FEE', 500))
 API_BASE_URL = os.getenv('TENNIS_API_URL', 'https://tennis-play.by/profile/api.php')
 API_SECRET_TOKEN = os.getenv('TENNIS_API_TOKEN', 'qTDrzUztf2CbdH3sUad9plkmfUryMNA5JAkX1HM2uXw')
+# Клиент API сайтов tennis-play.*: таймаут запроса (с), соединений на домен,
+# сколько секунд хранится ответ get_user, одновременных запросов при массовом импорте
+WEB_API_TIMEOUT = float(os.getenv('WEB_API_TIMEOUT', 10))
+WEB_API_MAX_CONNECTIONS = int(os.getenv('WEB_API_MAX_CONNECTIONS', 10))
+WEB_API_CACHE_TTL = float(os.getenv('WEB_API_CACHE_TTL', 60))
+WEB_API_IMPORT_CONCURRENCY = int(os.getenv('WEB_API_IMPORT_CONCURRENCY', 8))
 
 # Email настройки
-EMAIL_SMTP_HOST = 'smtp.yandex.ru'
-EMAIL_SMTP_PORT = 465
+EMAIL_SMTP_HOST = os.getenv('EMAIL_SMTP_HOST', 'smtp.yandex.ru')
+EMAIL_SMTP_PORT = int(os.getenv('EMAIL_SMTP_PORT', 465))
 EMAIL_SMTP_USERNAME = os.getenv('EMAIL_SMTP_USERNAME', 'info@tennis-play.com')
 EMAIL_SMTP_PASSWORD = os.getenv('EMAIL_SMTP_PASSWORD', '111111111')
+# Без STARTTLS на нестандартных портах — только для локального тестового SMTP (aiosmtpd)
+EMAIL_SMTP_PLAINTEXT = os.getenv('EMAIL_SMTP_PLAINTEXT', '0') == '1'
 EMAIL_FROM_ADDRESS = os.getenv('EMAIL_FROM_ADDRESS', 'info@tennis-play.com')
 EMAIL_FROM_NAME = os.getenv('EMAIL_FROM_NAME', 'Tennis-Play.com')
 EMAIL_ADMIN = os.getenv('EMAIL_ADMIN', 'toqoko@gmail.com')
+# Очередь писем: размер, писем за один проход, закрытие простаивающего соединения (с), попыток на письмо
+EMAIL_QUEUE_SIZE = int(os.getenv('EMAIL_QUEUE_SIZE', 1000))
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', 20))
+EMAIL_IDLE_SECONDS = float(os.getenv('EMAIL_IDLE_SECONDS', 60))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 5))
 
 TINKOFF_TERMINAL_KEY = os.getenv('TINKOFF_TERMINAL_KEY', '0000')
 TINKOFF_PASSWORD = os.getenv('TINKOFF_PASSWORD', '111111111')
-TINKOFF_BASE_URL = "https://securepay.tinkoff.ru/v2"
+TINKOFF_BASE_URL = os.getenv('TINKOFF_BASE_URL', "https://securepay.tinkoff.ru/v2")
+YOOKASSA_API_URL = os.getenv('YOOKASSA_API_URL', "https://api.yookassa.ru/v3")
+# Общий HTTP-клиент платёжных шлюзов: таймаут запроса (с) и предел одновременных соединений
+PAYMENTS_HTTP_TIMEOUT = float(os.getenv('PAYMENTS_HTTP_TIMEOUT', 15))
+PAYMENTS_MAX_CONNECTIONS = int(os.getenv('PAYMENTS_MAX_CONNECTIONS', 20))
+# Приём уведомлений платёжных шлюзов (POST /payments/tinkoff, /payments/yookassa; порт 0 — выключен)
+PAYMENTS_NOTIFY_HOST = os.getenv('PAYMENTS_NOTIFY_HOST', '127.0.0.1')
+PAYMENTS_NOTIFY_PORT = int(os.getenv('PAYMENTS_NOTIFY_PORT', 0))
+
+# Локальный эндпоинт метрик в формате Prometheus (порт 0 — выключен)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
+
+# Свой сервер Bot API (локальный telegram-bot-api или фейковый из benchmarks); пусто — api.telegram.org
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')
+
+# Режим получения апдейтов: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Публичный адрес, по которому Telegram будет слать апдейты (без пути), например https://bot.example.com
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# Сколько апдейтов обрабатывается одновременно (порядок внутри чата сохраняется всегда)
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 16))
+# Предел очереди; при переполнении вебхук ждёт WEBHOOK_ENQUEUE_TIMEOUT секунд и отвечает 503
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 1000))
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv('WEBHOOK_ENQUEUE_TIMEOUT', 5))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+
+# Кластерный режим: число процессов-воркеров (1 — один процесс, как раньше)
+CLUSTER_WORKERS = int(os.getenv('CLUSTER_WORKERS', 1))
+# Воркер i принимает апдейты от роутера на 127.0.0.1:CLUSTER_BASE_PORT + i
+CLUSTER_BASE_PORT = int(os.getenv('CLUSTER_BASE_PORT', 8100))
+# Выставляются роутером при запуске воркеров
+CLUSTER_WORKER_INDEX = int(os.environ['CLUSTER_WORKER_INDEX']) if os.getenv('CLUSTER_WORKER_INDEX') else None
+CLUSTER_SECRET = os.getenv('CLUSTER_SECRET', '')
+# Как часто не-лидер пытается забрать лидерскую блокировку фоновых задач, с
+LEADER_RETRY_SECONDS = float(os.getenv('LEADER_RETRY_SECONDS', 15))
+
+# Анти-флуд: токен-бакеты на пользователя (скорость пополнения в апдейтах/с и запас)
+THROTTLE_RATE = float(os.getenv('THROTTLE_RATE', 3))
+THROTTLE_BURST = int(os.getenv('THROTTLE_BURST', 30))
+# Отдельный бюджет для тяжёлых хендлеров (картинки сеток, полный поиск, история игр)
+THROTTLE_HEAVY_RATE = float(os.getenv('THROTTLE_HEAVY_RATE', 0.5))
+THROTTLE_HEAVY_BURST = int(os.getenv('THROTTLE_HEAVY_BURST', 6))
+
+# Картинки сеток и таблиц: наибольшая сторона в пикселях (Telegram хранит фото не больше 2560)
+# и форматы с потерями, из которых выбирается меньший, если палитра PNG заметно искажает картинку
+BRACKET_IMAGE_MAX_SIDE = int(os.getenv('BRACKET_IMAGE_MAX_SIDE', 2560))
+BRACKET_IMAGE_LOSSY_FORMATS = tuple(
+    f.strip().upper() for f in os.getenv('BRACKET_IMAGE_LOSSY_FORMATS', 'JPEG').split(',') if f.strip()
+)
+# Кэш каркасов олимпийских сеток (рамки, посев, линии без результатов), МБ пикселей на процесс; 0 — без кэша.
+# Каркас сетки на 64 участника — ~130 МБ: при значении по умолчанию кэшируются сетки поменьше
+BRACKET_LAYER_CACHE_MB = int(os.getenv('BRACKET_LAYER_CACHE_MB', 64))
+# Сколько МБ освобождённой памяти картинок Pillow держит для повторного использования (0 — отдавать сразу):
+# холст сетки на 64 участника — ~160 МБ, и без пула каждый раз заново получает страницы у ОС
+BRACKET_PIXEL_POOL_MB = int(os.getenv('BRACKET_PIXEL_POOL_MB', 0))
+# Готовые картинки турниров: сколько держать в памяти и чат, куда они загружаются заранее
+# ради file_id (0 — не загружать, пользователям уходит сама картинка)
+TOURNAMENT_IMAGE_CACHE_SIZE = int(os.getenv('TOURNAMENT_IMAGE_CACHE_SIZE', 200))
+TOURNAMENT_IMAGE_UPLOAD_CHAT_ID = int(os.getenv('TOURNAMENT_IMAGE_UPLOAD_CHAT_ID', 0))
 
 required_vars = ['TOKEN', 'BOT_USERNAME', 'CHANNEL_ID', 'SHOP_ID', 'SECRET_KEY']
 for var in required_vars:
     if not os.getenv(var):
         raise ValueError(f"Необходимо установить переменную окружения {var}")
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    raise ValueError("Для BOT_MODE=webhook необходимо установить WEBHOOK_URL")
@@ -12,6 +12,9 @@ GAMES_PHOTOS_DIR = DATA_DIR / "games_photo"
 TOURNAMENTS_FILE = DATA_DIR / "tournaments.json"
 TOURNAMENT_APPLICATIONS_FILE = DATA_DIR / "tournament_applications.json"
 BEAUTY_CONTEST_FILE = DATA_DIR / "beauty_contest.json"
+LEADER_LOCK_FILE = DATA_DIR / "leader.lock"
+PAYMENTS_FILE = DATA_DIR / "payments.json"
+FILE_IDS_FILE = DATA_DIR / "file_ids.json"
 
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
@@ -11,6 +11,10 @@ import os
 import logging
 
 from utils.tournament_manager import tournament_manager
+from utils.round_robin_standings import record_match
+from utils.score import attach_score, flip_score, format_score
+from utils.metrics import metrics
+from utils.photos import release_photo
 from utils.tournament_lifecycle import admin_sort_tournament_items, participants_count_label
 from config.profile import format_admin_tournament_level, get_tournament_gender_display
 from services.storage import storage
@@ -531,6 +535,47 @@ async def admin_panel(message: Message):
         get_admin_keyboard()
     )
 
+# Команда для просмотра метрик производительности
+@admin_router.message(Command("perf"))
+async def perf_cmd(message: Message):
+    if not await is_admin(message.from_user.id):
+        language = await get_user_language_async(str(message.chat.id))
+        await safe_send_message(message, t("admin.no_admin_rights", language))
+        return
+    
+    def ms(value: float) -> str:
+        return f"{value * 1000:.0f}"
+    
+    text = "⏱ <b>Хендлеры (p50/p95/p99, мс)</b>\n<pre>"
+    rows = metrics.top("bot_handler_seconds", "handler", limit=10)
+    if not rows:
+        text += "нет данных\n"
+    for name, hist, (p50, p95, p99) in rows:
+        blocking = metrics.histogram("bot_handler_blocking_seconds").get((("handler", name),))
+        block_p95 = blocking.percentiles(0.95)[0] if blocking else 0.0
+        text += f"{html_escape(name[:32])}\n  n={hist.count} {ms(p50)}/{ms(p95)}/{ms(p99)} блок.p95={ms(block_p95)}\n"
+    text += "</pre>"
+    
+    text += "\n💾 <b>Хранилище (p95, мс / средний размер, КБ)</b>\n<pre>"
+    for key, hist in sorted(metrics.histogram("bot_storage_io_seconds").items(), key=lambda kv: -kv[1].percentiles(0.95)[0])[:8]:
+        labels = dict(key)
+        sizes = metrics.histogram("bot_storage_io_bytes").get(key)
+        avg_kb = sizes.total / sizes.count / 1024 if sizes and sizes.count else 0
+        text += f"{labels.get('op', ''):<5} {html_escape(labels.get('file', '')):<28} n={hist.count} {ms(hist.percentiles(0.95)[0])} {avg_kb:.0f}\n"
+    text += "</pre>"
+    
+    text += "\n📡 <b>Bot API (p95, мс)</b>\n<pre>"
+    for name, hist, (_, p95, _) in metrics.top("bot_api_seconds", "method", limit=8):
+        text += f"{html_escape(name):<28} n={hist.count} {ms(p95)}\n"
+    text += "</pre>"
+    
+    lag = metrics.histogram("bot_event_loop_lag_seconds").get(())
+    if lag:
+        p50, p95, p99 = lag.percentiles(0.5, 0.95, 0.99)
+        text += f"\n🔄 Задержка event loop: {ms(p50)}/{ms(p95)}/{ms(p99)} мс"
+    
+    await safe_send_message(message, text)
+
 # Обработчики кнопок админской панели - меню выбора
 @admin_router.callback_query(F.data == "admin_banned_list")
 async def banned_list_handler(callback: CallbackQuery):
@@ -1929,15 +1974,9 @@ async def confirm_delete_user(callback: CallbackQuery):
         else:
             new_games.append(game)
     
-    # Удаление фото профиля
-    if user_data.get('photo_path'):
-        try:
-            os.remove(user_data['photo_path'])
-        except:
-            pass
-    
-    # Удаление пользователя
+    # Удаление пользователя; фото удаляется, если такое же (по хешу) не стоит у других
     del users[user_id]
+    release_photo(user_data.get('photo_path'), users.values())
     
     await storage.save_users(users)
     await storage.save_games(new_games)
@@ -2128,15 +2167,9 @@ async def ban_user_handler(callback: CallbackQuery):
         else:
             new_games.append(game)
     
-    # Удаление фото профиля
-    if user_data.get('photo_path'):
-        try:
-            os.remove(user_data['photo_path'])
-        except:
-            pass
-    
-    # Удаление пользователя
+    # Удаление пользователя; фото удаляется, если такое же (по хешу) не стоит у других
     del users[user_id]
+    release_photo(user_data.get('photo_path'), users.values())
     
     await storage.save_users(users)
     await storage.save_games(new_games)
@@ -2523,23 +2556,13 @@ async def admin_edit_score_input(message: Message, state: FSMContext):
             int(parts[0])
             int(parts[1])
         
-        # Обновляем игру
-        games[game_index]['score'] = new_score
+        # Обновляем игру (счёт разбирается один раз и хранится в score_data)
+        score_data = attach_score(games[game_index], new_score)
         games[game_index]['sets'] = sets
         
         # Пересчитываем победителя по новому счету
-        team1_wins = 0
-        team2_wins = 0
-        
-        for s in sets:
-            parts = s.split(':')
-            score1 = int(parts[0])
-            score2 = int(parts[1])
-            
-            if score1 > score2:
-                team1_wins += 1
-            elif score2 > score1:
-                team2_wins += 1
+        team1_wins = score_data['sets_a'] if score_data else 0
+        team2_wins = score_data['sets_b'] if score_data else 0
         
         team1_players = game.get('players', {}).get('team1', [])
         team2_players = game.get('players', {}).get('team2', [])
@@ -2580,12 +2603,16 @@ async def admin_edit_score_input(message: Message, state: FSMContext):
                         # Проверяем, совпадают ли игроки (в любом порядке)
                         if ((match_player1 == game_team1 and match_player2 == game_team2) or
                             (match_player1 == game_team2 and match_player2 == game_team1)):
-                            # Обновляем счет, победителя и статус в матче
-                            match['score'] = new_score
+                            # Обновляем счет, победителя и статус в матче (со стороны player1 матча)
+                            if match_player1 == game_team1:
+                                attach_score(match, new_score, score_data)
+                            else:
+                                attach_score(match, format_score(score_data, flip=True) or new_score, flip_score(score_data))
                             match['winner_id'] = winner_id
                             match['status'] = 'completed'
                             if 'completed_at' not in match:
                                 match['completed_at'] = datetime.now().isoformat()
+                            record_match(tournament, match)
                             logger.info(f"Обновлен матч {match.get('id')} в турнире {tournament_id}")
                             break
                     
@@ -2989,6 +3016,7 @@ async def admin_set_winner_handler(callback: CallbackQuery):
                             match['status'] = 'completed'
                             if 'completed_at' not in match:
                                 match['completed_at'] = datetime.now().isoformat()
+                            record_match(tournament, match)
                             logger.info(f"Обновлен победитель матча {match.get('id')} в турнире {tournament_id}")
                             break
                     
@@ -3162,6 +3190,7 @@ async def admin_confirm_delete_game_handler(callback: CallbackQuery):
                             match['status'] = 'pending'
                             if 'completed_at' in match:
                                 del match['completed_at']
+                            record_match(tournament, match)
                             logger.info(f"Сброшен матч {match.get('id')} в турнире {tournament_id}")
                             break
                     
@@ -7,13 +7,14 @@ from aiogram.types import (
     InlineKeyboardButton
 )
 
-from config.paths import BASE_DIR, PHOTOS_DIR
+from config.paths import PHOTOS_DIR
 from config.profile import create_sport_keyboard, moscow_districts, cities_data, countries, sport_type
 from models.states import AdminEditProfileStates, RegistrationStates
 from services.storage import storage
 from utils.admin import is_admin
 from utils.bot import show_profile
 from utils.media import download_photo_to_path
+from utils.photos import ingest_photo, photo_fields
 from utils.utils import remove_country_flag
 from handlers.profile import calculate_level_from_points
 from utils.translations import get_user_language_async, t
@@ -714,7 +715,7 @@ async def admin_edit_photo_handler(callback: types.CallbackQuery, state: FSMCont
         await callback.message.answer(t("admin_edit.upload_photo", language))
         await state.set_state(AdminEditProfileStates.PHOTO_UPLOAD)
     elif action == "none":
-        users[user_id]['photo_path'] = None
+        users[user_id].update(photo_fields(None))
         await storage.save_users(users)
         await callback.message.answer(t("admin_edit.photo_deleted", language))
         await show_profile(callback.message, users[user_id])
@@ -728,8 +729,7 @@ async def admin_edit_photo_handler(callback: types.CallbackQuery, state: FSMCont
                 dest_path = PHOTOS_DIR / filename
                 ok = await download_photo_to_path(callback.message.bot, file_id, dest_path)
                 if ok:
-                    rel_path = dest_path.relative_to(BASE_DIR).as_posix()
-                    users[user_id]['photo_path'] = rel_path
+                    users[user_id].update(await ingest_photo(dest_path))
                     await storage.save_users(users)
                     await callback.message.answer(t("admin_edit.photo_from_profile", language))
                     await show_profile(callback.message, users[user_id])
@@ -774,8 +774,7 @@ async def admin_save_photo_upload(message: types.Message, state: FSMContext):
         ok = await download_photo_to_path(message.bot, photo_id, dest_path)
         
         if ok:
-            rel_path = dest_path.relative_to(BASE_DIR).as_posix()
-            users[user_id]['photo_path'] = rel_path
+            users[user_id].update(await ingest_photo(dest_path))
             await storage.save_users(users)
             await message.answer(t("admin_edit.photo_updated", language))
             await show_profile(message, users[user_id])
@@ -5,8 +5,7 @@ from aiogram.types import (
     Message,
     CallbackQuery,
     InlineKeyboardMarkup,
-    InlineKeyboardButton,
-    FSInputFile
+    InlineKeyboardButton
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
@@ -14,6 +13,7 @@ from handlers.more import back_to_main
 from models.states import BeautyContestStates
 from services.storage import storage
 from utils.admin import is_admin
+from utils.file_ids import send_cached_file
 from utils.utils import calculate_age, remove_country_flag
 from utils.translations import get_user_language_async, t
 from config.profile import get_country_translation, get_city_translation, get_gender_translation
@@ -374,11 +374,14 @@ async def show_profile_page(message: Message, viewer_id: int, state: FSMContext)
             except:
                 pass
             
-            await message.answer_photo(
-                photo=FSInputFile(photo_path),
-                caption=text,
-                reply_markup=builder.as_markup(),
-                parse_mode="HTML"
+            await send_cached_file(
+                lambda media: message.answer_photo(
+                    photo=media,
+                    caption=text,
+                    reply_markup=builder.as_markup(),
+                    parse_mode="HTML"
+                ),
+                photo_path,
             )
         else:
             await message.edit_text(text, reply_markup=builder.as_markup(), parse_mode="HTML")
@@ -629,11 +632,14 @@ async def apply_to_contest(callback: CallbackQuery, state: FSMContext):
         except:
             pass
         
-        await callback.message.answer_photo(
-            photo=FSInputFile(photo_path),
-            caption=text,
-            reply_markup=builder.as_markup(),
-            parse_mode="HTML"
+        await send_cached_file(
+            lambda media: callback.message.answer_photo(
+                photo=media,
+                caption=text,
+                reply_markup=builder.as_markup(),
+                parse_mode="HTML"
+            ),
+            photo_path,
         )
     except:
         await callback.message.edit_text(text, reply_markup=builder.as_markup(), parse_mode="HTML")
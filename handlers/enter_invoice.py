@@ -15,10 +15,14 @@ from services.channels import send_game_notification_to_channel
 from services.storage import storage
 from utils.tournament_manager import tournament_manager
 from utils.admin import is_admin
+from utils.file_ids import send_cached_file
 from utils.media import save_media_file
 from utils.utils import calculate_age, calculate_new_ratings, create_user_profile_link, search_users
+from utils.round_robin_standings import ensure_standings, record_result
+from utils.score import SCORE_DATA_KEY, attach_score, flip_score, format_score, game_difference, parse_score, score_data_of
 from handlers.profile import calculate_level_from_points
 from utils.translations import get_user_language_async, t
+from middlewares.throttling import HEAVY
 
 def format_rating(rating: float) -> str:
     """Форматирует рейтинг, убирая лишние нули после запятой"""
@@ -283,7 +287,7 @@ async def handle_game_type_selection(callback: types.CallbackQuery, state: FSMCo
     
     await callback.answer()
 
-@router.message(AddScoreState.searching_opponent)
+@router.message(AddScoreState.searching_opponent, flags=HEAVY)
 async def handle_opponent_search(message: types.Message, state: FSMContext):
     search_query = message.text
     current_user_id = str(message.chat.id)
@@ -309,7 +313,7 @@ async def handle_opponent_search(message: types.Message, state: FSMContext):
     msg = await message.answer(t("enter_invoice.select_opponent", language=language), reply_markup=keyboard)
     save_message_id(message.chat.id, msg.message_id)
 
-@router.message(AddScoreState.selecting_partner)
+@router.message(AddScoreState.selecting_partner, flags=HEAVY)
 async def handle_partner_search(message: types.Message, state: FSMContext):
     search_query = message.text
     current_user_id = str(message.chat.id)
@@ -375,7 +379,7 @@ async def handle_partner_selection(callback: types.CallbackQuery, state: FSMCont
     )
     await callback.answer()
 
-@router.message(AddScoreState.searching_opponent1)
+@router.message(AddScoreState.searching_opponent1, flags=HEAVY)
 async def handle_opponent1_search(message: types.Message, state: FSMContext):
     search_query = message.text
     current_user_id = str(message.chat.id)
@@ -443,7 +447,7 @@ async def handle_opponent1_selection(callback: types.CallbackQuery, state: FSMCo
     )
     await callback.answer()
 
-@router.message(AddScoreState.searching_opponent2)
+@router.message(AddScoreState.searching_opponent2, flags=HEAVY)
 async def handle_opponent2_search(message: types.Message, state: FSMContext):
     search_query = message.text
     current_user_id = str(message.chat.id)
@@ -582,9 +586,12 @@ async def handle_set_score_selection(callback: types.CallbackQuery, state: FSMCo
     # Проверяем, был ли выбран супертайбрейк
     supertiebreak_set = data.get('supertiebreak_set')
     
-    # Если это супертайбрейк, просто используем счет как есть
+    # Если это супертайбрейк, просто используем счет как есть и запоминаем номер сета
+    tiebreak_sets = [n for n in data.get('tiebreak_sets', []) if n != set_number]
     if supertiebreak_set == set_number:
+        tiebreak_sets.append(set_number)
         await state.update_data(supertiebreak_set=None)
+    await state.update_data(tiebreak_sets=tiebreak_sets)
     
     # Обновляем или добавляем счет сета
     if len(sets) >= set_number:
@@ -711,17 +718,12 @@ async def process_completed_game(callback: types.CallbackQuery, state: FSMContex
         await callback.answer(t("enter_invoice.score_not_entered", language=language))
         return
     
-    # Рассчитываем общую разницу геймов
-    total_game_diff = 0
-    for set_score in sets:
-        games1, games2 = map(int, set_score.split(':'))
-        total_game_diff += abs(games1 - games2)
+    # Разбираем счёт один раз: дальше используются только готовые поля
+    score_data = parse_score(sets, data.get('tiebreak_sets'))
+    total_game_diff = game_difference(score_data)
     
     # Определяем победителя
-    team1_wins = sum(1 for s in sets if int(s.split(':')[0]) > int(s.split(':')[1]))
-    team2_wins = sum(1 for s in sets if int(s.split(':')[0]) < int(s.split(':')[1]))
-    
-    if team1_wins > team2_wins:
+    if score_data and score_data['sets_a'] > score_data['sets_b']:
         winner_side = "team1"
     else:
         winner_side = "team2"
@@ -731,6 +733,7 @@ async def process_completed_game(callback: types.CallbackQuery, state: FSMContex
     await state.update_data(
         score=score_text,
         sets=sets,
+        score_data=score_data,
         game_difference=total_game_diff,
         winner_side=winner_side
     )
@@ -828,6 +831,7 @@ async def confirm_score(message_or_callback: Union[types.Message, types.Callback
     game_type: str = data.get('game_type')            # 'single' | 'double'
     score = data.get('score')
     sets = data.get('sets')
+    score_data = data.get('score_data') or parse_score(sets or score)
     game_diff = data.get('game_difference')
     winner_side = data.get('winner_side')             # 'team1' | 'team2'
 
@@ -1264,6 +1268,7 @@ async def confirm_score(message_or_callback: Union[types.Message, types.Callback
         'type': game_type,
         'score': score,
         'sets': sets,
+        SCORE_DATA_KEY: score_data,
         'media_filename': media_filename,
         'players': players_block,
         'rating_changes': rating_changes_for_game,
@@ -1296,8 +1301,11 @@ async def confirm_score(message_or_callback: Union[types.Message, types.Callback
                 if mk:
                     seen_keys.add(mk)
                 if new_key and mk == new_key:
-                    # обновим счет и победителя
-                    m['score'] = score
+                    # обновим счет и победителя (счёт хранится со стороны player1 матча)
+                    if str(m.get('player1_id')) == current_id:
+                        attach_score(m, score, score_data)
+                    else:
+                        attach_score(m, format_score(score_data, flip=True) or score, flip_score(score_data))
                     m['winner_id'] = winner_id_for_record
                     updated = True
                     break
@@ -1309,8 +1317,11 @@ async def confirm_score(message_or_callback: Union[types.Message, types.Callback
                     'player1_id': current_id,
                     'player2_id': pid(opponent1),
                     'score': score,
+                    SCORE_DATA_KEY: score_data,
                     'winner_id': winner_id_for_record
                 })
+            if new_key:
+                record_result(ensure_standings(t_tournaments), current_id, pid(opponent1), score_data, winner_id_for_record)
             t_tournaments['matches'] = t_matches
             tournaments[tid] = t_tournaments
             await storage.save_tournaments(tournaments)
@@ -1406,7 +1417,8 @@ async def handle_score_confirmation(callback: types.CallbackQuery, state: FSMCon
             
             # Обновляем результат матча в турнире и подготавливаем следующий раунд
             if match_id:
-                await tournament_manager.update_match_result(match_id, winner_id, data.get('score'), bot=callback.bot)
+                await tournament_manager.update_match_result(match_id, winner_id, data.get('score'), bot=callback.bot, score_data=data.get('score_data'),
+                                                          reporter_id=current_user_id)
                 # После обновления результата можно уведомить участников о новых матчах
                 try:
                     from utils.tournament_notifications import TournamentNotifications
@@ -2028,7 +2040,7 @@ async def handle_navigation(callback: types.CallbackQuery, state: FSMContext):
     
     await callback.answer()
 
-@router.callback_query(F.data.startswith("game_history:"))
+@router.callback_query(F.data.startswith("game_history:"), flags=HEAVY)
 async def handle_history_request(callback: types.CallbackQuery):
     """Обработчик запроса истории игр"""
     try:
@@ -2058,7 +2070,7 @@ async def handle_history_request(callback: types.CallbackQuery):
         print(f"Ошибка при выводе истории: {e}")
         await callback.answer("Произошла ошибка при загрузке истории")
 
-@router.callback_query(F.data.startswith("history_nav:"))
+@router.callback_query(F.data.startswith("history_nav:"), flags=HEAVY)
 async def handle_history_navigation(callback: types.CallbackQuery):
     """Обработчик навигации по истории игр"""
     try:
@@ -2127,10 +2139,9 @@ async def show_single_game_history(callback: types.CallbackQuery, target_user_id
     # Определяем результат для пользователя
     user_in_team1 = target_user_id in game['players']['team1']
     
-    team1_wins = sum(1 for set_score in game['sets'] 
-                   if int(set_score.split(':')[0]) > int(set_score.split(':')[1]))
-    team2_wins = sum(1 for set_score in game['sets'] 
-                   if int(set_score.split(':')[0]) < int(set_score.split(':')[1]))
+    score_data = score_data_of(game) or {}
+    team1_wins = score_data.get('sets_a', 0)
+    team2_wins = score_data.get('sets_b', 0)
     
     if (user_in_team1 and team1_wins > team2_wins) or (not user_in_team1 and team2_wins > team1_wins):
         result = "✅ Победа" if language == "ru" else "✅ Victory"
@@ -2243,23 +2254,27 @@ async def show_single_game_history(callback: types.CallbackQuery, target_user_id
         if os.path.exists(media_path):
             # Определяем тип медиа
             if game['media_filename'].endswith(('.jpg', '.jpeg', '.png')):
-                with open(media_path, 'rb') as photo:
-                    await callback.message.delete()
-                    await callback.message.answer_photo(
-                        photo,
+                await callback.message.delete()
+                await send_cached_file(
+                    lambda media: callback.message.answer_photo(
+                        media,
                         caption=history_text,
                         reply_markup=keyboard,
                         parse_mode='Markdown',
-                    )
+                    ),
+                    media_path,
+                )
             elif game['media_filename'].endswith(('.mp4', '.mov')):
-                with open(media_path, 'rb') as video:
-                    await callback.message.delete()
-                    await callback.message.answer_video(
-                        video,
+                await callback.message.delete()
+                await send_cached_file(
+                    lambda media: callback.message.answer_video(
+                        media,
                         caption=history_text,
                         reply_markup=keyboard,
                         parse_mode='Markdown',
-                    )
+                    ),
+                    media_path,
+                )
             else:
                 try:
                     await callback.message.edit_text(history_text, reply_markup=keyboard, parse_mode='Markdown')
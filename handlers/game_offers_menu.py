@@ -15,8 +15,10 @@ from config.profile import (
 )
 from services.storage import storage
 from utils.admin import is_admin
+from utils.file_ids import send_cached_file
+from utils.offer_index import offer_index
 from models.states import BrowseOffersStates, RespondToOfferStates
-from utils.utils import create_user_profile_link, get_sort_key, remove_country_flag, parse_date_flexible
+from utils.utils import create_user_profile_link, remove_country_flag, parse_date_flexible
 from utils.translations import get_user_language_async, t
 
 router = Router()
@@ -41,19 +43,8 @@ async def select_offer_sport(callback: types.CallbackQuery, state: FSMContext):
     await state.update_data(selected_sport=sport_type_selected)
     language = await get_user_language_async(str(callback.message.chat.id))
     
-    users = await storage.load_users()
-    current_user_id = str(callback.message.chat.id)
-    
-    # Собираем статистику по странам для выбранного вида спорта
-    country_stats = {}
-    for user_id, user_data in users.items():
-        if user_data.get('games'):
-            for game in user_data['games']:
-                if (game.get('active', True) and 
-                    game.get('sport') == sport_type_selected and
-                    game.get('country')):
-                    country = game.get('country')
-                    country_stats[country] = country_stats.get(country, 0) + 1
+    # Статистика по странам для выбранного вида спорта — из индекса предложений
+    country_stats = await offer_index.country_counts(sport_type_selected)
     
     if not country_stats:
         await callback.message.edit_text(
@@ -123,19 +114,8 @@ async def select_offer_country(callback: types.CallbackQuery, state: FSMContext)
     
     await state.update_data(selected_country=country)
     
-    users = await storage.load_users()
-    
-    # Собираем статистику по городам в выбранной стране для выбранного вида спорта
-    city_stats = {}
-    for user_id, user_data in users.items():
-        if user_data.get('games'):
-            for game in user_data['games']:
-                if (game.get('active', True) and 
-                    game.get('sport') == sport_type_selected and
-                    game.get('country') == country and
-                    game.get('city')):
-                    city = game.get('city')
-                    city_stats[city] = city_stats.get(city, 0) + 1
+    # Статистика по городам в выбранной стране для выбранного вида спорта — из индекса предложений
+    city_stats = await offer_index.city_counts(sport_type_selected, country)
     
     if not city_stats:
         await callback.message.edit_text(
@@ -148,7 +128,8 @@ async def select_offer_country(callback: types.CallbackQuery, state: FSMContext)
     
     # Создаем клавиатуру с кнопками городов
     buttons = []
-    for city, count in list(city_stats.items())[:5]:
+    # Города по убыванию числа предложений
+    for city, count in sorted(city_stats.items(), key=lambda x: x[1], reverse=True)[:5]:
         buttons.append([
             InlineKeyboardButton(
                 text=t("game_offers_menu.city_item", language, city=get_city_translation(city, language), count=count),
@@ -183,46 +164,8 @@ async def select_offer_city(callback: types.CallbackQuery, state: FSMContext):
     
     await state.update_data(selected_city=city)
     
-    # Получаем все активные предложения в выбранном городе, стране и виде спорта
-    users = await storage.load_users()
-    all_offers = []
-    
-    for user_id, user_data in users.items():
-        if user_data.get('games') and user_id != callback.message.chat.id:
-            # Если есть фамилия - сокращаем имя, если нет - используем полное имя
-            first_name = user_data.get('first_name', 'Неизвестно')
-            last_name = user_data.get('last_name', '')
-            if last_name:
-                user_name = f"{first_name[:1]}.{last_name}".strip()
-            else:
-                user_name = first_name
-            
-            for game in user_data['games']:
-                if (game.get('active', True) and 
-                    game.get('sport') == sport_type_selected and
-                    game.get('country') == country and 
-                    game.get('city') == city):
-                    
-                    offer = {
-                        'user_id': user_id,
-                        'user_name': user_name,
-                        'player_level': user_data.get('player_level'),
-                        'rating_points': user_data.get('rating_points'),
-                        'gender': user_data.get('gender'),
-                        'district': game.get('district'),
-                        'game_id': game.get('id'),
-                        'country': game.get('country'),
-                        'city': game.get('city'),
-                        'date': game.get('date'),
-                        'time': game.get('time'),
-                        'sport_type': game.get('sport'),
-                        'game_type': game.get('type'),
-                        'payment_type': game.get('payment_type'),
-                        'competitive': game.get('competitive'),
-                        'repeat': game.get('repeat'),
-                        'comment': game.get('comment')
-                    }
-                    all_offers.append(offer)
+    # Активные предложения в выбранном городе, стране и виде спорта, уже отсортированные по дате и времени
+    all_offers = await offer_index.offers(sport_type_selected, country, city)
     
     if not all_offers:
         language = await get_user_language_async(str(callback.message.chat.id))
@@ -234,8 +177,6 @@ async def select_offer_city(callback: types.CallbackQuery, state: FSMContext):
         )
         return
     
-    all_offers.sort(key=get_sort_key)
-    
     # Сохраняем все предложения в state
     await state.update_data(all_offers=all_offers, current_page=0)
     
@@ -364,10 +305,10 @@ async def view_offer_details(callback: types.CallbackQuery, state: FSMContext):
         if str(g.get('id')) == game_id and g.get('active', True):
             game = g
             break
-    game["media_filename"] = user_data.get('photo_path', '')
     if not game:
         await callback.answer("❌ " + ("Предложение не найдено" if language == "ru" else "Offer not found"))
         return
+    game["media_filename"] = user_data.get('photo_path', '')
     
     # Сохраняем информацию о выбранном предложении для возможного отклика
     await state.update_data(
@@ -618,21 +559,25 @@ async def view_offer_details(callback: types.CallbackQuery, state: FSMContext):
         if os.path.exists(media_path):
             # Определяем тип медиа
             if game['media_filename'].endswith(('.jpg', '.jpeg', '.png')):
-                with open(media_path, 'rb') as photo:
-                    await callback.message.delete()
-                    await callback.message.answer_photo(
-                        photo,
+                await callback.message.delete()
+                await send_cached_file(
+                    lambda media: callback.message.answer_photo(
+                        media,
                         caption=text,
                         reply_markup=keyboard
-                    )
+                    ),
+                    media_path,
+                )
             elif game['media_filename'].endswith(('.mp4', '.mov')):
-                with open(media_path, 'rb') as video:
-                    await callback.message.delete()
-                    await callback.message.answer_video(
-                        video,
+                await callback.message.delete()
+                await send_cached_file(
+                    lambda media: callback.message.answer_video(
+                        media,
                         caption=text,
                         reply_markup=keyboard
-                    )
+                    ),
+                    media_path,
+                )
             else:
                 await callback.message.edit_text(text, reply_markup=keyboard)
         else:
@@ -779,19 +724,8 @@ async def back_to_country_selection(callback: types.CallbackQuery, state: FSMCon
     sport_type_selected = state_data.get('selected_sport')
     language = await get_user_language_async(str(callback.message.chat.id))
     
-    users = await storage.load_users()
-    current_user_id = str(callback.message.chat.id)
-    
-    # Собираем статистику по странам (исключая текущего пользователя) для выбранного вида спорта
-    country_stats = {}
-    for user_id, user_data in users.items():
-        if user_data.get('games'):
-            for game in user_data['games']:
-                if (game.get('active', True) and 
-                    game.get('sport') == sport_type_selected and
-                    game.get('country')):
-                    country = game.get('country')
-                    country_stats[country] = country_stats.get(country, 0) + 1
+    # Статистика по странам для выбранного вида спорта — из индекса предложений
+    country_stats = await offer_index.country_counts(sport_type_selected)
     
     if not country_stats:
         await callback.message.edit_text(
@@ -860,19 +794,8 @@ async def back_to_city_selection(callback: types.CallbackQuery, state: FSMContex
     sport_type_selected = state_data.get('selected_sport')
     language = await get_user_language_async(str(callback.message.chat.id))
     
-    users = await storage.load_users()
-    
-    # Собираем статистику по городам в выбранной стране для выбранного вида спорта
-    city_stats = {}
-    for user_id, user_data in users.items():
-        if user_data.get('games'):
-            for game in user_data['games']:
-                if (game.get('active', True) and 
-                    game.get('sport') == sport_type_selected and
-                    game.get('country') == country and
-                    game.get('city')):
-                    city = game.get('city')
-                    city_stats[city] = city_stats.get(city, 0) + 1
+    # Статистика по городам в выбранной стране для выбранного вида спорта — из индекса предложений
+    city_stats = await offer_index.city_counts(sport_type_selected, country)
     
     if not city_stats:
         await callback.message.edit_text(
@@ -885,7 +808,8 @@ async def back_to_city_selection(callback: types.CallbackQuery, state: FSMContex
     
     # Создаем клавиатуру с кнопками городов
     buttons = []
-    for city, count in list(city_stats.items())[:5]:
+    # Города по убыванию числа предложений
+    for city, count in sorted(city_stats.items(), key=lambda x: x[1], reverse=True)[:5]:
         buttons.append([
             InlineKeyboardButton(
                 text=t("game_offers_menu.city_item", language, city=get_city_translation(city, language), count=count),
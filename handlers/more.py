@@ -16,6 +16,7 @@ from utils.admin import is_admin
 from utils.bot import show_profile
 from utils.utils import calculate_age, count_users_by_location, get_top_countries, get_top_cities, remove_country_flag
 from utils.translations import get_user_language_async, t
+from middlewares.throttling import HEAVY
 
 router = Router()
 
@@ -237,7 +238,7 @@ async def process_search_country_input(message: Message, state: FSMContext):
     await state.set_state(SearchStates.SEARCH_CITY_INPUT)
     await storage.save_session(message.from_user.id, await state.get_data())
 
-@router.callback_query(SearchStates.SEARCH_CITY, F.data.startswith("search_city_"))
+@router.callback_query(SearchStates.SEARCH_CITY, F.data.startswith("search_city_"), flags=HEAVY)
 async def process_search_city(callback: types.CallbackQuery, state: FSMContext):
     city = callback.data.split("_", maxsplit=2)[2]
     await state.update_data(search_city=city)
@@ -321,7 +322,7 @@ async def back_to_countries(callback: types.CallbackQuery, state: FSMContext):
     await state.set_state(SearchStates.SEARCH_COUNTRY)
     await callback.answer()
 
-@router.message(SearchStates.SEARCH_CITY_INPUT, F.text)
+@router.message(SearchStates.SEARCH_CITY_INPUT, F.text, flags=HEAVY)
 async def process_search_city_input(message: Message, state: FSMContext):
     await state.update_data(search_city=message.text.strip())
     
@@ -544,7 +545,7 @@ async def show_price_ranges(message: Union[types.Message, types.CallbackQuery],
             )
     await state.set_state(SearchStates.SEARCH_PRICE_RANGE)
 
-@router.callback_query(SearchStates.SEARCH_PRICE_RANGE, F.data.startswith("price_range_"))
+@router.callback_query(SearchStates.SEARCH_PRICE_RANGE, F.data.startswith("price_range_"), flags=HEAVY)
 async def process_price_range(callback: types.CallbackQuery, state: FSMContext):
     if callback.data == "price_range_any":
         await state.update_data(price_min=None, price_max=None)
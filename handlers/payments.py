@@ -1,15 +1,14 @@
-from yookassa import Configuration
-from datetime import datetime, timedelta
+from datetime import datetime
 from aiogram import F, Router, types
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from config.config import SECRET_KEY, SHOP_ID, SUBSCRIPTION_PRICE
+from config.config import SUBSCRIPTION_PRICE
 from config.profile import get_base_keyboard
 from models.states import PaymentStates
-from services.payments import check_tinkoff_payment_status, check_yookassa_payment_status, generate_yookassa_payment_link, generate_tinkoff_payment_link
+from services.payment_ledger import APPLIED, KIND_SUBSCRIPTION, REFUND, reconcile_payment, record_pending_payment
+from services.payments import generate_tinkoff_payment_link
 from services.storage import storage
-from utils.email import send_payment_notification_to_admin
 from utils.translations import get_user_language_async, t
 import logging
 
@@ -98,18 +97,21 @@ async def process_email_input(message: types.Message, state: FSMContext):
     
     await state.update_data(user_email=email)
     
-    Configuration.account_id = SHOP_ID
-    Configuration.secret_key = SECRET_KEY
-    
     try:
-        payment_link, payment_id = await generate_tinkoff_payment_link(
+        result = await generate_tinkoff_payment_link(
             message.chat.id, 
             SUBSCRIPTION_PRICE, 
             "Оплата подписки для расширенного функционала",
             email
         )
+        if isinstance(result, dict):
+            raise RuntimeError(result.get('message') or result.get('error'))
+        payment_link, payment_id = result
         
         await state.update_data(payment_id=payment_id)
+        # Платёж подтвердится и без кнопки: его проверит фоновая сверка
+        await record_pending_payment(payment_id, "tinkoff", KIND_SUBSCRIPTION, message.chat.id,
+                                     SUBSCRIPTION_PRICE, email)
         
         builder = InlineKeyboardBuilder()
         builder.add(types.InlineKeyboardButton(
@@ -148,67 +150,28 @@ async def confirm_payment(callback: types.CallbackQuery, state: FSMContext):
         pass
     
     try:
-        payment = await check_tinkoff_payment_status(payment_id)
+        user_id = callback.message.chat.id
+        # Платежи, созданные до появления журнала, заносятся в него здесь
+        await record_pending_payment(payment_id, "tinkoff", KIND_SUBSCRIPTION, user_id,
+                                     SUBSCRIPTION_PRICE, user_email)
+        # Подписка активируется один раз на payment_id, даже если её уже применила фоновая сверка
+        status = await reconcile_payment(callback.bot, payment_id, notify_user=False, source="button")
         
-        if payment['status'] == "CONFIRMED":
-            user_id = callback.message.chat.id
-            users = await storage.load_users()
-            
-            if str(user_id) in users and users[str(user_id)].get('subscription', {}).get('active', False):
-                subscription_until = users[str(user_id)]['subscription'].get('until')
-                if subscription_until:
-                    try:
-                        until_date = datetime.strptime(subscription_until, '%Y-%m-%d')
-                        if until_date > datetime.now():
-                            language = await get_user_language_async(str(user_id))
-                            profile = await storage.get_user(user_id) or {}
-                            sport = profile.get("sport", "🎾Большой теннис")
-                            await callback.message.answer(
-                                t("payments.subscription_active_refund", language, date=subscription_until),
-                                reply_markup=get_base_keyboard(sport, language=language)
-                            )
-                            await state.clear()
-                            await callback.answer()
-                            return
-                    except ValueError:
-                        pass
-            
-            # Активируем подписку
-            language = await get_user_language_async(str(user_id))
-            profile = await storage.get_user(user_id) or {}
-            sport = profile.get("sport", "🎾Большой теннис")
+        language = await get_user_language_async(str(user_id))
+        profile = await storage.get_user(user_id) or {}
+        sport = profile.get("sport", "🎾Большой теннис")
+        if status == APPLIED:
             await callback.message.answer(
                 t("payments.payment_success", language, email=user_email),
                 reply_markup=get_base_keyboard(sport, language=language)
             )
-            
-            # Сохраняем информацию о подписке в базе данных
-            user_id = callback.message.chat.id
-            users = await storage.load_users()
-            if str(user_id) not in users:
-                users[str(user_id)] = {}
-            
-            users[str(user_id)]['subscription'] = {
-                'active': True,
-                'until': (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'),
-                'activated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'email': user_email
-            }
-            await storage.save_users(users)
-            
-            # Отправляем письмо администратору о платеже
-            await send_payment_notification_to_admin(
-                user_id=user_id,
-                profile=users[str(user_id)],
-                payment_id=payment_id,
-                user_email=user_email,
-                payment_amount=SUBSCRIPTION_PRICE
+        elif status == REFUND:
+            subscription_until = (profile.get('subscription') or {}).get('until', '')
+            await callback.message.answer(
+                t("payments.subscription_active_refund", language, date=subscription_until),
+                reply_markup=get_base_keyboard(sport, language=language)
             )
-
         else:
-            language = await get_user_language_async(str(callback.message.chat.id))
-            profile = await storage.get_user(callback.message.chat.id) or {}
-            sport = profile.get("sport", "🎾Большой теннис")
             await callback.message.answer(
                 t("payments.payment_not_completed", language),
                 reply_markup=get_base_keyboard(sport, language=language)
@@ -16,6 +16,7 @@ from config.profile import (
 from models.states import EditProfileStates
 from utils.bot import show_profile
 from utils.media import download_photo_to_path
+from utils.photos import ingest_photo, photo_fields
 from utils.utils import remove_country_flag
 from utils.admin import is_admin
 from services.storage import storage
@@ -791,7 +792,7 @@ async def edit_photo_handler(callback: types.CallbackQuery, state: FSMContext):
         await callback.message.answer(t("profile_edit.photo_send_new", language))
         await state.set_state(EditProfileStates.PHOTO_UPLOAD)
     elif action == "none":
-        users[user_key]['photo_path'] = None
+        users[user_key].update(photo_fields(None))
         await storage.save_users(users)
         await callback.message.answer(t("profile_edit.photo_deleted", language))
         await show_profile(callback.message, users[user_key])
@@ -806,8 +807,7 @@ async def edit_photo_handler(callback: types.CallbackQuery, state: FSMContext):
                 dest_path = PHOTOS_DIR / filename
                 ok = await download_photo_to_path(callback.message.bot, file_id, dest_path)
                 if ok:
-                    rel_path = dest_path.relative_to(BASE_DIR).as_posix()
-                    users[user_key]['photo_path'] = rel_path
+                    users[user_key].update(await ingest_photo(dest_path))
                     await storage.save_users(users)
                     await callback.message.answer(t("profile_edit.photo_set_from_telegram", language))
                     await show_profile(callback.message, users[user_key])
@@ -841,8 +841,7 @@ async def save_photo_upload(message: types.Message, state: FSMContext):
         ok = await download_photo_to_path(message.bot, photo_id, dest_path)
         
         if ok:
-            rel_path = dest_path.relative_to(BASE_DIR).as_posix()
-            users[user_key]['photo_path'] = rel_path
+            users[user_key].update(await ingest_photo(dest_path))
             await storage.save_users(users)
             await message.answer(t("profile_edit.photo_updated", language))
             await show_profile(message, users[user_key])
@@ -13,7 +13,7 @@ from aiogram.types import (
     InlineKeyboardButton
 )
 
-from config.paths import BASE_DIR, PHOTOS_DIR
+from config.paths import PHOTOS_DIR
 from config.profile import (
     create_sport_keyboard,
     get_moscow_districts,
@@ -46,6 +46,8 @@ from models.states import RegistrationStates
 from services.channels import send_registration_notification, send_tour_to_channel
 from utils.admin import is_user_banned
 from utils.media import download_photo_to_path
+from utils.photos import ingest_photo, photo_fields
+from utils.game import new_offer_id
 from utils.bot import show_current_data, show_profile
 from utils.validate import validate_date, validate_date_range, validate_future_date, validate_price
 from utils.utils import calculate_age, remove_country_flag, escape_markdown, parse_date_flexible
@@ -338,7 +340,7 @@ async def handle_auto_registration(message: types.Message, state: FSMContext, st
             params["country"] = "Беларусь"
         
         # Скачиваем фото профиля если есть
-        photo_path = None
+        photo = None
         photo_url_large = web_user_data.get('photo_url_large', '')
         
         if photo_url_large and photo_url_large.strip():
@@ -350,8 +352,8 @@ async def handle_auto_registration(message: types.Message, state: FSMContext, st
                 
                 # Скачиваем фото
                 if await web_api_client.download_photo(photo_url_large, str(dest_path)):
-                    # Сохраняем относительный путь
-                    photo_path = dest_path.relative_to(BASE_DIR).as_posix()
+                    # Превью и хранение по хешу содержимого
+                    photo = await ingest_photo(dest_path)
             except Exception as e:
                 # Если ошибка скачивания - просто логируем и продолжаем без фото
                 pass
@@ -402,7 +404,7 @@ async def handle_auto_registration(message: types.Message, state: FSMContext, st
             "player_level": params.get("level", ""),
             "rating_points": table_tennis_levels[params.get("level", "")].get("points", 0) if params.get("sport", "") != "Настольный теннис" else int(params.get("level", "")),
             "price": params.get("price", None),
-            "photo_path": photo_path,
+            **photo_fields(photo),
             "games_played": 0,
             "games_wins": 0,
             "default_payment": params.get("payment", "Пополам"),
@@ -420,9 +422,6 @@ async def handle_auto_registration(message: types.Message, state: FSMContext, st
             "vacation_comment": vacation_comment,
         }
         
-        # Инициализируем счетчик игр
-        game_counter = 1
-        
         # Проверяем актуальность даты предложения игры
         if params.get("public_offer", False):
             offer_date_str = params.get("public_offer_date", "")
@@ -450,7 +449,7 @@ async def handle_auto_registration(message: types.Message, state: FSMContext, st
                             "type": "Одиночная",
                             "payment_type": "Пополам",
                             "competitive": False,
-                            "id": game_counter,
+                            "id": new_offer_id(),
                             "created_at": datetime.now().isoformat(timespec="seconds"),
                             "active": True
                         }
@@ -464,8 +463,6 @@ async def handle_auto_registration(message: types.Message, state: FSMContext, st
                             if not (user_gender == 'Женский' and sport in ['🍒Знакомства', '🍻По пиву']):
                                 free_offers_used = profile.get('free_offers_used', 0)
                                 profile['free_offers_used'] = free_offers_used + 1
-
-                        game_counter += 1
         
         await storage.save_user(user_id, profile)
         
@@ -1443,8 +1440,7 @@ async def process_photo_choice(callback: types.CallbackQuery, state: FSMContext)
                 dest_path = PHOTOS_DIR / filename
                 ok = await download_photo_to_path(callback.message.bot, file_id, dest_path)
                 if ok:
-                    rel_path = dest_path.relative_to(BASE_DIR).as_posix()
-                    await state.update_data(photo="profile", photo_path=rel_path)
+                    await state.update_data(photo="profile", **await ingest_photo(dest_path))
                     await ask_for_next_step_after_photo(callback.message, state)
                 else:
                     await callback.message.edit_text(t("registration.photo_error", language))
@@ -1456,10 +1452,10 @@ async def process_photo_choice(callback: types.CallbackQuery, state: FSMContext)
             await callback.message.edit_text(t("registration.photo_error", language))
             return
     elif choice == "none":
-        await state.update_data(photo="none", photo_path=None)
+        await state.update_data(photo="none", **photo_fields(None))
         await ask_for_next_step_after_photo(callback.message, state)
     else:
-        await state.update_data(photo="none", photo_path=None)
+        await state.update_data(photo="none", **photo_fields(None))
         await ask_for_next_step_after_photo(callback.message, state)
 
     await callback.answer()
@@ -1476,8 +1472,7 @@ async def process_photo_upload(message: types.Message, state: FSMContext):
     
     ok = await download_photo_to_path(message.bot, photo_id, dest_path)
     if ok:
-        rel_path = dest_path.relative_to(BASE_DIR).as_posix()
-        await state.update_data(photo="uploaded", photo_path=rel_path)
+        await state.update_data(photo="uploaded", **await ingest_photo(dest_path))
         await ask_for_next_step_after_photo(message, state)
     else:
         await message.answer(t("registration.photo_save_error", language))
@@ -1768,7 +1763,7 @@ async def create_user_profile(user_id: int, username: str, user_state: dict) ->
         "player_level": user_state.get("player_level"),
         "rating_points": rating_points,
         "price": user_state.get("price"),
-        "photo_path": user_state.get("photo_path"),
+        **photo_fields(user_state),
         "games_played": 0,
         "games_wins": 0,
         "default_payment": user_state.get("default_payment"),
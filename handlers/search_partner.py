@@ -17,8 +17,10 @@ from handlers.dating_filters import show_age_range_selection, show_dating_goal_s
 from models.states import SearchPartnerStates
 from utils.bot import show_profile
 from utils.utils import calculate_age, count_users_by_location, get_users_by_location, get_top_countries, get_top_cities, remove_country_flag
+from utils.dating_index import DATING_SPORT, dating_index
 from services.storage import storage
 from utils.translations import get_user_language_async, t
+from middlewares.throttling import HEAVY
 
 router = Router()
 
@@ -50,7 +52,7 @@ async def handle_search_partner(message: types.Message, state: FSMContext):
     await state.update_data(last_message_id=sent_message.message_id)
     await state.set_state(SearchPartnerStates.SEARCH_SPORT)
 
-@router.callback_query(SearchPartnerStates.SEARCH_SPORT, F.data.startswith("partner_sport_"))
+@router.callback_query(SearchPartnerStates.SEARCH_SPORT, F.data.startswith("partner_sport_"), flags=HEAVY)
 async def process_search_sport_partner(callback: types.CallbackQuery, state: FSMContext):
     if callback.data == "partner_sport_any":
         await state.update_data(sport_type=None)
@@ -95,7 +97,7 @@ async def process_search_sport_partner(callback: types.CallbackQuery, state: FSM
     await state.set_state(SearchPartnerStates.SEARCH_COUNTRY)
     await callback.answer()
 
-@router.callback_query(SearchPartnerStates.SEARCH_COUNTRY, F.data.startswith("partner_search_country_"))
+@router.callback_query(SearchPartnerStates.SEARCH_COUNTRY, F.data.startswith("partner_search_country_"), flags=HEAVY)
 async def process_search_country_partner(callback: types.CallbackQuery, state: FSMContext):
     country = callback.data.split("_", maxsplit=3)[3]
     await state.update_data(search_country=country)
@@ -157,7 +159,7 @@ async def process_search_country_partner(callback: types.CallbackQuery, state: F
     await state.set_state(SearchPartnerStates.SEARCH_CITY)
     await callback.answer()
 
-@router.callback_query(SearchPartnerStates.SEARCH_CITY, F.data.startswith("partner_search_city_"))
+@router.callback_query(SearchPartnerStates.SEARCH_CITY, F.data.startswith("partner_search_city_"), flags=HEAVY)
 async def process_search_city_partner(callback: types.CallbackQuery, state: FSMContext):
     city = callback.data.split("_", maxsplit=3)[3]
     await state.update_data(search_city=city)
@@ -233,7 +235,7 @@ async def process_district_selection(callback: types.CallbackQuery, state: FSMCo
     await show_gender_selection(callback.message, state)
     await callback.answer()
 
-@router.callback_query(SearchPartnerStates.SEARCH_DISTRICT, F.data == "partner_back_to_cities")
+@router.callback_query(SearchPartnerStates.SEARCH_DISTRICT, F.data == "partner_back_to_cities", flags=HEAVY)
 async def partner_back_to_cities_from_district(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     country = data.get('search_country')
@@ -383,7 +385,7 @@ async def show_level_selection(message: Union[types.Message, types.CallbackQuery
     )
     await state.set_state(SearchPartnerStates.SEARCH_LEVEL)
 
-@router.callback_query(SearchPartnerStates.SEARCH_LEVEL, F.data.startswith("partner_level_"))
+@router.callback_query(SearchPartnerStates.SEARCH_LEVEL, F.data.startswith("partner_level_"), flags=HEAVY)
 async def process_level_selection(callback: types.CallbackQuery, state: FSMContext):
     if callback.data == "partner_level_any":
         await state.update_data(level=None)
@@ -416,7 +418,14 @@ async def perform_partner_search(message: Union[types.Message, types.CallbackQue
     language = await get_user_language_async(str(message_obj.chat.id))
     results = []
     
-    for user_id, profile in users.items():
+    if sport_type_val == DATING_SPORT:
+        # Город, пол, возраст и цель отбирает индекс знакомств — дальше проверяются только его кандидаты
+        candidate_ids = await dating_index.search(country, city, gender, age_range, dating_goal)
+        candidates = [(user_id, users[user_id]) for user_id in candidate_ids if user_id in users]
+    else:
+        candidates = users.items()
+    
+    for user_id, profile in candidates:
         if not profile.get('show_in_search', True):
             continue
         
@@ -441,35 +450,6 @@ async def perform_partner_search(message: Union[types.Message, types.CallbackQue
         if level and profile.get('player_level') != level:
             continue
         
-        # Фильтрация для знакомств
-        if sport_type_val == "🍒Знакомства":
-            # Фильтр по возрасту
-            if age_range and age_range != "any":
-                user_age = await calculate_age(profile.get('birth_date', '01.01.2000'))
-                if age_range == "18-25" and not (18 <= user_age <= 25):
-                    continue
-                elif age_range == "26-35" and not (26 <= user_age <= 35):
-                    continue
-                elif age_range == "36-45" and not (36 <= user_age <= 45):
-                    continue
-                elif age_range == "46-55" and not (46 <= user_age <= 55):
-                    continue
-                elif age_range == "56+" and user_age < 56:
-                    continue
-            
-            # Фильтр по цели знакомств - исправляем маппинг
-            if dating_goal and dating_goal != "any":
-                # Новый формат: ключи
-                profile_goal_key = profile.get("dating_goal_key")
-                if profile_goal_key and profile_goal_key != dating_goal:
-                    continue
-                # Fallback на старые профили, где хранится текст
-                if not profile_goal_key:
-                    profile_goal = profile.get('dating_goal')
-                    target_goal = t(f"config.dating_goals.{dating_goal}", "ru")
-                    if profile_goal != target_goal:
-                        continue
-            
         results.append((user_id, profile))
     
     # Сортировка партнеров по возрастанию уровня/рейтинга, если это не знакомства
@@ -549,7 +529,7 @@ async def partner_back_to_age_from_dating_goal(callback: types.CallbackQuery, st
     await show_age_range_selection(callback.message, state)
     await callback.answer()
 
-@router.callback_query(SearchPartnerStates.SEARCH_DISTANCE, F.data.startswith("partner_distance_"))
+@router.callback_query(SearchPartnerStates.SEARCH_DISTANCE, F.data.startswith("partner_distance_"), flags=HEAVY)
 async def process_distance_selection(callback: types.CallbackQuery, state: FSMContext):
     if callback.data == "partner_distance_any":
         await state.update_data(distance=None)
@@ -625,7 +605,7 @@ async def partner_back_to_countries_from_city(callback: types.CallbackQuery, sta
     await state.set_state(SearchPartnerStates.SEARCH_COUNTRY)
     await callback.answer()
 
-@router.callback_query(SearchPartnerStates.SEARCH_GENDER, F.data == "partner_back_to_cities")
+@router.callback_query(SearchPartnerStates.SEARCH_GENDER, F.data == "partner_back_to_cities", flags=HEAVY)
 async def partner_back_to_cities_from_gender(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     country = data.get('search_country')
@@ -737,7 +717,7 @@ async def process_search_other_country_partner(callback: types.CallbackQuery, st
     await callback.answer()
 
 # Обработчик для выбора страны из "Других стран"
-@router.callback_query(SearchPartnerStates.SEARCH_OTHER_COUNTRIES, F.data.startswith("partner_search_country_"))
+@router.callback_query(SearchPartnerStates.SEARCH_OTHER_COUNTRIES, F.data.startswith("partner_search_country_"), flags=HEAVY)
 async def process_other_country_selection(callback: types.CallbackQuery, state: FSMContext):
     country = callback.data.split("_", maxsplit=3)[3]
     await state.update_data(search_country=country)
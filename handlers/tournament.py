@@ -1,5 +1,5 @@
 from aiogram import Bot, Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, BufferedInputFile
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from typing import Optional
@@ -24,23 +24,26 @@ from utils.bracket_image_generator import (
     create_simple_text_image_bytes,
 )
 from utils.round_robin_image_generator import build_round_robin_table
+from utils.round_robin_standings import ensure_standings
+from utils.score import SCORE_DATA_KEY, attach_score, game_difference, parse_score, score_data_of, set_pairs
 from utils.tournament_manager import tournament_manager
-from utils.utils import calculate_new_ratings, remove_country_flag
+from utils.utils import calculate_new_ratings, remove_country_flag, search_users
+from utils.photos import avatar_file
 from handlers.profile import calculate_level_from_points
 from utils.tournament_notifications import TournamentNotifications
+from utils.tournament_images import fingerprint, tournament_images
 from utils.tournament_lifecycle import (
     admin_sort_tournament_items,
     participants_count_label,
     maybe_begin_payment_collection,
-    maybe_clear_payment_window_if_resolved,
     tournament_strip_removed_participant_payment_state,
 )
 from utils.translations import get_user_language_async, t
-from config.config import SHOP_ID, SECRET_KEY
-from yookassa import Configuration, Payment
 from models.states import TournamentPaymentStates
-from services.payments import check_tinkoff_payment_status, generate_tinkoff_payment_link, generate_yookassa_payment_link
-from utils.email import send_tournament_payment_notification_to_admin
+from middlewares.callbacks import idempotent
+from middlewares.throttling import HEAVY
+from services.payment_ledger import APPLIED, KIND_TOURNAMENT, REFUND, reconcile_payment, record_pending_payment
+from services.payments import generate_tinkoff_payment_link, generate_yookassa_payment_link
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -228,9 +231,9 @@ def create_advanced_tournament_bracket(tournament_data, bracket_text, users_data
         user_data = users_data[str(user_id)]
         photo_path = user_data.get('photo_path')
         
-        if photo_path and os.path.exists(photo_path):
+        if photo_path and os.path.exists(avatar_file(photo_path, 30)):
             try:
-                avatar = Image.open(photo_path)
+                avatar = Image.open(avatar_file(photo_path, 30))
                 # Изменяем размер аватара
                 avatar = avatar.resize((30, 30), Image.Resampling.LANCZOS)
                 return avatar
@@ -317,21 +320,11 @@ def create_advanced_tournament_bracket(tournament_data, bracket_text, users_data
                     if not player1_id or not player2_id:
                         continue
 
-                    # Парсим счет (например, "6:1, 6:3")
-                    sets = [s.strip() for s in str(score).split(',') if ':' in s]
-                    player1_sets = 0
-                    player2_sets = 0
-                    sets_data = []  # Сохраняем детализацию по сетам для подсчета очков
-                    for set_score in sets:
-                        try:
-                            p1_games, p2_games = map(int, set_score.split(':'))
-                            sets_data.append((p1_games, p2_games))
-                        except Exception:
-                            continue
-                        if p1_games > p2_games:
-                            player1_sets += 1
-                        elif p2_games > p1_games:
-                            player2_sets += 1
+                    # Счёт уже разобран при записи игры (score_data)
+                    score_data = score_data_of(game) or {}
+                    player1_sets = score_data.get('sets_a', 0)
+                    player2_sets = score_data.get('sets_b', 0)
+                    sets_data = set_pairs(score_data)  # Детализация по сетам для подсчета очков
 
                     # Сохраняем результат
                     results.setdefault(player1_id, {})
@@ -904,6 +897,7 @@ async def build_and_render_tournament_image(tournament_data: dict, tournament_id
             norm_game = {
                 'tournament_id': tournament_id,
                 'score': g.get('score') or (', '.join(g.get('sets', []) or [])),
+                'score_data': g.get('score_data'),
                 'players': {
                     'team1': team1_list,
                     'team2': team2_list,
@@ -930,16 +924,23 @@ async def build_and_render_tournament_image(tournament_data: dict, tournament_id
         )
         return create_simple_text_image_bytes(placeholder, tour_name), t("tournament.image.bracket_hidden_title", language)
 
-    # Генерируем изображение сетки через утилиту
+    # Генерируем изображение сетки через утилиту; готовая картинка с теми же данными берётся из кэша
     try:
         if tournament_type == 'Круговая':
             # Собираем компактный список игроков для таблицы (добавляем фото профиля)
             table_players = [{"id": p.id, "name": p.name, "photo_path": getattr(p, 'photo_url', None)} for p in players]
             tour_name = tournament_data.get('name') or t("tournament.no_name", language)
-            image_bytes = build_round_robin_table(table_players, completed_games, tour_name)
+            standings = ensure_standings(tournament_data)
+            image_bytes, _ = await tournament_images.get(
+                tournament_id, fingerprint(tournament_data, players, completed_games, tour_name),
+                lambda: (build_round_robin_table(table_players, completed_games, tour_name, standings=standings), ""),
+            )
             return image_bytes, t("tournament.image.round_robin_table", language)
         else:
-            return build_tournament_bracket_image_bytes(tournament_data, players, completed_games)
+            return await tournament_images.get(
+                tournament_id, fingerprint(tournament_data, players, completed_games),
+                lambda: build_tournament_bracket_image_bytes(tournament_data, players, completed_games),
+            )
     except Exception as e:
         logger.error(f"Ошибка при генерации изображения: {e}")
         fallback = t("tournament.image.bracket_error", language)
@@ -2502,13 +2503,13 @@ async def show_tournaments_list(callback: CallbackQuery, tournaments: dict, spor
             final_caption = text + t("tournament.browse.payments_header", language) + payments_block
 
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=truncate_caption(final_caption),
         reply_markup=builder.as_markup()
     )
 
 # Обработчики пагинации для новой системы просмотра турниров
-@router.callback_query(F.data.startswith("view_tournament_prev:"))
+@router.callback_query(F.data.startswith("view_tournament_prev:"), flags=HEAVY)
 async def view_tournament_prev(callback: CallbackQuery, state: FSMContext):
     """Обработчик кнопки 'Предыдущий' в просмотре турниров"""
     language = await get_user_language_async(str(callback.message.chat.id))
@@ -2649,13 +2650,13 @@ async def view_tournament_prev(callback: CallbackQuery, state: FSMContext):
             final_caption = text + t("tournament.browse.payments_header", language) + payments_block
 
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=truncate_caption(final_caption),
         reply_markup=builder.as_markup()
     )
     await callback.answer()
 
-@router.callback_query(F.data.startswith("view_tournament_next:"))
+@router.callback_query(F.data.startswith("view_tournament_next:"), flags=HEAVY)
 async def view_tournament_next(callback: CallbackQuery, state: FSMContext):
     """Обработчик кнопки 'Следующий' в просмотре турниров"""
     language = await get_user_language_async(str(callback.message.chat.id))
@@ -2783,14 +2784,14 @@ async def view_tournament_next(callback: CallbackQuery, state: FSMContext):
     # Всегда отправляем изображение сетки
     await callback.message.delete()
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=truncate_caption(text),
         reply_markup=builder.as_markup()
     )
     await callback.answer()
 
 # Обработчик кнопки "Участвовать"
-@router.callback_query(F.data.startswith("apply_tournament:"))
+@router.callback_query(F.data.startswith("apply_tournament:"), flags=HEAVY)
 async def apply_tournament_handler(callback: CallbackQuery):
     """Немедленное участие в турнире (без заявок)"""
     tournament_id = callback.data.split(':')[1]
@@ -2897,13 +2898,13 @@ async def apply_tournament_handler(callback: CallbackQuery):
     except:
         pass
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=truncate_caption(caption),
         reply_markup=builder.as_markup()
     )
     await callback.answer()
 
-@router.callback_query(F.data == "apply_proposed_tournament")
+@router.callback_query(F.data == "apply_proposed_tournament", flags=HEAVY)
 async def apply_proposed_tournament(callback: CallbackQuery, state: FSMContext):
     """Создает предложенный турнир и регистрирует пользователя"""
     language = await get_user_language_async(str(callback.from_user.id))
@@ -3021,7 +3022,7 @@ async def apply_proposed_tournament(callback: CallbackQuery, state: FSMContext):
     except Exception:
         pass
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=truncate_caption(caption),
         reply_markup=builder.as_markup()
     )
@@ -3082,12 +3083,14 @@ async def tournament_pay_get_email(message: Message, state: FSMContext):
     data = await state.get_data()
     tournament_id = data['tournament_id']
     fee = data['tournament_fee']
-    Configuration.account_id = SHOP_ID
-    Configuration.secret_key = SECRET_KEY
-    
     try:
-        payment_link, payment_id = await generate_tinkoff_payment_link(message.chat.id, fee, t("tournament.payment_description", language, tournament_id=tournament_id), email)
+        result = await generate_tinkoff_payment_link(message.chat.id, fee, t("tournament.payment_description", language, tournament_id=tournament_id), email)
+        if isinstance(result, dict):
+            raise RuntimeError(result.get('message') or result.get('error'))
+        payment_link, payment_id = result
         await state.update_data(payment_id=payment_id, user_email=email)
+        await record_pending_payment(payment_id, "tinkoff", KIND_TOURNAMENT, message.chat.id, fee, email,
+                                     tournament_id=tournament_id)
         kb = InlineKeyboardBuilder()
         kb.button(text=t("tournament.buttons.to_payments", language), url=payment_link)
         kb.button(text=t("tournament.buttons.confirm_payment", language), callback_data=f"tournament_pay_confirm:{tournament_id}")
@@ -3101,7 +3104,8 @@ async def tournament_pay_get_email(message: Message, state: FSMContext):
         await message.answer(t("tournament.payment_error_create", language, error=str(e)))
         await state.clear()
 
-@router.callback_query(TournamentPaymentStates.CONFIRM_PAYMENT, F.data.startswith("tournament_pay_confirm:"))
+@router.callback_query(TournamentPaymentStates.CONFIRM_PAYMENT, F.data.startswith("tournament_pay_confirm:"), flags=HEAVY)
+@idempotent(key=lambda callback: (callback.from_user.id, callback.data))
 async def tournament_pay_confirm(callback: CallbackQuery, state: FSMContext):
     language = await get_user_language_async(str(callback.message.chat.id))
     data = await state.get_data()
@@ -3109,34 +3113,15 @@ async def tournament_pay_confirm(callback: CallbackQuery, state: FSMContext):
     tournament_id = callback.data.split(":")[1]
     user_id = callback.from_user.id
     try:
-        payment = await check_tinkoff_payment_status(payment_id)
-        if payment['status'] == "CONFIRMED":
+        # Платежи, созданные до появления журнала, заносятся в него здесь
+        await record_pending_payment(payment_id, "tinkoff", KIND_TOURNAMENT, user_id, data['tournament_fee'],
+                                     data.get('user_email'), tournament_id=tournament_id)
+        # Взнос засчитывается один раз на payment_id, даже если его уже применила фоновая сверка
+        status = await reconcile_payment(callback.bot, payment_id, notify_user=False, source="button")
+        if status == APPLIED:
             tournaments = await storage.load_tournaments()
             tournament = tournaments.get(tournament_id, {})
-            payments = tournament.get('payments', {})
-            payments[str(user_id)] = {
-                'payment_id': payment_id,
-                'status': 'succeeded',
-                'amount': float(data['tournament_fee']),
-                'paid_at': datetime.now().isoformat(),
-                'email': data.get('user_email')
-            }
-            tournament['payments'] = payments
-            tournaments[tournament_id] = tournament
-            await storage.save_tournaments(tournaments)
-            await maybe_clear_payment_window_if_resolved(tournament_id)
-
-            profile = await storage.get_user(user_id) or {}
             tour_name = tournament.get('name') or t("tournament.no_name", language)
-            await send_tournament_payment_notification_to_admin(
-                user_id=user_id,
-                profile=profile,
-                payment_id=payment_id,
-                user_email=data.get('user_email', ''),
-                payment_amount=int(data['tournament_fee']),
-                tournament_name=tour_name,
-                tournament_id=tournament_id
-            )
 
             # Показываем турнир с обновленной информацией
             entry_fee = int(tournament.get('entry_fee', get_tournament_entry_fee()) or get_tournament_entry_fee())
@@ -3155,10 +3140,12 @@ async def tournament_pay_confirm(callback: CallbackQuery, state: FSMContext):
             )
             
             await callback.message.answer_photo(
-                photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+                photo=tournament_images.photo(bracket_image, "tournament_bracket"),
                 caption=truncate_caption(caption),
                 reply_markup=builder.as_markup()
             )
+        elif status == REFUND:
+            await callback.message.answer(t("tournament.payment_already_paid", language))
         else:
             language = await get_user_language_async(str(callback.message.chat.id))
             await callback.message.answer(t("tournament.payment_not_completed", language))
@@ -3169,7 +3156,7 @@ async def tournament_pay_confirm(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 # Просмотр турнира из заявки
-@router.callback_query(F.data.startswith("view_tournament:"))
+@router.callback_query(F.data.startswith("view_tournament:"), flags=HEAVY)
 async def view_tournament_from_application(callback: CallbackQuery):
     """Показывает турнир"""
     language = await get_user_language_async(str(callback.message.chat.id))
@@ -3249,14 +3236,14 @@ async def view_tournament_from_application(callback: CallbackQuery):
     # Всегда отправляем изображение сетки
     await callback.message.delete()
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=truncate_caption(text),
         reply_markup=builder.as_markup()
     )
     await callback.answer()
 
 # Просмотр своих турниров с пагинацией
-@router.callback_query(F.data.startswith("my_tournaments_list:"))
+@router.callback_query(F.data.startswith("my_tournaments_list:"), flags=HEAVY)
 async def my_tournaments_list(callback: CallbackQuery):
     """Показывает турниры пользователя с пагинацией"""
     language = await get_user_language_async(str(callback.message.chat.id))
@@ -3344,7 +3331,7 @@ async def my_tournaments_list(callback: CallbackQuery):
     # Всегда отправляем изображение сетки
     await callback.message.delete()
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=truncate_caption(text),
         reply_markup=builder.as_markup()
     )
@@ -3739,7 +3726,7 @@ async def admin_view_tournament_participants(callback: CallbackQuery, state: FSM
     # Всегда отправляем изображение сетки
     await callback.message.delete()
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=truncate_caption(text),
         reply_markup=builder.as_markup()
     )
@@ -3783,10 +3770,9 @@ async def admin_edit_game(callback: CallbackQuery, state: FSMContext):
     player2_name = f"{player2.get('first_name', '')} {player2.get('last_name', '')}".strip()
     
     # Определяем текущего победителя
-    team1_wins = sum(1 for set_score in game['sets'] 
-                    if int(set_score.split(':')[0]) > int(set_score.split(':')[1]))
-    team2_wins = sum(1 for set_score in game['sets'] 
-                    if int(set_score.split(':')[0]) < int(set_score.split(':')[1]))
+    score_data = score_data_of(game) or {}
+    team1_wins = score_data.get('sets_a', 0)
+    team2_wins = score_data.get('sets_b', 0)
     
     if team1_wins > team2_wins:
         current_winner = player1_name
@@ -3965,7 +3951,7 @@ async def admin_edit_score_input(message: Message, state: FSMContext):
             int(parts[1])
         
         # Обновляем игру
-        game['score'] = new_score
+        attach_score(game, new_score)
         game['sets'] = sets
         
         # Сохраняем изменения
@@ -4093,7 +4079,7 @@ async def admin_set_winner(callback: CallbackQuery, state: FSMContext):
         new_sets = ["4:6", "2:6"]  # Простой пример
     
     game['sets'] = new_sets
-    game['score'] = ", ".join(new_sets)
+    attach_score(game, ", ".join(new_sets))
     
     # Сохраняем изменения
     await storage.save_games(games)
@@ -4204,7 +4190,7 @@ async def _show_tournament_edit(callback: CallbackQuery, state: FSMContext, tour
     
     await callback.message.delete()
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=text,
         reply_markup=builder.as_markup()
     )
@@ -4413,7 +4399,7 @@ async def update_tournament_field(callback: CallbackQuery, state: FSMContext):
     
     await callback.message.delete()
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=text,
         reply_markup=builder.as_markup()
     )
@@ -4470,7 +4456,7 @@ async def edit_participants_count(message: Message, state: FSMContext):
         bracket_image, _ = await build_and_render_tournament_image(tournament_data, tournament_id)
         
         await message.answer_photo(
-            photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+            photo=tournament_images.photo(bracket_image, "tournament_bracket"),
             caption=text,
             reply_markup=builder.as_markup()
         )
@@ -4528,7 +4514,7 @@ async def edit_comment(message: Message, state: FSMContext):
     bracket_image, _ = await build_and_render_tournament_image(tournament_data, tournament_id)
     
     await message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=text,
         reply_markup=builder.as_markup()
     )
@@ -4601,7 +4587,7 @@ async def manage_participants(callback: CallbackQuery, state: FSMContext):
     
     await callback.message.delete()
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=text,
         reply_markup=builder.as_markup(),
         parse_mode="HTML"
@@ -4704,7 +4690,7 @@ async def tournament_seeding_menu(callback: CallbackQuery, state: FSMContext):
     except Exception:
         pass
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_seeding.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_seeding"),
         caption=truncate_caption("\n".join(text_lines)),
         reply_markup=kb.as_markup()
     )
@@ -4899,7 +4885,7 @@ async def seeding_move(callback: CallbackQuery, state: FSMContext):
     
     bracket_image, _ = await build_and_render_tournament_image(t, tid)
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="seeding.png"),
+        photo=tournament_images.photo(bracket_image, "seeding"),
         caption=truncate_caption("\n".join(text_lines)),
         reply_markup=kb.as_markup()
     )
@@ -4983,7 +4969,7 @@ async def tournament_seeding_move(callback: CallbackQuery, state: FSMContext):
     # Рендерим изображение сетки
     bracket_image, _ = await build_and_render_tournament_image(t, tid)
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_seeding.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_seeding"),
         caption=truncate_caption("\n".join(text_lines)),
         reply_markup=kb.as_markup()
     )
@@ -5039,7 +5025,7 @@ async def seeding_shuffle(callback: CallbackQuery, state: FSMContext):
     
     bracket_image, _ = await build_and_render_tournament_image(t, tid)
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="seeding.png"),
+        photo=tournament_images.photo(bracket_image, "seeding"),
         caption=truncate_caption("\n".join(text_lines)),
         reply_markup=kb.as_markup()
     )
@@ -5104,7 +5090,7 @@ async def tournament_seeding_shuffle(callback: CallbackQuery, state: FSMContext)
     # Рендерим изображение сетки
     bracket_image, _ = await build_and_render_tournament_image(t, tid)
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_seeding.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_seeding"),
         caption=truncate_caption("\n".join(text_lines)),
         reply_markup=kb.as_markup()
     )
@@ -5121,23 +5107,15 @@ async def search_participant_by_name(message: Message, state: FSMContext):
         await message.answer("❌ Введите минимум 2 символа для поиска")
         return
     
-    # Загружаем всех пользователей
-    users = await storage.load_users()
-    
-    # Ищем пользователей по имени или фамилии
+    # Ищем пользователей по имени или фамилии (индекс имён, лучшие совпадения первыми)
     found_users = []
-    for user_id, user_data in users.items():
-        first_name = (user_data.get('first_name') or '').lower()
-        last_name = (user_data.get('last_name') or '').lower()
-        full_name = f"{first_name} {last_name}".strip()
-        
-        if search_query in first_name or search_query in last_name or search_query in full_name:
-            found_users.append({
-                'id': user_id,
-                'name': f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip(),
-                'phone': user_data.get('phone', 'Не указан'),
-                'city': user_data.get('city', 'Не указан')
-            })
+    for user_id, user_data in await search_users(search_query):
+        found_users.append({
+            'id': user_id,
+            'name': f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip(),
+            'phone': user_data.get('phone', 'Не указан'),
+            'city': user_data.get('city', 'Не указан')
+        })
     
     if not found_users:
         await message.answer(f"❌ Не найдено: '{message.text}'\n\nПопробуйте другой запрос")
@@ -5368,7 +5346,7 @@ async def input_participant_id(message: Message, state: FSMContext):
         bracket_image, _ = await build_and_render_tournament_image(tournament_data, tournament_id)
         
         await message.answer_photo(
-            photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+            photo=tournament_images.photo(bracket_image, "tournament_bracket"),
             caption=text,
             reply_markup=builder.as_markup()
         )
@@ -5481,7 +5459,7 @@ async def confirm_remove_participant(callback: CallbackQuery, state: FSMContext)
     
     await callback.message.delete()
     await callback.message.answer_photo(
-        photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+        photo=tournament_images.photo(bracket_image, "tournament_bracket"),
         caption=text,
         reply_markup=builder.as_markup()
     )
@@ -5902,7 +5880,7 @@ async def show_tournament_brief_info(message: Message, tournament_id: str, user_
         try:
             bracket_image, _ = await build_and_render_tournament_image(tournament_data, tournament_id)
             await message.answer_photo(
-                photo=BufferedInputFile(bracket_image, filename=f"tournament_{tournament_id}_bracket.png"),
+                photo=tournament_images.photo(bracket_image, f"tournament_{tournament_id}_bracket"),
                 caption=truncate_caption(text),
                 parse_mode="Markdown",
                 reply_markup=builder.as_markup()
@@ -6173,7 +6151,8 @@ async def admin_process_tournament_score_input(message: Message, state: FSMConte
         )
         return
     
-    success = await tournament_manager.update_match_result(match_id, winner_id, score, message.bot)
+    score_data = parse_score(score)
+    success = await tournament_manager.update_match_result(match_id, winner_id, score, message.bot, score_data=score_data)
     
     # Инициализируем переменные для использования позже
     rating_changes = {}
@@ -6208,10 +6187,7 @@ async def admin_process_tournament_score_input(message: Message, state: FSMConte
                 loser_id = p2_id if winner_id_str == p1_id else p1_id
                 
                 # Рассчитываем разницу геймов для изменения рейтинга
-                total_game_diff = 0
-                for set_score in [s.strip() for s in score.split(',')]:
-                    games1, games2 = map(int, set_score.split(':'))
-                    total_game_diff += abs(games1 - games2)
+                total_game_diff = game_difference(score_data)
                 
                 # Получаем текущие рейтинги игроков
                 winner_rating = float(users.get(winner_id_str, {}).get('rating_points', 500))
@@ -6252,6 +6228,7 @@ async def admin_process_tournament_score_input(message: Message, state: FSMConte
                     'type': 'tournament',
                     'score': score,
                     'sets': [s.strip() for s in score.split(',')],
+                    SCORE_DATA_KEY: score_data,
                     'media_filename': None,
                     'players': {
                         'team1': [p1_id],
@@ -6329,7 +6306,7 @@ async def admin_process_tournament_score_input(message: Message, state: FSMConte
         tournament_data = tournaments.get(tournament_id, {})
         
         if tournament_data:
-            from aiogram.types import CallbackQuery, BufferedInputFile
+            from aiogram.types import CallbackQuery
             
             # Генерируем обновленную сетку
             bracket_image, _ = await build_and_render_tournament_image(tournament_data, tournament_id)
@@ -6350,7 +6327,7 @@ async def admin_process_tournament_score_input(message: Message, state: FSMConte
             builder.adjust(1)
             
             await message.answer_photo(
-                photo=BufferedInputFile(bracket_image, filename="tournament_bracket.png"),
+                photo=tournament_images.photo(bracket_image, "tournament_bracket"),
                 caption=text,
                 reply_markup=builder.as_markup()
             )
@@ -4,14 +4,15 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import (
     InlineKeyboardMarkup,
     InlineKeyboardButton,
-    Message,
-    FSInputFile
+    Message
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config.config import ITEMS_PER_PAGE
+from config.paths import BASE_DIR
 from config.profile import create_sport_keyboard, sport_type, countries, cities_data, get_sport_config, get_country_translation, get_city_translation, get_sport_translation
 from models.states import BrowseToursStates, CreateTourStates
 from services.channels import send_tour_to_channel
+from utils.file_ids import send_cached_file
 from utils.utils import create_user_profile_link, format_tour_date, remove_country_flag
 from utils.validate import validate_future_date, validate_date, validate_date_range
 from services.storage import storage
@@ -504,12 +505,14 @@ async def view_tour_details(callback: types.CallbackQuery, state: FSMContext):
             pass
         
         try:
-            photo = FSInputFile(photo_path)
-            await callback.message.answer_photo(
-                photo=photo,
-                caption=text,
-                reply_markup=keyboard,
-                parse_mode='Markdown'
+            await send_cached_file(
+                lambda media: callback.message.answer_photo(
+                    photo=media,
+                    caption=text,
+                    reply_markup=keyboard,
+                    parse_mode='Markdown'
+                ),
+                BASE_DIR / photo_path,
             )
         except Exception as e:
             # Если не удалось отправить фото, отправляем текстом
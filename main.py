@@ -1,16 +1,43 @@
 import asyncio
-from datetime import datetime
+import signal
+from functools import partial
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import Message
 from aiogram.filters import Filter
 from aiogram.enums import ChatType
 from handlers import game_offers_menu, registration, game_offers, more, payments, profile, enter_invoice, search_partner, tours, admin, admin_edit, tournament, invite, tournament_score, beauty_contest
-from config.config import TOKEN
+from config.config import (
+    BOT_MODE, CLUSTER_BASE_PORT, CLUSTER_SECRET, CLUSTER_WORKER_INDEX, CLUSTER_WORKERS, TELEGRAM_API_URL, TOKEN,
+    WEBHOOK_PORT, WEBHOOK_URL,
+)
 from utils.admin import is_user_banned
 from utils.notifications import send_subscription_reminders
 from services.storage import storage
+from services.payments import close_http_client
+from services.email import email_service
+from services.web_api import web_api_client
+from services.payment_ledger import payment_reconciliation_loop, serve_payment_notifications
+from services.webhook import run_webhook
+from services.cluster import WORKER_PATH, run_cluster, run_leader_jobs
 from utils.translations import get_user_language_async, t
-from utils.utils import parse_date_flexible
+from utils.score import migrate_score_data
+from utils.dates import migrate_dates
+from utils.leaderboard import leaderboards
+from utils.dating_index import dating_index
+from utils.name_index import name_index
+from utils.offer_index import CLUSTER_RESYNC_SECONDS, MAX_SLEEP_SECONDS, RETRY_SECONDS, offer_index
+from utils.metrics import monitor_event_loop_lag
+from utils.file_ids import file_id_cache
+from utils.bracket import configure_pixel_pool
+from utils.tournament_images import tournament_images
+from middlewares.perf import ApiCallMiddleware, PerfMiddleware
+from middlewares.callbacks import CallbackGuardMiddleware
+from middlewares.throttling import ThrottlingMiddleware
+from services.metrics_server import start_metrics_server
 
 class BannedUserFilter(Filter):
     async def __call__(self, message: Message) -> bool:
@@ -40,76 +67,41 @@ async def ban_check_handler(message: Message):
     return False
 
 async def cleanup_expired_game_offers(bot: Bot):
-    """Очистка прошедших предложенных игр"""
+    """Очистка прошедших предложенных игр (по куче индекса, без обхода всех пользователей)"""
+    popped = []
     try:
-        users = await storage.load_users()
-        current_time = datetime.now()
-        updated = False
-        expired_count = 0
-        
-        for user_id, user_data in users.items():
-            # Пропускаем забаненных пользователей
+        await offer_index.ensure_loaded()
+        popped = offer_index.pop_expired(datetime.now())
+        expired: Dict[str, List[str]] = {}
+        skipped = []
+        for user_id, game_id in popped:
+            # Предложения забаненных пользователей не трогаем, но и не забываем — проверим позже
             if await is_user_banned(user_id):
+                skipped.append((user_id, game_id))
                 continue
-                
-            # Проверяем игры пользователя
-            if 'games' in user_data and user_data['games']:
-                games_to_keep = []
-                
-                for game in user_data['games']:
-                    if game.get('active', True) and game.get('date') and game.get('time'):
-                        try:
-                            # Парсим дату и время игры
-                            game_date_str = game.get('date')
-                            game_time_str = game.get('time')
-                            
-                            # Парсим дату (может быть в разных форматах)
-                            if 'T' in game_date_str:
-                                # ISO формат: 2025-01-15T10:30
-                                game_datetime = datetime.fromisoformat(game_date_str)
-                            elif '.' in game_date_str and len(game_date_str.split('.')) == 2:
-                                # Формат: 20.09 (день.месяц) с текущим годом
-                                day, month = game_date_str.split('.')
-                                current_year = current_time.year
-                                game_date = datetime.strptime(f"{day}.{month}.{current_year}", '%d.%m.%Y').date()
-                                game_time = datetime.strptime(game_time_str, '%H:%M').time()
-                                game_datetime = datetime.combine(game_date, game_time)
-                            else:
-                                # Форматы DD.MM.YYYY или YYYY-MM-DD
-                                game_date = parse_date_flexible(game_date_str)
-                                if game_date is None:
-                                    raise ValueError(f"Неизвестный формат даты: {game_date_str}")
-                                game_time = datetime.strptime(game_time_str, '%H:%M').time()
-                                game_datetime = datetime.combine(game_date, game_time)
-                            
-                            # Если игра уже прошла (более 1 часа назад), удаляем её
-                            if game_datetime < current_time:
-                                expired_count += 1
-                                print(f"Удалена прошедшая игра пользователя {user_id}: {game_date_str} {game_time_str}")
-                            else:
-                                games_to_keep.append(game)
-                                
-                        except (ValueError, TypeError) as e:
-                            # Если не удается распарсить дату/время, оставляем игру
-                            print(f"Не удалось распарсить дату игры пользователя {user_id}: {e}")
-                            games_to_keep.append(game)
-                    else:
-                        # Неактивные игры или игры без даты/времени оставляем
-                        games_to_keep.append(game)
-                
-                # Обновляем список игр пользователя, если что-то изменилось
-                if len(games_to_keep) != len(user_data['games']):
-                    users[user_id]['games'] = games_to_keep
-                    updated = True
-        
-        if updated:
-            await storage.save_users(users)
+            expired.setdefault(user_id, []).append(game_id)
+
+        if expired:
+            expired_count = await storage.remove_user_games(expired)
             print(f"[{datetime.now()}] Очищено прошедших предложенных игр: {expired_count}")
-        else:
-            print(f"[{datetime.now()}] Проверка прошедших игр завершена, изменений нет")
-            
+        offer_index.retry_later(skipped, datetime.now() + timedelta(seconds=RETRY_SECONDS))
     except Exception as e:
         print(f"Ошибка при очистке прошедших игр: {e}")
+        # Снятые, но не удалённые предложения вернутся в кучу (удалённые индекс уже забыл)
+        offer_index.retry_later(popped, datetime.now() + timedelta(seconds=RETRY_SECONDS))
+
+async def game_offers_expiry_loop(bot: Bot):
+    """Снимает предложения в момент начала игры: спит до ближайшего срока в куче или до нового предложения"""
+    while True:
+        await cleanup_expired_game_offers(bot)
+        next_expiry = offer_index.next_expiry()
+        timeout = MAX_SLEEP_SECONDS
+        if storage.config.process_lock:
+            # Предложения, добавленные другими воркерами, видны только после перечитывания users.json
+            timeout = CLUSTER_RESYNC_SECONDS
+        if next_expiry is not None:
+            timeout = min(timeout, max(0.0, (next_expiry - datetime.now()).total_seconds()) + 1)
+        await offer_index.wait_change(timeout)
 
 async def tournament_scheduled_loop(bot: Bot):
     """Окна оплаты 24ч и напоминания по круговым турнирам."""
@@ -122,74 +114,97 @@ async def tournament_scheduled_loop(bot: Bot):
         await asyncio.sleep(15 * 60)
 
 
+async def run_subscription_sweep(bot: Bot):
+    """Один проход проверки подписок: истечение, очистка прошедших игр и напоминания"""
+    users = await storage.load_users()
+    current_time = datetime.now()
+    updated = False
+
+    # Проверка истечения подписок
+    for user_id, user_data in users.items():
+        # Пропускаем забаненных пользователей
+        if await is_user_banned(user_id):
+            continue
+
+        if 'subscription' in user_data and user_data['subscription'].get('active', False):
+            subscription_until = user_data['subscription'].get('until')
+            if subscription_until:
+                try:
+                    until_date = datetime.strptime(subscription_until, '%Y-%m-%d')
+                    if until_date < current_time:
+                        # Подписка истекла
+                        users[user_id]['subscription']['active'] = False
+                        users[user_id]['subscription']['expired'] = True
+                        updated = True
+
+                        # Отправляем уведомление не чаще одного раза в сутки
+                        today_str = current_time.strftime('%Y-%m-%d')
+                        last_notification = users[user_id]['subscription'].get('last_expired_notification')
+                        if last_notification != today_str:
+                            try:
+                                language = await get_user_language_async(user_id)
+                                await bot.send_message(
+                                    int(user_id),
+                                    t("main.subscription_expired", language)
+                                )
+                                users[user_id]['subscription']['last_expired_notification'] = today_str
+                                updated = True
+                            except Exception as e:
+                                print(f"Не удалось отправить уведомление пользователю {user_id}: {e}")
+
+                except ValueError:
+                    # Некорректный формат даты
+                    users[user_id]['subscription']['active'] = False
+                    users[user_id]['subscription']['error'] = 'invalid_date_format'
+                    updated = True
+
+    if updated:
+        await storage.save_users(users)
+        print(f"[{datetime.now()}] Обновлены статусы подписок")
+    else:
+        print(f"[{datetime.now()}] Проверка подписок завершена, изменений нет")
+
+    # Очистка прошедших предложенных игр
+    await cleanup_expired_game_offers(bot)
+
+    # Отправка напоминаний (только для незабаненных пользователей)
+    await send_subscription_reminders(bot)
+
 async def check_subscriptions(bot: Bot):
     """Ежедневная проверка и обновление статуса подписок"""
     while True:
         try:
-            users = await storage.load_users()
-            current_time = datetime.now()
-            updated = False
-            
-            # Проверка истечения подписок
-            for user_id, user_data in users.items():
-                # Пропускаем забаненных пользователей
-                if await is_user_banned(user_id):
-                    continue
-                    
-                if 'subscription' in user_data and user_data['subscription'].get('active', False):
-                    subscription_until = user_data['subscription'].get('until')
-                    if subscription_until:
-                        try:
-                            until_date = datetime.strptime(subscription_until, '%Y-%m-%d')
-                            if until_date < current_time:
-                                # Подписка истекла
-                                users[user_id]['subscription']['active'] = False
-                                users[user_id]['subscription']['expired'] = True
-                                updated = True
-                                
-                                # Отправляем уведомление не чаще одного раза в сутки
-                                today_str = current_time.strftime('%Y-%m-%d')
-                                last_notification = users[user_id]['subscription'].get('last_expired_notification')
-                                if last_notification != today_str:
-                                    try:
-                                        language = await get_user_language_async(user_id)
-                                        await bot.send_message(
-                                            int(user_id),
-                                            t("main.subscription_expired", language)
-                                        )
-                                        users[user_id]['subscription']['last_expired_notification'] = today_str
-                                        updated = True
-                                    except Exception as e:
-                                        print(f"Не удалось отправить уведомление пользователю {user_id}: {e}")
-                                
-                        except ValueError:
-                            # Некорректный формат даты
-                            users[user_id]['subscription']['active'] = False
-                            users[user_id]['subscription']['error'] = 'invalid_date_format'
-                            updated = True
-            
-            if updated:
-                await storage.save_users(users)
-                print(f"[{datetime.now()}] Обновлены статусы подписок")
-            else:
-                print(f"[{datetime.now()}] Проверка подписок завершена, изменений нет")
-                
-            # Очистка прошедших предложенных игр
-            await cleanup_expired_game_offers(bot)
-                
-            # Отправка напоминаний (только для незабаненных пользователей)
-            await send_subscription_reminders(bot)
-                
+            await run_subscription_sweep(bot)
         except Exception as e:
             print(f"Ошибка при проверке подписок: {e}")
         
         # Ждем 24 часа до следующей проверки
         await asyncio.sleep(24 * 60 * 60)  # 24 часа
 
-async def main():
-    bot = Bot(token=TOKEN)
+async def _stop_polling_on(stop: asyncio.Event, dp: Dispatcher):
+    await stop.wait()
+    await dp.stop_polling()
+
+def create_bot(api_url: str = TELEGRAM_API_URL) -> Bot:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_url)) if api_url else None
+    bot = Bot(token=TOKEN, session=session)
+    bot.session.middleware(ApiCallMiddleware())
+    return bot
+
+def build_dispatcher() -> Dispatcher:
     dp = Dispatcher()
 
+    # Анти-флуд раньше замера времени: отброшенные апдейты не попадают в метрики хендлеров
+    throttling = ThrottlingMiddleware()
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
+
+    # Замер времени хендлеров (распространяется на все вложенные роутеры)
+    dp.message.middleware(PerfMiddleware())
+    dp.callback_query.middleware(PerfMiddleware())
+    # Двойные нажатия и устаревшие нажатия под одним сообщением отбрасываются до хендлеров
+    dp.callback_query.outer_middleware(CallbackGuardMiddleware())
+
     dp.message.register(non_private_chat_handler, PrivateChatFilter())
     dp.message.register(ban_check_handler, BannedUserFilter())
     
@@ -209,28 +224,113 @@ async def main():
     dp.include_router(invite.router)
     dp.include_router(payments.router)
     dp.include_router(beauty_contest.router)
+    return dp
+
+def _stop_on_signals(stop: asyncio.Event) -> None:
+    """SIGTERM/SIGINT завершают бота штатно: вебхук дообрабатывает принятые апдейты"""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+async def main(api_url: str = TELEGRAM_API_URL, stop: Optional[asyncio.Event] = None, mode: str = BOT_MODE,
+               webhook_url: str = WEBHOOK_URL, webhook_port: int = WEBHOOK_PORT):
+    """
+    Запуск бота; stop — событие для штатной остановки извне (нагрузочный тест).
+
+    mode: polling, webhook или worker — процесс кластера, которому апдейты
+    пересылает роутер (services/cluster.py).
+    """
+    bot = create_bot(api_url)
+    dp = build_dispatcher()
+    configure_pixel_pool()
+    if mode == "worker":
+        # Файлы данных общие с другими воркерами
+        storage.config.process_lock = True
+    if mode != "polling" and stop is None:
+        stop = asyncio.Event()
+        _stop_on_signals(stop)
 
-    # Запускаем фоновые задачи
-    subscription_task = asyncio.create_task(check_subscriptions(bot))
-    tournament_jobs_task = asyncio.create_task(tournament_scheduled_loop(bot))
+    # Разбираем счёт старых игр в score_data (повторный запуск ничего не меняет)
+    try:
+        await migrate_score_data()
+    except Exception as e:
+        print(f"Ошибка миграции счёта игр: {e}")
+
+    # Канонические даты рядом со строками (дальше дописываются при каждой записи users.json)
+    # и уникальные id предложений
+    try:
+        await migrate_dates()
+    except Exception as e:
+        print(f"Ошибка миграции дат: {e}")
+
+    # Рейтинговые таблицы строятся один раз, дальше обновляются при записи users.json
+    await leaderboards.ensure_loaded()
+    await offer_index.ensure_loaded()
+    await dating_index.ensure_loaded()
+    await name_index.ensure_loaded()
+    # Картинки идущих турниров рисуются заранее и перерисовываются при их изменении
+    await tournament_images.start(bot, tournament.build_and_render_tournament_image)
+
+    # Фоновые задачи выполняет один процесс на все воркеры — держатель лидерской блокировки
+    jobs_task = asyncio.create_task(run_leader_jobs([
+        partial(job, bot) for job in (check_subscriptions, tournament_scheduled_loop, game_offers_expiry_loop,
+                                      payment_reconciliation_loop, serve_payment_notifications)
+    ]))
+    loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+    metrics_runner = await start_metrics_server()
+    stop_task = None
     
     try:
-        await dp.start_polling(bot)
+        if mode == "worker":
+            await run_webhook(dp, bot, stop, host="127.0.0.1", port=CLUSTER_BASE_PORT + CLUSTER_WORKER_INDEX,
+                              path=WORKER_PATH, secret=CLUSTER_SECRET, register=False)
+        elif mode == "webhook":
+            await run_webhook(dp, bot, stop, url=webhook_url, port=webhook_port)
+        else:
+            # Вебхук, оставшийся от режима webhook, не даст получать апдейты через getUpdates
+            await bot.delete_webhook()
+            if stop is not None:
+                stop_task = asyncio.create_task(_stop_polling_on(stop, dp))
+            await dp.start_polling(bot)
     finally:
         # Отменяем фоновые задачи при завершении работы
-        subscription_task.cancel()
-        tournament_jobs_task.cancel()
+        if stop_task:
+            stop_task.cancel()
+        jobs_task.cancel()
+        loop_lag_task.cancel()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         
         try:
-            await subscription_task
-        except asyncio.CancelledError:
-            pass
-        try:
-            await tournament_jobs_task
+            await jobs_task
         except asyncio.CancelledError:
             pass
         
+        await close_http_client()
+        await email_service.close()
+        await web_api_client.close()
+        await file_id_cache.flush()
+        await tournament_images.close()
+        await bot.session.close()
+
+async def cluster_main(api_url: str = TELEGRAM_API_URL, workers: int = CLUSTER_WORKERS, mode: str = BOT_MODE):
+    """Роутер кластера: сам апдейты не обрабатывает, а раздаёт их процессам-воркерам"""
+    bot = create_bot(api_url)
+    metrics_runner = await start_metrics_server()
+    try:
+        await run_cluster(bot, workers, mode, build_dispatcher().resolve_used_update_types(), api_url=api_url)
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
         await bot.session.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if CLUSTER_WORKER_INDEX is not None:
+        asyncio.run(main(mode="worker"))
+    elif CLUSTER_WORKERS > 1:
+        asyncio.run(cluster_main())
+    else:
+        asyncio.run(main())
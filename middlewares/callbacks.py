@@ -0,0 +1,158 @@
+"""
+Защита от повторных нажатий inline-кнопок.
+
+CallbackGuardMiddleware подключается внешним middleware к callback_query
+диспетчера и до фильтров и хендлеров:
+- отбрасывает дубликаты — то же callback_data в том же чате, пока первое
+  нажатие обрабатывается или не прошло DEBOUNCE_SECONDS с его прихода;
+- выполняет нажатия под одним сообщением по очереди и отбрасывает
+  устаревшие: если, пока нажатие ждало своей очереди, под тем же
+  сообщением нажали другую кнопку, выполнится только последнее.
+На отброшенные нажатия бот молча отвечает answerCallbackQuery, чтобы у
+пользователя пропали «часики».
+
+Декоратор idempotent помечает хендлер идемпотентным по ключу: повтор
+с тем же ключом в течение ttl не выполняет работу заново, а получает
+результат первого вызова (одновременные повторы ждут его завершения).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Окно, в котором повтор того же callback_data считается двойным нажатием
+DEBOUNCE_SECONDS = 1.0
+# Сколько хранится результат идемпотентного хендлера
+IDEMPOTENCY_TTL = 60.0
+
+metrics.describe("bot_callbacks_dropped_total", "Отброшенные нажатия inline-кнопок по причине")
+metrics.describe("bot_idempotent_hits_total", "Повторы идемпотентных хендлеров, получившие готовый результат")
+
+
+async def _silent_answer(callback: CallbackQuery) -> None:
+    try:
+        await callback.answer()
+    except Exception:
+        pass
+
+
+@dataclass
+class _MessageSlot:
+    """Очередь нажатий под одним сообщением."""
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    latest: int = 0
+    users: int = 0
+
+
+class CallbackGuardMiddleware(BaseMiddleware):
+    def __init__(self, window: float = DEBOUNCE_SECONDS):
+        self.window = window
+        self._in_flight: set = set()
+        # (чат, callback_data) -> время прихода первого нажатия, по возрастанию
+        self._recent: "OrderedDict[Tuple[int, str], float]" = OrderedDict()
+        self._messages: Dict[Hashable, _MessageSlot] = {}
+        self._seq = itertools.count(1)
+
+    def _prune(self, now: float) -> None:
+        while self._recent:
+            key, at = next(iter(self._recent.items()))
+            if now - at < self.window:
+                break
+            self._recent.popitem(last=False)
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        message = event.message
+        chat_id = message.chat.id if message else event.from_user.id
+        key = (chat_id, event.data or "")
+        now = time.monotonic()
+        self._prune(now)
+        if key in self._in_flight or key in self._recent:
+            metrics.inc("bot_callbacks_dropped_total", labels={"reason": "duplicate"})
+            await _silent_answer(event)
+            return None
+        self._recent[key] = now
+        self._in_flight.add(key)
+
+        message_key = (chat_id, message.message_id) if message else event.inline_message_id
+        slot = self._messages.get(message_key)
+        if slot is None:
+            slot = self._messages[message_key] = _MessageSlot()
+        seq = slot.latest = next(self._seq)
+        slot.users += 1
+        try:
+            async with slot.lock:
+                if slot.latest != seq:
+                    metrics.inc("bot_callbacks_dropped_total", labels={"reason": "stale"})
+                    await _silent_answer(event)
+                    return None
+                return await handler(event, data)
+        finally:
+            self._in_flight.discard(key)
+            slot.users -= 1
+            if not slot.users:
+                self._messages.pop(message_key, None)
+
+
+_FAILED = object()
+
+
+def idempotent(key: Callable[[CallbackQuery], Hashable], ttl: float = IDEMPOTENCY_TTL):
+    """
+    Делает callback-хендлер идемпотентным по key(callback).
+
+    Результат успешного вызова хранится ttl секунд; ошибка не кэшируется,
+    и следующий повтор выполнит хендлер заново.
+    """
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        done: Dict[Hashable, Tuple[float, Any]] = {}
+        pending: Dict[Hashable, asyncio.Future] = {}
+        name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        async def wrapper(callback: CallbackQuery, *args: Any, **kwargs: Any) -> Any:
+            k = key(callback)
+            now = time.monotonic()
+            for stale in [s for s, (at, _) in done.items() if now - at >= ttl]:
+                del done[stale]
+            cached: Optional[Tuple[float, Any]] = done.get(k)
+            if cached is None and k in pending:
+                result = await asyncio.shield(pending[k])
+                if result is not _FAILED:
+                    cached = (now, result)
+            if cached is not None:
+                metrics.inc("bot_idempotent_hits_total", labels={"handler": name})
+                await _silent_answer(callback)
+                return cached[1]
+
+            future = pending[k] = asyncio.get_running_loop().create_future()
+            result = _FAILED
+            try:
+                result = await func(callback, *args, **kwargs)
+                done[k] = (time.monotonic(), result)
+                return result
+            finally:
+                pending.pop(k, None)
+                future.set_result(result)
+
+        return wrapper
+
+    return decorator
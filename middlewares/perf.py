@@ -0,0 +1,84 @@
+"""
+Замер производительности хендлеров и вызовов Bot API.
+
+PerfMiddleware подключается внутренним middleware к message и callback_query
+диспетчера (и тем самым ко всем вложенным роутерам) и для каждого
+хендлера пишет в utils.metrics:
+- полное время обработки;
+- время, которое хендлер синхронно держал event loop;
+- число операций и байт чтения/записи хранилища;
+- число вызовов Bot API.
+
+ApiCallMiddleware вешается на сессию бота и считает каждый запрос к Bot API.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+
+from utils.metrics import SIZE_BUCKETS, TimedCoroutine, UpdateStats, current_update, metrics, record_api_call
+
+logger = logging.getLogger(__name__)
+
+# Хендлеры дольше этого времени попадают в лог
+SLOW_HANDLER_SECONDS = 2.0
+
+
+def _handler_name(data: Dict[str, Any]) -> str:
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return "unknown"
+    module = getattr(callback, "__module__", "") or ""
+    return f"{module.rsplit('.', 1)[-1]}.{getattr(callback, '__name__', 'handler')}"
+
+
+class PerfMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = _handler_name(data)
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        try:
+            return await TimedCoroutine(handler(event, data), stats)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_update.reset(token)
+            labels = {"handler": name}
+            metrics.observe("bot_handler_seconds", elapsed, labels)
+            metrics.observe("bot_handler_blocking_seconds", stats.busy, labels)
+            metrics.observe("bot_handler_storage_ops", stats.storage_reads, {"handler": name, "op": "read"}, buckets=(0, 1, 2, 4, 8, 16, 32, 64))
+            metrics.observe("bot_handler_storage_ops", stats.storage_writes, {"handler": name, "op": "write"}, buckets=(0, 1, 2, 4, 8, 16, 32, 64))
+            metrics.observe("bot_handler_storage_bytes", stats.storage_read_bytes + stats.storage_write_bytes, labels, buckets=SIZE_BUCKETS)
+            metrics.observe("bot_handler_api_calls", stats.api_calls, labels, buckets=(0, 1, 2, 4, 8, 16, 32, 64))
+            if elapsed >= SLOW_HANDLER_SECONDS:
+                logger.warning(
+                    f"Медленный хендлер {name}: {elapsed:.2f} с, блокировка {stats.busy:.2f} с "
+                    f"(макс. шаг {stats.max_step:.2f} с), чтений {stats.storage_reads} "
+                    f"({stats.storage_read_bytes} Б), записей {stats.storage_writes} "
+                    f"({stats.storage_write_bytes} Б), вызовов API {stats.api_calls}"
+                )
+
+
+class ApiCallMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = await make_request(bot, method)
+            ok = True
+            return response
+        finally:
+            record_api_call(name, time.perf_counter() - started, ok)
@@ -0,0 +1,125 @@
+"""
+Анти-флуд: токен-бакеты на пользователя.
+
+У каждого пользователя два бюджета: общий на все апдейты и отдельный для
+тяжёлых хендлеров — тех, что помечены флагом throttle="heavy":
+
+    @router.callback_query(F.data.startswith("view_tournament_next:"), flags=HEAVY)
+
+Тяжёлый апдейт расходует оба бюджета. Если бюджета не хватает, хендлер
+не вызывается, а пользователь получает вежливый ответ (на нажатие кнопки —
+всплывающее уведомление, на сообщение — не чаще раза в NOTICE_INTERVAL).
+Администраторы не ограничиваются.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from config.config import THROTTLE_BURST, THROTTLE_HEAVY_BURST, THROTTLE_HEAVY_RATE, THROTTLE_RATE
+from utils.admin import is_admin
+from utils.metrics import metrics
+from utils.translations import get_user_language_async, t
+
+logger = logging.getLogger(__name__)
+
+# Флаги хендлера для тяжёлых путей
+HEAVY = {"throttle": "heavy"}
+# Не чаще одного текстового предупреждения за это время
+NOTICE_INTERVAL = 10.0
+# Бакеты, не тронутые дольше этого времени, удаляются (они всё равно полные)
+IDLE_SECONDS = 600.0
+
+metrics.describe("bot_throttled_total", "Апдейты, отброшенные анти-флудом, по бюджету")
+
+
+@dataclass
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float
+    updated: float
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Через сколько секунд будет доступен один токен."""
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate else float("inf")
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, rate: float = THROTTLE_RATE, burst: int = THROTTLE_BURST,
+                 heavy_rate: float = THROTTLE_HEAVY_RATE, heavy_burst: int = THROTTLE_HEAVY_BURST):
+        self.budgets = {"cheap": (rate, burst), "heavy": (heavy_rate, heavy_burst)}
+        self._buckets: Dict[Tuple[int, str], TokenBucket] = {}
+        self._notified: Dict[int, float] = {}
+        self._last_prune = time.monotonic()
+
+    def _bucket(self, user_id: int, budget: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get((user_id, budget))
+        if bucket is None:
+            rate, burst = self.budgets[budget]
+            bucket = self._buckets[(user_id, budget)] = TokenBucket(rate, burst, burst, now)
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        if now - self._last_prune < IDLE_SECONDS:
+            return
+        self._last_prune = now
+        for key in [k for k, b in self._buckets.items() if now - b.updated > IDLE_SECONDS]:
+            del self._buckets[key]
+        for user_id in [u for u, at in self._notified.items() if now - at > NOTICE_INTERVAL]:
+            del self._notified[user_id]
+
+    def check(self, user_id: int, heavy: bool, now: float) -> Tuple[bool, str, float]:
+        """(пропустить, исчерпанный бюджет, ожидание в секундах); токены списываются только при пропуске."""
+        self._prune(now)
+        buckets = [("cheap", self._bucket(user_id, "cheap", now))]
+        if heavy:
+            buckets.append(("heavy", self._bucket(user_id, "heavy", now)))
+        for budget, bucket in buckets:
+            if bucket.tokens < 1:
+                return False, budget, bucket.wait_time()
+        for _, bucket in buckets:
+            bucket.tokens -= 1
+        return True, "", 0.0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or await is_admin(user.id):
+            return await handler(event, data)
+        heavy = get_flag(data, "throttle") == "heavy"
+        now = time.monotonic()
+        allowed, budget, wait = self.check(user.id, heavy, now)
+        if allowed:
+            return await handler(event, data)
+
+        metrics.inc("bot_throttled_total", labels={"budget": budget})
+        language = await get_user_language_async(str(user.id))
+        text = (t("throttle.too_fast_heavy", language, seconds=max(1, round(wait)))
+                if budget == "heavy" else t("throttle.too_fast", language))
+        try:
+            if isinstance(event, CallbackQuery):
+                await event.answer(text)
+            elif isinstance(event, Message) and now - self._notified.get(user.id, 0.0) >= NOTICE_INTERVAL:
+                self._notified[user.id] = now
+                await event.answer(text)
+        except Exception as e:
+            logger.debug(f"Не удалось предупредить пользователя {user.id} о лимите: {e}")
+        return None
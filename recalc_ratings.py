@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Пересчёт рейтингов всех игроков по истории игр (games.json).
+
+По умолчанию только показывает, у кого и как изменится рейтинг.
+С --apply записывает rating_points/player_level в users.json и
+rating_changes в games.json (перед этим сделайте копию data/).
+
+Примеры:
+  python recalc_ratings.py
+  python recalc_ratings.py --top 100
+  python recalc_ratings.py --step 0.005
+  python recalc_ratings.py --apply
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.rating_replay import format_report, recalculate_ratings
+from utils.utils import RATING_STEP
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Пересчёт рейтингов TennisBot по истории игр")
+    parser.add_argument("--apply", action="store_true", help="Сохранить пересчитанные рейтинги")
+    parser.add_argument("--top", type=int, default=50, help="Сколько строк отчёта вывести")
+    parser.add_argument("--step", type=float, default=RATING_STEP, help="Коэффициент за гейм разницы")
+    return parser
+
+
+async def run(args: argparse.Namespace) -> int:
+    started = time.perf_counter()
+    result, rows = await recalculate_ratings(apply=args.apply, step=args.step)
+    print(format_report(rows, result, limit=args.top))
+    print(f"Время: {time.perf_counter() - started:.2f} с")
+    if args.apply:
+        print("✅ Рейтинги сохранены")
+    else:
+        print("Изменения не сохранены (запустите с --apply)")
+    return 0
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
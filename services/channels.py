@@ -2,7 +2,7 @@ from typing import Any, Dict
 import logging
 import os
 from aiogram import Bot, types
-from aiogram.types import FSInputFile, InlineKeyboardButton
+from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from config.paths import BASE_DIR
@@ -10,6 +10,8 @@ from config.profile import channels_id, tour_channel_id, get_sport_translation,
 from config.config import BOT_USERNAME
 from utils.utils import calculate_age, create_user_profile_link, escape_markdown, remove_country_flag
 from utils.translations import t
+from utils.file_ids import send_cached_file, send_cached_photo_album
+from utils.bracket.encoding import image_filename
 
 logger = logging.getLogger(__name__)
 
@@ -174,11 +176,14 @@ async def send_registration_notification(message: types.Message, profile: dict):
         # Отправляем во все целевые каналы
         for channel_id in target_channels:
             if profile.get('photo_path'):
-                await message.bot.send_photo(
-                    chat_id=channel_id,
-                    photo=FSInputFile(BASE_DIR / profile.get('photo_path')),
-                    caption=registration_text,
-                    parse_mode="Markdown"
+                await send_cached_file(
+                    lambda media: message.bot.send_photo(
+                        chat_id=channel_id,
+                        photo=media,
+                        caption=registration_text,
+                        parse_mode="Markdown"
+                    ),
+                    BASE_DIR / profile.get('photo_path'),
                 )
             else:
                 await message.bot.send_message(
@@ -262,9 +267,7 @@ async def send_game_notification_to_channel(bot: Bot, data: Dict[str, Any], user
         # Собираем фото игроков
         for pl in (player1, player2):
             if pl.get("photo_path"):
-                media_group.append(
-                    types.InputMediaPhoto(media=FSInputFile(BASE_DIR / pl["photo_path"]))
-                )
+                media_group.append(BASE_DIR / pl["photo_path"])
     
     elif game_type == 'single':
         # Одиночная игра
@@ -330,9 +333,7 @@ async def send_game_notification_to_channel(bot: Bot, data: Dict[str, Any], user
         # соберем фото игроков
         for pl in (player1, player2):
             if pl.get("photo_path"):
-                media_group.append(
-                    types.InputMediaPhoto(media=FSInputFile(BASE_DIR / pl["photo_path"]))
-                )
+                media_group.append(BASE_DIR / pl["photo_path"])
         
     else:
         # Парная игра
@@ -414,9 +415,7 @@ async def send_game_notification_to_channel(bot: Bot, data: Dict[str, Any], user
         # соберем фото игроков (до 4)
         for pl in (team1_player1, team1_player2, team2_player1, team2_player2):
             if pl.get("photo_path"):
-                media_group.append(
-                    types.InputMediaPhoto(media=FSInputFile(BASE_DIR / pl["photo_path"]))
-                )
+                media_group.append(BASE_DIR / pl["photo_path"])
 
     # --- Отправка в канал ---
     # Создаем кнопку для турнирной игры
@@ -448,9 +447,12 @@ async def send_game_notification_to_channel(bot: Bot, data: Dict[str, Any], user
             )
         elif media_group:
             # если фото/видео игры нет, шлём фото игроков как альбом
-            media_group[0].caption = game_text
-            media_group[0].parse_mode = "Markdown"
-            await bot.send_media_group(chat_id=channel_id, media=media_group)
+            await send_cached_photo_album(
+                lambda media: bot.send_media_group(chat_id=channel_id, media=media),
+                media_group,
+                caption=game_text,
+                parse_mode="Markdown",
+            )
             # Для media_group отправляем кнопку отдельным сообщением (если есть)
             if reply_markup:
                 language = "ru"  # Каналы используют русский язык по умолчанию
@@ -660,11 +662,14 @@ async def send_game_offer_to_channel(bot: Bot, game_data: Dict[str, Any], user_i
         for channel_id in target_channels:
             if photo_path:
                 # отправляем фото + текст в подписи
-                await bot.send_photo(
-                    chat_id=channel_id,
-                    photo=FSInputFile(BASE_DIR / photo_path),
-                    caption=offer_text,
-                    parse_mode="Markdown"
+                await send_cached_file(
+                    lambda media: bot.send_photo(
+                        chat_id=channel_id,
+                        photo=media,
+                        caption=offer_text,
+                        parse_mode="Markdown"
+                    ),
+                    BASE_DIR / photo_path,
                 )
             else:
                 # если фото нет — обычное сообщение
@@ -727,11 +732,14 @@ async def send_tour_to_channel(bot: Bot, user_id: str, user_data: Dict[str, Any]
 
         if photo_path:
             logger.info(f"[TOUR] Отправка тура с фото: {photo_path}")
-            await bot.send_photo(
-                chat_id=tour_channel_id,
-                photo=FSInputFile(BASE_DIR / photo_path),
-                caption=tour_text,
-                parse_mode="Markdown"
+            await send_cached_file(
+                lambda media: bot.send_photo(
+                    chat_id=tour_channel_id,
+                    photo=media,
+                    caption=tour_text,
+                    parse_mode="Markdown"
+                ),
+                BASE_DIR / photo_path,
             )
         else:
             logger.info(f"[TOUR] Отправка тура без фото")
@@ -886,13 +894,15 @@ async def send_tournament_application_to_channel(
                     abs_path = photo_path if os.path.isabs(photo_path) else os.path.join(BASE_DIR, photo_path)
                     if os.path.exists(abs_path):
                         # Отправляем с фото
-                        photo_file = FSInputFile(abs_path)
-                        await bot.send_photo(
-                            chat_id=channel_id,
-                            photo=photo_file,
-                            caption=text,
-                            parse_mode="Markdown",
-                            reply_markup=builder.as_markup(),
+                        await send_cached_file(
+                            lambda media: bot.send_photo(
+                                chat_id=channel_id,
+                                photo=media,
+                                caption=text,
+                                parse_mode="Markdown",
+                                reply_markup=builder.as_markup(),
+                            ),
+                            abs_path,
                         )
                         logger.info(f"Отправлено уведомление с фото участника {user_id} в канал {channel_id}")
                     else:
@@ -996,7 +1006,7 @@ async def send_tournament_started_to_channel(
             # Отправляем с фото сетки, если оно есть
             if bracket_image_bytes:
                 from aiogram.types import BufferedInputFile
-                photo = BufferedInputFile(bracket_image_bytes, filename=f"tournament_{tournament_id}_bracket.png")
+                photo = BufferedInputFile(bracket_image_bytes, filename=image_filename(bracket_image_bytes, f"tournament_{tournament_id}_bracket"))
                 await bot.send_photo(
                     chat_id=channel_id,
                     photo=photo,
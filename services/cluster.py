@@ -0,0 +1,336 @@
+"""
+Кластерный режим: несколько процессов бота на общих данных.
+
+Процесс-роутер (python main.py при CLUSTER_WORKERS > 1) получает апдейты
+так же, как одиночный бот (getUpdates или вебхук по BOT_MODE), и раздаёт
+их воркерам по chat_id % CLUSTER_WORKERS. Воркеры — дочерние процессы
+main.py с CLUSTER_WORKER_INDEX; каждый принимает апдейты на
+127.0.0.1:CLUSTER_BASE_PORT + номер и обрабатывает их через UpdateQueue
+(services/webhook.py), так что порядок внутри чата сохраняется.
+
+Состояние в памяти процесса, привязанное к пользователю (FSM,
+last_message_ids в enter_invoice, страницы списков турниров), остаётся
+согласованным: апдейты одного чата всегда попадают в один и тот же воркер.
+При изменении CLUSTER_WORKERS незавершённые диалоги сбрасываются — как и
+при перезапуске бота.
+
+JSON-файлы общие: транзакции и save_* хранилища берут файловую
+блокировку (StorageConfig.process_lock), запись идёт через временный
+файл. save_* после load_* сливает свои изменения с записанными другими
+воркерами по записям верхнего уровня; одновременное изменение одной
+записи двумя воркерами — побеждает последний.
+Фоновые задачи запускает только процесс, держащий
+StorageConfig.leader_lock_file (data/leader.lock);
+если он завершается, блокировку забирает другой воркер.
+"""
+
+import asyncio
+import logging
+import os
+import secrets
+import signal
+import sys
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+
+from config.config import (
+    CLUSTER_BASE_PORT, LEADER_RETRY_SECONDS, METRICS_PORT, WEBHOOK_ENQUEUE_TIMEOUT, WEBHOOK_HOST,
+    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_QUEUE_SIZE, WEBHOOK_SECRET, WEBHOOK_URL,
+)
+from services.storage import storage
+from services.webhook import SECRET_HEADER
+from utils.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - нет на Windows, там только однопроцессный режим
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Путь, на который роутер пересылает апдейты воркерам
+WORKER_PATH = "/updates"
+# Пауза перед перезапуском упавшего воркера, с
+RESTART_DELAY = 2.0
+
+metrics.describe("bot_cluster_forwarded_total", "Апдейты, пересланные роутером воркерам")
+metrics.describe("bot_cluster_forward_retries_total", "Повторные попытки переслать апдейт воркеру")
+metrics.describe("bot_cluster_worker_restarts_total", "Перезапуски процессов-воркеров")
+metrics.describe("bot_leader_job_restarts_total", "Перезапуски упавших фоновых задач лидера")
+
+
+def raw_update_chat_id(update: Dict[str, Any]) -> Optional[int]:
+    """Чат апдейта (иначе пользователь) прямо из JSON, без разбора в объекты aiogram."""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return int(chat["id"])
+        user = event.get("from") or event.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return int(user["id"])
+    return None
+
+
+def shard_of(update: Dict[str, Any], workers: int) -> int:
+    """Номер воркера для апдейта; апдейты одного чата всегда попадают в один воркер."""
+    chat_id = raw_update_chat_id(update)
+    return (chat_id if chat_id is not None else int(update.get("update_id", 0))) % workers
+
+
+class LeaderLock:
+    """Эксклюзивная flock-блокировка файла; снимается ОС, если процесс-владелец умер."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or storage.config.leader_lock_file
+        self._fd: Optional[int] = None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+async def _supervise_job(job: Callable[[], Awaitable[Any]]) -> None:
+    """Выполняет фоновую задачу, перезапуская её после исключения; обычное завершение — конец задачи."""
+    name = getattr(getattr(job, "func", job), "__name__", repr(job))
+    while True:
+        try:
+            await job()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Фоновая задача {name} упала, перезапуск через {RESTART_DELAY} с")
+            metrics.inc("bot_leader_job_restarts_total", labels={"job": name})
+            await asyncio.sleep(RESTART_DELAY)
+
+
+async def run_leader_jobs(jobs: List[Callable[[], Awaitable[Any]]], lock: Optional[LeaderLock] = None,
+                          retry: float = LEADER_RETRY_SECONDS) -> None:
+    """
+    Запускает фоновые задачи jobs только в процессе, взявшем лидерскую блокировку.
+
+    Каждая задача — фабрика корутины: если задача падает, ошибка пишется
+    в лог, а задача запускается заново, не затрагивая остальные.
+    Остальные процессы раз в retry секунд пробуют забрать блокировку — так
+    задачи продолжают выполняться, если лидер остановился или упал.
+    """
+    lock = lock or LeaderLock()
+    while not lock.try_acquire():
+        await asyncio.sleep(retry)
+    logger.info(f"Процесс {os.getpid()} выполняет фоновые задачи")
+    tasks = [asyncio.ensure_future(_supervise_job(job)) for job in jobs]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        lock.release()
+
+
+class UpdateRouter:
+    """
+    Пересылка апдейтов воркерам.
+
+    На каждого воркера — своя ограниченная очередь и одна задача-отправитель,
+    поэтому апдейты воркеру уходят по порядку. Если воркер недоступен
+    (перезапускается) или отвечает 503, отправитель повторяет попытку,
+    а очередь воркера заполняется — это и есть backpressure для приёма.
+    """
+
+    def __init__(self, workers: int, base_port: int = CLUSTER_BASE_PORT, secret: str = "",
+                 maxsize: int = WEBHOOK_QUEUE_SIZE):
+        self.workers = workers
+        self.base_port = base_port
+        self.secret = secret
+        self._queues: List["asyncio.Queue[Dict[str, Any]]"] = [asyncio.Queue(maxsize) for _ in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def start(self) -> None:
+        self._session = aiohttp.ClientSession(headers={SECRET_HEADER: self.secret} if self.secret else None)
+        self._tasks = [asyncio.create_task(self._sender(i)) for i in range(self.workers)]
+
+    async def route(self, update: Dict[str, Any], timeout: Optional[float] = None) -> bool:
+        """Ставит апдейт в очередь его воркера; False — места не дождались за timeout."""
+        queue = self._queues[shard_of(update, self.workers)]
+        try:
+            await asyncio.wait_for(queue.put(update), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Роутер: не переслано апдейтов {sum(q.qsize() for q in self._queues)}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session:
+            await self._session.close()
+
+    async def _sender(self, index: int) -> None:
+        queue = self._queues[index]
+        url = f"http://127.0.0.1:{self.base_port + index}{WORKER_PATH}"
+        while True:
+            update = await queue.get()
+            delay = 0.05
+            while True:
+                try:
+                    async with self._session.post(url, json=update) as response:
+                        if response.status == 200:
+                            break
+                except aiohttp.ClientError:
+                    pass
+                metrics.inc("bot_cluster_forward_retries_total", labels={"worker": str(index)})
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+            metrics.inc("bot_cluster_forwarded_total", labels={"worker": str(index)})
+            queue.task_done()
+
+
+async def _poll_updates(router: UpdateRouter, bot: Bot, api: TelegramAPIServer,
+                        allowed_updates: List[str], stop: asyncio.Event) -> None:
+    """getUpdates в сыром JSON: роутеру не нужны объекты aiogram, только chat_id."""
+    await bot.delete_webhook()
+    url = api.api_url(bot.token, "getUpdates")
+    offset = 0
+    async with aiohttp.ClientSession() as session:
+        while not stop.is_set():
+            try:
+                payload = {"offset": offset, "timeout": 25, "allowed_updates": allowed_updates}
+                async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=40)) as response:
+                    body = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"Роутер: ошибка getUpdates: {e!r}")
+                await asyncio.sleep(1)
+                continue
+            if not body.get("ok"):
+                retry_after = (body.get("parameters") or {}).get("retry_after", 1)
+                logger.warning(f"Роутер: getUpdates вернул {body.get('description')}")
+                await asyncio.sleep(retry_after)
+                continue
+            for update in body["result"]:
+                # Очередь воркера полна — ждём: следующий getUpdates просто придёт позже
+                await router.route(update)
+                offset = update["update_id"] + 1
+
+
+async def _webhook_handler(request: web.Request) -> web.Response:
+    router: UpdateRouter = request.app["router"]
+    if WEBHOOK_SECRET and request.headers.get(SECRET_HEADER) != WEBHOOK_SECRET:
+        return web.Response(status=403)
+    try:
+        update = await request.json()
+    except ValueError:
+        return web.Response()
+    if not await router.route(update, timeout=WEBHOOK_ENQUEUE_TIMEOUT):
+        return web.Response(status=503, headers={"Retry-After": "1"})
+    return web.Response()
+
+
+async def _serve_webhook(router: UpdateRouter, bot: Bot, allowed_updates: List[str], stop: asyncio.Event) -> None:
+    app = web.Application()
+    app["router"] = router
+    app.router.add_post(WEBHOOK_PATH, _webhook_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=allowed_updates,
+        )
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+async def _supervise(index: int, script: Path, env: Dict[str, str], stop: asyncio.Event,
+                     procs: Dict[int, asyncio.subprocess.Process]) -> None:
+    """Держит воркер index запущенным до stop, перезапуская его после падения."""
+    while not stop.is_set():
+        proc = await asyncio.create_subprocess_exec(sys.executable, str(script), env=env)
+        procs[index] = proc
+        code = await proc.wait()
+        if stop.is_set():
+            break
+        logger.error(f"Воркер {index} (pid {proc.pid}) завершился с кодом {code}, перезапуск")
+        metrics.inc("bot_cluster_worker_restarts_total", labels={"worker": str(index)})
+        await asyncio.sleep(RESTART_DELAY)
+
+
+async def run_cluster(bot: Bot, workers: int, mode: str, allowed_updates: List[str],
+                      api_url: str = "", stop: Optional[asyncio.Event] = None) -> None:
+    """Роутер: запускает workers процессов main.py и раздаёт им апдейты до stop (SIGTERM/SIGINT)."""
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    secret = secrets.token_urlsafe(24)
+    script = Path(sys.modules["__main__"].__file__).resolve()
+    procs: Dict[int, asyncio.subprocess.Process] = {}
+    supervisors = []
+    for index in range(workers):
+        env = dict(os.environ, CLUSTER_WORKER_INDEX=str(index), CLUSTER_SECRET=secret,
+                   METRICS_PORT=str(METRICS_PORT + 1 + index if METRICS_PORT else 0))
+        supervisors.append(asyncio.create_task(_supervise(index, script, env, stop, procs)))
+
+    router = UpdateRouter(workers, secret=secret)
+    router.start()
+    api = TelegramAPIServer.from_base(api_url) if api_url else PRODUCTION
+    logger.info(f"Кластер: {workers} воркеров, приём апдейтов: {mode}")
+    try:
+        if mode == "webhook":
+            await _serve_webhook(router, bot, allowed_updates, stop)
+        else:
+            receiver = asyncio.create_task(_poll_updates(router, bot, api, allowed_updates, stop))
+            await stop.wait()
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+    finally:
+        stop.set()
+        await router.stop()
+        for proc in procs.values():
+            if proc.returncode is None:
+                proc.terminate()
+        # Воркеры дообрабатывают свои очереди; зависшие добиваем
+        try:
+            await asyncio.wait_for(asyncio.gather(*supervisors, return_exceptions=True), 30)
+        except asyncio.TimeoutError:
+            for proc in procs.values():
+                if proc.returncode is None:
+                    proc.kill()
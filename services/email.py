@@ -1,10 +1,13 @@
 """
-Сервис для отправки email-сообщений
+Сервис для отправки email-сообщений: одно переиспользуемое SMTP-соединение
+и очередь писем, которую разбирает фоновая задача.
 """
 
+import asyncio
 import logging
 import re
 import ssl
+import time
 from typing import Optional, List, Tuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -16,12 +19,21 @@ from config.config import (
     EMAIL_SMTP_PORT,
     EMAIL_SMTP_USERNAME,
     EMAIL_SMTP_PASSWORD,
+    EMAIL_SMTP_PLAINTEXT,
     EMAIL_FROM_ADDRESS,
-    EMAIL_FROM_NAME
+    EMAIL_FROM_NAME,
+    EMAIL_QUEUE_SIZE,
+    EMAIL_BATCH_SIZE,
+    EMAIL_IDLE_SECONDS,
+    EMAIL_MAX_ATTEMPTS,
 )
+from utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+metrics.describe("bot_email_total", "Письма из очереди по результату (sent, failed, retried, dropped)")
+metrics.describe("bot_email_send_seconds", "Длительность отправки письма SMTP-серверу")
+
 
 def _html_to_plain_text(html: str) -> str:
     text = re.sub(r"<(script|style)[^>]*>.*?</\1>", " ", html, flags=re.I | re.S)
@@ -34,8 +46,31 @@ def _html_to_plain_text(html: str) -> str:
     return text.strip() or "HTML-версия письма"
 
 
+# Коды 5xx — постоянный отказ (адрес, авторизация, содержимое): повтор не поможет
+PERMANENT_ERROR_CODE = 500
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# (письмо, получатели, тема, future с результатом)
+EmailJob = Tuple[MIMEMultipart, List[str], str, "asyncio.Future[Tuple[bool, str]]"]
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPAuthenticationError)):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and error.code >= PERMANENT_ERROR_CODE
+
+
 class EmailService:
-    """Сервис для отправки email через SMTP"""
+    """
+    Сервис для отправки email через SMTP.
+
+    Держит одно авторизованное соединение и переиспользует его, пока оно
+    не простаивает дольше idle_seconds; разорванное соединение
+    переоткрывается. Хендлеры ставят письма в очередь через enqueue() и не
+    ждут SMTP: очередь разбирает фоновая задача пачками до batch_size
+    писем, повторяя временные ошибки с экспоненциальной паузой.
+    """
     
     def __init__(
         self,
@@ -45,7 +80,11 @@ class EmailService:
         password: str = None,
         from_address: str = None,
         from_name: str = None,
-        use_tls: bool = True
+        use_tls: bool = True,
+        queue_size: int = None,
+        batch_size: int = None,
+        idle_seconds: float = None,
+        max_attempts: int = None,
     ):
         """
         Инициализация сервиса email
@@ -58,6 +97,10 @@ class EmailService:
             from_address: Email адрес отправителя
             from_name: Имя отправителя
             use_tls: Использовать TLS/SSL
+            queue_size: Сколько писем может ждать отправки
+            batch_size: Сколько писем отправляется за один проход очереди
+            idle_seconds: Через сколько секунд простоя соединение закрывается
+            max_attempts: Попыток отправки одного письма
         """
         self.host = host or EMAIL_SMTP_HOST
         self.port = port or EMAIL_SMTP_PORT
@@ -66,6 +109,137 @@ class EmailService:
         self.from_address = from_address or EMAIL_FROM_ADDRESS
         self.from_name = from_name or EMAIL_FROM_NAME
         self.use_tls = use_tls
+        self.queue_size = queue_size or EMAIL_QUEUE_SIZE
+        self.batch_size = batch_size or EMAIL_BATCH_SIZE
+        self.idle_seconds = idle_seconds or EMAIL_IDLE_SECONDS
+        self.max_attempts = max_attempts or EMAIL_MAX_ATTEMPTS
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._smtp_lock: Optional[asyncio.Lock] = None
+        self._last_used = 0.0
+        self._queue: Optional["asyncio.Queue[EmailJob]"] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    def _bind_loop(self) -> None:
+        """Соединение, блокировка и очередь принадлежат текущему циклу событий."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._smtp = None
+        self._smtp_lock = asyncio.Lock()
+        self._queue = asyncio.Queue(self.queue_size)
+        self._worker = None
+    
+    def _build_message(
+        self,
+        to_list: List[str],
+        subject: str,
+        body: str,
+        html: bool,
+        cc: Optional[List[str]],
+    ) -> MIMEMultipart:
+        message = MIMEMultipart('alternative')
+        message['Subject'] = subject
+        message['From'] = f"{self.from_name} <{self.from_address}>"
+        message['To'] = ', '.join(to_list)
+        
+        if cc:
+            message['Cc'] = ', '.join(cc)
+        
+        # Добавляем тело письма
+        charset = 'utf-8'
+        if html:
+            message.attach(MIMEText(_html_to_plain_text(body), 'plain', charset))
+            message.attach(MIMEText(body, 'html', charset))
+        else:
+            message.attach(MIMEText(body, 'plain', charset))
+        return message
+    
+    def _new_client(self) -> aiosmtplib.SMTP:
+        # Для порта 465 используем TLS с самого начала (use_tls=True)
+        # Для порта 587 — STARTTLS (aiosmtplib выполняет его сам при connect)
+        if self.port == 465:
+            return aiosmtplib.SMTP(
+                hostname=self.host,
+                port=self.port,
+                use_tls=True,
+                tls_context=ssl.create_default_context(),
+                start_tls=False
+            )
+        if self.port == 587:
+            return aiosmtplib.SMTP(
+                hostname=self.host,
+                port=self.port,
+                use_tls=False,
+                start_tls=True
+            )
+        # Другие порты: STARTTLS, если сервер его предлагает (по умолчанию aiosmtplib);
+        # открытый текст — только по явному EMAIL_SMTP_PLAINTEXT для локального тестового SMTP
+        return aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            start_tls=False if EMAIL_SMTP_PLAINTEXT else None
+        )
+    
+    async def _connection(self) -> aiosmtplib.SMTP:
+        """Открытое авторизованное соединение: текущее, если оно живо и не простаивало."""
+        if (
+            self._smtp is not None
+            and self._smtp.is_connected
+            and time.monotonic() - self._last_used < self.idle_seconds
+        ):
+            return self._smtp
+        await self._disconnect()
+        smtp_client = self._new_client()
+        await smtp_client.connect()
+        # Локальный тестовый SMTP (aiosmtpd) не объявляет AUTH — тогда входить не нужно
+        if self.username and self.password and smtp_client.supports_extension("auth"):
+            await smtp_client.login(self.username, self.password)
+        self._smtp = smtp_client
+        self._last_used = time.monotonic()
+        return smtp_client
+    
+    async def _disconnect(self) -> None:
+        smtp_client, self._smtp = self._smtp, None
+        if smtp_client is None:
+            return
+        try:
+            await asyncio.wait_for(smtp_client.quit(), timeout=5)
+        except Exception:
+            smtp_client.close()  # Игнорируем ошибки при закрытии соединения
+    
+    async def _deliver(self, message: MIMEMultipart, recipients: List[str]) -> str:
+        """Отправляет письмо по общему соединению; возвращает ответ сервера."""
+        self._bind_loop()
+        started = time.perf_counter()
+        async with self._smtp_lock:
+            reused = self._smtp is not None
+            while True:
+                smtp_client = await self._connection()
+                try:
+                    smtp_response = await smtp_client.send_message(
+                        message,
+                        sender=self.from_address,
+                        recipients=recipients
+                    )
+                except (aiosmtplib.SMTPServerDisconnected, ConnectionError):
+                    await self._disconnect()
+                    # Сервер мог закрыть простаивающее соединение — одна попытка на новом
+                    if reused:
+                        reused = False
+                        continue
+                    raise
+                except Exception:
+                    await self._disconnect()
+                    raise
+                self._last_used = time.monotonic()
+                break
+        metrics.observe("bot_email_send_seconds", time.perf_counter() - started)
+        if isinstance(smtp_response, tuple) and len(smtp_response) == 2:
+            return str(smtp_response[1])
+        return ""
     
     async def send_email(
         self,
@@ -78,7 +252,7 @@ class EmailService:
         return_smtp_response: bool = False,
     ) -> bool | Tuple[bool, str]:
         """
-        Отправка email-сообщения
+        Отправка email-сообщения с ожиданием ответа SMTP (без очереди)
         
         Args:
             to: Email получателя или список получателей
@@ -95,89 +269,11 @@ class EmailService:
         """
         try:
             # Нормализуем список получателей
-            if isinstance(to, str):
-                to_list = [to]
-            else:
-                to_list = to
-            
-            # Создаем сообщение
-            message = MIMEMultipart('alternative')
-            message['Subject'] = subject
-            message['From'] = f"{self.from_name} <{self.from_address}>"
-            message['To'] = ', '.join(to_list)
-            
-            if cc:
-                message['Cc'] = ', '.join(cc)
-            
-            # Добавляем тело письма
-            charset = 'utf-8'
-            if html:
-                message.attach(MIMEText(_html_to_plain_text(body), 'plain', charset))
-                message.attach(MIMEText(body, 'html', charset))
-            else:
-                message.attach(MIMEText(body, 'plain', charset))
-            
-            # Собираем всех получателей
-            recipients = to_list.copy()
-            if cc:
-                recipients.extend(cc)
-            if bcc:
-                recipients.extend(bcc)
-            
-            # Определяем параметры подключения
-            # Для порта 465 используем TLS с самого начала (use_tls=True)
-            # Для порта 587 используем STARTTLS (start_tls=True)
+            to_list = [to] if isinstance(to, str) else to
+            message = self._build_message(to_list, subject, body, html, cc)
+            recipients = to_list + (cc or []) + (bcc or [])
             
-            if self.port == 465:
-                # SSL/TLS соединение с самого начала
-                smtp_client = aiosmtplib.SMTP(
-                    hostname=self.host,
-                    port=self.port,
-                    use_tls=True,  # SSL/TLS с самого начала
-                    tls_context=ssl.create_default_context(),
-                    start_tls=False
-                )
-            elif self.port == 587:
-                # STARTTLS (сначала обычное соединение, потом апгрейд)
-                smtp_client = aiosmtplib.SMTP(
-                    hostname=self.host,
-                    port=self.port,
-                    use_tls=False,  # Без TLS изначально
-                    start_tls=True  # Используем STARTTLS
-                )
-            else:
-                # Для других портов настройте по необходимости
-                smtp_client = aiosmtplib.SMTP(
-                    hostname=self.host,
-                    port=self.port
-                )
-            
-            try:
-                await smtp_client.connect()
-                
-                # Для порта 587 нужно явно вызвать STARTTLS
-                if self.port == 587:
-                    await smtp_client.starttls()
-                
-                if self.username and self.password:
-                    await smtp_client.login(self.username, self.password)
-                
-                # Отправляем всем получателям
-                smtp_response = await smtp_client.send_message(
-                    message,
-                    sender=self.from_address,
-                    recipients=recipients
-                )
-                
-            finally:
-                try:
-                    await smtp_client.quit()
-                except:
-                    pass  # Игнорируем ошибки при закрытии соединения
-
-            server_message = ""
-            if isinstance(smtp_response, tuple) and len(smtp_response) == 2:
-                server_message = str(smtp_response[1])
+            server_message = await self._deliver(message, recipients)
 
             logger.info(
                 "Email принят SMTP-сервером. Тема: %s, получатели: %s, ответ: %s",
@@ -200,6 +296,101 @@ class EmailService:
                 return False, str(e)
             return False
     
+    def enqueue(
+        self,
+        to: str | List[str],
+        subject: str,
+        body: str,
+        html: bool = True,
+        cc: Optional[List[str]] = None,
+        bcc: Optional[List[str]] = None,
+    ) -> "asyncio.Future[Tuple[bool, str]]":
+        """
+        Ставит письмо в очередь и сразу возвращается.
+        
+        Возвращает future с результатом (успех, ответ сервера) — его можно
+        не ждать. Если очередь переполнена, письмо отбрасывается.
+        """
+        self._bind_loop()
+        future: "asyncio.Future[Tuple[bool, str]]" = self._loop.create_future()
+        to_list = [to] if isinstance(to, str) else to
+        message = self._build_message(to_list, subject, body, html, cc)
+        recipients = to_list + (cc or []) + (bcc or [])
+        try:
+            self._queue.put_nowait((message, recipients, subject, future))
+        except asyncio.QueueFull:
+            logger.error(f"Очередь писем переполнена, письмо «{subject}» не отправлено")
+            metrics.inc("bot_email_total", labels={"status": "dropped"})
+            future.set_result((False, "queue full"))
+            return future
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run_worker())
+        return future
+    
+    async def _send_with_retries(self, job: EmailJob) -> None:
+        message, recipients, subject, future = job
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                server_message = await self._deliver(message, recipients)
+            except Exception as e:
+                if attempt == self.max_attempts or _is_permanent(e):
+                    logger.error(f"Письмо «{subject}» не отправлено после {attempt} попыток: {e}")
+                    metrics.inc("bot_email_total", labels={"status": "failed"})
+                    if not future.done():
+                        future.set_result((False, str(e)))
+                    return
+                delay = min(RETRY_BASE_DELAY * 2 ** (attempt - 1), RETRY_MAX_DELAY)
+                logger.warning(f"Ошибка отправки письма «{subject}» (попытка {attempt}): {e}; повтор через {delay:.0f} с")
+                metrics.inc("bot_email_total", labels={"status": "retried"})
+                await asyncio.sleep(delay)
+                continue
+            logger.info(
+                "Email принят SMTP-сервером. Тема: %s, получатели: %s, ответ: %s",
+                subject,
+                ", ".join(recipients),
+                server_message or "ok",
+            )
+            metrics.inc("bot_email_total", labels={"status": "sent"})
+            if not future.done():
+                future.set_result((True, server_message))
+            return
+    
+    async def _run_worker(self) -> None:
+        """Разбирает очередь пачками; простаивающее соединение закрывает."""
+        queue = self._queue
+        while True:
+            try:
+                job = await asyncio.wait_for(queue.get(), timeout=self.idle_seconds)
+            except asyncio.TimeoutError:
+                async with self._smtp_lock:
+                    await self._disconnect()
+                continue
+            batch = [job]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            for job in batch:
+                try:
+                    await self._send_with_retries(job)
+                except Exception as e:
+                    logger.error(f"Ошибка очереди писем: {e}", exc_info=True)
+                finally:
+                    queue.task_done()
+    
+    async def close(self, timeout: float = 10.0) -> None:
+        """Дожидается отправки очереди (не дольше timeout) и закрывает соединение."""
+        if self._loop is not asyncio.get_running_loop():
+            return
+        if self._worker is not None and not self._worker.done():
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Не отправлено писем из очереди: {self._queue.qsize()}")
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        async with self._smtp_lock:
+            await self._disconnect()
+    
     async def send_html_email(
         self,
         to: str | List[str],
@@ -0,0 +1,41 @@
+"""
+Локальный HTTP-эндпоинт /metrics в текстовом формате Prometheus.
+
+Слушает METRICS_HOST:METRICS_PORT (по умолчанию только localhost),
+наружу его стоит открывать только через reverse proxy или туннель.
+"""
+
+import logging
+from typing import Optional
+
+from aiohttp import web
+
+from config.config import METRICS_HOST, METRICS_PORT
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        body=metrics.render_prometheus().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    """Запускает сервер метрик; возвращает runner для остановки или None, если выключен."""
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.error(f"Не удалось запустить сервер метрик на {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,411 @@
+"""
+Журнал платежей и их сверка со шлюзом.
+
+Каждая созданная ссылка на оплату записывается в payments.json со статусом
+pending. Дальше платёж подтверждается одним из трёх путей:
+
+    - фоновая сверка (payment_reconciliation_loop) пачками опрашивает
+      шлюз по платежам, срок проверки которых подошёл; интервал между
+      проверками одного платежа растёт экспоненциально, а через сутки
+      неоплаченный платёж помечается expired;
+    - уведомление шлюза на HTTP-эндпоинт (serve_payment_notifications);
+    - кнопка «Я оплатил» в боте.
+
+Все пути сходятся в _settle: эффект платежа (подписка или взнос за турнир)
+применяется по payment_id и повторно не выполняется — запись в профиле или
+турнире хранит payment_id. Сообщение пользователю и письмо администратору
+отправляет только тот вызов, который перевёл запись журнала из pending
+в конечный статус.
+
+Фоновые задачи выполняет лидер кластера; записи журнала из других
+процессов он видит при следующем чтении файла (не реже IDLE_SLEEP_SECONDS).
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiohttp import web
+
+from config.config import PAYMENTS_NOTIFY_HOST, PAYMENTS_NOTIFY_PORT, SUBSCRIPTION_PRICE
+from config.profile import get_base_keyboard
+from services.payments import (
+    check_tinkoff_payment_status, get_yookassa_payment_status, verify_tinkoff_notification,
+)
+from services.storage import storage
+from utils.email import send_payment_notification_to_admin, send_tournament_payment_notification_to_admin
+from utils.metrics import metrics
+from utils.tournament_lifecycle import maybe_clear_payment_window_if_resolved
+from utils.translations import get_user_language_async, t
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("bot_payments_total", "Платежи в журнале по итоговому статусу")
+metrics.describe("bot_payment_checks_total", "Проверки статуса платежей по источнику")
+
+# Статусы записи журнала
+PENDING = "pending"
+APPLIED = "applied"    # подписка активирована / взнос засчитан
+REFUND = "refund"      # оплачено, но эффект применить нельзя (подписка уже активна, взнос уже внесён)
+FAILED = "failed"      # шлюз отклонил или отменил платёж
+EXPIRED = "expired"    # за PAYMENT_TTL_SECONDS платёж так и не завершился
+UNKNOWN = "unknown"    # платежа нет в журнале
+FINAL_STATUSES = (APPLIED, REFUND, FAILED, EXPIRED)
+
+KIND_SUBSCRIPTION = "subscription"
+KIND_TOURNAMENT = "tournament"
+
+POLL_BATCH = 20
+POLL_BASE_DELAY_SECONDS = 15
+POLL_MAX_DELAY_SECONDS = 15 * 60
+PAYMENT_TTL_SECONDS = 24 * 60 * 60
+IDLE_SLEEP_SECONDS = 30
+SUBSCRIPTION_DAYS = 30
+
+TINKOFF_SUCCESS = {"CONFIRMED"}
+TINKOFF_FAILED = {"REJECTED", "CANCELED", "REVERSED", "REFUNDED", "DEADLINE_EXPIRED", "AUTH_FAIL"}
+YOOKASSA_SUCCESS = {"succeeded"}
+YOOKASSA_FAILED = {"canceled"}
+
+# Будит фоновую сверку после новой записи в этом процессе
+_wakeup = asyncio.Event()
+
+
+class PaymentCheckError(Exception):
+    """Шлюз не вернул статус платежа"""
+
+
+def _outcome(gateway: str, gateway_status: Optional[str]) -> Optional[bool]:
+    """True — оплачен, False — отклонён, None — ещё в процессе."""
+    success, failed = (YOOKASSA_SUCCESS, YOOKASSA_FAILED) if gateway == "yookassa" else (TINKOFF_SUCCESS, TINKOFF_FAILED)
+    if gateway_status in success:
+        return True
+    if gateway_status in failed:
+        return False
+    return None
+
+
+def _backoff(attempts: int) -> int:
+    return min(POLL_BASE_DELAY_SECONDS * 2 ** attempts, POLL_MAX_DELAY_SECONDS)
+
+
+async def record_pending_payment(payment_id: Any, gateway: str, kind: str, user_id: Any, amount: float,
+                                 email: Optional[str] = None, tournament_id: Optional[str] = None) -> None:
+    """Заносит созданный платёж в журнал (повторная запись того же payment_id ничего не меняет)."""
+    if not payment_id:
+        return
+    payment_id = str(payment_id)
+    now = int(time.time())
+    async with storage.payments_transaction() as ledger:
+        if payment_id in ledger:
+            return
+        ledger[payment_id] = {
+            'payment_id': payment_id,
+            'gateway': gateway,
+            'kind': kind,
+            'user_id': str(user_id),
+            'amount': amount,
+            'email': email,
+            'tournament_id': tournament_id,
+            'status': PENDING,
+            'created_ts': now,
+            'attempts': 0,
+            'next_check_ts': now + POLL_BASE_DELAY_SECONDS,
+        }
+    metrics.inc("bot_payments_total", labels={"gateway": gateway, "status": PENDING})
+    _wakeup.set()
+
+
+async def _fetch_gateway_status(record: Dict[str, Any]) -> Optional[str]:
+    if record.get('gateway') == "yookassa":
+        return await get_yookassa_payment_status(record['payment_id'])
+    payment = await check_tinkoff_payment_status(record['payment_id'])
+    if not payment.get('success'):
+        raise PaymentCheckError(payment.get('message') or payment.get('error') or "no status")
+    return payment.get('status')
+
+
+async def _reschedule(payment_id: str, gateway_status: Optional[str]) -> str:
+    """Откладывает следующую проверку; просроченный платёж закрывает как expired."""
+    now = int(time.time())
+    async with storage.payments_transaction() as ledger:
+        record = ledger.get(payment_id)
+        if record is None or record.get('status') != PENDING:
+            return record.get('status', UNKNOWN) if record else UNKNOWN
+        record['gateway_status'] = gateway_status
+        record['checked_ts'] = now
+        if now - record.get('created_ts', now) >= PAYMENT_TTL_SECONDS:
+            record['status'] = EXPIRED
+            record['finished_ts'] = now
+        else:
+            record['attempts'] = record.get('attempts', 0) + 1
+            record['next_check_ts'] = now + _backoff(record['attempts'])
+        status = record['status']
+    if status == EXPIRED:
+        metrics.inc("bot_payments_total", labels={"gateway": record.get('gateway', ''), "status": EXPIRED})
+    return status
+
+
+async def _finish(payment_id: str, status: str, gateway_status: Optional[str]) -> bool:
+    """Переводит запись из pending в конечный статус; False — это уже сделал другой вызов."""
+    now = int(time.time())
+    async with storage.payments_transaction() as ledger:
+        record = ledger.get(payment_id)
+        if record is None or record.get('status') != PENDING:
+            return False
+        record.update({'status': status, 'gateway_status': gateway_status, 'checked_ts': now, 'finished_ts': now})
+    metrics.inc("bot_payments_total", labels={"gateway": record.get('gateway', ''), "status": status})
+    return True
+
+
+def _subscription_until(subscription: Dict[str, Any]) -> Optional[datetime]:
+    if not subscription.get('active') or not subscription.get('until'):
+        return None
+    try:
+        return datetime.strptime(subscription['until'], '%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+async def _apply_subscription(record: Dict[str, Any]) -> str:
+    payment_id, user_id = record['payment_id'], record['user_id']
+    now = datetime.now()
+    async with storage.users_transaction() as users:
+        profile = users.setdefault(user_id, {})
+        subscription = profile.get('subscription') or {}
+        if subscription.get('payment_id') == payment_id:
+            return APPLIED
+        until = _subscription_until(subscription)
+        if until and until > now:
+            return REFUND
+        profile['subscription'] = {
+            'active': True,
+            'until': (now + timedelta(days=SUBSCRIPTION_DAYS)).strftime('%Y-%m-%d'),
+            'activated': now.strftime('%Y-%m-%d %H:%M:%S'),
+            'email': record.get('email'),
+            'payment_id': payment_id,
+        }
+    return APPLIED
+
+
+async def _apply_tournament(record: Dict[str, Any]) -> str:
+    payment_id, user_id, tournament_id = record['payment_id'], record['user_id'], record.get('tournament_id')
+    async with storage.tournaments_transaction() as tournaments:
+        tournament = tournaments.get(tournament_id)
+        if tournament is None:
+            return REFUND
+        payments = tournament.setdefault('payments', {})
+        current = payments.get(user_id) or {}
+        if current.get('status') == 'succeeded':
+            return APPLIED if current.get('payment_id') == payment_id else REFUND
+        payments[user_id] = {
+            'payment_id': payment_id,
+            'status': 'succeeded',
+            'amount': float(record.get('amount') or 0),
+            'paid_at': datetime.now().isoformat(),
+            'email': record.get('email'),
+        }
+    await maybe_clear_payment_window_if_resolved(tournament_id)
+    return APPLIED
+
+
+async def _notify(bot: Optional[Bot], record: Dict[str, Any], status: str, notify_user: bool) -> None:
+    """Письмо администратору об оплате и (если нужно) сообщение пользователю."""
+    user_id = record['user_id']
+    profile = await storage.get_user(user_id) or {}
+    tournament: Dict[str, Any] = {}
+    if record.get('kind') == KIND_TOURNAMENT:
+        tournament = (await storage.load_tournaments()).get(record.get('tournament_id'), {}) or {}
+
+    if status == APPLIED:
+        if record.get('kind') == KIND_TOURNAMENT:
+            await send_tournament_payment_notification_to_admin(
+                user_id=int(user_id),
+                profile=profile,
+                payment_id=record['payment_id'],
+                user_email=record.get('email') or '',
+                payment_amount=int(record.get('amount') or 0),
+                tournament_name=tournament.get('name') or t("tournament.no_name", "ru"),
+                tournament_id=record.get('tournament_id'),
+            )
+        else:
+            await send_payment_notification_to_admin(
+                user_id=int(user_id),
+                profile=profile,
+                payment_id=record['payment_id'],
+                user_email=record.get('email') or '',
+                payment_amount=record.get('amount') or SUBSCRIPTION_PRICE,
+            )
+
+    if not notify_user or bot is None:
+        return
+    language = await get_user_language_async(user_id)
+    sport = profile.get("sport", "🎾Большой теннис")
+    if record.get('kind') == KIND_TOURNAMENT:
+        if status == APPLIED:
+            text = (
+                t("tournament.payment_confirmed_message", language)
+                + t("tournament.payment_confirmed_tournament_line", language,
+                    name=tournament.get('name') or t("tournament.no_name", language))
+                + t("tournament.payment_confirmed_paid_line", language, fee=int(record.get('amount') or 0))
+            )
+        else:
+            text = t("tournament.payment_already_paid", language)
+        reply_markup = None
+    else:
+        if status == APPLIED:
+            text = t("payments.payment_success", language, email=record.get('email') or '')
+        else:
+            until = (profile.get('subscription') or {}).get('until', '')
+            text = t("payments.subscription_active_refund", language, date=until)
+        reply_markup = get_base_keyboard(sport, language=language)
+    try:
+        await bot.send_message(int(user_id), text, reply_markup=reply_markup)
+    except Exception as e:
+        logger.warning(f"Не удалось уведомить {user_id} о платеже {record['payment_id']}: {e}")
+
+
+async def _settle(bot: Optional[Bot], record: Dict[str, Any], gateway_status: Optional[str],
+                  notify_user: bool) -> str:
+    """Применяет известный статус шлюза к записи журнала; возвращает итоговый статус записи."""
+    payment_id = record['payment_id']
+    outcome = _outcome(record.get('gateway', 'tinkoff'), gateway_status)
+    if outcome is None:
+        return await _reschedule(payment_id, gateway_status)
+    if outcome is False:
+        await _finish(payment_id, FAILED, gateway_status)
+        return FAILED
+
+    if record.get('kind') == KIND_TOURNAMENT:
+        status = await _apply_tournament(record)
+    else:
+        status = await _apply_subscription(record)
+    if await _finish(payment_id, status, gateway_status):
+        try:
+            await _notify(bot, record, status, notify_user)
+        except Exception as e:
+            logger.error(f"Ошибка уведомления о платеже {payment_id}: {e}")
+    return status
+
+
+async def reconcile_payment(bot: Optional[Bot], payment_id: Any, notify_user: bool = True,
+                            source: str = "worker") -> str:
+    """
+    Сверяет платёж из журнала со шлюзом и применяет результат.
+
+    Возвращает статус записи (pending, applied, refund, failed, expired, unknown).
+    Ошибка запроса к шлюзу откладывает следующую проверку и пробрасывается.
+    """
+    ledger = await storage.load_payments()
+    record = ledger.get(str(payment_id))
+    if record is None:
+        return UNKNOWN
+    if record.get('status') in FINAL_STATUSES:
+        return record['status']
+    metrics.inc("bot_payment_checks_total", labels={"gateway": record.get('gateway', ''), "source": source})
+    try:
+        gateway_status = await _fetch_gateway_status(record)
+    except Exception:
+        await _reschedule(record['payment_id'], record.get('gateway_status'))
+        raise
+    return await _settle(bot, record, gateway_status, notify_user)
+
+
+async def run_reconciliation_batch(bot: Optional[Bot]) -> float:
+    """Проверяет до POLL_BATCH платежей, срок проверки которых подошёл; возвращает паузу до следующих."""
+    now = time.time()
+    ledger = await storage.load_payments()
+    pending = [r for r in ledger.values() if isinstance(r, dict) and r.get('status') == PENDING]
+    due = sorted((r for r in pending if r.get('next_check_ts', 0) <= now), key=lambda r: r.get('next_check_ts', 0))
+    batch = due[:POLL_BATCH]
+    if batch:
+        results = await asyncio.gather(
+            *(reconcile_payment(bot, r['payment_id']) for r in batch), return_exceptions=True
+        )
+        for record, result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Сверка платежа {record['payment_id']} не удалась: {result}")
+    if len(due) > POLL_BATCH:
+        return 0
+    ledger = await storage.load_payments()
+    upcoming = [r.get('next_check_ts', 0) for r in ledger.values()
+                if isinstance(r, dict) and r.get('status') == PENDING]
+    if not upcoming:
+        return IDLE_SLEEP_SECONDS
+    return max(1.0, min(min(upcoming) - time.time(), IDLE_SLEEP_SECONDS))
+
+
+async def payment_reconciliation_loop(bot: Bot) -> None:
+    """Фоновая сверка незавершённых платежей (задача лидера)."""
+    while True:
+        _wakeup.clear()
+        try:
+            delay = await run_reconciliation_batch(bot)
+        except Exception as e:
+            logger.error(f"Ошибка сверки платежей: {e}")
+            delay = IDLE_SLEEP_SECONDS
+        if delay <= 0:
+            continue
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _tinkoff_notification(request: web.Request) -> web.Response:
+    try:
+        payload = await request.json()
+    except Exception:
+        return web.Response(status=400, text="bad request")
+    if not isinstance(payload, dict) or not verify_tinkoff_notification(payload):
+        logger.warning("Уведомление Т-Банка с неверной подписью")
+        return web.Response(status=403, text="forbidden")
+    payment_id = str(payload.get("PaymentId", ""))
+    record = (await storage.load_payments()).get(payment_id)
+    if record is not None and record.get('status') == PENDING:
+        metrics.inc("bot_payment_checks_total", labels={"gateway": "tinkoff", "source": "notification"})
+        await _settle(request.app["bot"], record, payload.get("Status"), notify_user=True)
+    # Т-Банк повторяет уведомление, пока не получит ответ OK
+    return web.Response(text="OK")
+
+
+async def _yookassa_notification(request: web.Request) -> web.Response:
+    try:
+        payload = await request.json()
+        payment_id = str(payload["object"]["id"])
+    except Exception:
+        return web.Response(status=400, text="bad request")
+    # Уведомления ЮKassa не подписаны: статус перепроверяется запросом к API
+    try:
+        await reconcile_payment(request.app["bot"], payment_id, source="notification")
+    except Exception as e:
+        logger.warning(f"Сверка платежа {payment_id} по уведомлению ЮKassa не удалась: {e}")
+        return web.Response(status=502, text="retry")
+    return web.Response(text="OK")
+
+
+async def serve_payment_notifications(bot: Bot, host: str = PAYMENTS_NOTIFY_HOST,
+                                      port: int = PAYMENTS_NOTIFY_PORT) -> None:
+    """Принимает уведомления шлюзов, пока задачу не отменят (задача лидера; порт 0 — выключено)."""
+    if not port:
+        return
+    app = web.Application()
+    app["bot"] = bot
+    app.router.add_post("/payments/tinkoff", _tinkoff_notification)
+    app.router.add_post("/payments/yookassa", _yookassa_notification)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.error(f"Не удалось запустить приём уведомлений платежей на {host}:{port}: {e}")
+        await runner.cleanup()
+        return
+    logger.info(f"Уведомления платежей принимаются на http://{host}:{port}/payments/")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -1,14 +1,84 @@
-import uuid
+"""
+Платёжные шлюзы (Т-Банк и ЮKassa) поверх одного долгоживущего httpx.AsyncClient.
+
+Клиент создаётся при первом запросе и переиспользует соединения
+(keep-alive) с ограничением их числа и таймаутами, поэтому проверка
+статуса платежа не открывает новое TLS-соединение и не блокирует цикл
+событий. ЮKassa вызывается напрямую по HTTP API v3 вместо синхронного SDK.
+
+Адреса шлюзов задаются в конфиге (TINKOFF_BASE_URL, YOOKASSA_API_URL) —
+для проверок их можно направить на локальный mock-сервер.
+"""
+
+import asyncio
 import hashlib
+import hmac
+import logging
+import time
+import uuid
+from typing import Optional
+
 import httpx
-from yookassa import Payment
 
-from config.config import BOT_USERNAME, TINKOFF_BASE_URL, TINKOFF_PASSWORD, TINKOFF_TERMINAL_KEY
+from config.config import (
+    BOT_USERNAME, PAYMENTS_HTTP_TIMEOUT, PAYMENTS_MAX_CONNECTIONS, SECRET_KEY, SHOP_ID,
+    TINKOFF_BASE_URL, TINKOFF_PASSWORD, TINKOFF_TERMINAL_KEY, YOOKASSA_API_URL,
+)
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("bot_payment_gateway_seconds", "Длительность запросов к платёжным шлюзам")
+metrics.describe("bot_payment_gateway_errors_total", "Ошибки запросов к платёжным шлюзам")
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Общий клиент шлюзов; пересоздаётся, если закрыт или создан в другом цикле событий."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(PAYMENTS_HTTP_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=PAYMENTS_MAX_CONNECTIONS,
+                max_keepalive_connections=PAYMENTS_MAX_CONNECTIONS,
+                keepalive_expiry=30.0,
+            ),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_http_client() -> None:
+    """Закрывает общий клиент (при остановке бота)."""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+
+async def _request(gateway: str, method: str, http_method: str, url: str, **kwargs) -> httpx.Response:
+    started = time.perf_counter()
+    try:
+        response = await get_http_client().request(http_method, url, **kwargs)
+    except httpx.HTTPError:
+        metrics.inc("bot_payment_gateway_errors_total", labels={"gateway": gateway, "method": method})
+        raise
+    finally:
+        metrics.observe("bot_payment_gateway_seconds", time.perf_counter() - started,
+                        labels={"gateway": gateway, "method": method})
+    return response
+
 
 async def generate_yookassa_payment_link(user_id, amount, description, email=None):
     """
     Создает платеж и возвращает ссылку для оплаты
     """
+    order_id = str(uuid.uuid4())
     payment_data = {
         "amount": {
             "value": amount,
@@ -22,10 +92,10 @@ async def generate_yookassa_payment_link(user_id, amount, description, email=Non
         "description": description,
         "metadata": {
             "user_id": user_id,
-            "order_id": str(uuid.uuid4())
+            "order_id": order_id
         }
     }
-    
+
     # Добавляем чек, если есть email
     if email:
         payment_data["receipt"] = {
@@ -46,19 +116,33 @@ async def generate_yookassa_payment_link(user_id, amount, description, email=Non
                 }
             ]
         }
-    
-    payment = Payment.create(payment_data)
-    
+
+    # Ключ идемпотентности — повтор запроса не создаст второй платёж
+    response = await _request(
+        "yookassa", "create", "POST", f"{YOOKASSA_API_URL}/payments",
+        json=payment_data, auth=(SHOP_ID or "", SECRET_KEY or ""),
+        headers={"Idempotence-Key": order_id},
+    )
+    response.raise_for_status()
+    payment = response.json()
+
     # Получаем ссылку для оплаты
-    confirmation_url = payment.confirmation.confirmation_url
-    payment_id = payment.id
-    
+    confirmation_url = payment["confirmation"]["confirmation_url"]
+    payment_id = payment["id"]
+
     return confirmation_url, payment_id
 
-async def check_yookassa_payment_status(payment_id):
-    status_result = Payment.find_one(payment_id)
+async def get_yookassa_payment_status(payment_id) -> Optional[str]:
+    """Статус платежа ЮKassa (pending, waiting_for_capture, succeeded, canceled)."""
+    response = await _request(
+        "yookassa", "status", "GET", f"{YOOKASSA_API_URL}/payments/{payment_id}",
+        auth=(SHOP_ID or "", SECRET_KEY or ""),
+    )
+    response.raise_for_status()
+    return response.json().get("status")
 
-    return status_result.status == "succeeded"
+async def check_yookassa_payment_status(payment_id):
+    return await get_yookassa_payment_status(payment_id) == "succeeded"
 
 def generate_tinkoff_token(payload: dict) -> str:
     """
@@ -66,18 +150,40 @@ def generate_tinkoff_token(payload: dict) -> str:
     """
     data_for_token = {k: v for k, v in payload.items() if k not in ("DATA", "Receipt")}
     data_for_token["Password"] = TINKOFF_PASSWORD
-    
+
     sorted_keys = sorted(data_for_token.keys())
     token_string = "".join(str(data_for_token[key]) for key in sorted_keys)
-    
+
     return hashlib.sha256(token_string.encode('utf-8')).hexdigest()
 
+def verify_tinkoff_notification(payload: dict) -> bool:
+    """
+    Проверяет подпись уведомления Т-Банка: токен считается по всем полям
+    верхнего уровня, кроме самого Token и вложенных объектов; логические
+    значения входят в строку как true/false.
+    """
+    token = payload.get("Token")
+    if not token:
+        return False
+    data_for_token = {
+        k: v for k, v in payload.items()
+        if k != "Token" and not isinstance(v, (dict, list))
+    }
+    data_for_token["Password"] = TINKOFF_PASSWORD
+    token_string = "".join(
+        ("true" if data_for_token[key] else "false") if isinstance(data_for_token[key], bool)
+        else str(data_for_token[key])
+        for key in sorted(data_for_token)
+    )
+    expected = hashlib.sha256(token_string.encode('utf-8')).hexdigest()
+    return hmac.compare_digest(expected, str(token))
+
 async def generate_tinkoff_payment_link(user_id, amount_rub, description, email=None):
     url = f"{TINKOFF_BASE_URL}/Init"
-    
+
     amount_kopeeks = int(amount_rub * 100)
     order_id = str(uuid.uuid4())
-    
+
     payload = {
         "TerminalKey": TINKOFF_TERMINAL_KEY,
         "Amount": amount_kopeeks,
@@ -100,20 +206,19 @@ async def generate_tinkoff_payment_link(user_id, amount_rub, description, email=
             ]
         }
     }
-    
+
     payload["Token"] = generate_tinkoff_token(payload)
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, json=payload)
-            data = response.json()
-
-            if data.get("Success"):
-                return data.get("PaymentURL"), data.get("PaymentId") 
-            return {"success": False, "message": data.get("Message"), "details": data.get("Details")}
-        except Exception as e:
-            return {"success": False, "error": str(e)}
-        
+    try:
+        response = await _request("tinkoff", "init", "POST", url, json=payload)
+        data = response.json()
+
+        if data.get("Success"):
+            return data.get("PaymentURL"), data.get("PaymentId")
+        return {"success": False, "message": data.get("Message"), "details": data.get("Details")}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
 async def check_tinkoff_payment_status(payment_id):
     url = f"{TINKOFF_BASE_URL}/GetState"
     payload = {
@@ -122,36 +227,9 @@ async def check_tinkoff_payment_status(payment_id):
     }
     payload["Token"] = generate_tinkoff_token(payload)
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get("Success"):
-                return {
-                    "success": True,
-                    "status": data.get("Status"),
-                    "order_id": data.get("OrderId"),
-                    "amount": data.get("Amount")
-                }
-            return {"success": False, "message": data.get("Message")}
-        except Exception as e:
-            return {"success": False, "error": str(e)}
-    payload = {
-        "TerminalKey": TINKOFF_TERMINAL_KEY,
-        "PaymentId": str(payment_id),
-    }
-
-    params_for_token = payload.copy()
-    params_for_token["Password"] = TINKOFF_PASSWORD
-    
-    sorted_keys = sorted(params_for_token.keys())
-    token_string = "".join(str(params_for_token[key]) for key in sorted_keys)
-    payload["Token"] = hashlib.sha256(token_string.encode('utf-8')).hexdigest()
-
     try:
-        response = requests.post(TINKOFF_STATUS_URL, json=payload)
+        response = await _request("tinkoff", "status", "POST", url, json=payload)
+        response.raise_for_status()
         data = response.json()
 
         if data.get("Success"):
@@ -161,11 +239,6 @@ async def check_tinkoff_payment_status(payment_id):
                 "order_id": data.get("OrderId"),
                 "amount": data.get("Amount")
             }
-        else:
-            return {
-                "success": False,
-                "message": data.get("Message")
-            }
-
+        return {"success": False, "message": data.get("Message")}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -1,10 +1,13 @@
 import asyncio
 import json
+import os
 import aiofiles
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
 from dataclasses import dataclass
 import logging
+import time
+import uuid
 from contextlib import asynccontextmanager
 
 from config.paths import (
@@ -16,10 +19,117 @@ from config.paths import (
     TOURNAMENTS_FILE,
     TOURNAMENT_APPLICATIONS_FILE,
     BEAUTY_CONTEST_FILE,
+    PAYMENTS_FILE,
+    FILE_IDS_FILE,
+    LEADER_LOCK_FILE,
 )
+from utils.metrics import metrics, record_storage_io
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - нет на Windows, там только однопроцессный режим
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+metrics.describe("bot_storage_merges_total", "Записи save_* в кластерном режиме, слитые с изменениями других процессов")
+
+
+class _TrackedDict(dict):
+    """Содержимое файла, прочитанного в кластерном режиме: помнит (версия, байты) файла на момент чтения"""
+    __slots__ = ("_baseline",)
+
+
+class _TrackedList(list):
+    __slots__ = ("_baseline",)
+
+
+def _tracked(data: Any, version: Optional[tuple], raw: bytes) -> Any:
+    if isinstance(data, dict):
+        data = _TrackedDict(data)
+    elif isinstance(data, list):
+        data = _TrackedList(data)
+    else:
+        return data
+    data._baseline = (version, raw)
+    return data
+
+
+def _item_key(item: Any) -> Any:
+    if isinstance(item, dict) and 'id' in item:
+        return 'id', str(item['id'])
+    return json.dumps(item, ensure_ascii=False, sort_keys=True, default=str)
+
+
+def _merge(base: Any, ours: Any, theirs: Any) -> Any:
+    """
+    Трёхстороннее слияние по записям верхнего уровня (ключам словаря или
+    элементам списка, элементы узнаются по id). Записи, которые этот процесс
+    изменил, добавил или удалил относительно base, берутся его; остальные —
+    с диска (theirs). Одновременное изменение одной записи — побеждает последняя запись.
+    """
+    if isinstance(base, dict) and isinstance(ours, dict) and isinstance(theirs, dict):
+        merged = dict(theirs)
+        for key in base.keys() - ours.keys():
+            merged.pop(key, None)
+        for key, value in ours.items():
+            if key not in base or base[key] != value:
+                merged[key] = value
+        return merged
+    if isinstance(base, list) and isinstance(ours, list) and isinstance(theirs, list):
+        base_items = {_item_key(item): item for item in base}
+        ours_items = {_item_key(item): item for item in ours}
+        merged = []
+        seen = set()
+        for item in theirs:
+            key = _item_key(item)
+            seen.add(key)
+            if key in ours_items:
+                mine = ours_items[key]
+                merged.append(mine if key not in base_items or base_items[key] != mine else item)
+            elif key not in base_items:
+                merged.append(item)
+        for key, item in ours_items.items():
+            if key not in seen and (key not in base_items or base_items[key] != item):
+                merged.append(item)
+        return merged
+    return ours
+
+
+_ENTRY_ENCODER = json.JSONEncoder(ensure_ascii=False, indent=2)
+# Без indent json кодирует на C — в разы быстрее; этим текстом записи только сравниваются
+_COMPACT_ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+# Запись верхнего уровня: (хеш компактного JSON, её текст в файле)
+Entry = Tuple[int, bytes]
+
+
+def _encode_entries(data: Dict[str, Any], previous: Optional[Dict[str, Entry]],
+                    normalize: Optional[Callable[[Any], None]] = None) -> Tuple[bytes, Dict[str, Entry]]:
+    """
+    Тот же текст, что json.dumps(data, ensure_ascii=False, indent=2), собранный
+    по записям верхнего уровня. Записи, не изменившиеся с previous, берутся
+    готовыми — с отступами заново кодируются только изменённые (и только
+    они проходят через normalize).
+    """
+    entries: Dict[str, Entry] = {}
+    for key, value in data.items():
+        key = str(key)
+        digest = hash(_COMPACT_ENCODER.encode(value))
+        entry = previous.get(key) if previous else None
+        if entry is None or entry[0] != digest:
+            if normalize is not None:
+                normalize(value)
+                digest = hash(_COMPACT_ENCODER.encode(value))
+            # В тексте JSON переводы строк только между элементами — сдвиг записи на уровень вглубь
+            text = _ENTRY_ENCODER.encode(value).replace("\n", "\n  ")
+            entry = digest, f"  {_COMPACT_ENCODER.encode(key)}: {text}".encode('utf-8')
+        entries[key] = entry
+    if not entries:
+        return b"{}", entries
+    return b"{\n" + b",\n".join(part for _, part in entries.values()) + b"\n}", entries
+
+
 @dataclass
 class StorageConfig:
     users_file: Path = USERS_FILE
@@ -30,21 +140,93 @@ class StorageConfig:
     tournaments_file: Path = TOURNAMENTS_FILE
     tournament_applications_file: Path = TOURNAMENT_APPLICATIONS_FILE
     beauty_contest_file: Path = BEAUTY_CONTEST_FILE
+    payments_file: Path = PAYMENTS_FILE
+    file_ids_file: Path = FILE_IDS_FILE
+    # Блокировка процесса, выполняющего фоновые задачи кластера (services/cluster.py)
+    leader_lock_file: Path = LEADER_LOCK_FILE
+    # Файлы читают и пишут несколько процессов (кластерный режим):
+    # транзакции и save_* дополнительно берут файловую блокировку <файл>.lock,
+    # а save_* сливают свои изменения с записанными другими процессами после чтения
+    process_lock: bool = False
+
+# listener(данные файла, ключи изменившихся записей или None)
+Listener = Callable[[Dict[str, Any], Optional[Set[str]]], None]
+
 
 class AsyncJSONStorage:
     def __init__(self, config: StorageConfig = None):
         self.config = config or StorageConfig()
         self._cache = {}
         self._lock = asyncio.Lock()
+        self._lock_fds: Dict[Path, int] = {}
+        self._file_locks: Dict[Path, asyncio.Lock] = {}
+        self._users_listeners: List[Listener] = []
+        self._users_normalizers: List[Callable[[Dict[str, Any]], Any]] = []
+        self._tournaments_listeners: List[Listener] = []
+        # Записи users.json и tournaments.json на момент их последней записи этим процессом
+        # (текст всех записей — около размера файла в памяти)
+        self._entries: Dict[Path, Dict[str, Entry]] = {}
+    
+    def add_users_listener(self, listener: Listener) -> None:
+        """
+        Подписка на каждую запись users.json (например, для индексов рейтинга).
+        listener(users, changed): changed — id пользователей, чьи профили
+        добавлены, изменены или удалены с прошлой записи файла этим процессом;
+        None — при первой записи, когда сравнивать не с чем.
+        """
+        if listener not in self._users_listeners:
+            self._users_listeners.append(listener)
+    
+    def add_users_normalizer(self, normalizer: Callable[[Dict[str, Any]], Any]) -> None:
+        """
+        Обработчик, приводящий профиль к каноническому виду перед записью
+        users.json: normalizer(profile) вызывается для новых и изменившихся
+        с прошлой записи профилей (при первой записи — для всех).
+        """
+        if normalizer not in self._users_normalizers:
+            self._users_normalizers.append(normalizer)
+    
+    def _normalize_user(self, profile: Any) -> None:
+        if not isinstance(profile, dict):
+            return
+        for normalizer in self._users_normalizers:
+            try:
+                normalizer(profile)
+            except Exception as e:
+                logger.error(f"Users normalizer error: {e}")
+    
+    def _notify_users_saved(self, users_data: Dict[str, Any], changed: Optional[Set[str]]) -> None:
+        for listener in self._users_listeners:
+            try:
+                listener(users_data, changed)
+            except Exception as e:
+                logger.error(f"Users listener error: {e}")
+    
+    def add_tournaments_listener(self, listener: Listener) -> None:
+        """Подписка на каждую запись tournaments.json (например, для перерисовки сеток); changed — как в add_users_listener"""
+        if listener not in self._tournaments_listeners:
+            self._tournaments_listeners.append(listener)
+    
+    def _notify_tournaments_saved(self, tournaments_data: Dict[str, Any], changed: Optional[Set[str]]) -> None:
+        for listener in self._tournaments_listeners:
+            try:
+                listener(tournaments_data, changed)
+            except Exception as e:
+                logger.error(f"Tournaments listener error: {e}")
     
     async def _read_file(self, filepath: Path, default: Any = None) -> Any:
         """Асинхронное чтение файла с кэшированием"""
+        started = time.perf_counter()
         try:
-            async with aiofiles.open(filepath, 'r', encoding='utf-8') as f:
+            async with aiofiles.open(filepath, 'rb') as f:
+                version = self._stat_version(os.fstat(f.fileno()))
                 content = await f.read()
-                return json.loads(content) if content else (default if default is not None else {})
+            data = json.loads(content.decode('utf-8')) if content else (default if default is not None else {})
+            record_storage_io("read", filepath.name, len(content), time.perf_counter() - started)
+            return _tracked(data, version, content) if self.config.process_lock else data
         except FileNotFoundError:
-            return default if default is not None else {}
+            data = default if default is not None else {}
+            return _tracked(data, None, b"") if self.config.process_lock else data
         except json.JSONDecodeError as e:
             logger.error(f"JSON decode error in {filepath}: {e}")
             return default if default is not None else {}
@@ -52,31 +234,162 @@ class AsyncJSONStorage:
             logger.error(f"Error reading {filepath}: {e}")
             return default if default is not None else {}
     
-    async def _write_file(self, filepath: Path, data: Any) -> None:
-        """Асинхронная запись файла"""
+    async def _write_file(self, filepath: Path, data: Any) -> bytes:
+        """Асинхронная запись файла (через временный файл и os.replace — читатели не видят недописанный JSON)"""
+        started = time.perf_counter()
+        per_entry = filepath in (self.config.users_file, self.config.tournaments_file) and isinstance(data, dict)
+        changed = None
         try:
-            async with aiofiles.open(filepath, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(data, ensure_ascii=False, indent=2))
+            if per_entry:
+                normalize = self._normalize_user if filepath == self.config.users_file and self._users_normalizers else None
+                payload, entries = _encode_entries(data, self._entries.get(filepath), normalize)
+            else:
+                payload = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+            # Своё имя у каждой записи: одновременные записи одного файла не делят временный файл
+            tmp_path = filepath.with_name(f"{filepath.name}.{uuid.uuid4().hex}.tmp")
+            try:
+                async with aiofiles.open(tmp_path, 'wb') as f:
+                    await f.write(payload)
+                os.replace(tmp_path, filepath)
+                # Сразу после replace, без await: сравнение идёт с предыдущей записью, что бы ни писалось параллельно
+                if per_entry:
+                    changed = self._changed_entries(filepath, entries)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            record_storage_io("write", filepath.name, len(payload), time.perf_counter() - started)
         except Exception as e:
             logger.error(f"Error writing to {filepath}: {e}")
             raise
+        if isinstance(data, (_TrackedDict, _TrackedList)):
+            # Записано под блокировкой файла: версия на диске — наша
+            data._baseline = (self.file_version(filepath), payload)
+        if filepath == self.config.users_file:
+            self._notify_users_saved(data, changed)
+        elif filepath == self.config.tournaments_file:
+            self._notify_tournaments_saved(data, changed)
+        return payload
+    
+    def _changed_entries(self, filepath: Path, entries: Dict[str, Entry]) -> Optional[Set[str]]:
+        previous = self._entries.get(filepath)
+        self._entries[filepath] = entries
+        if previous is None:
+            return None
+        changed = {key for key, entry in entries.items() if key not in previous or previous[key][0] != entry[0]}
+        changed.update(previous.keys() - entries.keys())
+        return changed
+    
+    @staticmethod
+    def _stat_version(stat: os.stat_result) -> tuple:
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+    
+    def file_version(self, filepath: Path) -> Optional[tuple]:
+        """(mtime_ns, size, inode) файла — меняется при каждой записи, в том числе другим процессом"""
+        try:
+            return self._stat_version(filepath.stat())
+        except FileNotFoundError:
+            return None
+    
+    def _file_lock(self, filepath: Path) -> asyncio.Lock:
+        lock = self._file_locks.get(filepath)
+        if lock is None:
+            lock = self._file_locks[filepath] = asyncio.Lock()
+        return lock
+    
+    async def _save(self, filepath: Path, data: Any) -> None:
+        """
+        Запись файла целиком (save_*). В кластерном режиме — под блокировкой
+        файла; если после чтения data файл записал кто-то ещё, записи, которые
+        вызывающий код не менял, берутся с диска (_merge), и data обновляется
+        на месте. Данные не из load_* (собранные заново, копии) записываются как есть.
+        """
+        if not self.config.process_lock:
+            await self._write_file(filepath, data)
+            return
+        async with self._file_lock(filepath):
+            async with self._process_lock(filepath):
+                baseline = getattr(data, '_baseline', None)
+                if baseline is not None and baseline[0] != self.file_version(filepath):
+                    await self._merge_from_disk(filepath, data, baseline[1])
+                await self._write_file(filepath, data)
+    
+    async def _merge_from_disk(self, filepath: Path, data: Any, base_raw: bytes) -> None:
+        empty = b"{}" if isinstance(data, dict) else b"[]"
+        try:
+            try:
+                async with aiofiles.open(filepath, 'rb') as f:
+                    content = await f.read()
+            except FileNotFoundError:
+                content = b""
+            base = json.loads((base_raw or empty).decode('utf-8'))
+            theirs = json.loads((content or empty).decode('utf-8'))
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot merge concurrent changes of {filepath}, overwriting: {e}")
+            return
+        merged = _merge(base, data, theirs)
+        metrics.inc("bot_storage_merges_total", labels={"file": filepath.name})
+        if isinstance(data, dict):
+            data.clear()
+            data.update(merged)
+        else:
+            data[:] = merged
+    
+    @asynccontextmanager
+    async def _process_lock(self, filepath: Path):
+        """Межпроцессная блокировка файла; без process_lock ничего не делает"""
+        if not self.config.process_lock or fcntl is None:
+            yield
+            return
+        fd = self._lock_fds.get(filepath)
+        if fd is None:
+            fd = self._lock_fds[filepath] = os.open(f"{filepath}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        # Неблокирующие попытки с паузами: ожидание не занимает поток
+        # и корректно прерывается отменой задачи
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
     
     @asynccontextmanager
     async def _transaction(self, filepath: Path, default: Any = None):
         """Контекстный менеджер для атомарных операций"""
-        async with self._lock:
-            data = await self._read_file(filepath, default)
-            yield data
-            await self._write_file(filepath, data)
+        async with self._lock, self._file_lock(filepath):
+            async with self._process_lock(filepath):
+                data = await self._read_file(filepath, default)
+                yield data
+                await self._write_file(filepath, data)
     
     # Users methods
     async def load_users(self) -> Dict[str, Any]:
         """Загрузка всех пользователей"""
         return await self._read_file(self.config.users_file, {})
     
+    async def load_users_with_version(self) -> Tuple[Dict[str, Any], Optional[tuple]]:
+        """users.json и file_version, которой соответствует прочитанное (файл не переписан между чтением и возвратом)"""
+        while True:
+            version = self.file_version(self.config.users_file)
+            users = await self.load_users()
+            if self.file_version(self.config.users_file) == version:
+                return users, version
+    
     async def save_users(self, users_data: Dict[str, Any]) -> None:
         """Сохранение всех пользователей"""
-        await self._write_file(self.config.users_file, users_data)
+        await self._save(self.config.users_file, users_data)
+    
+    def users_transaction(self):
+        """Атомарное чтение-изменение-запись users.json: async with storage.users_transaction() as users"""
+        return self._transaction(self.config.users_file, {})
     
     async def get_user(self, user_id: int) -> Optional[Dict]:
         """Получение данных пользователя по ID"""
@@ -106,6 +419,20 @@ class AsyncJSONStorage:
             if user_id in users:
                 users[user_id].update(updates)
 
+    async def remove_user_games(self, user_games: Dict[str, Any]) -> int:
+        """Удаляет предложенные игры {user_id: ids игр}; возвращает число удалённых"""
+        removed = 0
+        async with self._transaction(self.config.users_file, {}) as users:
+            for user_id, game_ids in user_games.items():
+                games = users.get(user_id, {}).get('games')
+                if not games:
+                    continue
+                ids = {str(game_id) for game_id in game_ids}
+                keep = [game for game in games if str(game.get('id')) not in ids]
+                removed += len(games) - len(keep)
+                users[user_id]['games'] = keep
+        return removed
+
     # Languages methods (separate file)
     async def load_languages(self) -> Dict[str, str]:
         """Загрузка языков пользователей (отдельный файл)"""
@@ -131,7 +458,7 @@ class AsyncJSONStorage:
     
     async def save_games(self, games_data: List[Any]) -> None:
         """Сохранение всех игр"""
-        await self._write_file(self.config.games_file, games_data)
+        await self._save(self.config.games_file, games_data)
     
     async def add_game(self, game_data: Dict) -> None:
         """Добавление новой игры"""
@@ -145,7 +472,7 @@ class AsyncJSONStorage:
     
     async def save_banned_users(self, banned_data: Dict[str, Any]) -> None:
         """Сохранение забаненных пользователей"""
-        await self._write_file(self.config.banned_file, banned_data)
+        await self._save(self.config.banned_file, banned_data)
     
     # Session methods
     async def save_session(self, user_id: int, session_data: Dict) -> None:
@@ -173,7 +500,11 @@ class AsyncJSONStorage:
 
     async def save_tournaments(self, tournaments_data: Dict[str, Any]) -> None:
         """Сохранение турниров"""
-        await self._write_file(self.config.tournaments_file, tournaments_data)
+        await self._save(self.config.tournaments_file, tournaments_data)
+
+    def tournaments_transaction(self):
+        """Атомарное чтение-изменение-запись tournaments.json"""
+        return self._transaction(self.config.tournaments_file, {})
 
     async def load_tournament_applications(self) -> Dict[str, Any]:
         """Загрузка заявок на турниры"""
@@ -181,7 +512,7 @@ class AsyncJSONStorage:
 
     async def save_tournament_applications(self, applications_data: Dict[str, Any]) -> None:
         """Сохранение заявок на турниры"""
-        await self._write_file(self.config.tournament_applications_file, applications_data)
+        await self._save(self.config.tournament_applications_file, applications_data)
 
     # Beauty Contest methods
     async def load_beauty_contest(self) -> Dict[str, Any]:
@@ -190,7 +521,25 @@ class AsyncJSONStorage:
 
     async def save_beauty_contest(self, beauty_contest_data: Dict[str, Any]) -> None:
         """Сохранение данных конкурса красоты"""
-        await self._write_file(self.config.beauty_contest_file, beauty_contest_data)
+        await self._save(self.config.beauty_contest_file, beauty_contest_data)
+
+    # Payments ledger
+    async def load_payments(self) -> Dict[str, Any]:
+        """Журнал платежей {payment_id: запись}"""
+        return await self._read_file(self.config.payments_file, {})
+
+    def payments_transaction(self):
+        """Атомарное чтение-изменение-запись журнала платежей"""
+        return self._transaction(self.config.payments_file, {})
+
+    # Telegram file_id загруженных файлов
+    async def load_file_ids(self) -> Dict[str, str]:
+        """Соответствие «путь|mtime» → file_id"""
+        return await self._read_file(self.config.file_ids_file, {})
+
+    def file_ids_transaction(self):
+        """Атомарное чтение-изменение-запись соответствия файлов и file_id"""
+        return self._transaction(self.config.file_ids_file, {})
 
 # Создаем глобальный экземпляр хранилища
 storage = AsyncJSONStorage()
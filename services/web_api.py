@@ -1,21 +1,44 @@
 """
 Сервис для работы с Web API сайта Tennis-Play
+
+На каждый хост (домены из domain_urls и хосты фото) — одна долгоживущая
+aiohttp-сессия с ограничением соединений и таймаутами. Ответы get_user
+кэшируются на WEB_API_CACHE_TTL секунд; фото скачиваются потоком,
+частями, во временный файл без блокировки цикла событий.
 """
 
+import aiofiles
 import aiohttp
 import asyncio
+import copy
 import logging
-from typing import Optional, Dict
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Iterable, Tuple
+
+from yarl import URL
 
-from config.config import API_BASE_URL, API_SECRET_TOKEN
+from config.config import (
+    API_BASE_URL, API_SECRET_TOKEN, WEB_API_CACHE_TTL, WEB_API_IMPORT_CONCURRENCY,
+    WEB_API_MAX_CONNECTIONS, WEB_API_TIMEOUT,
+)
+from utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+metrics.describe("bot_web_api_seconds", "Длительность запросов к API сайтов")
+metrics.describe("bot_web_api_cache_total", "Обращения к кэшу get_user (hit, miss)")
+
+CACHE_MAX_SIZE = 1000
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_PHOTO_BYTES = 20 * 1024 * 1024
+
 
 class WebAPIClient:
     """Клиент для работы с Web API"""
     
-    def __init__(self):
+    def __init__(self, cache_ttl: float = WEB_API_CACHE_TTL):
         self.base_url = API_BASE_URL
         self.token = API_SECRET_TOKEN
         # URLs для разных доменов
@@ -27,42 +50,87 @@ class WebAPIClient:
             'tabletennis': 'https://tabletennis-play.com/profile/api.php',
             'tournaments': 'https://tennis-tournaments.com/profile/api.php'
         }
+        self.cache_ttl = cache_ttl
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._sessions_loop: Optional[asyncio.AbstractEventLoop] = None
+        # (домен, user_id) -> (момент записи, данные)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict]]" = OrderedDict()
+    
+    def _session(self, url: str) -> aiohttp.ClientSession:
+        """Общая сессия хоста url; пересоздаётся, если закрыта или создана в другом цикле событий."""
+        loop = asyncio.get_running_loop()
+        if self._sessions_loop is not loop:
+            self._sessions = {}
+            self._sessions_loop = loop
+        host = URL(url).host or ''
+        session = self._sessions.get(host)
+        if session is None or session.closed:
+            session = self._sessions[host] = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=WEB_API_TIMEOUT, connect=5),
+                connector=aiohttp.TCPConnector(limit=WEB_API_MAX_CONNECTIONS, keepalive_timeout=30),
+            )
+        return session
+    
+    async def close(self) -> None:
+        """Закрывает сессии (при остановке бота)."""
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            if not session.closed:
+                await session.close()
+    
+    def _cached(self, key: Tuple[str, str]) -> Optional[Dict]:
+        entry = self._cache.get(key)
+        if entry is None or time.monotonic() - entry[0] >= self.cache_ttl:
+            return None
+        return copy.deepcopy(entry[1])
+    
+    def _remember(self, key: Tuple[str, str], data: Dict) -> None:
+        self._cache[key] = (time.monotonic(), copy.deepcopy(data))
+        self._cache.move_to_end(key)
+        while len(self._cache) > CACHE_MAX_SIZE:
+            self._cache.popitem(last=False)
     
     async def get_user_data(self, user_id: str, domain: str = 'com') -> Optional[Dict]:
         """
-        Получает данные пользователя с сайта
+        Получает данные пользователя с сайта (повтор в течение cache_ttl — из кэша)
         
         Args:
             user_id: ID пользователя на сайте
-            domain: Домен сайта ('com' или 'by')
+            domain: Домен сайта (ключ domain_urls)
         """
+        key = (domain, str(user_id))
+        cached = self._cached(key)
+        if cached is not None:
+            metrics.inc("bot_web_api_cache_total", labels={"result": "hit"})
+            return cached
+        metrics.inc("bot_web_api_cache_total", labels={"result": "miss"})
+        
+        started = time.perf_counter()
         try:
             # Выбираем URL в зависимости от домена
             api_url = self.domain_urls.get(domain, self.base_url)
+            params = {
+                'action': 'get_user',
+                'user_id': user_id,
+                'token': self.token
+            }
             
-            async with aiohttp.ClientSession() as session:
-                params = {
-                    'action': 'get_user',
-                    'user_id': user_id,
-                    'token': self.token
-                }
+            async with self._session(api_url).get(api_url, params=params) as response:
+                if response.status == 200:
+                    result = await response.json(content_type=None)
+                    if result.get('success'):
+                        data = result.get('data')
+                        if isinstance(data, dict):
+                            self._remember(key, data)
+                        return data
+                elif response.status == 404:
+                    logger.warning(f"Пользователь {user_id} не найден на сайте")
+                elif response.status == 403:
+                    logger.error("Ошибка авторизации API: неверный токен")
+                else:
+                    logger.error(f"Ошибка API: статус {response.status}")
                 
-                async with session.get(
-                    api_url,
-                    params=params
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if result.get('success'):
-                            return result.get('data')
-                    elif response.status == 404:
-                        logger.warning(f"Пользователь {user_id} не найден на сайте")
-                    elif response.status == 403:
-                        logger.error("Ошибка авторизации API: неверный токен")
-                    else:
-                        logger.error(f"Ошибка API: статус {response.status}")
-                    
-                    return None
+                return None
                     
         except asyncio.TimeoutError:
             logger.error(f"Таймаут при запросе данных пользователя {user_id}")
@@ -70,11 +138,40 @@ class WebAPIClient:
         except Exception as e:
             logger.error(f"Ошибка получения данных пользователя {user_id}: {e}")
             return None
+        finally:
+            metrics.observe("bot_web_api_seconds", time.perf_counter() - started,
+                            labels={"domain": domain, "action": "get_user"})
+    
+    async def import_users(self, user_ids: Iterable[str], domain: str = 'com',
+                           concurrency: int = WEB_API_IMPORT_CONCURRENCY) -> Dict[str, Optional[Dict]]:
+        """
+        Массовая загрузка пользователей сайта (перенос с tennis-play.*)
+        
+        Не больше concurrency запросов одновременно; повторяющиеся id
+        запрашиваются один раз.
+        
+        Returns:
+            {user_id: данные или None, если пользователь не получен}
+        """
+        pending = iter(dict.fromkeys(str(user_id) for user_id in user_ids))
+        results: Dict[str, Optional[Dict]] = {}
+        
+        async def worker() -> None:
+            for user_id in pending:
+                results[user_id] = await self.get_user_data(user_id, domain)
+        
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        found = sum(1 for data in results.values() if data)
+        logger.info(f"Импорт с {domain}: получено {found} из {len(results)} пользователей")
+        return results
     
     async def download_photo(self, photo_url: str, save_path: str) -> bool:
         """
         Скачивает фото с сайта и сохраняет в указанный путь
         
+        Файл пишется частями во временный файл и переименовывается в
+        save_path только после полной загрузки.
+        
         Args:
             photo_url: URL фото на сайте
             save_path: Путь для сохранения файла
@@ -82,20 +179,33 @@ class WebAPIClient:
         Returns:
             True если успешно, False иначе
         """
+        tmp_path = f"{save_path}.part"
+        started = time.perf_counter()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(photo_url) as response:
-                    if response.status == 200:
-                        with open(save_path, 'wb') as f:
-                            f.write(await response.read())
-                        logger.info(f"Фото успешно скачано: {save_path}")
-                        return True
-                    else:
-                        logger.error(f"Ошибка скачивания фото: статус {response.status}")
-                        return False
+            async with self._session(photo_url).get(photo_url) as response:
+                if response.status != 200:
+                    logger.error(f"Ошибка скачивания фото: статус {response.status}")
+                    return False
+                size = 0
+                async with aiofiles.open(tmp_path, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > MAX_PHOTO_BYTES:
+                            raise ValueError(f"файл больше {MAX_PHOTO_BYTES} байт")
+                        await f.write(chunk)
+            os.replace(tmp_path, save_path)
+            logger.info(f"Фото успешно скачано: {save_path}")
+            return True
         except Exception as e:
             logger.error(f"Ошибка скачивания фото {photo_url}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
             return False
+        finally:
+            metrics.observe("bot_web_api_seconds", time.perf_counter() - started,
+                            labels={"domain": URL(photo_url).host or '', "action": "photo"})
     
     def convert_web_user_to_params(self, web_user: Dict) -> Dict:
         # Разбиваем имя на имя и фамилию
@@ -0,0 +1,202 @@
+"""
+Режим вебхука: aiohttp-сервер принимает апдейты от Telegram и складывает
+их во внутреннюю очередь, которую разбирает ограниченный пул воркеров.
+
+Порядок внутри одного чата сохраняется: апдейты чата стоят в своей
+очереди, и в каждый момент её обрабатывает не больше одного воркера.
+Разные чаты обрабатываются параллельно (до WEBHOOK_WORKERS одновременно).
+
+Если в очереди уже WEBHOOK_QUEUE_SIZE апдейтов, обработчик вебхука ждёт
+освобождения места не дольше WEBHOOK_ENQUEUE_TIMEOUT, а затем отвечает 503 —
+Telegram повторит доставку позже (backpressure вместо роста памяти).
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Hashable, List, Optional, Tuple
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+from config.config import (
+    WEBHOOK_ENQUEUE_TIMEOUT, WEBHOOK_HOST, WEBHOOK_MAX_CONNECTIONS, WEBHOOK_PATH, WEBHOOK_PORT,
+    WEBHOOK_QUEUE_SIZE, WEBHOOK_SECRET, WEBHOOK_URL, WEBHOOK_WORKERS,
+)
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+metrics.describe("bot_update_queue_wait_seconds", "Время апдейта во внутренней очереди до начала обработки")
+metrics.describe("bot_update_queue_depth", "Апдейтов в очереди в момент постановки нового")
+metrics.describe("bot_webhook_updates_total", "Апдейты, пришедшие на вебхук, по результату")
+
+
+def update_key(update: Update) -> Hashable:
+    """Ключ упорядочивания: чат, иначе пользователь, иначе сам апдейт (без ограничений)."""
+    context = UserContextMiddleware.resolve_event_context(event=update)
+    if context.chat_id is not None:
+        return ("chat", context.chat_id)
+    if context.user_id is not None:
+        return ("user", context.user_id)
+    return ("update", update.update_id)
+
+
+@dataclass
+class _Lane:
+    """Очередь одного чата."""
+    items: Deque[Tuple[Update, float]] = field(default_factory=deque)
+    busy: bool = False
+
+
+class UpdateQueue:
+    """
+    Ограниченная очередь апдейтов с пулом воркеров и порядком внутри чата.
+
+    В ready стоят ключи чатов, у которых есть необработанные апдейты и
+    которых сейчас никто не обрабатывает; воркер берёт ключ и разбирает
+    очередь этого чата до конца, после чего ключ освобождается.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int = WEBHOOK_WORKERS,
+                 maxsize: int = WEBHOOK_QUEUE_SIZE):
+        self.dp = dp
+        self.bot = bot
+        self.workers = max(1, workers)
+        self.maxsize = max(1, maxsize)
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self._ready: "asyncio.Queue[Hashable]" = asyncio.Queue()
+        self._size = 0
+        self._space = asyncio.Condition()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: List[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def put(self, update: Update, timeout: Optional[float] = None) -> bool:
+        """Ставит апдейт в очередь; False — места не дождались за timeout."""
+        if self._size >= self.maxsize:
+            try:
+                async with self._space:
+                    await asyncio.wait_for(self._space.wait_for(lambda: self._size < self.maxsize), timeout)
+            except asyncio.TimeoutError:
+                return False
+        metrics.observe("bot_update_queue_depth", self._size, buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000))
+        key = update_key(update)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+        lane.items.append((update, time.perf_counter()))
+        self._size += 1
+        self._idle.clear()
+        if not lane.busy:
+            lane.busy = True
+            self._ready.put_nowait(key)
+        return True
+
+    async def join(self) -> None:
+        """Ждёт, пока очередь опустеет и все апдейты будут обработаны."""
+        await self._idle.wait()
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """Даёт дообработать очередь (не дольше drain_timeout) и останавливает воркеров."""
+        try:
+            await asyncio.wait_for(self.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Остановка вебхука: не обработано апдейтов {self._size}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, number: int) -> None:
+        while True:
+            key = await self._ready.get()
+            lane = self._lanes[key]
+            while lane.items:
+                update, queued_at = lane.items.popleft()
+                metrics.observe("bot_update_queue_wait_seconds", time.perf_counter() - queued_at)
+                try:
+                    await self.dp.feed_update(self.bot, update)
+                except Exception:
+                    logger.exception(f"Ошибка обработки апдейта {update.update_id}")
+                finally:
+                    self._size -= 1
+                    async with self._space:
+                        self._space.notify()
+            # Новые апдейты чата, пришедшие во время обработки, уже разобраны в цикле выше
+            del self._lanes[key]
+            if self._size == 0:
+                self._idle.set()
+
+
+async def _webhook_handler(request: web.Request) -> web.Response:
+    queue: UpdateQueue = request.app["update_queue"]
+    secret = request.app["secret"]
+    if secret and request.headers.get(SECRET_HEADER) != secret:
+        metrics.inc("bot_webhook_updates_total", labels={"result": "forbidden"})
+        return web.Response(status=403)
+    try:
+        update = Update.model_validate(await request.json(), context={"bot": queue.bot})
+    except Exception as e:
+        logger.warning(f"Некорректный апдейт на вебхуке: {e}")
+        metrics.inc("bot_webhook_updates_total", labels={"result": "invalid"})
+        # 200, чтобы Telegram не повторял заведомо битый апдейт
+        return web.Response()
+    if not await queue.put(update, timeout=request.app["enqueue_timeout"]):
+        metrics.inc("bot_webhook_updates_total", labels={"result": "rejected"})
+        return web.Response(status=503, headers={"Retry-After": "1"})
+    metrics.inc("bot_webhook_updates_total", labels={"result": "queued"})
+    return web.Response()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, stop: Optional[asyncio.Event] = None,
+                      url: str = WEBHOOK_URL, path: str = WEBHOOK_PATH,
+                      host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT,
+                      secret: str = WEBHOOK_SECRET, register: bool = True) -> None:
+    """
+    Работает в режиме вебхука до stop (или до отмены задачи).
+
+    Регистрирует вебхук url + path у Telegram (register=False — не регистрирует:
+    апдейты присылает роутер кластера), принимает апдейты на host:port
+    и обрабатывает их через UpdateQueue. При остановке дообрабатывает очередь.
+    """
+    queue = UpdateQueue(dp, bot)
+    app = web.Application()
+    app["update_queue"] = queue
+    app["secret"] = secret
+    app["enqueue_timeout"] = WEBHOOK_ENQUEUE_TIMEOUT
+    app.router.add_post(path, _webhook_handler)
+    runner = web.AppRunner(app, access_log=None)
+
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    queue.start()
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        if register:
+            await bot.set_webhook(
+                url.rstrip("/") + path,
+                secret_token=secret or None,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+        logger.info(f"Вебхук слушает {host}:{port}{path}, воркеров {queue.workers}, очередь {queue.maxsize}")
+        await (stop or asyncio.Event()).wait()
+    finally:
+        # Сначала перестаём принимать апдейты, потом дообрабатываем принятые
+        await runner.cleanup()
+        await queue.stop()
+        await dp.emit_shutdown(bot=bot, **workflow_data)
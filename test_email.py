@@ -78,26 +78,28 @@ def _print_smtp_config() -> None:
 
 
 async def _send_with_result(coro_factory, verbose: bool = False) -> tuple[bool, str]:
-    result: dict[str, Any] = {"ok": False, "response": ""}
-    original = email_utils.email_service.send_html_email
+    """Вызывает функцию уведомления и ждёт, пока письмо уйдёт из очереди."""
+    futures: list[Any] = []
+    original = email_utils.email_service.enqueue
 
-    async def wrapped(*args, **kwargs):
-        kwargs["return_smtp_response"] = True
-        ok, response = await original(*args, **kwargs)
-        result["ok"] = ok
-        result["response"] = response
-        return ok
+    def wrapped(*args, **kwargs):
+        future = original(*args, **kwargs)
+        futures.append(future)
+        return future
 
-    email_utils.email_service.send_html_email = wrapped
+    email_utils.email_service.enqueue = wrapped
     try:
         await coro_factory()
     finally:
-        email_utils.email_service.send_html_email = original
+        email_utils.email_service.enqueue = original
 
-    if verbose and result["response"]:
-        print(f"SMTP ответ: {result['response']}")
+    ok, response = (await futures[0]) if futures else (False, "")
+    await email_utils.email_service.close()
 
-    return bool(result["ok"]), result["response"]
+    if verbose and response:
+        print(f"SMTP ответ: {response}")
+
+    return bool(ok), response
 
 
 def _print_delivery_hint(recipient: str) -> None:
@@ -3,10 +3,10 @@ from utils.admin import is_admin
 from aiogram import types
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
-    FSInputFile,
     InlineKeyboardMarkup,
     InlineKeyboardButton
 )
+from utils.file_ids import send_cached_file
 from utils.utils import calculate_age, remove_country_flag
 from utils.translations import get_user_language_async, t
 from config.profile import (
@@ -261,11 +261,14 @@ async def show_profile(message: types.Message, profile: dict, back_button=False)
 
     photo_path = profile.get("photo_path")
     if photo_path and (BASE_DIR / photo_path).exists():
-        await message.answer_photo(
-            FSInputFile(BASE_DIR / photo_path), 
-            caption=caption, 
-            parse_mode="HTML",
-            reply_markup=keyboard
+        await send_cached_file(
+            lambda media: message.answer_photo(
+                media,
+                caption=caption,
+                parse_mode="HTML",
+                reply_markup=keyboard
+            ),
+            BASE_DIR / photo_path,
         )
     else:
         await message.answer(
@@ -1,5 +1,6 @@
 from .models import Player, Match, TournamentBracket
-from .renderer import BracketImageGenerator
+from .renderer import BracketImageGenerator, configure_pixel_pool
+from .encoding import EncodedImage, encode_image, image_filename
 from .builders import (
     create_tournament_from_data,
     create_bracket_image,
@@ -13,6 +14,10 @@ __all__ = [
     "Match",
     "TournamentBracket",
     "BracketImageGenerator",
+    "configure_pixel_pool",
+    "EncodedImage",
+    "encode_image",
+    "image_filename",
     "create_tournament_from_data",
     "create_bracket_image",
     "save_bracket_image",
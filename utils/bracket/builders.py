@@ -1,10 +1,10 @@
-import io
 import os
 from typing import List, Dict, Any, Optional
 from PIL import Image, ImageDraw, ImageFont
 
 from config.paths import GAMES_PHOTOS_DIR, BASE_DIR
 from .models import Player, Match, TournamentBracket
+from .encoding import encode_image
 from .renderer import BracketImageGenerator
 
 
@@ -718,10 +718,7 @@ def create_simple_text_image_bytes(text: str, title: str = "Информация
             draw.text((30, y), safe_line, fill=(31, 41, 55), font=text_font)
         y += line_spacing
 
-    buf = io.BytesIO()
-    image.save(buf, format='PNG')
-    buf.seek(0)
-    return buf.getvalue()
+    return encode_image(image, kind="text")
 
 
 def build_tournament_bracket_image_bytes(tournament_data: Dict[str, Any], players_input: List[Any], completed_games: Optional[List[Dict[str, Any]]] = None):
@@ -755,9 +752,7 @@ def build_tournament_bracket_image_bytes(tournament_data: Dict[str, Any], player
             # Пробросим фото профилей в первую отрисовку (у игроков уже photo_url), а в нижний блок передадим фото игр
             image = generator.generate_olympic_bracket_image(bracket_struct, photo_paths)
             print(f"[BRACKET] Сгенерировано изображение олимпийской сетки. Фото прикреплено: {len(photo_paths)}")
-            buf = io.BytesIO()
-            image.save(buf, format='PNG')
-            buf.seek(0)
+            image_bytes = encode_image(image, kind="olympic")
 
             # Текстовое краткое описание пар первого круга
             lines = [f"{name}", "", "Первый круг:"]
@@ -768,10 +763,11 @@ def build_tournament_bracket_image_bytes(tournament_data: Dict[str, Any], player
                     lines.append(f"- {p1} vs {p2}")
             text = "\n".join(lines)
             print("[BRACKET] Возвращаю байты изображения и краткий текст первого круга.")
-            return buf.getvalue(), text
+            return image_bytes, text
         else:
             # Для круговой таблицы используем отдельный генератор с фото
             from utils.round_robin_image_generator import build_round_robin_table
+            from utils.round_robin_standings import ensure_standings
             table_players = [{"id": getattr(p, 'id', None) or p.get('id'), "name": getattr(p, 'name', None) or p.get('name')} for p in players_input]
             # Собираем фото путей
             photo_paths: list[str] = []
@@ -785,7 +781,7 @@ def build_tournament_bracket_image_bytes(tournament_data: Dict[str, Any], player
                 pass
             # Генератор round robin сейчас не принимает фото, но мы расширили _draw_game_photos_area, так что передадим позже при интеграции
             # Возвращаем совместимо: старый вызов без фото (фото выводятся placeholders)
-            image_bytes = build_round_robin_table(table_players, completed_games, name)
+            image_bytes = build_round_robin_table(table_players, completed_games, name, standings=ensure_standings(tournament_data))
             print("[BRACKET][RR] Возвращаю изображение круговой таблицы.")
             return image_bytes, name
     except Exception as e:
@@ -0,0 +1,168 @@
+"""
+Кодирование картинок сеток и таблиц для отправки в Telegram.
+
+Сетка рисуется в крупном масштабе (ячейка 700×220, шрифт 44 px), и на 32–64
+участниках получается картинка 5000–12000 px по стороне. Telegram такие фото
+всё равно уменьшает до 2560 px, а при ширине + высоте больше 10000 не
+принимает вовсе. Поэтому перед отправкой картинка уменьшается (LANCZOS —
+текст остаётся чётким) до BRACKET_IMAGE_MAX_SIDE и кодируется так:
+
+- не больше 256 цветов — PNG с палитрой без потерь;
+- иначе PNG с палитрой из 256 цветов, если она почти не отличается от
+  исходника (линии, заливки и текст сетки);
+- если отличается (фото игроков и игр) — меньший из форматов
+  BRACKET_IMAGE_LOSSY_FORMATS (JPEG, можно добавить WEBP).
+
+Размеры и время кодирования для сеток разного размера — в
+``python -m benchmarks encoding``.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import time
+from typing import Callable, Dict, Tuple
+
+from PIL import Image, ImageChops
+
+from config.config import BRACKET_IMAGE_LOSSY_FORMATS, BRACKET_IMAGE_MAX_SIDE
+from utils.metrics import SIZE_BUCKETS, metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("bot_image_encode_seconds", "Уменьшение и кодирование картинок сеток и таблиц")
+metrics.describe("bot_image_encode_bytes", "Размер закодированных картинок сеток и таблиц")
+
+# Ограничения Telegram для sendPhoto
+TELEGRAM_MAX_DIMENSIONS_SUM = 10000
+TELEGRAM_MAX_ASPECT = 20
+TELEGRAM_MAX_PHOTO_BYTES = 10 * 1024 * 1024
+# Уменьшение меньше чем на четверть стоит дороже (LANCZOS по всей картинке), чем экономит
+# на размере файла, — такие картинки в пределах лимитов Telegram отправляются как есть
+MIN_DOWNSCALE = 0.75
+
+# Палитра считается незаметной, если не больше PALETTE_MAX_CHANGED_SHARE пикселей
+# отличаются от исходника сильнее PALETTE_VISIBLE_DIFF уровней яркости: у сетки это
+# края сглаженного текста (0,3–4 %), у фотографий — десятки процентов
+PALETTE_VISIBLE_DIFF = 6
+PALETTE_MAX_CHANGED_SHARE = 0.05
+JPEG_QUALITY = 88
+WEBP_QUALITY = 90
+
+
+class EncodedImage(bytes):
+    """Байты картинки из encode_image и её формат (PNG, JPEG, WEBP)."""
+
+    format: str
+
+    def __new__(cls, data: bytes, fmt: str) -> "EncodedImage":
+        image = super().__new__(cls, data)
+        image.format = fmt
+        return image
+
+
+_EXTENSIONS = {'PNG': 'png', 'JPEG': 'jpg', 'WEBP': 'webp'}
+
+
+def image_format(data: bytes) -> str:
+    """Формат картинки: из encode_image или по сигнатуре файла."""
+    fmt = getattr(data, 'format', None)
+    if fmt:
+        return fmt
+    if data[:3] == b'\xff\xd8\xff':
+        return 'JPEG'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'WEBP'
+    return 'PNG'
+
+
+def image_filename(data: bytes, stem: str) -> str:
+    """Имя файла для отправки с расширением по формату картинки: stem.png, stem.jpg, stem.webp."""
+    return f"{stem}.{_EXTENSIONS.get(image_format(data), 'png')}"
+
+
+def _resample():
+    try:
+        return Image.Resampling.LANCZOS  # Pillow>=9
+    except AttributeError:
+        return Image.LANCZOS
+
+
+def fit_to_telegram(image: Image.Image, max_side: int = BRACKET_IMAGE_MAX_SIDE) -> Image.Image:
+    """Уменьшает картинку до max_side по большей стороне и до лимита Telegram на сумму сторон."""
+    width, height = image.size
+    scale = min(1.0, max_side / max(width, height), TELEGRAM_MAX_DIMENSIONS_SUM / (width + height))
+    if scale >= 1.0 or (scale > MIN_DOWNSCALE and width + height <= TELEGRAM_MAX_DIMENSIONS_SUM):
+        return image
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    if max(size) / min(size) > TELEGRAM_MAX_ASPECT:
+        logger.warning(f"Соотношение сторон картинки {size} больше {TELEGRAM_MAX_ASPECT}: Telegram её не примет")
+    # Сначала быстрое целочисленное уменьшение (усреднение блоков), LANCZOS — только на остаток:
+    # в 3–5 раз быстрее LANCZOS по всей картинке при том же качестве текста
+    factor = int(1 / scale)
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image.resize(size, _resample())
+
+
+def _save(image: Image.Image, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def encode_png(image: Image.Image) -> bytes:
+    return _save(image, 'PNG')
+
+
+def encode_palette_png(image: Image.Image) -> Tuple[bytes, float]:
+    """PNG с палитрой и доля пикселей, заметно изменённых палитрой (0 — без потерь)."""
+    if image.getcolors(256) is not None:
+        return _save(image.convert('P', palette=Image.Palette.ADAPTIVE, colors=256), 'PNG'), 0.0
+    paletted = image.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+    histogram = ImageChops.difference(image, paletted.convert('RGB')).convert('L').histogram()
+    changed = sum(histogram[PALETTE_VISIBLE_DIFF + 1:]) / (image.width * image.height)
+    return _save(paletted, 'PNG'), changed
+
+
+def encode_jpeg(image: Image.Image) -> bytes:
+    # 4:4:4 — без прореживания цвета, иначе цветной текст и тонкие линии размываются
+    try:
+        return _save(image, 'JPEG', quality=JPEG_QUALITY, subsampling=0, optimize=True)
+    except OSError:
+        # optimize кодирует в буфер размером с картинку; почти несжимаемая (шум) в него не помещается
+        return _save(image, 'JPEG', quality=JPEG_QUALITY, subsampling=0)
+
+
+def encode_webp(image: Image.Image) -> bytes:
+    return _save(image, 'WEBP', quality=WEBP_QUALITY, method=4)
+
+
+LOSSY_ENCODERS: Dict[str, Callable[[Image.Image], bytes]] = {
+    'JPEG': encode_jpeg,
+    'WEBP': encode_webp,
+}
+
+
+def encode_image(image: Image.Image, kind: str = "bracket") -> EncodedImage:
+    """
+    Готовит картинку к отправке: уменьшает под Telegram и выбирает формат
+    (см. модуль). Формат — в .format результата; имя файла для отправки
+    даёт image_filename.
+    """
+    started = time.perf_counter()
+    image = fit_to_telegram(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    data, changed = encode_palette_png(image)
+    fmt = 'PNG'
+    if changed > PALETTE_MAX_CHANGED_SHARE or len(data) > TELEGRAM_MAX_PHOTO_BYTES:
+        candidates = [(name, LOSSY_ENCODERS[name](image)) for name in BRACKET_IMAGE_LOSSY_FORMATS if name in LOSSY_ENCODERS]
+        if candidates:
+            fmt, data = min(candidates, key=lambda item: len(item[1]))
+
+    metrics.observe("bot_image_encode_seconds", time.perf_counter() - started, labels={"kind": kind, "format": fmt})
+    metrics.observe("bot_image_encode_bytes", len(data), labels={"kind": kind, "format": fmt}, buckets=SIZE_BUCKETS)
+    return EncodedImage(data, fmt)
@@ -1,9 +1,81 @@
 import os
-from typing import List, Tuple, Optional
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Tuple, Optional
 from PIL import Image, ImageDraw, ImageFont
 
+from config.config import BRACKET_LAYER_CACHE_MB, BRACKET_PIXEL_POOL_MB
 from config.paths import BASE_DIR
+from utils.metrics import metrics
+from utils.photos import avatar_file
 from .models import Player, Match, TournamentBracket
+from .text import default_font, text_metrics, truetype
+
+metrics.describe("bot_bracket_skeleton_cache_total", "Каркасы олимпийских сеток: из кэша (hit) и нарисованные заново (miss)")
+
+
+class _Skeleton:
+    """Статичный слой сетки и позиции ячеек, по которым поверх рисуются результаты."""
+
+    def __init__(self, image: Image.Image, round_positions: List[List[Tuple[int, int]]],
+                 mini_positions: List[List[List[Tuple[int, int]]]]):
+        self.image = image
+        self.round_positions = round_positions
+        self.mini_positions = mini_positions
+        self.nbytes = image.width * image.height * len(image.getbands())
+
+
+class _SkeletonCache:
+    """
+    LRU каркасов, ограниченный объёмом пикселей: каркас сетки на 64 участника
+    занимает ~130 МБ, поэтому считаем байты, а не записи.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._items: "OrderedDict[Hashable, _Skeleton]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[_Skeleton]:
+        with self._lock:
+            skeleton = self._items.get(key)
+            if skeleton is not None:
+                self._items.move_to_end(key)
+        metrics.inc("bot_bracket_skeleton_cache_total", labels={"result": "hit" if skeleton else "miss"})
+        return skeleton
+
+    def put(self, key: Hashable, skeleton: _Skeleton) -> None:
+        if skeleton.nbytes > self._max_bytes:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._items[key] = skeleton
+            self._bytes += skeleton.nbytes
+            while self._bytes > self._max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+_skeletons = _SkeletonCache(BRACKET_LAYER_CACHE_MB * 1024 * 1024)
+
+
+def configure_pixel_pool(pool_mb: int = BRACKET_PIXEL_POOL_MB) -> None:
+    """
+    Пул блоков памяти Pillow: копия каркаса и холст новой сетки берут уже
+    отображённые страницы (в 3–4 раза быстрее, чем получать их у ОС).
+    Настройка общая для процесса, поэтому вызывается из main(), а не при
+    импорте; 0 или PILLOW_BLOCKS_MAX в окружении — оставить как есть.
+    """
+    if pool_mb > 0 and 'PILLOW_BLOCKS_MAX' not in os.environ:
+        Image.core.set_blocks_max(pool_mb * 1024 * 1024 // Image.core.get_block_size())
 
 
 class BracketImageGenerator:
@@ -61,7 +133,7 @@ class BracketImageGenerator:
         def _try_load_font(candidates, size):
             for path in candidates:
                 try:
-                    return ImageFont.truetype(path, size)
+                    return truetype(path, size)
                 except Exception:
                     continue
             return None
@@ -89,111 +161,111 @@ class BracketImageGenerator:
         # Фолбэк Arial
         if not self.font:
             try:
-                self.font = ImageFont.truetype("arial.ttf", self.font_size)
+                self.font = truetype("arial.ttf", self.font_size)
             except Exception:
                 self.font = None
         if not self.bold_font:
             try:
-                self.bold_font = ImageFont.truetype("arialbd.ttf", self.font_size)
+                self.bold_font = truetype("arialbd.ttf", self.font_size)
             except Exception:
                 self.bold_font = None
         if not self.name_font:
             try:
-                self.name_font = ImageFont.truetype("arial.ttf", self.name_font_size)
+                self.name_font = truetype("arial.ttf", self.name_font_size)
             except Exception:
                 self.name_font = None
         if not self.name_bold_font:
             try:
-                self.name_bold_font = ImageFont.truetype("arialbd.ttf", self.name_font_size)
+                self.name_bold_font = truetype("arialbd.ttf", self.name_font_size)
             except Exception:
                 self.name_bold_font = None
         if not self.title_font:
             try:
-                self.title_font = ImageFont.truetype("arialbd.ttf", self.title_font_size)
+                self.title_font = truetype("arialbd.ttf", self.title_font_size)
             except Exception:
                 self.title_font = None
         if not self.subtitle_font:
             try:
-                self.subtitle_font = ImageFont.truetype("arial.ttf", self.subtitle_font_size)
+                self.subtitle_font = truetype("arial.ttf", self.subtitle_font_size)
             except Exception:
                 self.subtitle_font = None
         if not self.score_font:
             try:
-                self.score_font = ImageFont.truetype("arial.ttf", self.score_font_size)
+                self.score_font = truetype("arial.ttf", self.score_font_size)
             except Exception:
                 self.score_font = None
 
         # Фолбэк DejaVuSans
         if not self.font:
             try:
-                self.font = ImageFont.truetype("DejaVuSans.ttf", self.font_size)
+                self.font = truetype("DejaVuSans.ttf", self.font_size)
             except Exception:
                 self.font = None
         if not self.bold_font:
             try:
-                self.bold_font = ImageFont.truetype("DejaVuSans-Bold.ttf", self.font_size)
+                self.bold_font = truetype("DejaVuSans-Bold.ttf", self.font_size)
             except Exception:
                 self.bold_font = None
         if not self.name_font:
             try:
-                self.name_font = ImageFont.truetype("DejaVuSans.ttf", self.name_font_size)
+                self.name_font = truetype("DejaVuSans.ttf", self.name_font_size)
             except Exception:
                 self.name_font = None
         if not self.name_bold_font:
             try:
-                self.name_bold_font = ImageFont.truetype("DejaVuSans-Bold.ttf", self.name_font_size)
+                self.name_bold_font = truetype("DejaVuSans-Bold.ttf", self.name_font_size)
             except Exception:
                 self.name_bold_font = None
         if not self.title_font:
             try:
-                self.title_font = ImageFont.truetype("DejaVuSans-Bold.ttf", self.title_font_size)
+                self.title_font = truetype("DejaVuSans-Bold.ttf", self.title_font_size)
             except Exception:
                 self.title_font = None
         if not self.subtitle_font:
             try:
-                self.subtitle_font = ImageFont.truetype("DejaVuSans.ttf", self.subtitle_font_size)
+                self.subtitle_font = truetype("DejaVuSans.ttf", self.subtitle_font_size)
             except Exception:
                 self.subtitle_font = None
         if not self.score_font:
             try:
-                self.score_font = ImageFont.truetype("DejaVuSans.ttf", self.score_font_size)
+                self.score_font = truetype("DejaVuSans.ttf", self.score_font_size)
             except Exception:
                 self.score_font = None
 
         # Последний фолбэк — дефолтный
         if not self.font:
             try:
-                self.font = ImageFont.load_default()
+                self.font = default_font()
             except Exception:
                 self.font = None
         if not self.bold_font:
             try:
-                self.bold_font = ImageFont.load_default()
+                self.bold_font = default_font()
             except Exception:
                 self.bold_font = None
         if not self.name_font:
             try:
-                self.name_font = ImageFont.load_default()
+                self.name_font = default_font()
             except Exception:
                 self.name_font = None
         if not self.name_bold_font:
             try:
-                self.name_bold_font = ImageFont.load_default()
+                self.name_bold_font = default_font()
             except Exception:
                 self.name_bold_font = None
         if not self.title_font:
             try:
-                self.title_font = ImageFont.load_default()
+                self.title_font = default_font()
             except Exception:
                 self.title_font = None
         if not self.subtitle_font:
             try:
-                self.subtitle_font = ImageFont.load_default()
+                self.subtitle_font = default_font()
             except Exception:
                 self.subtitle_font = None
         if not self.score_font:
             try:
-                self.score_font = ImageFont.load_default()
+                self.score_font = default_font()
             except Exception:
                 self.score_font = None
 
@@ -237,8 +309,8 @@ class BracketImageGenerator:
         # Пробуем загрузить пользовательское фото, если имеется
         try:
             if player is not None and getattr(player, 'photo_url', None):
-                raw_path = str(player.photo_url)
-                abs_path = raw_path if os.path.isabs(raw_path) else os.path.join(BASE_DIR, raw_path)
+                # Готовое квадратное превью нужного размера, если фото обработано при загрузке
+                abs_path = avatar_file(str(player.photo_url), size)
                 if os.path.exists(abs_path):
                     src = Image.open(abs_path)
                     src = src.convert('RGBA')
@@ -276,7 +348,7 @@ class BracketImageGenerator:
                     draw = ImageDraw.Draw(img)
                     # Выбираем доступный шрифт
                     font = self.name_bold_font or self.bold_font or self.font
-                    bbox = draw.textbbox((0, 0), initials, font=font)
+                    bbox = text_metrics.bbox(initials, font=font)
                     text_w = max(0, bbox[2] - bbox[0])
                     text_h = max(0, bbox[3] - bbox[1])
                     x = (size - text_w) // 2
@@ -328,20 +400,25 @@ class BracketImageGenerator:
         """Получает полное имя и фамилию"""
         return player.name
     
+    def _cell_border_color(self, is_placement: bool, is_mini_tournament: bool) -> Tuple[int, int, int]:
+        # Для мини-турниров не используем цвет игр за места
+        if is_placement and not is_mini_tournament:
+            return self.placement_color
+        return self.cell_border_color
+
+    def _skeleton_players(self, match: Match, is_mini_tournament: bool) -> Tuple[Optional[Player], Optional[Player]]:
+        """Игроки ячейки в каркасе: в основной сетке — посев (без выделения победителя), в мини-сетках — пусто."""
+        if is_mini_tournament:
+            return None, None
+        return match.player1, match.player2
+
     def draw_match_cell(self, draw: ImageDraw.Draw, x: int, y: int, match: Match, round_num: int = 0, 
-                       is_placement: bool = False, is_mini_tournament: bool = False) -> None:
-        """Рисует ячейку матча в стиле tennis-play.com"""
+                       is_placement: bool = False, is_mini_tournament: bool = False, static: bool = False) -> None:
+        """Рисует ячейку матча в стиле tennis-play.com (static — только каркас, см. _skeleton_players)"""
         if not match:
             return
         
-        # Цвета для разных типов матчей
-        if is_mini_tournament:
-            # Для мини-турниров не используем зеленый цвет границ
-            border_color = self.cell_border_color
-        elif is_placement:
-            border_color = self.placement_color
-        else:
-            border_color = self.cell_border_color
+        border_color = self._cell_border_color(is_placement, is_mini_tournament)
         
         # Фон ячейки
         draw.rectangle([x, y, x + self.cell_width, y + self.cell_height], 
@@ -350,8 +427,12 @@ class BracketImageGenerator:
         # Счёт матча больше не рисуем над ячейкой — он выводится под подписью победителя на коннекторе
 
         # Информация о матче
-        player1 = match.player1
-        player2 = match.player2
+        if static:
+            player1, player2 = self._skeleton_players(match, is_mini_tournament)
+            winner = None
+        else:
+            player1, player2 = match.player1, match.player2
+            winner = match.winner
         
         # Рисуем игроков
         player_height = self.cell_height // 2
@@ -359,7 +440,7 @@ class BracketImageGenerator:
         
         # Игрок 1 (рисуем даже при отсутствии игрока — будет серый аватар)
         self._draw_player_in_cell(draw, player1, x, player_y, self.cell_width, player_height, 
-                                  match.winner == player1 if player1 else False, is_placement or is_mini_tournament)
+                                  winner == player1 if player1 else False, is_placement or is_mini_tournament)
         
         # Разделительная линия
         draw.line([x, y + player_height, x + self.cell_width, y + player_height], 
@@ -367,7 +448,25 @@ class BracketImageGenerator:
         
         # Игрок 2 (рисуем даже при отсутствии игрока — будет серый аватар)
         self._draw_player_in_cell(draw, player2, x, y + player_height, self.cell_width, player_height, 
-                                  match.winner == player2 if player2 else False, is_placement or is_mini_tournament)
+                                  winner == player2 if player2 else False, is_placement or is_mini_tournament)
+
+    def _draw_cell_results(self, image: Image.Image, x: int, y: int, match: Match,
+                           is_placement: bool = False, is_mini_tournament: bool = False) -> None:
+        """Поверх каркаса перерисовывает ячейку, если она отличается от него (победитель, игроки мини-сетки)."""
+        if not match:
+            return
+        skeleton = self._skeleton_players(match, is_mini_tournament)
+        actual = (match.player1, match.player2)
+        if match.winner is None and all(a is b for a, b in zip(actual, skeleton)):
+            return
+        # Ячейка рисуется целиком на отдельном холсте, а переносится только её внутренняя часть:
+        # рамку у правого края пересекают линии коннекторов, её пиксели остаются как в каркасе
+        cell = Image.new('RGB', (self.cell_width + 1, self.cell_height + 1), self.cell_color)
+        self.draw_match_cell(ImageDraw.Draw(cell), 0, 0, match, is_placement=is_placement,
+                             is_mini_tournament=is_mini_tournament)
+        border = self.cell_border_width
+        inner = (border, border, self.cell_width + 1 - border, self.cell_height + 1 - border)
+        image.paste(cell.crop(inner), (x + border, y + border))
 
     def _draw_player_in_cell(self, draw: ImageDraw.Draw, player: Optional[Player], x: int, y: int, width: int, height: int, 
                            is_winner: bool, is_special: bool = False):
@@ -389,7 +488,7 @@ class BracketImageGenerator:
         if font and not is_free and player is not None:
             display_name = player.name
             try:
-                bbox = draw.textbbox((0, 0), display_name, font=font)
+                bbox = text_metrics.bbox(display_name, font=font)
                 text_h = bbox[3] - bbox[1]
                 name_y = y + (height - text_h) // 2
             except Exception:
@@ -397,8 +496,12 @@ class BracketImageGenerator:
             draw.text((name_x, name_y), display_name, fill=color, font=font)
     
     def draw_connectors(self, draw: ImageDraw.Draw, round_positions: List[List[Tuple[int, int]]], 
-                       rounds_matches: List[List[Match]], is_mini_tournament: bool = False, tournament_name: str = ""):
-        """Рисует соединительные линии между раундами и победителя над стрелочками (полное имя)"""
+                       rounds_matches: List[List[Match]], is_mini_tournament: bool = False, tournament_name: str = "",
+                       lines: bool = True, labels: bool = True):
+        """Рисует соединительные линии между раундами и победителя над стрелочками (полное имя).
+
+        lines/labels — рисовать ли линии (каркас сетки) и подписи победителей со счётом (результаты).
+        """
         connector_color = self.connector_color
         
         # Больше не рисуем наконечник — только тонкая линия до следующего соединения
@@ -430,17 +533,18 @@ class BracketImageGenerator:
                         line_start_x = match_x
                     
                     line_length = self.final_line_length
-                    draw.line([line_start_x, match_center_y, 
-                              line_start_x + line_length, match_center_y], 
-                             fill=connector_color, width=self.final_line_width)
+                    if lines:
+                        draw.line([line_start_x, match_center_y, 
+                                  line_start_x + line_length, match_center_y], 
+                                 fill=connector_color, width=self.final_line_width)
                     
                     # Победитель финала над линией
                     try:
-                        if round_num < len(rounds_matches):
+                        if labels and round_num < len(rounds_matches):
                             final_match = rounds_matches[round_num][match_num] if match_num < len(rounds_matches[round_num]) else None
                             if final_match and getattr(final_match, 'winner', None) and self.font:
                                 winner_name = self._get_short_name(final_match.winner)
-                                bbox = draw.textbbox((0, 0), winner_name, font=self.font)
+                                bbox = text_metrics.bbox(winner_name, font=self.font)
                                 text_w = bbox[2] - bbox[0]
                                 text_h = bbox[3] - bbox[1]
                                 label_x = line_start_x + (line_length - text_w) // 2
@@ -451,7 +555,7 @@ class BracketImageGenerator:
                                 if getattr(final_match, 'score', None) and self.score_font:
                                     try:
                                         score_text = str(final_match.score)
-                                        sb = draw.textbbox((0, 0), score_text, font=self.score_font)
+                                        sb = text_metrics.bbox(score_text, font=self.score_font)
                                         sw = sb[2] - sb[0]
                                         sx = label_x + (text_w - sw) // 2
                                         sy = label_y + text_h + self.label_offset_below
@@ -471,7 +575,7 @@ class BracketImageGenerator:
                 next_has_cell = (round_num + 1) == 0
                 
                 # Прокладываем мостик внутри узла следующего раунда, чтобы линии были
-                if next_has_cell:
+                if next_has_cell and lines:
                     try:
                         # продолжаем короткий заход (до next_x-1) вправо до начала выхода (next_x + cell_width)
                         draw.line([next_x - 1, next_center_y, next_x + self.cell_width, next_center_y],
@@ -496,20 +600,21 @@ class BracketImageGenerator:
                     # Расстояние до точки схождения (больше для линий от ячеек, увеличено для полных имен и длинных линий)
                     connector_offset = self.connector_offset
                     
-                    # Горизонтальная линия от предыдущего матча
-                    draw.line([line_start_x, prev_center_y, 
-                              next_x - connector_offset, prev_center_y], 
-                             fill=connector_color, width=self.line_width)
-                    
-                    # Вертикальная линия
-                    draw.line([next_x - connector_offset, prev_center_y, 
-                              next_x - connector_offset, next_center_y], 
-                             fill=connector_color, width=self.line_width)
-                    # Тонкий заход в следующий матч без стрелки
-                    try:
-                        draw.line([next_x - connector_offset, next_center_y, next_x - 1, next_center_y], fill=connector_color, width=self.line_width)
-                    except Exception:
-                        pass
+                    if lines:
+                        # Горизонтальная линия от предыдущего матча
+                        draw.line([line_start_x, prev_center_y, 
+                                  next_x - connector_offset, prev_center_y], 
+                                 fill=connector_color, width=self.line_width)
+                        
+                        # Вертикальная линия
+                        draw.line([next_x - connector_offset, prev_center_y, 
+                                  next_x - connector_offset, next_center_y], 
+                                 fill=connector_color, width=self.line_width)
+                        # Тонкий заход в следующий матч без стрелки
+                        try:
+                            draw.line([next_x - connector_offset, next_center_y, next_x - 1, next_center_y], fill=connector_color, width=self.line_width)
+                        except Exception:
+                            pass
                     
                     # Подпись победителя на линии предыдущего матча 1 (полное имя)
                     try:
@@ -518,9 +623,9 @@ class BracketImageGenerator:
                             cur_round_matches = rounds_matches[round_num]
                             if prev_match1_idx < len(cur_round_matches):
                                 match_obj = cur_round_matches[prev_match1_idx]
-                        if match_obj and getattr(match_obj, 'winner', None) and self.font:
+                        if labels and match_obj and getattr(match_obj, 'winner', None) and self.font:
                             winner_name = self._get_short_name(match_obj.winner)
-                            bbox = draw.textbbox((0, 0), winner_name, font=self.font)
+                            bbox = text_metrics.bbox(winner_name, font=self.font)
                             text_w = bbox[2] - bbox[0]
                             text_h = bbox[3] - bbox[1]
                             # Центруем по горизонтальному отрезку
@@ -533,7 +638,7 @@ class BracketImageGenerator:
                             if getattr(match_obj, 'score', None) and self.score_font:
                                 try:
                                     score_text = str(match_obj.score)
-                                    sb = draw.textbbox((0, 0), score_text, font=self.score_font)
+                                    sb = text_metrics.bbox(score_text, font=self.score_font)
                                     sw = sb[2] - sb[0]
                                     sx = label_x + (text_w - sw) // 2
                                     sy = label_y + text_h + self.label_offset_below
@@ -553,20 +658,21 @@ class BracketImageGenerator:
                     # Расстояние до точки схождения (больше для линий от ячеек, увеличено для полных имен и длинных линий)
                     connector_offset = self.connector_offset
                     
-                    # Горизонтальная линия от предыдущего матча
-                    draw.line([line_start_x, prev_center_y, 
-                              next_x - connector_offset, prev_center_y], 
-                             fill=connector_color, width=self.line_width)
-                    
-                    # Вертикальная линия
-                    draw.line([next_x - connector_offset, prev_center_y, 
-                              next_x - connector_offset, next_center_y], 
-                             fill=connector_color, width=self.line_width)
-                    # Тонкий заход в следующий матч без стрелки
-                    try:
-                        draw.line([next_x - connector_offset, next_center_y, next_x - 1, next_center_y], fill=connector_color, width=self.line_width)
-                    except Exception:
-                        pass
+                    if lines:
+                        # Горизонтальная линия от предыдущего матча
+                        draw.line([line_start_x, prev_center_y, 
+                                  next_x - connector_offset, prev_center_y], 
+                                 fill=connector_color, width=self.line_width)
+                        
+                        # Вертикальная линия
+                        draw.line([next_x - connector_offset, prev_center_y, 
+                                  next_x - connector_offset, next_center_y], 
+                                 fill=connector_color, width=self.line_width)
+                        # Тонкий заход в следующий матч без стрелки
+                        try:
+                            draw.line([next_x - connector_offset, next_center_y, next_x - 1, next_center_y], fill=connector_color, width=self.line_width)
+                        except Exception:
+                            pass
                     
                     # Подпись победителя на линии предыдущего матча 2 (полное имя)
                     try:
@@ -575,9 +681,9 @@ class BracketImageGenerator:
                             cur_round_matches = rounds_matches[round_num]
                             if prev_match2_idx < len(cur_round_matches):
                                 match_obj = cur_round_matches[prev_match2_idx]
-                        if match_obj and getattr(match_obj, 'winner', None) and self.font:
+                        if labels and match_obj and getattr(match_obj, 'winner', None) and self.font:
                             winner_name = self._get_short_name(match_obj.winner)
-                            bbox = draw.textbbox((0, 0), winner_name, font=self.font)
+                            bbox = text_metrics.bbox(winner_name, font=self.font)
                             text_w = bbox[2] - bbox[0]
                             text_h = bbox[3] - bbox[1]
                             seg_left = line_start_x
@@ -589,7 +695,7 @@ class BracketImageGenerator:
                             if getattr(match_obj, 'score', None) and self.score_font:
                                 try:
                                     score_text = str(match_obj.score)
-                                    sb = draw.textbbox((0, 0), score_text, font=self.score_font)
+                                    sb = text_metrics.bbox(score_text, font=self.score_font)
                                     sw = sb[2] - sb[0]
                                     sx = label_x + (text_w - sw) // 2
                                     sy = label_y + text_h + self.label_offset_below
@@ -599,112 +705,156 @@ class BracketImageGenerator:
                     except Exception:
                         pass
     
+    # Параметры разметки, от которых зависит каркас (остальные задаются в __init__ и не меняются)
+    _LAYOUT_FIELDS = ('cell_width', 'cell_height', 'round_spacing', 'mini_spacing', 'final_line_length',
+                      'match_spacing', 'vertical_labels_padding', 'label_offset_above', 'label_offset_below')
+
+    @staticmethod
+    def _mini_order_key(tournament: TournamentBracket) -> int:
+        """Порядок мини-турниров под основной сеткой: 3-е место, 5-е, 7-е, остальные."""
+        name = (tournament.name or '').lower()
+        if '3' in name and 'мест' in name:
+            return 0
+        if '5' in name and 'мест' in name:
+            return 1
+        if '7' in name and 'мест' in name:
+            return 2
+        return 3
+
+    @staticmethod
+    def _player_key(player: Optional[Player]) -> Optional[tuple]:
+        if player is None:
+            return None
+        return (player.id, player.name, player.photo_url, player.initial)
+
+    def _skeleton_key(self, bracket: TournamentBracket) -> tuple:
+        """Всё, что рисуется в каркасе: разметка, название, форма сеток и посев первого круга."""
+        def shape(tournament: TournamentBracket) -> tuple:
+            return tuple(len(r or []) for r in (tournament.rounds or []))
+
+        first_round = bracket.rounds[0] if bracket.rounds else []
+        return (
+            tuple(getattr(self, field) for field in self._LAYOUT_FIELDS),
+            self._sanitize_title(bracket.name),
+            shape(bracket),
+            tuple((self._player_key(m.player1), self._player_key(m.player2)) if m else None for m in first_round),
+            # В порядке списка: от него зависит высота каркаса (отступы между мини-сетками)
+            tuple((t.name, shape(t)) for t in (bracket.additional_tournaments or [])),
+        )
+
+    def _render_skeleton(self, bracket: TournamentBracket) -> "_Skeleton":
+        """Рисует каркас: заголовки, рамки ячеек с посевом первого круга, линии коннекторов."""
+        # Внешние отступы изображения
+        margin = 20
+        title_gap = 50  # Увеличенный интервал от названия турнира до подписей туров
+        # Вычисляем размеры для основной сетки
+        main_bracket_width, main_bracket_height = self.calculate_bracket_dimensions(bracket)
+        
+        # Вычисляем размеры для мини-турниров (которые будут снизу)
+        mini_tournaments_height = 0
+        mini_tournaments_width = 0
+        bottom_gap = 40  # Базовый зазор между основной сеткой и мини-сетками
+        gap_between_main_and_minis = max(10, bottom_gap // 2)
+        
+        if bracket.additional_tournaments:
+            for i, mini_tournament in enumerate(bracket.additional_tournaments):
+                # Добавляем отступ сверху перед турниром за 3 место
+                if '3' in mini_tournament.name and 'место' in mini_tournament.name:
+                    mini_tournaments_height += self.mini_tournament_top_offset
+                
+                mini_width, mini_height = self.calculate_bracket_dimensions(mini_tournament, is_mini=True)
+                mini_tournaments_height += mini_height
+                # Добавляем отступ только между турнирами (не после последнего)
+                if i < len(bracket.additional_tournaments) - 1:
+                    # Учитываем увеличенный отступ после мини-турнира за 5-6 места
+                    spacing = self.mini_tournament_gap_large if (i == 0 and '5' in mini_tournament.name) else self.mini_tournament_gap_normal
+                    mini_tournaments_height += spacing
+                mini_tournaments_width = max(mini_tournaments_width, mini_width)
+        
+        # Общие размеры изображения: ровно по контенту + 20px слева/справа
+        content_width = max(main_bracket_width, mini_tournaments_width)
+        total_width = margin * 2 + content_width
+
+        # Высота: заголовок + основная сетка + (зазор + мини-сетки, если есть); нижнего отступа нет
+        if mini_tournaments_height > 0:
+            content_height = main_bracket_height + gap_between_main_and_minis + mini_tournaments_height
+        else:
+            content_height = main_bracket_height
+        # Высота заголовка (для расчета вертикального отступа контента)
+        title = self._sanitize_title(bracket.name)
+        title_h = 0
+        if self.font:
+            try:
+                tb = text_metrics.bbox(title, font=self.font)
+                title_h = max(0, tb[3] - tb[1])
+            except Exception:
+                title_h = 0
+        total_height = margin + title_h + title_gap + content_height + margin
+        
+        # Создаем изображение
+        image = Image.new('RGB', (total_width, total_height), self.bg_color)
+        draw = ImageDraw.Draw(image)
+        
+        # Заголовок турнира (черный, без жирного)
+        if self.title_font:
+            try:
+                title_bbox = text_metrics.bbox(title, font=self.title_font)
+                title_width = title_bbox[2] - title_bbox[0]
+                draw.text(((total_width - title_width) // 2, margin), title, 
+                         fill=(0, 0, 0), font=self.title_font)
+            except Exception:
+                pass
+        
+        # Основная сетка и её соединительные линии
+        main_bracket_y = margin + title_h + title_gap
+        round_positions = self._draw_bracket_grid(draw, bracket, margin, main_bracket_y, main_bracket_width, main_bracket_height,
+                                                  static=True)
+        self.draw_connectors(draw, round_positions, bracket.rounds, labels=False)
+        
+        # Мини-турниры снизу от основной сетки в порядке _mini_order_key
+        mini_positions = []
+        current_y = main_bracket_y + main_bracket_height + gap_between_main_and_minis
+        for mini_tournament in sorted(bracket.additional_tournaments or [], key=self._mini_order_key):
+            positions = self._draw_mini_tournament_grid(draw, mini_tournament, margin, current_y, static=True)
+            self.draw_connectors(draw, positions, mini_tournament.rounds,
+                                 is_mini_tournament=True, tournament_name=mini_tournament.name, labels=False)
+            mini_positions.append(positions)
+            mini_w, mini_h = self.calculate_bracket_dimensions(mini_tournament, is_mini=True)
+            current_y += mini_h + 10
+        
+        # Блок фотографий отключен по требованиям
+        
+        return _Skeleton(image, round_positions, mini_positions)
+
+    def _draw_results(self, image: Image.Image, bracket: TournamentBracket, skeleton: "_Skeleton") -> None:
+        """Рисует поверх каркаса результаты: победителей в ячейках, игроков мини-сеток, подписи со счётом."""
+        draw = ImageDraw.Draw(image)
+        grids = [(bracket, skeleton.round_positions, False)]
+        minis = sorted(bracket.additional_tournaments or [], key=self._mini_order_key)
+        grids.extend((mini, positions, True) for mini, positions in zip(minis, skeleton.mini_positions))
+        for tournament, positions, is_mini in grids:
+            if tournament.rounds and positions:
+                for match, (x, y) in zip(tournament.rounds[0], positions[0]):
+                    self._draw_cell_results(image, x, y, match, is_mini_tournament=is_mini)
+            self.draw_connectors(draw, positions, tournament.rounds, is_mini_tournament=is_mini,
+                                 tournament_name=tournament.name if is_mini else "", lines=False)
+
     def generate_olympic_bracket_image(self, bracket: TournamentBracket, photo_paths: Optional[list[str]] = None) -> Image.Image:
-        """Генерирует изображение сетки олимпийской системы"""
+        """Генерирует изображение сетки олимпийской системы.
+
+        Каркас (заголовки, рамки, посев, линии) берётся из кэша _skeletons, если сетка
+        с тем же посевом уже рисовалась; поверх его копии рисуются результаты.
+        """
         try:
             # Автонастройка размеров ячеек и линий под текущие шрифты и тексты
             self._autosize_layout(bracket)
-            
-            # Внешние отступы изображения
-            margin = 20
-            title_gap = 50  # Увеличенный интервал от названия турнира до подписей туров
-            # Вычисляем размеры для основной сетки
-            main_bracket_width, main_bracket_height = self.calculate_bracket_dimensions(bracket)
-            
-            # Вычисляем размеры для мини-турниров (которые будут снизу)
-            mini_tournaments_height = 0
-            mini_tournaments_width = 0
-            bottom_gap = 40  # Базовый зазор между основной сеткой и мини-сетками
-            gap_between_main_and_minis = max(10, bottom_gap // 2)
-            
-            if bracket.additional_tournaments:
-                for i, mini_tournament in enumerate(bracket.additional_tournaments):
-                    # Добавляем отступ сверху перед турниром за 3 место
-                    if '3' in mini_tournament.name and 'место' in mini_tournament.name:
-                        mini_tournaments_height += self.mini_tournament_top_offset
-                    
-                    mini_width, mini_height = self.calculate_bracket_dimensions(mini_tournament, is_mini=True)
-                    mini_tournaments_height += mini_height
-                    # Добавляем отступ только между турнирами (не после последнего)
-                    if i < len(bracket.additional_tournaments) - 1:
-                        # Учитываем увеличенный отступ после мини-турнира за 5-6 места
-                        spacing = self.mini_tournament_gap_large if (i == 0 and '5' in mini_tournament.name) else self.mini_tournament_gap_normal
-                        mini_tournaments_height += spacing
-                    mini_tournaments_width = max(mini_tournaments_width, mini_width)
-            
-            # Общие размеры изображения: ровно по контенту + 20px слева/справа
-            content_width = max(main_bracket_width, mini_tournaments_width)
-            total_width = margin * 2 + content_width
-
-            # Нижний отступ отсутствует
-            base_bottom_padding = 0
-
-            # Высота: заголовок + основная сетка + (зазор + мини-сетки, если есть) + нижний отступ
-            if mini_tournaments_height > 0:
-                content_height = main_bracket_height + gap_between_main_and_minis + mini_tournaments_height
-            else:
-                content_height = main_bracket_height
-            # Высота заголовка (для расчета вертикального отступа контента)
-            # Временный draw для измерения, фактический рисуем ниже
-            title = self._sanitize_title(bracket.name)
-            tmp_img = Image.new('RGB', (1, 1), self.bg_color)
-            tmp_draw = ImageDraw.Draw(tmp_img)
-            title_h = 0
-            if self.font:
-                try:
-                    tb = tmp_draw.textbbox((0, 0), title, font=self.font)
-                    title_h = max(0, tb[3] - tb[1])
-                except Exception:
-                    title_h = 0
-            total_height = margin + title_h + title_gap + content_height + margin
-            
-            # Создаем изображение
-            image = Image.new('RGB', (total_width, total_height), self.bg_color)
-            draw = ImageDraw.Draw(image)
-            
-            # Заголовок турнира (черный, без жирного)
-            title = self._sanitize_title(bracket.name)
-            if self.title_font:
-                try:
-                    title_bbox = draw.textbbox((0, 0), title, font=self.title_font)
-                    title_width = title_bbox[2] - title_bbox[0]
-                    draw.text(((total_width - title_width) // 2, margin), title, 
-                             fill=(0, 0, 0), font=self.title_font)
-                except Exception:
-                    pass
-            
-            # Рисуем основную сетку
-            main_bracket_y = margin + title_h + title_gap
-            round_positions = self._draw_bracket_grid(draw, bracket, margin, main_bracket_y, main_bracket_width, main_bracket_height)
-            
-            # Рисуем соединительные линии для основной сетки
-            self.draw_connectors(draw, round_positions, bracket.rounds)
-            
-            # Рисуем мини-турниры снизу от основной сетки с переупорядочиванием: 3-е место, 5-е, 7-е
-            current_y = main_bracket_y + main_bracket_height + gap_between_main_and_minis
-            if bracket.additional_tournaments:
-                # Сортировка: сначала содержащие '3 место', потом '5', затем '7'
-                def _order_key(t):
-                    name = (t.name or '').lower()
-                    if '3' in name and 'мест' in name:
-                        return 0
-                    if '5' in name and 'мест' in name:
-                        return 1
-                    if '7' in name and 'мест' in name:
-                        return 2
-                    return 3
-                sorted_minis = sorted(bracket.additional_tournaments, key=_order_key)
-                for i, mini_tournament in enumerate(sorted_minis):
-                    tournament_x = margin
-                    tournament_y = current_y
-                    mini_round_positions = self._draw_mini_tournament_grid(draw, mini_tournament, tournament_x, tournament_y)
-                    self.draw_connectors(draw, mini_round_positions, mini_tournament.rounds, 
-                                        is_mini_tournament=True, tournament_name=mini_tournament.name)
-                    mini_w, mini_h = self.calculate_bracket_dimensions(mini_tournament, is_mini=True)
-                    current_y += mini_h + 10
-            
-            # Блок фотографий отключен по требованиям
-            
+            key = self._skeleton_key(bracket)
+            skeleton = _skeletons.get(key)
+            if skeleton is None:
+                skeleton = self._render_skeleton(bracket)
+                _skeletons.put(key, skeleton)
+            image = skeleton.image.copy()
+            self._draw_results(image, bracket, skeleton)
             return image
             
         except Exception as e:
@@ -716,11 +866,7 @@ class BracketImageGenerator:
         try:
             if not font:
                 return (0, 0)
-            # Используем временное изображение для расчёта bbox
-            dummy = Image.new('RGB', (1, 1))
-            d = ImageDraw.Draw(dummy)
-            bbox = d.textbbox((0, 0), str(text or ''), font=font)
-            return (max(0, bbox[2] - bbox[0]), max(0, bbox[3] - bbox[1]))
+            return text_metrics.size(str(text or ''), font)
         except Exception:
             return (0, 0)
 
@@ -803,7 +949,8 @@ class BracketImageGenerator:
             # В случае ошибки не рушим процесс
             pass
     
-    def _draw_bracket_grid(self, draw: ImageDraw.Draw, bracket: TournamentBracket, start_x: int, start_y: int, width: int, height: int) -> List[List[Tuple[int, int]]]:
+    def _draw_bracket_grid(self, draw: ImageDraw.Draw, bracket: TournamentBracket, start_x: int, start_y: int, width: int, height: int,
+                           static: bool = False) -> List[List[Tuple[int, int]]]:
         """Рисует основную сетку турнира и возвращает позиции матчей"""
         round_positions = []
         current_x = start_x
@@ -826,7 +973,7 @@ class BracketImageGenerator:
             round_title = self._get_round_title(round_num, len(bracket.rounds))
             if self.font and not is_final:
                 try:
-                    title_bbox = draw.textbbox((0, 0), round_title, font=self.font)
+                    title_bbox = text_metrics.bbox(round_title, font=self.font)
                     title_width = title_bbox[2] - title_bbox[0]
                     if round_num == 0:
                         title_x = round_x + (self.cell_width - title_width) // 2
@@ -845,14 +992,14 @@ class BracketImageGenerator:
                 match_positions.append((round_x, match_y))
                 # Рисуем полноценные ячейки только в первом раунде; далее — только линии и подписи
                 if round_num == 0:
-                    self.draw_match_cell(draw, round_x, match_y, match, round_num)
+                    self.draw_match_cell(draw, round_x, match_y, match, round_num, static=static)
             
             round_positions.append(match_positions)
             
             # Рисуем заголовок "Финал" посередине линии на той же высоте, что и другие туры
             if is_final and self.font and match_positions and round_num > 0 and len(round_positions) > 0:
                 try:
-                    title_bbox = draw.textbbox((0, 0), round_title, font=self.font)
+                    title_bbox = text_metrics.bbox(round_title, font=self.font)
                     title_width = title_bbox[2] - title_bbox[0]
                     # Позиция по горизонтали - посередине линии от предыдущего раунда до точки схождения
                     prev_round = round_positions[round_num - 1]
@@ -871,7 +1018,8 @@ class BracketImageGenerator:
         
         return round_positions
     
-    def _draw_mini_tournament_grid(self, draw: ImageDraw.Draw, tournament: TournamentBracket, start_x: int, start_y: int) -> List[List[Tuple[int, int]]]:
+    def _draw_mini_tournament_grid(self, draw: ImageDraw.Draw, tournament: TournamentBracket, start_x: int, start_y: int,
+                                   static: bool = False) -> List[List[Tuple[int, int]]]:
         """Рисует сетку мини-турнира"""
         round_positions = []
         current_x = start_x
@@ -905,7 +1053,7 @@ class BracketImageGenerator:
                 
                 # Рисуем ячейки только для первого раунда, далее только линии
                 if round_num == 0:
-                    self.draw_match_cell(draw, round_x, match_y, match, round_num, is_mini_tournament=True)
+                    self.draw_match_cell(draw, round_x, match_y, match, round_num, is_mini_tournament=True, static=static)
             
             round_positions.append(match_positions)
         
@@ -913,7 +1061,7 @@ class BracketImageGenerator:
         tournament_title = tournament.name
         if self.bold_font and tournament_title and first_match_y is not None:
             try:
-                title_bbox = draw.textbbox((0, 0), tournament_title, font=self.font)
+                title_bbox = text_metrics.bbox(tournament_title, font=self.font)
                 title_height = title_bbox[3] - title_bbox[1]
                 title_x = start_x
                 draw.text((title_x, first_match_y - title_height - self.mini_title_spacing),
@@ -967,7 +1115,7 @@ class BracketImageGenerator:
             title = "Фото с игр турнира"
             if self.subtitle_font:
                 try:
-                    title_bbox = draw.textbbox((0, 0), title, font=self.subtitle_font)
+                    title_bbox = text_metrics.bbox(title, font=self.subtitle_font)
                     title_width = title_bbox[2] - title_bbox[0]
                     draw.text((x + (width - title_width) // 2, y + 10), 
                              title, fill=self.text_color, font=self.subtitle_font)
@@ -1004,7 +1152,7 @@ class BracketImageGenerator:
             else:
                 if self.font:
                     text = "Здесь будут размещены фотографии с турнирных игр"
-                    text_bbox = draw.textbbox((0, 0), text, font=self.font)
+                    text_bbox = text_metrics.bbox(text, font=self.font)
                     text_width = text_bbox[2] - text_bbox[0]
                     text_x = x + (width - text_width) // 2
                     text_y = y + (height - 10) // 2
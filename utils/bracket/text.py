@@ -0,0 +1,83 @@
+"""
+Шрифты и размеры текста для отрисовки сеток.
+
+Шрифты загружаются один раз на процесс (путь, кегль) и общие для всех
+BracketImageGenerator, поэтому объект шрифта — устойчивый ключ кэша.
+text_metrics запоминает bbox текста по (шрифт, текст) в ограниченном LRU
+и меряет новые строки на одном служебном холсте 1×1 — вместо временной
+картинки на каждое измерение. Имена игроков, счета и подписи раундов
+повторяются от отрисовки к отрисовке, так что разметка сетки почти
+целиком берётся из кэша.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+MAX_ENTRIES = 8192
+
+BBox = Tuple[int, int, int, int]
+
+_fonts: Dict[Tuple[str, int], Optional[ImageFont.FreeTypeFont]] = {}
+
+
+def truetype(path: str, size: int) -> ImageFont.FreeTypeFont:
+    """ImageFont.truetype с кэшем на процесс (в том числе неудачных попыток — они дают OSError)."""
+    key = (path, size)
+    if key not in _fonts:
+        try:
+            _fonts[key] = ImageFont.truetype(path, size)
+        except OSError:
+            _fonts[key] = None
+    font = _fonts[key]
+    if font is None:
+        raise OSError(f"Шрифт {path} не найден")
+    return font
+
+
+@lru_cache(maxsize=1)
+def default_font() -> ImageFont.ImageFont:
+    return ImageFont.load_default()
+
+
+class TextMetrics:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._bboxes: "OrderedDict[Tuple[object, str], BBox]" = OrderedDict()
+        self._draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bbox(self, text: str, font: Optional[ImageFont.ImageFont] = None) -> BBox:
+        """То же, что draw.textbbox((0, 0), text, font=font), но из кэша."""
+        key = (font, text)
+        with self._lock:
+            box = self._bboxes.get(key)
+            if box is not None:
+                self._bboxes.move_to_end(key)
+                self.hits += 1
+                return box
+            box = tuple(self._draw.textbbox((0, 0), text, font=font))
+            self._bboxes[key] = box
+            if len(self._bboxes) > self._max_entries:
+                self._bboxes.popitem(last=False)
+            self.misses += 1
+            return box
+
+    def size(self, text: str, font: Optional[ImageFont.ImageFont] = None) -> Tuple[int, int]:
+        left, top, right, bottom = self.bbox(text, font)
+        return max(0, right - left), max(0, bottom - top)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bboxes.clear()
+            self.hits = self.misses = 0
+
+
+text_metrics = TextMetrics()
@@ -0,0 +1,190 @@
+"""
+Канонические даты в профилях.
+
+Пользователь вводит даты в разных форматах ("ДД.ММ", "ДД.ММ.ГГГГ",
+"ГГГГ-ММ-ДД", ISO с 'T', "%Y-%m-%d %H:%M:%S"), и эти строки показываются
+как есть. Разбирать их при каждом поиске дорого, поэтому при записи
+users.json в новые и изменённые профили рядом со строками кладутся
+канонические поля:
+
+    birth_iso / birth_ordinal                  — дата рождения (date.toordinal)
+    vacation_start_iso / vacation_start_ordinal,
+    vacation_end_iso / vacation_end_ordinal    — период тура
+    games[*].start_iso / start_ts              — начало предложенной игры (epoch, локальное время)
+
+Поиск, сортировка и фильтры сравнивают эти числа; строка разбирается
+заново только если она изменилась (разбор кэширован по самой строке).
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from services.storage import storage
+from utils.game import dedupe_offer_ids
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y")
+TIME_FORMAT = "%H:%M"
+
+
+@lru_cache(maxsize=65536)
+def _parse_date(value: str, year: int) -> Optional[date]:
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    # ДД.ММ без года — считаем текущий год (он входит в ключ кэша)
+    try:
+        return datetime.strptime(value, "%d.%m").replace(year=year).date()
+    except ValueError:
+        return None
+
+
+def parse_date(value: Any) -> Optional[date]:
+    """Дата из строки в любом из принятых форматов или None."""
+    if not value or not isinstance(value, str):
+        return None
+    return _parse_date(value.strip(), datetime.now().year)
+
+
+@lru_cache(maxsize=65536)
+def _parse_birth_date(value: str) -> Optional[date]:
+    for fmt in ("%d.%m.%Y", "%d.%m"):
+        try:
+            # ДД.ММ без года даёт 1900 год, как и раньше в calculate_age
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def birth_ordinal(value: Any) -> Optional[int]:
+    if not value or not isinstance(value, str):
+        return None
+    birth = _parse_birth_date(value)
+    return birth.toordinal() if birth else None
+
+
+def age_from_ordinal(ordinal: Optional[int], today: Optional[date] = None) -> int:
+    """Полных лет на сегодня; 0 — дата рождения неизвестна."""
+    if not ordinal:
+        return 0
+    birth = date.fromordinal(ordinal)
+    today = today or date.today()
+    return today.year - birth.year - ((today.month, today.day) < (birth.month, birth.day))
+
+
+@lru_cache(maxsize=65536)
+def _parse_start(date_str: str, time_str: str, year: int) -> Optional[datetime]:
+    try:
+        if 'T' in date_str:
+            start = datetime.fromisoformat(date_str)
+            return start.astimezone().replace(tzinfo=None) if start.tzinfo else start
+        game_date = _parse_date(date_str.strip(), year)
+        if game_date is None:
+            return None
+        return datetime.combine(game_date, datetime.strptime(time_str, TIME_FORMAT).time())
+    except (ValueError, TypeError):
+        return None
+
+
+def offer_start(game: Dict[str, Any]) -> Optional[datetime]:
+    """Начало предложенной игры: из start_ts, иначе из строк date/time."""
+    start_ts = game.get('start_ts')
+    if isinstance(start_ts, int):
+        return datetime.fromtimestamp(start_ts)
+    date_str, time_str = game.get('date'), game.get('time')
+    if not date_str or not time_str or not isinstance(date_str, str) or not isinstance(time_str, str):
+        return None
+    return _parse_start(date_str, time_str, datetime.now().year)
+
+
+def _set(record: Dict[str, Any], key: str, value: Any) -> bool:
+    if value is None:
+        return record.pop(key, None) is not None
+    if record.get(key) == value:
+        return False
+    record[key] = value
+    return True
+
+
+def normalize_profile(profile: Dict[str, Any]) -> bool:
+    """Пересчитывает канонические поля профиля; True — что-то изменилось."""
+    changed = False
+    ordinal = birth_ordinal(profile.get('birth_date'))
+    changed |= _set(profile, 'birth_ordinal', ordinal)
+    changed |= _set(profile, 'birth_iso', date.fromordinal(ordinal).isoformat() if ordinal else None)
+    for field in ('vacation_start', 'vacation_end'):
+        day = parse_date(profile.get(field))
+        changed |= _set(profile, f'{field}_ordinal', day.toordinal() if day else None)
+        changed |= _set(profile, f'{field}_iso', day.isoformat() if day else None)
+    for game in profile.get('games') or []:
+        if not isinstance(game, dict):
+            continue
+        # start_ts вычисляется из строк, а не читается обратно — строки первичны
+        date_str, time_str = game.get('date'), game.get('time')
+        start = None
+        if isinstance(date_str, str) and isinstance(time_str, str) and date_str and time_str:
+            start = _parse_start(date_str, time_str, datetime.now().year)
+        changed |= _set(game, 'start_ts', int(start.timestamp()) if start else None)
+        changed |= _set(game, 'start_iso', start.isoformat(timespec='minutes') if start else None)
+    return changed
+
+
+def normalize_users(users: Dict[str, Any]) -> int:
+    """Нормализует все профили перед записью users.json; возвращает число изменённых."""
+    changed = 0
+    for profile in users.values():
+        if isinstance(profile, dict) and normalize_profile(profile):
+            changed += 1
+    return changed
+
+
+def started_ts(tournament: Dict[str, Any]) -> Optional[int]:
+    """Момент старта турнира (epoch): из started_ts, иначе из ISO-строки started_at."""
+    value = tournament.get('started_ts')
+    if isinstance(value, int):
+        return value
+    started_at = tournament.get('started_at')
+    if not started_at or not isinstance(started_at, str):
+        return None
+    try:
+        return int(datetime.fromisoformat(started_at.replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return None
+
+
+async def migrate_dates() -> None:
+    """
+    Дописывает канонические поля в users.json и tournaments.json, даёт новые id
+    повторяющимся предложениям и включает нормализацию при записи (идемпотентна).
+    """
+    storage.add_users_normalizer(normalize_profile)
+    users = await storage.load_users()
+    # Повторяющиеся id предложений — до нормализации, чтобы записать всё одним сохранением
+    offers_renamed = dedupe_offer_ids(users)
+    users_changed = normalize_users(users)
+    if users_changed or offers_renamed:
+        await storage.save_users(users)
+    if offers_renamed:
+        logger.info(f"Миграция предложений: новые id у {offers_renamed} предложений с повторяющимися id")
+
+    tournaments = await storage.load_tournaments()
+    tournaments_changed = 0
+    for td in tournaments.values():
+        if isinstance(td, dict) and td.get('started_at') and not isinstance(td.get('started_ts'), int):
+            value = started_ts(td)
+            if value is not None:
+                td['started_ts'] = value
+                tournaments_changed += 1
+    if tournaments_changed:
+        await storage.save_tournaments(tournaments)
+
+    if users_changed or tournaments_changed:
+        logger.info(f"Миграция дат: профилей {users_changed}, турниров {tournaments_changed}")
@@ -0,0 +1,150 @@
+"""
+Индекс анкет для поиска в режиме «🍒Знакомства».
+
+Для каждой тройки (страна, город, пол) хранится SortedList пар
+(birth_ordinal, user_id) — фильтр по возрасту становится диапазоном
+порядковых дат рождения, а не расчётом возраста для каждой анкеты.
+Цель знакомства хранится как ключ (relationship, friendship, ...) и
+множество пользователей по ключу; старые анкеты с текстом цели
+приводятся к ключу по русскому переводу один раз, при индексации.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sortedcontainers import SortedList
+
+from utils.dates import birth_ordinal
+from utils.translations import load_translations
+from utils.users_index import UsersIndex
+
+logger = logging.getLogger(__name__)
+
+DATING_SPORT = "🍒Знакомства"
+
+# Диапазоны возраста из dating_filters: (от, до включительно; None — без верхней границы)
+AGE_RANGES: Dict[str, Tuple[int, Optional[int]]] = {
+    "18-25": (18, 25),
+    "26-35": (26, 35),
+    "36-45": (36, 45),
+    "46-55": (46, 55),
+    "56+": (56, None),
+}
+
+# Дата рождения, которую поиск подставлял анкетам без неё
+DEFAULT_BIRTH_DATE = "01.01.2000"
+
+Location = Tuple[str, str, str]
+# (страна, город, пол, birth_ordinal, ключ цели)
+Entry = Tuple[str, str, str, int, Optional[str]]
+
+
+def _years_before(today: date, years: int) -> date:
+    """Та же дата years лет назад (29 февраля в невисокосный год — 28 февраля)."""
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return date(today.year - years, 3, 1) - timedelta(days=1)
+
+
+def age_bounds(age_range: str, today: Optional[date] = None) -> Optional[Tuple[int, int]]:
+    """Диапазон birth_ordinal [от, до] для возрастного диапазона или None, если фильтра нет."""
+    bounds = AGE_RANGES.get(age_range)
+    if bounds is None:
+        return None
+    youngest, oldest = bounds
+    today = today or date.today()
+    # Возраст >= youngest: родился не позже, чем youngest лет назад;
+    # возраст <= oldest: родился позже, чем oldest + 1 лет назад
+    high = _years_before(today, youngest).toordinal()
+    low = _years_before(today, oldest + 1).toordinal() + 1 if oldest is not None else 1
+    return low, high
+
+
+def _legacy_goal_keys() -> Dict[str, str]:
+    goals = load_translations("ru").get("config", {}).get("dating_goals", {})
+    return {text: key for key, text in goals.items()}
+
+
+def _entry(profile: Dict[str, Any], legacy_goals: Dict[str, str]) -> Optional[Entry]:
+    if profile.get('sport') != DATING_SPORT:
+        return None
+    ordinal = profile.get('birth_ordinal')
+    if not isinstance(ordinal, int):
+        # 0 — дату не разобрать: такая анкета не попадает ни в один диапазон возраста
+        ordinal = birth_ordinal(profile.get('birth_date', DEFAULT_BIRTH_DATE)) or 0
+    goal = profile.get('dating_goal_key') or legacy_goals.get(profile.get('dating_goal'))
+    return (profile.get('country') or '', profile.get('city') or '', profile.get('gender') or '',
+            ordinal, goal)
+
+
+class DatingIndex(UsersIndex):
+    def __init__(self):
+        super().__init__()
+        self._entries: Dict[str, Entry] = {}
+        self._by_location: Dict[Location, SortedList] = {}
+        self._genders: Dict[Tuple[str, str], Set[str]] = {}
+        self._by_goal: Dict[str, Set[str]] = {}
+        self._legacy_goals: Optional[Dict[str, str]] = None
+
+    def _entry(self, user_id: str, profile: Dict[str, Any]) -> Optional[Entry]:
+        if self._legacy_goals is None:
+            self._legacy_goals = _legacy_goal_keys()
+        return _entry(profile, self._legacy_goals)
+
+    def _insert(self, user_id: str, entry: Entry) -> None:
+        country, city, gender, ordinal, goal = entry
+        self._entries[user_id] = entry
+        board = self._by_location.get((country, city, gender))
+        if board is None:
+            board = self._by_location[(country, city, gender)] = SortedList()
+            self._genders.setdefault((country, city), set()).add(gender)
+        board.add((ordinal, user_id))
+        if goal:
+            self._by_goal.setdefault(goal, set()).add(user_id)
+
+    def _remove(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        country, city, gender, ordinal, goal = entry
+        board = self._by_location[(country, city, gender)]
+        board.discard((ordinal, user_id))
+        if not board:
+            del self._by_location[(country, city, gender)]
+            self._genders[(country, city)].discard(gender)
+            if not self._genders[(country, city)]:
+                del self._genders[(country, city)]
+        if goal:
+            self._by_goal[goal].discard(user_id)
+
+    async def search(self, country: str, city: str, gender: Optional[str] = None,
+                     age_range: Optional[str] = None, goal: Optional[str] = None) -> List[str]:
+        """
+        user_id анкет знакомств в городе с нужным полом, возрастом и целью.
+
+        Остальные фильтры (показ в поиске, округ, уровень) проверяет вызывающий
+        по самому профилю — после этого запроса анкет остаётся немного.
+        """
+        await self.ensure_loaded()
+        genders = [gender] if gender else sorted(self._genders.get((country, city), ()))
+        bounds = age_bounds(age_range) if age_range and age_range != "any" else None
+        goal_users = self._by_goal.get(goal, set()) if goal and goal != "any" else None
+        found: List[str] = []
+        for g in genders:
+            board = self._by_location.get((country, city, g))
+            if not board:
+                continue
+            if bounds is None:
+                pairs = iter(board)
+            else:
+                low, high = bounds
+                pairs = board.irange((low, ''), (high + 1, ''), inclusive=(True, False))
+            found.extend(uid for _, uid in pairs if goal_users is None or uid in goal_users)
+        return found
+
+
+dating_index = DatingIndex()
@@ -54,12 +54,13 @@ async def send_payment_notification_to_admin(
 </body>
 </html>
         """
-        await email_service.send_html_email(
+        # Письмо уходит из очереди в фоне — ответ пользователю не ждёт SMTP
+        email_service.enqueue(
             to=EMAIL_ADMIN,
             subject=f"Оплата подписки — {first_name} {last_name}",
-            html_body=html_body
+            body=html_body
         )
-        print(f"[{datetime.now()}] Письмо об оплате подписки отправлено для {user_id}")
+        print(f"[{datetime.now()}] Письмо об оплате подписки поставлено в очередь для {user_id}")
     except Exception as e:
         print(f"[{datetime.now()}] Ошибка отправки письма об оплате подписки: {e}")
 
@@ -106,11 +107,11 @@ async def send_tournament_payment_notification_to_admin(
 </body>
 </html>
         """
-        await email_service.send_html_email(
+        email_service.enqueue(
             to=EMAIL_ADMIN,
             subject=f"Оплата турнира — {first_name} {last_name} · {tournament_name}",
-            html_body=html_body
+            body=html_body
         )
-        print(f"[{datetime.now()}] Письмо об оплате турнира отправлено для {user_id}")
+        print(f"[{datetime.now()}] Письмо об оплате турнира поставлено в очередь для {user_id}")
     except Exception as e:
         print(f"[{datetime.now()}] Ошибка отправки письма об оплате турнира: {e}")
@@ -0,0 +1,207 @@
+"""
+Кэш Telegram file_id для локальных файлов (фото профилей, медиа игр).
+
+Файл, один раз загруженный в Telegram, дальше отправляется по file_id из
+ответа — без повторной загрузки. Ключ — путь файла и его mtime: новое фото
+под тем же именем получает новый ключ. Если Telegram не принимает
+сохранённый file_id (например, сменился токен бота), файл загружается
+заново, и кэш обновляется.
+
+Соответствия хранятся в data/file_ids.json. Новые записи копятся в памяти
+и сбрасываются на диск не чаще раза в FLUSH_SECONDS; записи других
+процессов кластера подхватываются по версии файла.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+from config.paths import BASE_DIR
+from services.storage import storage
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("bot_file_id_cache_total", "Отправки локальных файлов: по file_id (hit), загрузкой (miss), отклонённый file_id (stale)")
+
+FLUSH_SECONDS = 5.0
+RELOAD_SECONDS = 30.0
+
+_BASE = str(BASE_DIR) + os.sep
+
+
+def file_key(path: Union[str, Path]) -> Optional[str]:
+    """«путь относительно проекта|mtime_ns» или None, если файла нет."""
+    path = os.path.abspath(path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if path.startswith(_BASE):
+        path = path[len(_BASE):].replace(os.sep, '/')
+    return f"{path}|{mtime_ns}"
+
+
+def _file_id_of(message: Message) -> Optional[str]:
+    if message.photo:
+        return message.photo[-1].file_id
+    for media in (message.video, message.animation, message.document, message.audio):
+        if media is not None:
+            return media.file_id
+    return None
+
+
+class FileIdCache:
+    def __init__(self):
+        self._ids: Dict[str, str] = {}
+        # Ещё не записанные изменения: file_id или None — удалить
+        self._pending: Dict[str, Optional[str]] = {}
+        self._loaded = False
+        self._version: Optional[tuple] = None
+        self._checked = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._loaded and now - self._checked < RELOAD_SECONDS:
+            return
+        self._checked = now
+        version = storage.file_version(storage.config.file_ids_file)
+        if self._loaded and version == self._version:
+            return
+        ids = await storage.load_file_ids()
+        for key, file_id in self._pending.items():
+            if file_id is None:
+                ids.pop(key, None)
+            else:
+                ids[key] = file_id
+        self._ids = ids
+        self._version = version
+        self._loaded = True
+
+    async def get(self, key: str) -> Optional[str]:
+        await self._refresh()
+        return self._ids.get(key)
+
+    def remember(self, key: Optional[str], file_id: Optional[str]) -> None:
+        if not key or not file_id or self._ids.get(key) == file_id:
+            return
+        self._ids[key] = file_id
+        self._pending[key] = file_id
+        self._schedule_flush()
+
+    def forget(self, key: str) -> None:
+        if self._ids.pop(key, None) is not None:
+            self._pending[key] = None
+            self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(FLUSH_SECONDS)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Записывает накопленные изменения в data/file_ids.json."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            async with storage.file_ids_transaction() as ids:
+                for key, file_id in pending.items():
+                    if file_id is None:
+                        ids.pop(key, None)
+                    else:
+                        ids[key] = file_id
+        except Exception as e:
+            logger.error(f"Не удалось сохранить file_id: {e}")
+            pending.update(self._pending)
+            self._pending = pending
+            return
+        self._version = storage.file_version(storage.config.file_ids_file)
+
+
+file_id_cache = FileIdCache()
+
+
+async def send_cached_file(send: Callable[[Union[str, FSInputFile]], Awaitable[Message]],
+                           path: Union[str, Path]) -> Message:
+    """
+    Отправляет локальный файл через send(media): по сохранённому file_id,
+    а если его нет или Telegram его отклонил — загрузкой файла.
+
+    send — обёртка над answer_photo/answer_video/send_photo с остальными
+    параметрами, например: lambda media: message.answer_photo(media, caption=text)
+    """
+    key = file_key(path)
+    file_id = await file_id_cache.get(key) if key else None
+    if file_id:
+        try:
+            message = await send(file_id)
+            metrics.inc("bot_file_id_cache_total", labels={"result": "hit"})
+            return message
+        except TelegramBadRequest as e:
+            # Ошибки подписи или разметки не связаны с file_id — их не маскируем повторной загрузкой
+            if "file" not in str(e).lower():
+                raise
+            logger.info(f"file_id для {path} отклонён ({e}), загружаем файл заново")
+            metrics.inc("bot_file_id_cache_total", labels={"result": "stale"})
+            file_id_cache.forget(key)
+    message = await send(FSInputFile(path))
+    metrics.inc("bot_file_id_cache_total", labels={"result": "miss"})
+    file_id_cache.remember(key, _file_id_of(message))
+    return message
+
+
+async def send_cached_photo_album(send: Callable[[List[InputMediaPhoto]], Awaitable[List[Message]]],
+                                  paths: List[Union[str, Path]],
+                                  caption: Optional[str] = None,
+                                  parse_mode: Optional[str] = None) -> List[Message]:
+    """
+    Альбом фото из локальных файлов: send(media) — обёртка над send_media_group.
+    Файлы с известным file_id не загружаются; если Telegram отклонил
+    какой-то из них, альбом отправляется заново загрузкой всех файлов.
+    """
+    keys = [file_key(path) for path in paths]
+    file_ids = [await file_id_cache.get(key) if key else None for key in keys]
+
+    def build(use_cache: bool) -> List[InputMediaPhoto]:
+        # Подпись альбома — у первого элемента; InputMedia неизменяемы, поэтому задаём её сразу
+        return [
+            InputMediaPhoto(
+                media=file_id if use_cache and file_id else FSInputFile(path),
+                caption=caption if i == 0 else None,
+                parse_mode=parse_mode if i == 0 else None,
+            )
+            for i, (path, file_id) in enumerate(zip(paths, file_ids))
+        ]
+
+    cached = any(file_ids)
+    try:
+        messages = await send(build(use_cache=True))
+    except TelegramBadRequest as e:
+        if not cached or "file" not in str(e).lower():
+            raise
+        logger.info(f"file_id альбома отклонён ({e}), загружаем файлы заново")
+        metrics.inc("bot_file_id_cache_total", labels={"result": "stale"})
+        for key, file_id in zip(keys, file_ids):
+            if file_id:
+                file_id_cache.forget(key)
+        file_ids = [None] * len(keys)
+        messages = await send(build(use_cache=False))
+
+    for key, file_id, message in zip(keys, file_ids, messages):
+        metrics.inc("bot_file_id_cache_total", labels={"result": "hit" if file_id else "miss"})
+        if not file_id:
+            file_id_cache.remember(key, _file_id_of(message))
+    return messages
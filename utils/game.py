@@ -1,6 +1,47 @@
+import os
+import time
 from datetime import datetime
 from services.storage import storage
 
+_last_offer_id = 0
+
+def new_offer_id() -> int:
+    """
+    Уникальный id предложения: миллисекунды * 1000 + номер процесса.
+    Не повторяется после удаления предложений (в отличие от порядкового номера)
+    и между воркерами кластера; внутри процесса строго возрастает.
+    """
+    global _last_offer_id
+    candidate = time.time_ns() // 1_000_000 * 1000 + os.getpid() % 1000
+    if candidate <= _last_offer_id:
+        candidate = _last_offer_id + 1000
+    _last_offer_id = candidate
+    return candidate
+
+def dedupe_offer_ids(users: dict) -> int:
+    """
+    Даёт новый new_offer_id() каждому предложению, id которого уже встречался
+    у этого же пользователя (раньше id был порядковым номером len(games) + 1
+    и после удалений повторялся). Индекс предложений и их снятие по сроку
+    различают предложения по id. Возвращает число переименованных.
+    """
+    renamed = 0
+    for profile in users.values():
+        if not isinstance(profile, dict):
+            continue
+        seen = set()
+        for game in profile.get('games') or []:
+            if not isinstance(game, dict):
+                continue
+            game_id = str(game.get('id'))
+            if game_id in seen:
+                game['id'] = new_offer_id()
+                game_id = str(game['id'])
+                renamed += 1
+            seen.add(game_id)
+    return renamed
+
+
 # ---------- Вспомогательные функции для работы с играми ----------
 async def get_user_games(user_id: int) -> list:
     """Получить массив игр пользователя"""
@@ -20,7 +61,7 @@ async def save_user_game(user_id: int, game_data: dict) -> None:
         users[user_key]['games'] = []
     
     # Добавляем ID и timestamp для игры
-    game_data['id'] = len(users[user_key]['games']) + 1
+    game_data['id'] = new_offer_id()
     game_data['created_at'] = datetime.now().isoformat(timespec="seconds")
     game_data['active'] = True
     
@@ -0,0 +1,125 @@
+"""
+Рейтинговые таблицы по (вид спорта, страна, город).
+
+Каждая таблица — отсортированный список (-rating_points, user_id), поэтому
+страница топа и «моё место» считаются за O(log n), без сортировки всех
+профилей. Кроме городских таблиц ведутся таблицы по стране (city=None)
+и по виду спорта целиком (country=None, city=None).
+
+При записи users.json (utils/users_index.py) переставляются только те
+игроки, у которых изменились рейтинг, вид спорта, страна, город или
+видимость в поиске.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from config.profile import get_sport_config
+from utils.users_index import UsersIndex
+
+logger = logging.getLogger(__name__)
+
+Scope = Tuple[str, Optional[str], Optional[str]]
+
+# Конфиг спорта собирается с переводами, поэтому признак уровня кэшируем
+_has_level: Dict[str, bool] = {}
+
+
+def _sport_has_level(sport: str) -> bool:
+    value = _has_level.get(sport)
+    if value is None:
+        value = _has_level[sport] = bool(get_sport_config(sport).get('has_level', True))
+    return value
+
+
+def _entry_of(profile: Dict[str, Any]) -> Optional[Tuple[str, str, str, float]]:
+    """(sport, country, city, rating) игрока или None, если он не участвует в рейтинге."""
+    if profile.get('role') != "Игрок" or not profile.get('show_in_search', True):
+        return None
+    sport = profile.get('sport')
+    if not sport or not _sport_has_level(sport):
+        return None
+    rating = profile.get('rating_points')
+    if not isinstance(rating, (int, float)):
+        return None
+    return sport, profile.get('country') or '', profile.get('city') or '', float(rating)
+
+
+def _scopes(sport: str, country: str, city: str) -> Tuple[Scope, Scope, Scope]:
+    return (sport, country, city), (sport, country, None), (sport, None, None)
+
+
+class Leaderboards(UsersIndex):
+    def __init__(self):
+        super().__init__()
+        self._boards: Dict[Scope, SortedList] = {}
+        self._entries: Dict[str, Tuple[str, str, str, float]] = {}
+
+    def _entry(self, user_id: str, profile: Dict[str, Any]) -> Optional[Tuple[str, str, str, float]]:
+        return _entry_of(profile)
+
+    def _insert(self, user_id: str, entry: Tuple[str, str, str, float]) -> None:
+        sport, country, city, rating = entry
+        for scope in _scopes(sport, country, city):
+            board = self._boards.get(scope)
+            if board is None:
+                board = self._boards[scope] = SortedList()
+            board.add((-rating, user_id))
+        self._entries[user_id] = entry
+
+    def _remove(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        sport, country, city, rating = entry
+        for scope in _scopes(sport, country, city):
+            board = self._boards.get(scope)
+            if board is None:
+                continue
+            board.discard((-rating, user_id))
+            if not board:
+                del self._boards[scope]
+
+    def _on_loaded(self) -> None:
+        logger.info(f"Рейтинговые таблицы построены: {len(self._entries)} игроков, {len(self._boards)} таблиц")
+
+    async def top(
+        self,
+        sport: str,
+        country: Optional[str] = None,
+        city: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 10,
+    ) -> List[Tuple[int, str, float]]:
+        """Страница таблицы: [(место, user_id, rating_points)], места с 1."""
+        await self.ensure_loaded()
+        board = self._boards.get((sport, country, city if country is not None else None))
+        if not board:
+            return []
+        return [
+            (offset + i + 1, uid, -neg)
+            for i, (neg, uid) in enumerate(board.islice(offset, offset + limit))
+        ]
+
+    async def rank(self, user_id: str, scope: str = "city") -> Optional[Tuple[int, int]]:
+        """(место, всего игроков) в таблице города/страны/вида спорта или None."""
+        await self.ensure_loaded()
+        entry = self._entries.get(str(user_id))
+        if entry is None:
+            return None
+        sport, country, city, rating = entry
+        key = {"city": (sport, country, city), "country": (sport, country, None)}.get(scope, (sport, None, None))
+        board = self._boards[key]
+        return board.bisect_left((-rating, str(user_id))) + 1, len(board)
+
+    async def size(self, sport: str, country: Optional[str] = None, city: Optional[str] = None) -> int:
+        await self.ensure_loaded()
+        board = self._boards.get((sport, country, city if country is not None else None))
+        return len(board) if board else 0
+
+
+leaderboards = Leaderboards()
@@ -1,5 +1,7 @@
 from pathlib import Path
 
+from utils.file_ids import file_id_cache, file_key
+
 async def download_photo_to_path(bot, file_id: str, dest_path: Path) -> bool:
     try:
         file = await bot.get_file(file_id)
@@ -23,5 +25,7 @@ async def save_media_file(bot, file_id, media_type: str, game_id: str) -> str:
     
     # Скачиваем файл
     await bot.download_file(file.file_path, file_path)
+    # Файл уже есть в Telegram — показ игры отправит его по этому file_id без загрузки
+    file_id_cache.remember(file_key(file_path), file_id)
     
     return filename
@@ -0,0 +1,242 @@
+"""
+Метрики производительности бота.
+
+Гистограммы (время хендлеров, блокировка event loop, I/O хранилища,
+вызовы Bot API) и счётчики живут в памяти процесса в синглтоне ``metrics``.
+Их отдают локальный эндпоинт в формате Prometheus (services/metrics_server.py)
+и админская команда /perf.
+
+Для перцентилей каждая серия хранит последние RESERVOIR_SIZE значений,
+для Prometheus — накопительные бакеты.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESERVOIR_SIZE = 1024
+
+# Бакеты в секундах: от 1 мс до 30 с
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Бакеты в байтах: от 1 КБ до 64 МБ
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent: Deque[float] = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentiles(self, *qs: float) -> List[float]:
+        data = sorted(self.recent)
+        if not data:
+            return [0.0 for _ in qs]
+        return [data[min(len(data) - 1, int(q * len(data)))] for q in qs]
+
+
+@dataclass
+class UpdateStats:
+    """Счётчики одного апдейта (хендлера); живут в contextvar на время обработки."""
+    storage_reads: int = 0
+    storage_read_bytes: int = 0
+    storage_writes: int = 0
+    storage_write_bytes: int = 0
+    api_calls: int = 0
+    busy: float = 0.0
+    max_step: float = 0.0
+    api_methods: Dict[str, int] = field(default_factory=dict)
+
+
+current_update: ContextVar[Optional[UpdateStats]] = ContextVar("current_update", default=None)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None,
+                buckets: Tuple[float, ...] = TIME_BUCKETS) -> None:
+        series = self._histograms.setdefault(name, {})
+        key = _labels(labels)
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = Histogram(buckets)
+        hist.observe(value)
+
+    def inc(self, name: str, value: float = 1, labels: Optional[Dict[str, str]] = None) -> None:
+        series = self._counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def histogram(self, name: str) -> Dict[Labels, Histogram]:
+        return self._histograms.get(name, {})
+
+    def counter(self, name: str) -> Dict[Labels, float]:
+        return self._counters.get(name, {})
+
+    def top(self, name: str, label: str, limit: int = 10, by: float = 0.95) -> List[Tuple[str, Histogram, List[float]]]:
+        """Серии гистограммы, отсортированные по перцентилю by: [(значение метки, гистограмма, [p50, p95, p99])]."""
+        rows = []
+        for key, hist in self.histogram(name).items():
+            p50, p95, p99 = hist.percentiles(0.5, 0.95, 0.99)
+            rows.append((dict(key).get(label, ""), hist, [p50, p95, p99]))
+        index = {0.5: 0, 0.95: 1, 0.99: 2}.get(by, 1)
+        rows.sort(key=lambda r: -r[2][index])
+        return rows[:limit]
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def fmt_labels(key: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = list(key) + list(extra)
+            if not pairs:
+                return ""
+            body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+            return "{" + body + "}"
+
+        for name, series in sorted(self._counters.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{fmt_labels(key)} {value}")
+
+        for name, series in sorted(self._histograms.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in series.items():
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{fmt_labels(key, (('le', repr(float(bound))),))} {cumulative}")
+                lines.append(f"{name}_bucket{fmt_labels(key, (('le', '+Inf'),))} {hist.count}")
+                lines.append(f"{name}_sum{fmt_labels(key)} {hist.total}")
+                lines.append(f"{name}_count{fmt_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        self._histograms.clear()
+        self._counters.clear()
+
+
+metrics = MetricsRegistry()
+metrics.describe("bot_handler_seconds", "Полное время обработки апдейта хендлером")
+metrics.describe("bot_handler_blocking_seconds", "Время, которое хендлер синхронно занимал event loop")
+metrics.describe("bot_event_loop_lag_seconds", "Задержка пробуждения контрольной задачи event loop")
+metrics.describe("bot_storage_io_seconds", "Время чтения/записи JSON-файлов хранилища")
+metrics.describe("bot_storage_io_bytes", "Размер прочитанных/записанных JSON-файлов")
+metrics.describe("bot_handler_storage_ops", "Операций хранилища за один апдейт")
+metrics.describe("bot_handler_storage_bytes", "Байт прочитано и записано хранилищем за один апдейт")
+metrics.describe("bot_api_seconds", "Время вызовов Bot API")
+metrics.describe("bot_api_calls_total", "Вызовы Bot API по методам и успешности")
+metrics.describe("bot_handler_api_calls", "Вызовов Bot API за один апдейт")
+
+
+def record_storage_io(op: str, filename: str, nbytes: int, seconds: float) -> None:
+    """Вызывается из AsyncJSONStorage._read_file/_write_file."""
+    labels = {"op": op, "file": filename}
+    metrics.observe("bot_storage_io_seconds", seconds, labels)
+    metrics.observe("bot_storage_io_bytes", nbytes, labels, buckets=SIZE_BUCKETS)
+    stats = current_update.get()
+    if stats is None:
+        return
+    if op == "read":
+        stats.storage_reads += 1
+        stats.storage_read_bytes += nbytes
+    else:
+        stats.storage_writes += 1
+        stats.storage_write_bytes += nbytes
+
+
+def record_api_call(method: str, seconds: float, ok: bool) -> None:
+    metrics.observe("bot_api_seconds", seconds, {"method": method})
+    metrics.inc("bot_api_calls_total", 1, {"method": method, "ok": "1" if ok else "0"})
+    stats = current_update.get()
+    if stats is not None:
+        stats.api_calls += 1
+        stats.api_methods[method] = stats.api_methods.get(method, 0) + 1
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """Фоновая задача: насколько позже запланированного просыпается event loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        metrics.observe("bot_event_loop_lag_seconds", lag)
+        if lag > 1.0:
+            logger.warning(f"Event loop был заблокирован на {lag:.2f} с")
+
+
+class TimedCoroutine:
+    """Обёртка корутины, которая суммирует время её синхронных шагов.
+
+    Каждый send()/throw() во вложенную корутину — это отрезок, пока она
+    держит event loop; сумма отрезков и есть блокирующее время хендлера.
+    """
+
+    def __init__(self, coro, stats: UpdateStats):
+        self._coro = coro
+        self._stats = stats
+
+    def __await__(self):
+        it = self._coro.__await__()
+        value, error = None, None
+        while True:
+            started = time.perf_counter()
+            try:
+                yielded = it.throw(error) if error is not None else it.send(value)
+            except StopIteration as stop:
+                self._add(time.perf_counter() - started)
+                return stop.value
+            except BaseException:
+                self._add(time.perf_counter() - started)
+                raise
+            self._add(time.perf_counter() - started)
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                it.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+    def _add(self, step: float) -> None:
+        self._stats.busy += step
+        if step > self._stats.max_step:
+            self._stats.max_step = step
@@ -0,0 +1,167 @@
+"""
+Поиск пользователей по имени и фамилии (ввод соперника и партнёра при
+внесении счёта, админские инструменты).
+
+Имена нормализуются один раз, при индексации: регистр (casefold), ё → е
+и транслитерация кириллицы в латиницу, поэтому «Ivan», «иван» и «Иван»
+находят одного и того же человека. Запрос нормализуется так же.
+
+Для запросов от трёх символов кандидаты — пересечение списков триграмм
+запроса; они проверяются на вхождение подстроки (как раньше в search_users)
+и ранжируются: полное совпадение, затем начало имени или фамилии, затем
+начало любого слова, затем вхождение в середину. Запрос короче трёх
+символов ищется как начало слова по отсортированному списку слов.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sortedcontainers import SortedList
+
+from utils.users_index import UsersIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 200
+
+_CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+    # Латинские варианты тех же звуков
+    'x': 'ks', 'w': 'v', 'q': 'k',
+}
+_TRANSLIT = str.maketrans(_CYRILLIC_TO_LATIN)
+
+
+def normalize_name(text: Any) -> str:
+    """Регистр, ё/е и кириллица → латиница; пробелы схлопываются."""
+    if not text or not isinstance(text, str):
+        return ''
+    return ' '.join(text.casefold().translate(_TRANSLIT).split())
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# (имя, фамилия, "имя фамилия") в нормализованном виде
+Entry = Tuple[str, str, str]
+
+
+def _entry_of(profile: Dict[str, Any]) -> Optional[Entry]:
+    first = normalize_name(profile.get('first_name', ''))
+    last = normalize_name(profile.get('last_name', ''))
+    if not first and not last:
+        return None
+    return first, last, f"{first} {last}"
+
+
+def _rank(entry: Entry, query: str) -> Optional[Tuple[int, int, int]]:
+    """Ключ ранжирования (меньше — лучше) или None, если запрос не входит в имя."""
+    first, last, full = entry
+    position = full.find(query)
+    if position < 0:
+        return None
+    if query in (full, first, last):
+        grade = 0
+    elif first.startswith(query) or last.startswith(query):
+        grade = 1
+    elif f" {query}" in f" {full}":
+        grade = 2
+    else:
+        grade = 3
+    return grade, position, len(full)
+
+
+class NameIndex(UsersIndex):
+    """
+    Тёзки делят одну запись: триграммы и слова указывают на нормализованное
+    имя, а не на пользователя, поэтому ранжируются различные имена, а не
+    все совпавшие профили.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._entries: Dict[str, Entry] = {}
+        self._users: Dict[Entry, Set[str]] = {}
+        self._trigrams: Dict[str, Set[Entry]] = {}
+        # (слово, имя) — для запросов короче трёх символов
+        self._words: SortedList = SortedList()
+
+    def _entry(self, user_id: str, profile: Dict[str, Any]) -> Optional[Entry]:
+        return _entry_of(profile)
+
+    def _insert(self, user_id: str, entry: Entry) -> None:
+        self._entries[user_id] = entry
+        holders = self._users.get(entry)
+        if holders is None:
+            holders = self._users[entry] = set()
+            for gram in _trigrams(entry[2]):
+                self._trigrams.setdefault(gram, set()).add(entry)
+            for word in set(entry[2].split()):
+                self._words.add((word, entry))
+        holders.add(user_id)
+
+    def _remove(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        holders = self._users[entry]
+        holders.discard(user_id)
+        if holders:
+            return
+        del self._users[entry]
+        for gram in _trigrams(entry[2]):
+            postings = self._trigrams.get(gram)
+            if postings is not None:
+                postings.discard(entry)
+                if not postings:
+                    del self._trigrams[gram]
+        for word in set(entry[2].split()):
+            self._words.discard((word, entry))
+
+    def _substring_matches(self, query: str) -> List[Entry]:
+        """Имена, содержащие запрос (от трёх символов), от лучших к худшим."""
+        postings = sorted((self._trigrams.get(gram, set()) for gram in _trigrams(query)), key=len)
+        if not postings[0]:
+            return []
+        ranked = []
+        for entry in postings[0].intersection(*postings[1:]):
+            rank = _rank(entry, query)
+            if rank is not None:
+                ranked.append((rank, entry))
+        ranked.sort()
+        return [entry for _, entry in ranked]
+
+    def _prefix_matches(self, query: str) -> Iterable[Entry]:
+        """Имена со словом, начинающимся с короткого запроса: точное слово, затем по алфавиту."""
+        seen: Set[Entry] = set()
+        for _, entry in self._words.irange((query, ()), (query + '\uffff', ())):
+            if entry not in seen:
+                seen.add(entry)
+                yield entry
+
+    async def search(self, query: str, exclude_ids: Iterable[str] = (),
+                     limit: int = DEFAULT_LIMIT) -> List[str]:
+        """user_id лучших совпадений (не больше limit), от лучшего к худшему."""
+        await self.ensure_loaded()
+        query = normalize_name(query)
+        if not query:
+            return []
+        excluded = {str(uid) for uid in exclude_ids}
+        # Короткий запрос ищется как начало слова: по одной-двум буквам подходят почти все
+        entries = self._substring_matches(query) if len(query) >= 3 else self._prefix_matches(query)
+        found: List[str] = []
+        for entry in entries:
+            found.extend(sorted(self._users[entry] - excluded))
+            if len(found) >= limit:
+                break
+        return found[:limit]
+
+
+name_index = NameIndex()
@@ -0,0 +1,213 @@
+"""
+Индекс предложенных игр (users[uid]['games']).
+
+Предложения по-прежнему хранятся в профилях, а индекс держит их в памяти:
+- по (вид спорта, страна, город) — отсортированный по дате и времени список
+  для просмотра и счётчики по странам и городам для кнопок выбора;
+- min-куча по нормализованному началу игры — из неё expiry_loop снимает
+  прошедшие предложения ровно в момент начала, а не раз в сутки.
+
+При записи users.json (utils/users_index.py) переиндексируются только
+те пользователи, у кого изменились предложения или поля профиля,
+показываемые в списке.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from utils.dates import offer_start
+from utils.users_index import UsersIndex
+from utils.utils import get_sort_key
+
+logger = logging.getLogger(__name__)
+
+Location = Tuple[str, str, str]
+OfferKey = Tuple[str, str]
+
+# Не спим дольше этого: новые предложения и так будят цикл, это страховка
+MAX_SLEEP_SECONDS = 3600.0
+# В кластере предложения других воркеров подхватываются перечитыванием users.json
+CLUSTER_RESYNC_SECONDS = 60.0
+# Через столько снова пробуем снять предложение, которое не удалось удалить (или владелец забанен)
+RETRY_SECONDS = 300.0
+
+
+def _owner_name(profile: Dict[str, Any]) -> str:
+    first_name = profile.get('first_name', 'Неизвестно')
+    last_name = profile.get('last_name', '')
+    return f"{first_name[:1]}.{last_name}".strip() if last_name else first_name
+
+
+def _offer_view(user_id: str, profile: Dict[str, Any], game: Dict[str, Any]) -> Dict[str, Any]:
+    """Предложение в том виде, в каком его показывает список (game_offers_menu)."""
+    return {
+        'user_id': user_id,
+        'user_name': _owner_name(profile),
+        'player_level': profile.get('player_level'),
+        'rating_points': profile.get('rating_points'),
+        'gender': profile.get('gender'),
+        'district': game.get('district'),
+        'game_id': game.get('id'),
+        'country': game.get('country'),
+        'city': game.get('city'),
+        'date': game.get('date'),
+        'time': game.get('time'),
+        'start_ts': game.get('start_ts'),
+        'sport_type': game.get('sport'),
+        'game_type': game.get('type'),
+        'payment_type': game.get('payment_type'),
+        'competitive': game.get('competitive'),
+        'repeat': game.get('repeat'),
+        'comment': game.get('comment'),
+    }
+
+
+def _user_offers(user_id: str, profile: Dict[str, Any]) -> Dict[OfferKey, Dict[str, Any]]:
+    offers = {}
+    for game in profile.get('games') or []:
+        if isinstance(game, dict) and game.get('active', True):
+            offers[(user_id, str(game.get('id')))] = _offer_view(user_id, profile, game)
+    return offers
+
+
+class OfferIndex(UsersIndex):
+    def __init__(self):
+        super().__init__()
+        self._offers: Dict[OfferKey, Dict[str, Any]] = {}
+        # Предложения пользователя по user_id
+        self._entries: Dict[str, Dict[OfferKey, Dict[str, Any]]] = {}
+        self._by_location: Dict[Location, SortedList] = {}
+        self._countries: Dict[str, Counter] = {}
+        self._cities: Dict[Tuple[str, str], Counter] = {}
+        # (начало, user_id, game_id); удалённые и изменённые записи отбрасываются при снятии
+        self._heap: List[Tuple[datetime, str, str]] = []
+        self._starts: Dict[OfferKey, datetime] = {}
+        self._changed = asyncio.Event()
+
+    @staticmethod
+    def _location(offer: Dict[str, Any]) -> Location:
+        return offer.get('sport_type') or '', offer.get('country') or '', offer.get('city') or ''
+
+    @staticmethod
+    def _order(key: OfferKey, offer: Dict[str, Any]) -> Tuple[datetime, str, str]:
+        start = offer_start(offer)
+        if start is None:
+            day, moment = get_sort_key(offer)
+            start = datetime.combine(day, moment)
+        return start, key[0], key[1]
+
+    def _entry(self, user_id: str, profile: Dict[str, Any]) -> Optional[Dict[OfferKey, Dict[str, Any]]]:
+        return _user_offers(user_id, profile) or None
+
+    def _insert(self, user_id: str, offers: Dict[OfferKey, Dict[str, Any]]) -> None:
+        self._entries[user_id] = offers
+        for key, offer in offers.items():
+            self._insert_offer(key, offer)
+
+    def _remove(self, user_id: str) -> None:
+        for key in self._entries.pop(user_id, {}):
+            self._remove_offer(key)
+
+    def _insert_offer(self, key: OfferKey, offer: Dict[str, Any]) -> None:
+        self._offers[key] = offer
+        location = self._location(offer)
+        board = self._by_location.get(location)
+        if board is None:
+            board = self._by_location[location] = SortedList()
+        board.add(self._order(key, offer))
+        sport, country, city = location
+        if country:
+            self._countries.setdefault(sport, Counter())[country] += 1
+            if city:
+                self._cities.setdefault((sport, country), Counter())[city] += 1
+        start = offer_start(offer)
+        if start is not None:
+            self._starts[key] = start
+            if not self._heap or start < self._heap[0][0]:
+                self._changed.set()
+            heapq.heappush(self._heap, (start, key[0], key[1]))
+
+    def _remove_offer(self, key: OfferKey) -> None:
+        offer = self._offers.pop(key, None)
+        if offer is None:
+            return
+        location = self._location(offer)
+        board = self._by_location.get(location)
+        if board is not None:
+            board.discard(self._order(key, offer))
+            if not board:
+                del self._by_location[location]
+        sport, country, city = location
+        if country:
+            self._countries[sport][country] -= 1
+            if not self._countries[sport][country]:
+                del self._countries[sport][country]
+            if city:
+                self._cities[(sport, country)][city] -= 1
+                if not self._cities[(sport, country)][city]:
+                    del self._cities[(sport, country)][city]
+        self._starts.pop(key, None)
+
+    def _on_loaded(self) -> None:
+        logger.info(f"Индекс предложений построен: {len(self._offers)} предложений")
+
+    async def country_counts(self, sport: str) -> Dict[str, int]:
+        await self.ensure_loaded()
+        return dict(self._countries.get(sport, {}))
+
+    async def city_counts(self, sport: str, country: str) -> Dict[str, int]:
+        await self.ensure_loaded()
+        return dict(self._cities.get((sport, country), {}))
+
+    async def offers(self, sport: str, country: str, city: str) -> List[Dict[str, Any]]:
+        """Предложения города, отсортированные по дате и времени (копии, их можно менять)."""
+        await self.ensure_loaded()
+        board = self._by_location.get((sport, country, city)) or []
+        return [dict(self._offers[(uid, gid)]) for _, uid, gid in board]
+
+    def next_expiry(self) -> Optional[datetime]:
+        while self._heap:
+            start, uid, gid = self._heap[0]
+            if self._starts.get((uid, gid)) == start:
+                return start
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_expired(self, now: datetime) -> List[OfferKey]:
+        """
+        Снимает с кучи предложения, начало которых уже наступило. Те, что
+        не удалось удалить из users.json, надо вернуть через retry_later.
+        """
+        expired = []
+        while (start := self.next_expiry()) is not None and start <= now:
+            _, uid, gid = heapq.heappop(self._heap)
+            self._starts.pop((uid, gid), None)
+            expired.append((uid, gid))
+        return expired
+
+    def retry_later(self, keys: Iterable[OfferKey], at: datetime) -> None:
+        """Возвращает снятые предложения в кучу: pop_expired отдаст их снова в момент at."""
+        for key in keys:
+            # Изменённое с тех пор предложение уже в куче со своим началом
+            if key in self._offers and key not in self._starts:
+                self._starts[key] = at
+                heapq.heappush(self._heap, (at, key[0], key[1]))
+
+    async def wait_change(self, timeout: float) -> None:
+        """Ждёт появления предложения, которое начнётся раньше текущего ближайшего, или timeout."""
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+offer_index = OfferIndex()
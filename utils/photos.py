@@ -0,0 +1,157 @@
+"""
+Обработка фото профиля при загрузке.
+
+Скачанный файл один раз, в пуле потоков, приводится к виду, который
+нужен отрисовке: поворот по EXIF применяется к пикселям, сами EXIF
+(геометка, модель телефона) не сохраняются, слишком большое фото
+уменьшается. Файл хранится под именем из хеша содержимого
+(data/user_photos/<hash>.jpg) — одинаковые загрузки дают один файл.
+
+Рядом кладутся квадратные превью (data/user_photos/thumbs/<hash>_<px>.jpg)
+размеров, в которых рисуют аватары сетки, таблицы круговой системы и
+коллаж победителей. avatar_file() отдаёт ближайшее превью не меньше
+нужного размера, а для старых фото без превью — исходный файл.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from PIL import Image, ImageOps
+
+from config.paths import BASE_DIR, PHOTOS_DIR
+
+logger = logging.getLogger(__name__)
+
+THUMBS_DIR = PHOTOS_DIR / "thumbs"
+# Аватары: таблица турнира 30, круговая система 60, сетка ~88, коллаж 180 и 280
+AVATAR_SIZES = (64, 96, 192, 288)
+MAX_SIDE = 1280
+JPEG_QUALITY = 88
+PHOTO_FIELDS = ('photo_path', 'photo_hash', 'photo_thumbs')
+
+_HASH_NAME = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _resample():
+    try:
+        return Image.Resampling.LANCZOS  # Pillow>=9
+    except AttributeError:
+        return Image.LANCZOS
+
+
+def _relative(path: Path) -> str:
+    return path.relative_to(BASE_DIR).as_posix()
+
+
+def _absolute(path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _encode(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    # exif не передаётся — метаданные в новый файл не попадают
+    img.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _square(img: Image.Image, size: int) -> Image.Image:
+    w, h = img.size
+    side = min(w, h)
+    left = (w - side) // 2
+    top = (h - side) // 2
+    return img.crop((left, top, left + side, top + side)).resize((size, size), _resample())
+
+
+def photo_fields(photo: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Поля фото для профиля (None — фото нет)."""
+    photo = photo or {}
+    return {field: photo.get(field) for field in PHOTO_FIELDS}
+
+
+def thumb_path(digest: str, size: int) -> Path:
+    return THUMBS_DIR / f"{digest}_{size}.jpg"
+
+
+def process_photo(src: Path) -> Dict[str, Any]:
+    """Очищает фото, сохраняет его по хешу с превью и удаляет src (синхронно — для пула потоков)."""
+    src = Path(src)
+    data = src.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    target = PHOTOS_DIR / f"{digest}.jpg"
+    thumbs = {size: thumb_path(digest, size) for size in AVATAR_SIZES}
+
+    if not target.exists() or not all(path.exists() for path in thumbs.values()):
+        with Image.open(io.BytesIO(data)) as original:
+            img = ImageOps.exif_transpose(original).convert('RGB')
+        if max(img.size) > MAX_SIDE:
+            img.thumbnail((MAX_SIDE, MAX_SIDE), _resample())
+        THUMBS_DIR.mkdir(parents=True, exist_ok=True)
+        _write_atomic(target, _encode(img))
+        for size, path in thumbs.items():
+            _write_atomic(path, _encode(_square(img, size)))
+
+    if src.resolve() != target.resolve():
+        src.unlink(missing_ok=True)
+    return {
+        'photo_path': _relative(target),
+        'photo_hash': digest,
+        'photo_thumbs': {str(size): _relative(path) for size, path in thumbs.items()},
+    }
+
+
+async def ingest_photo(src: Path) -> Dict[str, Any]:
+    """
+    Обрабатывает скачанное фото в пуле потоков; возвращает поля профиля.
+
+    Если файл не удалось разобрать как изображение, он остаётся как есть
+    (без превью) — так же, как сохранялись фото раньше.
+    """
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, process_photo, Path(src))
+    except Exception as e:
+        logger.warning(f"Не удалось обработать фото {src}: {e}")
+        return photo_fields({'photo_path': _relative(Path(src))})
+
+
+def avatar_file(photo_path: str, size: int) -> str:
+    """Абсолютный путь к самому маленькому превью не меньше size, иначе к исходному фото."""
+    stem = Path(photo_path).stem
+    if _HASH_NAME.match(stem):
+        for thumb_size in AVATAR_SIZES:
+            if thumb_size >= size:
+                path = thumb_path(stem, thumb_size)
+                if path.exists():
+                    return str(path)
+                break
+    return _absolute(photo_path)
+
+
+def release_photo(photo_path: Optional[str], profiles: Iterable[Dict[str, Any]]) -> None:
+    """Удаляет файл фото и его превью, если ни один из profiles на него не ссылается."""
+    if not photo_path:
+        return
+    if any(isinstance(p, dict) and p.get('photo_path') == photo_path for p in profiles):
+        return
+    stem = Path(photo_path).stem
+    paths = [Path(_absolute(photo_path))]
+    if _HASH_NAME.match(stem):
+        paths.extend(thumb_path(stem, size) for size in AVATAR_SIZES)
+    for path in paths:
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            pass
@@ -0,0 +1,284 @@
+"""
+Пересчёт рейтингов по всей истории игр.
+
+Рейтинг в боте меняется по одной игре при подтверждении счёта
+(handlers/enter_invoice.confirm_score). Этот модуль заново проигрывает
+games.json в хронологическом порядке по той же формуле, что и
+utils.utils.calculate_new_ratings, и показывает, чем результат отличается
+от текущих rating_points.
+
+Состояние игроков хранится в массиве NumPy. Игры раскладываются по «волнам»:
+в одной волне каждый игрок встречается не больше одного раза, а любая игра
+попадает в волну позже всех предыдущих игр своих участников. Поэтому волну
+можно посчитать одной векторной операцией, и порядок пересчёта совпадает
+с последовательным.
+
+Исходный рейтинг игрока — текущий rating_points минус сумма всех его
+rating_changes из истории, то есть рейтинг до первой записанной игры.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from services.storage import storage
+from utils.score import score_data_of, winner_side
+from utils.utils import RATING_STEP
+
+logger = logging.getLogger(__name__)
+
+# Рейтинг игроков, которых нет в users.json (как в турнирном вводе счёта)
+DEFAULT_RATING = 500.0
+
+
+@dataclass
+class ReplayResult:
+    """Итог пересчёта: новые рейтинги и дельты по каждой учтённой игре."""
+    ratings: Dict[str, float]
+    start_ratings: Dict[str, float]
+    games_replayed: int = 0
+    games_skipped: int = 0
+    waves: int = 0
+    # Для rating_changes: индексы игр в games.json, слоты игроков и дельты сторон
+    _player_ids: List[str] = field(default_factory=list, repr=False)
+    _game_index: List[int] = field(default_factory=list, repr=False)
+    _slots: List[int] = field(default_factory=list, repr=False)
+    _deltas: Any = field(default=None, repr=False)
+
+    def game_changes(self) -> Iterator[Tuple[int, Dict[str, float]]]:
+        """(индекс игры в games.json, {user_id: дельта}) для каждой учтённой игры."""
+        if not self._game_index:
+            return
+        ids, slots = self._player_ids, self._slots
+        for g, (d1, d2) in enumerate(self._deltas.tolist()):
+            row = slots[4 * g:4 * g + 4]
+            yield self._game_index[g], {
+                ids[pos]: (d1 if k < 2 else d2) for k, pos in enumerate(row) if pos >= 0
+            }
+
+
+def _team_ids(team: Any) -> List[str]:
+    return [str(p.get('id') if isinstance(p, dict) else p) for p in team or [] if p is not None]
+
+
+def _game_sides(game: Dict[str, Any]) -> Optional[Tuple[List[str], List[str]]]:
+    players = game.get('players')
+    if isinstance(players, dict):
+        team1, team2 = _team_ids(players.get('team1')), _team_ids(players.get('team2'))
+    elif isinstance(players, list) and len(players) >= 2:
+        team1, team2 = _team_ids(players[:1]), _team_ids(players[1:2])
+    else:
+        return None
+    if not team1 or not team2 or len(team1) > 2 or len(team2) > 2:
+        return None
+    if set(team1) & set(team2):
+        return None
+    return team1, team2
+
+
+def _team1_won(game: Dict[str, Any], team1: List[str], team2: List[str], data: Dict[str, Any]) -> Optional[bool]:
+    # winner_id учитывает ручную смену победителя админом, поэтому он главнее счёта
+    winner_id = game.get('winner_id')
+    if winner_id is not None:
+        if str(winner_id) in team1:
+            return True
+        if str(winner_id) in team2:
+            return False
+    side = winner_side(data) or game.get('winner_side')
+    if side == 'team1':
+        return True
+    if side == 'team2':
+        return False
+    return None
+
+
+def start_ratings(games: List[Dict[str, Any]], users: Dict[str, Any]) -> Dict[str, float]:
+    """Рейтинг каждого игрока до его первой записанной игры."""
+    applied: Dict[str, float] = {}
+    for game in games:
+        for uid, delta in (game.get('rating_changes') or {}).items():
+            try:
+                applied[str(uid)] = applied.get(str(uid), 0.0) + float(delta)
+            except (TypeError, ValueError):
+                continue
+    result = {}
+    for uid, profile in users.items():
+        current = float(profile.get('rating_points', DEFAULT_RATING) or 0)
+        result[str(uid)] = current - applied.get(str(uid), 0.0)
+    return result
+
+
+def _game_order_key(item: Tuple[int, Dict[str, Any]]):
+    idx, game = item
+    return (str(game.get('date') or ''), idx)
+
+
+def replay_ratings(
+    games: List[Dict[str, Any]],
+    users: Dict[str, Any],
+    initial: Optional[Dict[str, float]] = None,
+    step: float = RATING_STEP,
+) -> ReplayResult:
+    """Проигрывает историю игр и возвращает новые рейтинги.
+
+    initial — рейтинги на старте; по умолчанию восстанавливаются из истории
+    (см. start_ratings). step — коэффициент формулы calculate_new_ratings.
+    """
+    initial = dict(initial) if initial is not None else start_ratings(games, users)
+
+    index: Dict[str, int] = {}
+    values: List[float] = []
+
+    def slot(uid: str) -> int:
+        pos = index.get(uid)
+        if pos is None:
+            pos = index[uid] = len(values)
+            values.append(initial.get(uid, DEFAULT_RATING))
+        return pos
+
+    for uid in users:
+        slot(str(uid))
+
+    # Разбираем игры один раз в плоские списки: 4 слота игроков (-1 — пусто)
+    ordered = sorted(enumerate(games), key=_game_order_key)
+    slots: List[int] = []
+    diff_list: List[int] = []
+    won_list: List[bool] = []
+    wave_list: List[int] = []
+    game_index: List[int] = []
+    last_wave: Dict[int, int] = {}
+    skipped = 0
+
+    for orig_idx, game in ordered:
+        sides = _game_sides(game)
+        data = score_data_of(game) if sides is not None else None
+        won = _team1_won(game, sides[0], sides[1], data) if data is not None else None
+        if won is None:
+            skipped += 1
+            continue
+        team1, team2 = sides
+        row = [slot(team1[0]), slot(team1[1]) if len(team1) > 1 else -1,
+               slot(team2[0]), slot(team2[1]) if len(team2) > 1 else -1]
+        w = 1 + max(last_wave.get(pos, -1) for pos in row if pos >= 0)
+        for pos in row:
+            if pos >= 0:
+                last_wave[pos] = w
+        slots.extend(row)
+        diff_list.append(sum(abs(s[0] - s[1]) for s in data['sets']))
+        won_list.append(won)
+        wave_list.append(w)
+        game_index.append(orig_idx)
+
+    count = len(game_index)
+    raw = np.asarray(slots, dtype=np.int64).reshape(count, 2, 2)
+    mask = raw >= 0
+    teams = np.where(mask, raw, 0)
+    diffs = np.asarray(diff_list, dtype=np.float64)
+    team1_won = np.asarray(won_list, dtype=bool)
+    wave = np.asarray(wave_list, dtype=np.int64)
+
+    ratings = np.asarray(values, dtype=np.float64)
+    deltas = np.zeros((count, 2), dtype=np.float64)
+
+    order = np.argsort(wave, kind='stable')
+    bounds = np.flatnonzero(np.diff(wave[order])) + 1
+    for chunk in np.split(order, bounds) if count else []:
+        t, m = teams[chunk], mask[chunk]
+        # Средний рейтинг команды (для одиночки — рейтинг игрока)
+        avg = (ratings[t] * m).sum(axis=2) / m.sum(axis=2)
+        won = team1_won[chunk]
+        w_old = np.where(won, avg[:, 0], avg[:, 1])
+        l_old = np.where(won, avg[:, 1], avg[:, 0])
+        change = diffs[chunk] * step
+        # np.rint, как и round(), округляет половины к чётному
+        w_new = np.rint(w_old + l_old * change)
+        l_new = np.rint(l_old - w_old * change)
+        d = np.empty((len(chunk), 2))
+        d[:, 0] = np.where(won, w_new - w_old, l_new - l_old)
+        d[:, 1] = np.where(won, l_new - l_old, w_new - w_old)
+        deltas[chunk] = d
+        # В волне игроки не повторяются, поэтому прибавление без np.add.at корректно
+        per_player = np.broadcast_to(d[:, :, None], t.shape)
+        ratings[t[m]] += per_player[m]
+
+    return ReplayResult(
+        ratings={uid: float(ratings[pos]) for uid, pos in index.items()},
+        start_ratings={uid: float(values[pos]) for uid, pos in index.items()},
+        games_replayed=count,
+        games_skipped=skipped,
+        waves=int(wave.max()) + 1 if count else 0,
+        _player_ids=list(index.keys()),
+        _game_index=game_index,
+        _slots=slots,
+        _deltas=deltas,
+    )
+
+
+def diff_report(users: Dict[str, Any], result: ReplayResult, min_diff: float = 0.5) -> List[Dict[str, Any]]:
+    """Игроки, у которых пересчитанный рейтинг отличается от текущего, по убыванию разницы."""
+    rows = []
+    for uid, profile in users.items():
+        uid = str(uid)
+        if uid not in result.ratings:
+            continue
+        old = float(profile.get('rating_points', DEFAULT_RATING) or 0)
+        new = result.ratings[uid]
+        if abs(new - old) < min_diff:
+            continue
+        rows.append({
+            'user_id': uid,
+            'name': f"{profile.get('first_name', '')} {profile.get('last_name', '')}".strip(),
+            'old': old,
+            'new': new,
+            'diff': new - old,
+        })
+    rows.sort(key=lambda r: -abs(r['diff']))
+    return rows
+
+
+def format_report(rows: List[Dict[str, Any]], result: ReplayResult, limit: int = 50) -> str:
+    lines = [
+        f"Игр пересчитано: {result.games_replayed}, пропущено: {result.games_skipped}, волн: {result.waves}",
+        f"Рейтинг изменится у {len(rows)} игроков",
+    ]
+    for r in rows[:limit]:
+        sign = '+' if r['diff'] > 0 else ''
+        lines.append(f"{r['user_id']:>12}  {r['name'][:30]:<30}  {r['old']:>8.0f} → {r['new']:>8.0f}  ({sign}{r['diff']:.0f})")
+    if len(rows) > limit:
+        lines.append(f"... и ещё {len(rows) - limit}")
+    return "\n".join(lines)
+
+
+def apply_replay(users: Dict[str, Any], games: List[Dict[str, Any]], result: ReplayResult) -> int:
+    """Записывает новые rating_points/player_level и rating_changes игр. Возвращает число изменённых игроков."""
+    from handlers.profile import calculate_level_from_points
+
+    changed = 0
+    for uid, profile in users.items():
+        new = result.ratings.get(str(uid))
+        if new is None or float(profile.get('rating_points', 0) or 0) == new:
+            continue
+        profile['rating_points'] = new
+        profile['player_level'] = calculate_level_from_points(int(new), profile.get('sport', '🎾Большой теннис'))
+        changed += 1
+    for idx, changes in result.game_changes():
+        games[idx]['rating_changes'] = changes
+    return changed
+
+
+async def recalculate_ratings(apply: bool = False, step: float = RATING_STEP) -> Tuple[ReplayResult, List[Dict[str, Any]]]:
+    """Пересчитывает рейтинги по games.json; при apply=True сохраняет users.json и games.json."""
+    users = await storage.load_users()
+    games = await storage.load_games()
+    result = replay_ratings(games, users, step=step)
+    rows = diff_report(users, result)
+    if apply:
+        changed = apply_replay(users, games, result)
+        await storage.save_users(users)
+        await storage.save_games(games)
+        logger.info(f"Пересчёт рейтингов применён: изменено {changed} игроков")
+    return result, rows
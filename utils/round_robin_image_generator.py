@@ -1,10 +1,12 @@
-import io
 import os
 from typing import List, Dict, Any, Optional
 from PIL import Image, ImageDraw, ImageFont
 from PIL import Image as PILImage
 
 from config.paths import BASE_DIR
+from utils.bracket.encoding import encode_image
+from utils.photos import avatar_file
+from utils.round_robin_standings import build_standings, pair_result, places, tied_group_size
 
 
 def _load_fonts():
@@ -113,79 +115,84 @@ def _sanitize_title(text: str) -> str:
         return "".join(ch for ch in str(text or "") if ord(ch) <= 0xFFFF)
 
 
-def build_round_robin_table(players: List[Dict[str, Any]], results: Optional[List[Dict[str, Any]]] = None, title: str = "Круговой турнир") -> bytes:
-    """Строит простую таблицу кругового турнира и возвращает PNG bytes.
+def _results_to_matches(results: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Приводит завершённые игры (разные форматы players) к виду матчей турнира."""
+    def _id(x):
+        if isinstance(x, dict):
+            return str(x.get('id'))
+        return str(x)
+
+    out: List[Dict[str, Any]] = []
+    for r in results or []:
+        p1 = r.get('player1_id')
+        p2 = r.get('player2_id')
+        if p1 is None or p2 is None:
+            gp = r.get('players')
+            if isinstance(gp, dict):
+                t1 = gp.get('team1') or []
+                t2 = gp.get('team2') or []
+                if not (t1 and t2):
+                    continue
+                p1, p2 = _id(t1[0]), _id(t2[0])
+            elif isinstance(gp, list) and len(gp) >= 2:
+                p1, p2 = _id(gp[0]), _id(gp[1])
+            else:
+                continue
+        out.append({
+            'player1_id': str(p1),
+            'player2_id': str(p2),
+            'score': r.get('sets') or r.get('score'),
+            'score_data': r.get('score_data'),
+            'winner_id': r.get('winner_id'),
+            'status': 'completed',
+        })
+    return out
+
+
+def build_round_robin_table(
+    players: List[Dict[str, Any]],
+    results: Optional[List[Dict[str, Any]]] = None,
+    title: str = "Круговой турнир",
+    standings: Optional[Dict[str, Any]] = None,
+) -> bytes:
+    """Строит простую таблицу кругового турнира и возвращает байты картинки (см. utils.bracket.encoding).
 
     players: список словарей с ключами id, name
     results: опционально список завершенных игр вида {player1_id, player2_id, score, winner_id}
+    standings: таблица турнира из utils.round_robin_standings; если не передана,
+        строится из results
     """
     title_font, subtitle_font, header_font, cell_font = _load_fonts()
 
     n = len(players)
-    
-    # Сначала парсим результаты для определения ширины ячеек
-    def _parse_ids_early(r: Dict[str, Any]) -> Optional[tuple]:
-        p1 = r.get('player1_id')
-        p2 = r.get('player2_id')
-        if p1 is not None and p2 is not None:
-            return str(p1), str(p2)
-        gp = r.get('players')
-        if isinstance(gp, dict):
-            t1 = gp.get('team1') or []
-            t2 = gp.get('team2') or []
-            def norm(x):
-                if isinstance(x, dict):
-                    return str(x.get('id'))
-                return str(x)
-            if t1 and t2:
-                return norm(t1[0]), norm(t2[0])
-        elif isinstance(gp, list) and len(gp) >= 2:
-            a, b = gp[0], gp[1]
-            def norm2(x):
-                if isinstance(x, dict):
-                    return str(x.get('id'))
-                return str(x)
-            return norm2(a), norm2(b)
-        return None
+    ids = [str(p.get('id')) for p in players]
+    if standings is None:
+        standings = build_standings(ids, _results_to_matches(results))
 
-    def _parse_sets_early(r: Dict[str, Any]) -> List[tuple]:
-        sets = []
-        if r.get('sets'):
-            for s in r['sets']:
-                try:
-                    a, b = s.split(':')
-                    sets.append((int(a), int(b)))
-                except Exception:
-                    pass
-        else:
-            score = r.get('score')
-            if score:
-                parts = [x.strip() for x in str(score).split(',') if ':' in x]
-                for s in parts:
-                    try:
-                        a, b = s.split(':')
-                        sets.append((int(a), int(b)))
-                    except Exception:
-                        pass
-        return sets
+    def _score_text(pa: str, pb: str) -> Optional[str]:
+        sets = pair_result(standings, pa, pb)
+        if sets is None:
+            return None
+        return ', '.join(f"{x}:{y}" for x, y in sets)
 
     # Собираем все счета для определения максимальной ширины
     max_score_width = 0
+    played_pairs = 0
     draw_temp = ImageDraw.Draw(Image.new('RGB', (1, 1), (255, 255, 255)))
-    for r in results or []:
-        ids = _parse_ids_early(r)
-        if not ids:
-            continue
-        sets = _parse_sets_early(r)
-        score_text = r.get('score') or ', '.join([f"{x}:{y}" for x, y in sets])
-        if score_text:
-            try:
-                bbox = draw_temp.textbbox((0, 0), score_text, font=cell_font)
-                score_width = bbox[2] - bbox[0]
-                max_score_width = max(max_score_width, score_width)
-            except Exception:
-                pass
-    
+    for i in range(n):
+        for j in range(i + 1, n):
+            score_text = _score_text(ids[i], ids[j])
+            if score_text is None:
+                continue
+            played_pairs += 1
+            if score_text:
+                try:
+                    bbox = draw_temp.textbbox((0, 0), score_text, font=cell_font)
+                    score_width = bbox[2] - bbox[0]
+                    max_score_width = max(max_score_width, score_width)
+                except Exception:
+                    pass
+
     # Размеры таблицы
     # Минимальная ширина для аватара (60 + отступы), максимум под текст + отступы (15px с каждой стороны)
     cell_w = max(80, min(180, max_score_width + 30)) if max_score_width > 0 else 100
@@ -198,8 +205,7 @@ def build_round_robin_table(players: List[Dict[str, Any]], results: Optional[Lis
     # Проверяем, завершён ли турнир (все матчи сыграны)
     # В круговой системе должно быть n*(n-1)/2 матчей
     total_matches_needed = n * (n - 1) // 2
-    has_results = results and len(results) > 0
-    tournament_finished = has_results and len(results) >= total_matches_needed
+    tournament_finished = played_pairs > 0 and played_pairs >= total_matches_needed
     
     # Колонку "Места" показываем только если турнир завершён
     if tournament_finished:
@@ -286,7 +292,7 @@ def build_round_robin_table(players: List[Dict[str, Any]], results: Optional[Lis
         path = p.get('photo_path') or p.get('photo_url')
         if path:
             try:
-                abs_path = path if os.path.isabs(path) else f"{BASE_DIR}/{path}"
+                abs_path = avatar_file(path, size)
                 if os.path.exists(abs_path):
                     img = PILImage.open(abs_path)
                     img = img.convert('RGBA')
@@ -365,123 +371,10 @@ def build_round_robin_table(players: List[Dict[str, Any]], results: Optional[Lis
         draw.text((name_x, y0 + (cell_h - 24) // 2), full_name, fill=(31, 41, 55), font=cell_font)
 
     # Диагональ «—» и пустые клетки
-    # Результаты: создадим словарь для быстрого поиска, поддерживая разные форматы
-    def _parse_ids(r: Dict[str, Any]) -> Optional[tuple]:
-        p1 = r.get('player1_id')
-        p2 = r.get('player2_id')
-        if p1 is not None and p2 is not None:
-            return str(p1), str(p2)
-        gp = r.get('players')
-        if isinstance(gp, dict):
-            t1 = gp.get('team1') or []
-            t2 = gp.get('team2') or []
-            def norm(x):
-                if isinstance(x, dict):
-                    return str(x.get('id'))
-                return str(x)
-            if t1 and t2:
-                return norm(t1[0]), norm(t2[0])
-        elif isinstance(gp, list) and len(gp) >= 2:
-            a, b = gp[0], gp[1]
-            def norm2(x):
-                if isinstance(x, dict):
-                    return str(x.get('id'))
-                return str(x)
-            return norm2(a), norm2(b)
-        return None
-
-    def _parse_sets(r: Dict[str, Any]) -> List[tuple]:
-        sets = []
-        if r.get('sets'):
-            for s in r['sets']:
-                try:
-                    a, b = s.split(':')
-                    sets.append((int(a), int(b)))
-                except Exception:
-                    pass
-        else:
-            score = r.get('score')
-            if score:
-                parts = [x.strip() for x in str(score).split(',') if ':' in x]
-                for s in parts:
-                    try:
-                        a, b = s.split(':')
-                        sets.append((int(a), int(b)))
-                    except Exception:
-                        pass
-        return sets
-
-    res_map: Dict[tuple, Dict[str, Any]] = {}
-    for r in results or []:
-        ids = _parse_ids(r)
-        if not ids:
-            continue
-        a, b = ids
-        sets = _parse_sets(r)
-        a_sets = sum(1 for x, y in sets if x > y)
-        b_sets = sum(1 for x, y in sets if y > x)
-        res_map[tuple(sorted([a, b]))] = {
-            'score': r.get('score') or ', '.join([f"{x}:{y}" for x, y in sets]),
-            'sets': sets,  # Сохраняем список сетов для инверсии
-            'a': a,
-            'b': b,
-            'a_sets': a_sets,
-            'b_sets': b_sets,
-        }
-
-    # Подсчет статистики: победы и сумма разниц очков в сетах между игроками с равным числом побед
-    ids = [str(p.get('id')) for p in players]
-    games_played = {pid: 0 for pid in ids}
-    wins = {pid: 0 for pid in ids}
-    set_diff = {pid: 0 for pid in ids}  # Сумма разниц очков в сетах для тай-брейка
-
-    for i in range(n):
-        for j in range(i + 1, n):
-            pa = str(players[i].get('id'))
-            pb = str(players[j].get('id'))
-            rec = res_map.get(tuple(sorted([pa, pb])))
-            if not rec:
-                continue
-            games_played[pa] += 1
-            games_played[pb] += 1
-            if rec['a'] == pa:
-                a_sets, b_sets = rec['a_sets'], rec['b_sets']
-            else:
-                a_sets, b_sets = rec['b_sets'], rec['a_sets']
-            if a_sets > b_sets:
-                wins[pa] += 1
-            elif b_sets > a_sets:
-                wins[pb] += 1
-
-    # Группируем игроков по количеству побед
-    from collections import defaultdict
-    wins_groups = defaultdict(list)
-    for pid in ids:
-        wins_groups[wins[pid]].append(pid)
-    
-    # Для игроков с равным числом побед вычисляем разницу очков в сетах только между ними
-    for win_count, group in wins_groups.items():
-        if len(group) <= 1:
-            # Если игрок один в группе, разница очков не важна
-            continue
-        for pid in group:
-            points_diff = 0
-            for opp in group:
-                if opp == pid:
-                    continue
-                rec = res_map.get(tuple(sorted([pid, opp])))
-                if not rec:
-                    continue
-                # Считаем сумму разниц очков в каждом сете
-                sets = rec.get('sets', [])
-                for set_score in sets:
-                    if rec['a'] == pid:
-                        # pid это игрок 'a', считаем его_очки - очки_соперника
-                        points_diff += set_score[0] - set_score[1]
-                    else:
-                        # pid это игрок 'b', считаем его_очки - очки_соперника
-                        points_diff += set_score[1] - set_score[0]
-            set_diff[pid] = points_diff
+    # Победы, места и тай-брейк берём из таблицы турнира — счета уже разобраны
+    player_stats = standings.get('players', {})
+    wins = {pid: player_stats.get(pid, {}).get('wins', 0) for pid in ids}
+    tiebreak = standings.get('tiebreak', {})
 
     for i in range(n):
         for j in range(n):
@@ -494,45 +387,9 @@ def build_round_robin_table(players: List[Dict[str, Any]], results: Optional[Lis
                 draw.rectangle([x0, y0, x0 + cell_w, y0 + cell_h], fill=(229, 229, 229), outline=(209, 213, 219))
             else:
                 draw.rectangle([x0, y0, x0 + cell_w, y0 + cell_h], outline=(209, 213, 219))
-            if j > i:
-                p1 = players[i]
-                p2 = players[j]
-                key = tuple(sorted([str(p1.get('id')), str(p2.get('id'))]))
-                rec = res_map.get(key)
-                if rec:
-                    # Счет относительно игрока строки (p1 = players[i])
-                    p1_id = str(p1.get('id'))
-                    sets = rec.get('sets', [])
-                    if rec['a'] == p1_id:
-                        # p1 это игрок 'a' в результате, счет как есть
-                        score = ', '.join([f"{x}:{y}" for x, y in sets]) if sets else rec.get('score', '')
-                    else:
-                        # p1 это игрок 'b' в результате, инвертируем счет
-                        score = ', '.join([f"{y}:{x}" for x, y in sets]) if sets else rec.get('score', '')
-                    # Центрирование текста с отступом 15px
-                    try:
-                        bbox = draw.textbbox((0, 0), score, font=cell_font)
-                        score_width = bbox[2] - bbox[0]
-                        score_x = x0 + (cell_w - score_width) // 2
-                    except Exception:
-                        score_x = x0 + 15
-                    draw.text((score_x, text_y), score, fill=(31, 41, 55), font=cell_font)
-            else:
-                # Нижняя половина: счет относительно игрока строки
-                p1 = players[i]  # игрок строки
-                p2 = players[j]  # игрок колонки
-                key = tuple(sorted([str(p1.get('id')), str(p2.get('id'))]))
-                rec = res_map.get(key)
-                if rec:
-                    # Счет относительно игрока строки (p1 = players[i])
-                    p1_id = str(p1.get('id'))
-                    sets = rec.get('sets', [])
-                    if rec['a'] == p1_id:
-                        # p1 это игрок 'a' в результате, счет как есть
-                        score = ', '.join([f"{x}:{y}" for x, y in sets]) if sets else rec.get('score', '')
-                    else:
-                        # p1 это игрок 'b' в результате, инвертируем счет
-                        score = ', '.join([f"{y}:{x}" for x, y in sets]) if sets else rec.get('score', '')
+                # Счет относительно игрока строки
+                score = _score_text(ids[i], ids[j])
+                if score:
                     # Центрирование текста с отступом 15px
                     try:
                         bbox = draw.textbbox((0, 0), score, font=cell_font)
@@ -552,10 +409,10 @@ def build_round_robin_table(players: List[Dict[str, Any]], results: Optional[Lis
         draw.rectangle([col_x, y0, col_x + extra_cell_w, y0 + cell_h], outline=(209, 213, 219))
         draw.text((col_x + extra_cell_w // 2 - 12, text_y), str(wins.get(pid, 0)), fill=(31, 41, 55), font=cell_font)
         col_x += extra_cell_w
-        # Очки (сумма разниц очков в сетах между игроками с равным числом побед)
+        # Очки (разница геймов в очных встречах между игроками с равным числом очков)
         draw.rectangle([col_x, y0, col_x + extra_cell_w, y0 + cell_h], outline=(209, 213, 219))
-        sd_value = set_diff.get(pid, 0)
-        sd_text = str(sd_value) if sd_value != 0 or len(wins_groups.get(wins.get(pid, 0), [])) > 1 else "-"
+        sd_value = tiebreak.get(pid, {}).get('games', 0)
+        sd_text = str(sd_value) if sd_value != 0 or tied_group_size(standings, pid) > 1 else "-"
         draw.text((col_x + extra_cell_w // 2 - 12, text_y), sd_text, fill=(31, 41, 55), font=cell_font)
         col_x += extra_cell_w
         # Места — рисуем ячейки только если турнир завершён
@@ -567,11 +424,8 @@ def build_round_robin_table(players: List[Dict[str, Any]], results: Optional[Lis
 
     # Пересортируем для определения мест (только если турнир завершён)
     if tournament_finished:
-        # Сортировка по победам, затем по сумме разниц очков в сетах
-        order = sorted(range(n), key=lambda idx: (wins.get(str(players[idx].get('id')), 0), set_diff.get(str(players[idx].get('id')), 0)), reverse=True)
-        place_of: Dict[str, int] = {}
-        for rank, idx in enumerate(order, start=1):
-            place_of[str(players[idx].get('id'))] = rank
+        # Места уже посчитаны движком таблицы (очки, очные встречи, разница сетов и геймов)
+        place_of = places(standings, ids)
         # Нарисуем места
         for i, p in enumerate(players):
             pid = str(p.get('id'))
@@ -581,18 +435,18 @@ def build_round_robin_table(players: List[Dict[str, Any]], results: Optional[Lis
             draw.text((col_x + extra_cell_w // 2 - 12, text_y), str(place_of.get(pid, i + 1)), fill=(31, 41, 55), font=cell_font)
 
     # Примечание по тай-брейку (уменьшенный шрифт для описания)
-    note = """* В столбце "Очки" показана общая разница в сетах между игроками с равным количеством побед.
-Она используется для определения победителя между ними.
-
-К примеру: У игроков А, Б и В равное кол-во побед (напр., по 1 у каждого), у игрока Г — 3.
-Игрок Г получает 1-е место, для остальных требуется определить на основе очков в сетах.
-
-Тогда для игрока А суммируются его очки в сетах в играх с Б и с В, и из них вычитаются
-очки в сетах игроков Б и В в их играх с А. Эта разница и выводится в столбце.
-Аналогично для игроков Б и В. У кого больше очков — выше место.
-Очки в играх с другими игроками в этом подсчёте не учитываются.
-
-В случае, когда число побед у игрока не совпадает с другими, дополнительный учёт очков в сетах не требуется."""
+    note = """* Места определяются по очкам турнира: победа — 3, ничья — 1, поражение — 0.
+При равенстве очков сравниваются только встречи этих игроков между собой:
+сначала очки в них, затем разница сетов и затем разница геймов.
+В столбце "Очки" показана разница геймов в этих очных встречах.
+
+К примеру: у игроков А, Б и В по 3 очка, у игрока Г — 9. Игрок Г получает
+1-е место, места А, Б и В определяются по их играм друг с другом.
+Тогда для игрока А суммируются его геймы в играх с Б и с В, и из них вычитаются
+геймы Б и В в их играх с А. Эта разница и выводится в столбце.
+Аналогично для игроков Б и В. Игры с другими игроками в этом подсчёте не учитываются.
+
+Если очки игрока не совпадают ни с чьими, дополнительный подсчёт не требуется."""
     try:
         # Подгрузим уменьшенный шрифт для описания
         def _load_small_font(sz: int = 12) -> ImageFont.FreeTypeFont:
@@ -624,7 +478,4 @@ def build_round_robin_table(players: List[Dict[str, Any]], results: Optional[Lis
     except Exception:
         pass
 
-    buf = io.BytesIO()
-    image.save(buf, format='PNG')
-    buf.seek(0)
-    return buf.getvalue()
+    return encode_image(image, kind="round_robin")
@@ -0,0 +1,300 @@
+"""
+Таблица результатов турнира: инкрементальный подсчёт и тай-брейки.
+
+Состояние хранится прямо в данных турнира (ключ ``standings``) и обновляется
+при записи каждого результата матча, поэтому потребителям (таблица круговой
+системы, итоговые места, get_tournament_standings) не нужно заново проходить
+по всем матчам и разбирать строки счёта.
+
+Порядок мест:
+1. очки (3 за победу, 1 за ничью);
+2. среди игроков с равными очками — мини-таблица только их очных встреч:
+   очки, разница сетов, разница геймов;
+3. общая разница сетов, затем общая разница геймов;
+4. исходный порядок участников (посев).
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.score import score_data_of, set_pairs
+
+logger = logging.getLogger(__name__)
+
+STANDINGS_KEY = "standings"
+STANDINGS_VERSION = 1
+
+WIN_POINTS = 3
+DRAW_POINTS = 1
+
+
+def pair_key(p1: str, p2: str) -> str:
+    a, b = sorted([str(p1), str(p2)])
+    return f"{a}__{b}"
+
+
+def _empty_player() -> Dict[str, int]:
+    return {
+        "played": 0,
+        "wins": 0,
+        "draws": 0,
+        "losses": 0,
+        "points": 0,
+        "sets_won": 0,
+        "sets_lost": 0,
+        "games_won": 0,
+        "games_lost": 0,
+    }
+
+
+def empty_standings(participant_ids: Iterable[str] = ()) -> Dict[str, Any]:
+    players = {}
+    seed: List[str] = []
+    for pid in participant_ids:
+        pid = str(pid)
+        if pid not in players:
+            players[pid] = _empty_player()
+            seed.append(pid)
+    return {
+        "version": STANDINGS_VERSION,
+        "players": players,
+        "pairs": {},
+        "seed": seed,
+        "order": list(seed),
+        "tiebreak": {},
+    }
+
+
+def _apply_pair(standings: Dict[str, Any], rec: Dict[str, Any], sign: int) -> None:
+    """Добавляет (sign=1) или вычитает (sign=-1) вклад одного матча в итоги игроков."""
+    players = standings["players"]
+    a, b = rec["a"], rec["b"]
+    for pid in (a, b):
+        if pid not in players:
+            players[pid] = _empty_player()
+            standings["seed"].append(pid)
+    sets = rec.get("sets") or []
+    a_sets = sum(1 for x, y in sets if x > y)
+    b_sets = sum(1 for x, y in sets if y > x)
+    a_games = sum(x for x, _ in sets)
+    b_games = sum(y for _, y in sets)
+    winner = rec.get("winner_id")
+    if winner not in (a, b):
+        winner = a if a_sets > b_sets else b if b_sets > a_sets else None
+
+    pa, pb = players[a], players[b]
+    pa["played"] += sign
+    pb["played"] += sign
+    if winner == a:
+        pa["wins"] += sign
+        pb["losses"] += sign
+        pa["points"] += sign * WIN_POINTS
+    elif winner == b:
+        pb["wins"] += sign
+        pa["losses"] += sign
+        pb["points"] += sign * WIN_POINTS
+    else:
+        pa["draws"] += sign
+        pb["draws"] += sign
+        pa["points"] += sign * DRAW_POINTS
+        pb["points"] += sign * DRAW_POINTS
+    pa["sets_won"] += sign * a_sets
+    pa["sets_lost"] += sign * b_sets
+    pb["sets_won"] += sign * b_sets
+    pb["sets_lost"] += sign * a_sets
+    pa["games_won"] += sign * a_games
+    pa["games_lost"] += sign * b_games
+    pb["games_won"] += sign * b_games
+    pb["games_lost"] += sign * a_games
+
+
+def _h2h_table(standings: Dict[str, Any], group: List[str]) -> Dict[str, Dict[str, int]]:
+    """Мини-таблица очных встреч внутри группы игроков с равными очками."""
+    members = set(group)
+    table = {pid: {"points": 0, "sets": 0, "games": 0} for pid in group}
+    for rec in standings["pairs"].values():
+        a, b = rec["a"], rec["b"]
+        if a not in members or b not in members:
+            continue
+        sets = rec.get("sets") or []
+        a_sets = sum(1 for x, y in sets if x > y)
+        b_sets = sum(1 for x, y in sets if y > x)
+        games = sum(x - y for x, y in sets)
+        winner = rec.get("winner_id")
+        if winner not in (a, b):
+            winner = a if a_sets > b_sets else b if b_sets > a_sets else None
+        if winner == a:
+            table[a]["points"] += WIN_POINTS
+        elif winner == b:
+            table[b]["points"] += WIN_POINTS
+        else:
+            table[a]["points"] += DRAW_POINTS
+            table[b]["points"] += DRAW_POINTS
+        table[a]["sets"] += a_sets - b_sets
+        table[b]["sets"] += b_sets - a_sets
+        table[a]["games"] += games
+        table[b]["games"] += -games
+    return table
+
+
+def _rerank(standings: Dict[str, Any]) -> None:
+    players = standings["players"]
+    seed_index = {pid: i for i, pid in enumerate(standings["seed"])}
+
+    groups: Dict[int, List[str]] = defaultdict(list)
+    for pid in standings["seed"]:
+        groups[players[pid]["points"]].append(pid)
+
+    tiebreak: Dict[str, Dict[str, int]] = {}
+    for group in groups.values():
+        if len(group) > 1:
+            tiebreak.update(_h2h_table(standings, group))
+
+    def key(pid: str):
+        p = players[pid]
+        tb = tiebreak.get(pid, {})
+        return (
+            -p["points"],
+            -tb.get("points", 0),
+            -tb.get("sets", 0),
+            -tb.get("games", 0),
+            -(p["sets_won"] - p["sets_lost"]),
+            -(p["games_won"] - p["games_lost"]),
+            seed_index.get(pid, 0),
+        )
+
+    standings["order"] = sorted(players.keys(), key=key)
+    standings["tiebreak"] = tiebreak
+
+
+def record_result(
+    standings: Dict[str, Any],
+    player1_id: str,
+    player2_id: str,
+    score_data: Optional[Dict[str, Any]],
+    winner_id: Optional[str] = None,
+) -> None:
+    """Записывает (или перезаписывает) результат встречи пары и пересчитывает места.
+
+    Повторная запись той же пары сначала вычитает прежний вклад, поэтому
+    исправление счёта и повторное подтверждение не задваивают статистику.
+    """
+    a, b = str(player1_id), str(player2_id)
+    key = pair_key(a, b)
+    old = standings["pairs"].get(key)
+    if old:
+        _apply_pair(standings, old, -1)
+    rec = {
+        "a": a,
+        "b": b,
+        "sets": [list(s) for s in set_pairs(score_data)],
+        "winner_id": str(winner_id) if winner_id is not None else None,
+    }
+    standings["pairs"][key] = rec
+    _apply_pair(standings, rec, 1)
+    _rerank(standings)
+
+
+def remove_result(standings: Dict[str, Any], player1_id: str, player2_id: str) -> None:
+    """Удаляет результат встречи пары (например, после удаления игры админом)."""
+    key = pair_key(player1_id, player2_id)
+    old = standings["pairs"].pop(key, None)
+    if old:
+        _apply_pair(standings, old, -1)
+        _rerank(standings)
+
+
+def _countable_match(m: Dict[str, Any]) -> bool:
+    if m.get("is_bye") or m.get("status") != "completed":
+        return False
+    if not m.get("player1_id") or not m.get("player2_id"):
+        return False
+    return score_data_of(m) is not None
+
+
+def build_standings(participant_ids: Iterable[str], matches: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Полный пересчёт по списку матчей — для миграции старых турниров."""
+    standings = empty_standings(participant_ids)
+    for m in matches or []:
+        if not _countable_match(m):
+            continue
+        rec = {
+            "a": str(m["player1_id"]),
+            "b": str(m["player2_id"]),
+            "sets": [list(s) for s in set_pairs(score_data_of(m))],
+            "winner_id": str(m["winner_id"]) if m.get("winner_id") is not None else None,
+        }
+        standings["pairs"][pair_key(rec["a"], rec["b"])] = rec
+        _apply_pair(standings, rec, 1)
+    _rerank(standings)
+    return standings
+
+
+def ensure_standings(tournament_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Возвращает сохранённую таблицу турнира, при необходимости строит её из матчей.
+
+    Вызывающий код сам решает, сохранять ли турнир после ленивой миграции.
+    """
+    standings = tournament_data.get(STANDINGS_KEY)
+    if not isinstance(standings, dict) or standings.get("version") != STANDINGS_VERSION:
+        participants = tournament_data.get("participants", {}) or {}
+        standings = build_standings(participants.keys(), tournament_data.get("matches", []) or [])
+        tournament_data[STANDINGS_KEY] = standings
+        return standings
+    # Участники, добавленные после старта, тоже должны быть в таблице
+    added = False
+    for pid in (tournament_data.get("participants", {}) or {}).keys():
+        pid = str(pid)
+        if pid not in standings["players"]:
+            standings["players"][pid] = _empty_player()
+            standings["seed"].append(pid)
+            added = True
+    if added:
+        _rerank(standings)
+    return standings
+
+
+def reset_standings(tournament_data: Dict[str, Any], participant_ids: Iterable[str]) -> Dict[str, Any]:
+    """Пустая таблица в порядке посева — при старте турнира."""
+    standings = empty_standings(participant_ids)
+    tournament_data[STANDINGS_KEY] = standings
+    return standings
+
+
+def record_match(tournament_data: Dict[str, Any], match: Dict[str, Any]) -> None:
+    """Учитывает завершённый матч турнира в его таблице (BYE и пустые счета пропускаются)."""
+    standings = ensure_standings(tournament_data)
+    if _countable_match(match):
+        record_result(standings, match["player1_id"], match["player2_id"], score_data_of(match), match.get("winner_id"))
+    elif match.get("player1_id") and match.get("player2_id") and match.get("status") != "completed":
+        remove_result(standings, match["player1_id"], match["player2_id"])
+
+
+def places(standings: Dict[str, Any], player_ids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Место каждого игрока (1..n); если передан список игроков — только среди них."""
+    order = standings.get("order", [])
+    if player_ids is not None:
+        wanted = {str(p) for p in player_ids}
+        order = [pid for pid in order if pid in wanted]
+    return {pid: idx for idx, pid in enumerate(order, start=1)}
+
+
+def tied_group_size(standings: Dict[str, Any], player_id: str) -> int:
+    """Сколько игроков делят очки с данным (для вывода колонки тай-брейка)."""
+    players = standings.get("players", {})
+    pts = players.get(str(player_id), {}).get("points", 0)
+    return sum(1 for p in players.values() if p.get("points", 0) == pts)
+
+
+def pair_result(standings: Dict[str, Any], player_id: str, opponent_id: str) -> Optional[List[Tuple[int, int]]]:
+    """Счёт встречи с точки зрения player_id или None, если она не сыграна."""
+    rec = standings.get("pairs", {}).get(pair_key(player_id, opponent_id))
+    if not rec:
+        return None
+    sets = [tuple(s) for s in rec.get("sets") or []]
+    if rec["a"] == str(player_id):
+        return sets
+    return [(y, x) for x, y in sets]
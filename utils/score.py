@@ -0,0 +1,154 @@
+"""
+Структурированный счёт игры.
+
+Строка вида "6:4, 3:6, 10:8" разбирается один раз — при записи результата —
+и хранится рядом с ней в поле ``score_data``:
+
+    {"sets": [[6, 4, 0], [3, 6, 0], [10, 8, 1]],
+     "sets_a": 2, "sets_b": 1, "games_a": 19, "games_b": 18}
+
+Каждый сет — (геймы стороны A, геймы стороны B, признак тай-брейка).
+Сторона A — team1 игры или player1 матча турнира.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+SCORE_DATA_KEY = "score_data"
+
+# Сет до 10 и больше геймов может быть только супертай-брейком
+SUPER_TIEBREAK_MIN = 10
+
+
+def parse_score(score: Any, tiebreak_sets: Optional[Iterable[int]] = None) -> Optional[Dict[str, Any]]:
+    """Разбирает счёт (строку или список "a:b") в структуру score_data.
+
+    tiebreak_sets — номера сетов (с 1), явно отмеченных как супертай-брейк.
+    Возвращает None, если в счёте нет ни одного сета (например, "BYE").
+    """
+    if not score:
+        return None
+    if isinstance(score, (list, tuple)):
+        parts = [str(x).strip() for x in score]
+    else:
+        parts = [x.strip() for x in str(score).split(",")]
+    marked = set(tiebreak_sets or [])
+    sets: List[List[int]] = []
+    for s in parts:
+        if ":" not in s:
+            continue
+        try:
+            a, b = s.split(":")
+            a, b = int(a), int(b)
+        except ValueError:
+            continue
+        is_tb = (len(sets) + 1) in marked or max(a, b) >= SUPER_TIEBREAK_MIN
+        sets.append([a, b, 1 if is_tb else 0])
+    if not sets:
+        return None
+    return {
+        "sets": sets,
+        "sets_a": sum(1 for a, b, _ in sets if a > b),
+        "sets_b": sum(1 for a, b, _ in sets if b > a),
+        "games_a": sum(a for a, _, _ in sets),
+        "games_b": sum(b for _, b, _ in sets),
+    }
+
+
+def attach_score(record: Dict[str, Any], score: Any, score_data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Записывает в запись игры/матча строку счёта и её разобранную форму."""
+    record["score"] = score
+    data = score_data if score_data is not None else parse_score(score)
+    if data is None:
+        record.pop(SCORE_DATA_KEY, None)
+    else:
+        record[SCORE_DATA_KEY] = data
+    return data
+
+
+def score_data_of(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Структурированный счёт записи; для записей до миграции — разбор на лету."""
+    data = record.get(SCORE_DATA_KEY)
+    if data is not None:
+        return data
+    return parse_score(record.get("sets") or record.get("score"))
+
+
+def set_pairs(data: Optional[Dict[str, Any]]) -> List[Tuple[int, int]]:
+    """Геймы по сетам без признака тай-брейка."""
+    if not data:
+        return []
+    return [(s[0], s[1]) for s in data.get("sets", [])]
+
+
+def game_difference(data: Optional[Dict[str, Any]]) -> int:
+    """Сумма модулей разницы геймов по сетам (как для пересчёта рейтинга)."""
+    return sum(abs(a - b) for a, b in set_pairs(data))
+
+
+def winner_side(data: Optional[Dict[str, Any]]) -> Optional[str]:
+    """'team1', 'team2' или None при равенстве сетов."""
+    if not data:
+        return None
+    if data["sets_a"] > data["sets_b"]:
+        return "team1"
+    if data["sets_b"] > data["sets_a"]:
+        return "team2"
+    return None
+
+
+def flip_score(data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Тот же счёт с точки зрения стороны B."""
+    if not data:
+        return data
+    return {
+        "sets": [[b, a, tb] for a, b, tb in data["sets"]],
+        "sets_a": data["sets_b"],
+        "sets_b": data["sets_a"],
+        "games_a": data["games_b"],
+        "games_b": data["games_a"],
+    }
+
+
+def format_score(data: Optional[Dict[str, Any]], flip: bool = False) -> str:
+    if not data:
+        return ""
+    return ", ".join(f"{b}:{a}" if flip else f"{a}:{b}" for a, b in set_pairs(data))
+
+
+def migrate_records(records: Iterable[Dict[str, Any]]) -> int:
+    """Добавляет score_data записям, у которых его ещё нет. Возвращает число изменённых."""
+    changed = 0
+    for rec in records:
+        if not isinstance(rec, dict) or SCORE_DATA_KEY in rec:
+            continue
+        data = parse_score(rec.get("sets") or rec.get("score"))
+        if data is None:
+            continue
+        rec[SCORE_DATA_KEY] = data
+        changed += 1
+    return changed
+
+
+async def migrate_score_data() -> None:
+    """Однократная миграция games.json и матчей tournaments.json (идемпотентна)."""
+    games = await storage.load_games()
+    games_changed = migrate_records(games)
+    if games_changed:
+        await storage.save_games(games)
+
+    tournaments = await storage.load_tournaments()
+    matches_changed = 0
+    for td in tournaments.values():
+        matches_changed += migrate_records(td.get("matches", []) or [])
+    if matches_changed:
+        await storage.save_tournaments(tournaments)
+
+    if games_changed or matches_changed:
+        logger.info(f"Миграция счёта: игр {games_changed}, матчей турниров {matches_changed}")
@@ -0,0 +1,281 @@
+"""
+Готовые картинки турнирных сеток и таблиц.
+
+Картинка турнира зависит только от его названия, участников, посева,
+матчей и сыгранных игр. По этим данным считается отпечаток: если картинка
+с таким отпечатком уже есть, она отдаётся без отрисовки, а одновременные
+запросы одной новой картинки ждут одну отрисовку. Рисуется картинка в
+отдельном потоке, одном на процесс (шрифты FreeType общие для всех сеток
+и не потокобезопасны), — цикл событий в это время обслуживает остальных.
+
+Кэш прогревается заранее. При каждой записи tournaments.json изменённые
+турниры (storage передаёт их id), у которых изменилось видимое на картинке (старт, результат матча, участники,
+посев), перерисовываются в фоне; при запуске рисуются все идущие турниры.
+От языка картинка не зависит (подписи на ней берутся из данных турнира),
+поэтому одна отрисовка годится для всех языков бота. Если задан
+TOURNAMENT_IMAGE_UPLOAD_CHAT_ID, перерисованная картинка сразу
+загружается в этот чат, и пользователям уходит по file_id.
+
+Кэш у каждого процесса свой: в кластерном режиме процесс прогревает
+турниры, которые изменил сам, а чужие изменения видит по отпечатку при
+первом показе.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple, Union
+
+from aiogram import Bot
+from aiogram.types import BufferedInputFile, Message
+
+from config.config import TOURNAMENT_IMAGE_CACHE_SIZE, TOURNAMENT_IMAGE_UPLOAD_CHAT_ID
+from services.storage import storage
+from utils.bracket.encoding import image_filename
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("bot_tournament_image_total", "Картинки турниров: из кэша (hit), отрисованные (miss), дождавшиеся чужой отрисовки (shared)")
+metrics.describe("bot_tournament_render_seconds", "Отрисовка картинок турниров: по запросу (view) и заранее (warm)")
+
+# Турниры, картинки которых рисуются при запуске
+WARM_STATUSES = ("active", "started")
+# Несколько записей подряд (результат, следующий круг, смена стадии) дают одну перерисовку
+DEBOUNCE_SECONDS = 1.0
+# После каждой фоновой отрисовки — пауза такой же длины: прогрев после запуска занимает
+# не больше половины процессора, остальное достаётся апдейтам пользователей
+WARM_PAUSE_FACTOR = 1.0
+
+# Поля матча, видимые на сетке и в таблице (без времени создания и завершения)
+_MATCH_FIELDS = ('id', 'round', 'match_number', 'player1_id', 'player2_id', 'player1_name', 'player2_name',
+                 'winner_id', 'score', 'status', 'is_bye', 'placement', 'is_consolation', 'consolation_place')
+
+Image = Tuple[bytes, str]
+Renderer = Callable[[Dict[str, Any], str], Awaitable[Image]]
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+# Кто запросил отрисовку: пользователь (view) или фоновый прогрев (warm) — для метрики
+_source: contextvars.ContextVar[str] = contextvars.ContextVar("tournament_render_source", default="view")
+
+
+def _digest(value: Any) -> str:
+    return hashlib.blake2b(repr(value).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def render_signature(tournament_data: Dict[str, Any]) -> str:
+    """Отпечаток того, что из самого турнира видно на картинке."""
+    participants = tournament_data.get('participants', {}) or {}
+    return _digest((
+        tournament_data.get('type'),
+        tournament_data.get('name'),
+        tournament_data.get('hide_bracket', False),
+        [(pid, (pdata or {}).get('name')) for pid, pdata in participants.items()],
+        tournament_data.get('seeding') or [],
+        [tuple(m.get(field) for field in _MATCH_FIELDS) for m in tournament_data.get('matches', []) or []],
+    ))
+
+
+def _image_key(image: bytes) -> str:
+    return hashlib.blake2b(image, digest_size=16).hexdigest()
+
+
+def fingerprint(tournament_data: Dict[str, Any], players: Iterable[Any], completed_games: Iterable[Dict[str, Any]],
+                *extra: Any) -> str:
+    """Отпечаток всех данных картинки: турнир, игроки в порядке посева (с фото), игры и extra."""
+    return _digest((
+        render_signature(tournament_data),
+        [(p.id, p.name, getattr(p, 'photo_url', None)) for p in players],
+        list(completed_games),
+        extra,
+    ))
+
+
+async def run_render(func: Callable[..., Any], *args: Any) -> Any:
+    """Выполняет отрисовку в потоке отрисовки."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+class TournamentImageCache:
+    def __init__(self, max_entries: int = TOURNAMENT_IMAGE_CACHE_SIZE):
+        self._max_entries = max_entries
+        # tournament_id -> (отпечаток, картинка)
+        self._entries: "OrderedDict[str, Tuple[str, Image]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # file_id загруженных картинок по хешу байтов — так их узнаёт photo()
+        self._file_ids: "OrderedDict[str, str]" = OrderedDict()
+        self._signatures: Dict[str, str] = {}
+        self._pending: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
+        self._renderer: Optional[Renderer] = None
+
+    async def get(self, tournament_id: str, fingerprint: str, render: Callable[[], Image]) -> Image:
+        """Картинка турнира с отпечатком fingerprint: из кэша или render() в потоке отрисовки."""
+        entry = self._entries.get(tournament_id)
+        if entry is not None and entry[0] == fingerprint:
+            self._entries.move_to_end(tournament_id)
+            metrics.inc("bot_tournament_image_total", labels={"result": "hit"})
+            return entry[1]
+        key = (tournament_id, fingerprint)
+        future = self._inflight.get(key)
+        if future is not None:
+            metrics.inc("bot_tournament_image_total", labels={"result": "shared"})
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        started = time.perf_counter()
+        try:
+            image = await run_render(render)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Ошибку забирают ожидающие; если их нет, asyncio не должен ругаться на неполученное исключение
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        metrics.inc("bot_tournament_image_total", labels={"result": "miss"})
+        metrics.observe("bot_tournament_render_seconds", time.perf_counter() - started,
+                        labels={"source": _source.get()})
+        self._entries[tournament_id] = (fingerprint, image)
+        self._entries.move_to_end(tournament_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        future.set_result(image)
+        return image
+
+    def photo(self, image: bytes, name: str) -> Union[str, BufferedInputFile]:
+        """
+        Фото для отправки: file_id, если эта картинка уже загружена в Telegram,
+        иначе сама картинка в файле name с расширением по её формату.
+        """
+        file_id = self._file_ids.get(_image_key(image)) if self._file_ids else None
+        return file_id or BufferedInputFile(image, filename=image_filename(image, name))
+
+    def remember_upload(self, image: bytes, message: Message) -> None:
+        """Запоминает file_id картинки из ответа на её отправку — следующие отправки пойдут по нему."""
+        if not message.photo:
+            return
+        key = _image_key(image)
+        self._file_ids[key] = message.photo[-1].file_id
+        self._file_ids.move_to_end(key)
+        while len(self._file_ids) > self._max_entries:
+            self._file_ids.popitem(last=False)
+
+    def forget(self, tournament_id: str) -> None:
+        self._entries.pop(tournament_id, None)
+        self._signatures.pop(tournament_id, None)
+        self._pending.discard(tournament_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._file_ids.clear()
+
+    # ---------- Прогрев ----------
+
+    async def start(self, bot: Bot, renderer: Renderer) -> None:
+        """
+        Подписывается на запись tournaments.json и ставит в очередь отрисовку
+        идущих турниров. renderer(tournament_data, tournament_id) — тот же
+        код, что рисует картинку для пользователя.
+        """
+        self._bot = bot
+        self._renderer = renderer
+        self._wakeup = asyncio.Event()
+        tournaments = await storage.load_tournaments()
+        for tournament_id, tournament_data in tournaments.items():
+            self._signatures[tournament_id] = render_signature(tournament_data)
+            if tournament_data.get('status') in WARM_STATUSES:
+                self._pending.add(tournament_id)
+        storage.add_tournaments_listener(self._on_tournaments_saved)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._warm_loop())
+        self._wakeup.set()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_tournaments_saved(self, tournaments: Dict[str, Any], changed: Optional[Set[str]] = None) -> None:
+        if changed is None:
+            changed = set(tournaments) | set(self._signatures)
+        for tournament_id in changed:
+            tournament_data = tournaments.get(tournament_id)
+            if tournament_data is None:
+                self.forget(tournament_id)
+                continue
+            signature = render_signature(tournament_data)
+            if self._signatures.get(tournament_id) != signature:
+                self._signatures[tournament_id] = signature
+                self._pending.add(tournament_id)
+        if self._pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _warm_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(DEBOUNCE_SECONDS)
+            self._wakeup.clear()
+            pending, self._pending = self._pending, set()
+            try:
+                tournaments = await storage.load_tournaments()
+            except Exception as e:
+                logger.error(f"Не удалось загрузить турниры для отрисовки: {e}")
+                continue
+            for tournament_id in pending:
+                tournament_data = tournaments.get(tournament_id)
+                if tournament_data is not None:
+                    started = time.perf_counter()
+                    await self._warm(tournament_id, tournament_data)
+                    await asyncio.sleep((time.perf_counter() - started) * WARM_PAUSE_FACTOR)
+
+    async def _warm(self, tournament_id: str, tournament_data: Dict[str, Any]) -> None:
+        token = _source.set("warm")
+        try:
+            image, _ = await self._renderer(tournament_data, tournament_id)
+        except Exception as e:
+            logger.error(f"Ошибка фоновой отрисовки турнира {tournament_id}: {e}")
+            return
+        finally:
+            _source.reset(token)
+        entry = self._entries.get(tournament_id)
+        if entry is None or entry[1][0] is not image:
+            # Скрытая сетка или ошибка отрисовки — картинка не из кэша, загружать её незачем
+            return
+        if TOURNAMENT_IMAGE_UPLOAD_CHAT_ID and self._bot is not None and _image_key(image) not in self._file_ids:
+            await self._upload(image)
+
+    async def _upload(self, image: bytes) -> None:
+        try:
+            message = await self._bot.send_photo(
+                TOURNAMENT_IMAGE_UPLOAD_CHAT_ID,
+                BufferedInputFile(image, filename=image_filename(image, "tournament_bracket")),
+                disable_notification=True,
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить картинку турнира заранее: {e}")
+            return
+        self.remember_upload(image, message)
+        # file_id остаётся действительным и после удаления сообщения
+        try:
+            await self._bot.delete_message(TOURNAMENT_IMAGE_UPLOAD_CHAT_ID, message.message_id)
+        except Exception:
+            pass
+
+tournament_images = TournamentImageCache()
@@ -5,6 +5,7 @@
 from __future__ import annotations
 
 import logging
+import time
 from datetime import datetime, timedelta
 from html import escape as html_escape
 from typing import Any, Dict, List, Tuple
@@ -13,6 +14,7 @@ from aiogram import Bot
 
 from config.config import BOT_USERNAME, TOURNAMENT_ENTRY_FEE
 from services.storage import storage
+from utils.dates import started_ts
 
 logger = logging.getLogger(__name__)
 
@@ -289,17 +291,11 @@ async def process_payment_windows(bot: Bot | None) -> None:
         await storage.save_tournaments(tournaments)
 
 
-def _days_since_started(started_at: str | None) -> int:
-    if not started_at:
+def _days_since_started(td: Dict[str, Any], now: float | None = None) -> int:
+    started = started_ts(td)
+    if started is None:
         return 0
-    try:
-        s = started_at.replace("Z", "+00:00")
-        started = datetime.fromisoformat(s)
-        if started.tzinfo is not None:
-            started = started.astimezone().replace(tzinfo=None)
-    except Exception:
-        return 0
-    return max(0, (datetime.now() - started).days)
+    return max(0, int(((now or time.time()) - started) // 86400))
 
 
 def _pending_user_matches(matches: List[dict], uid: str) -> List[dict]:
@@ -339,13 +335,13 @@ async def process_round_robin_reminders(bot: Bot | None) -> None:
     tournaments = await storage.load_tournaments()
     users = await storage.load_users()
     any_changed = False
+    now = time.time()
     for tid, td in tournaments.items():
         if td.get("type") != "Круговая" or td.get("status") != "started":
             continue
-        started_at = td.get("started_at")
-        if not started_at:
+        if not td.get("started_at"):
             continue
-        d = _days_since_started(started_at)
+        d = _days_since_started(td, now)
         tour_name = td.get("name", "Турнир")
         view = view_tournament_deeplink(tid)
         matches: List[dict] = td.get("matches", []) or []
@@ -11,11 +11,14 @@ from services.storage import storage
 from config.tournament_config import MIN_PARTICIPANTS
 from aiogram import Bot
 from utils.tournament_notifications import TournamentNotifications
+from utils.round_robin_standings import ensure_standings, record_match, reset_standings
+from utils.score import attach_score, flip_score, format_score, parse_score
 import random
 import os
 from PIL import Image, ImageDraw, ImageFont
 import io
 from config.paths import BASE_DIR
+from utils.photos import avatar_file
 
 logger = logging.getLogger(__name__)
 
@@ -143,7 +146,7 @@ class TournamentManager:
                 
                 if photo_path:
                     try:
-                        abs_path = photo_path if os.path.isabs(photo_path) else os.path.join(BASE_DIR, photo_path)
+                        abs_path = avatar_file(photo_path, size)
                         if os.path.exists(abs_path):
                             player_img = Image.open(abs_path)
                             player_img = player_img.convert('RGB')
@@ -308,9 +311,12 @@ class TournamentManager:
             
             # Обновляем статус турнира
             tournament_data['status'] = 'started'
-            tournament_data['started_at'] = datetime.now().isoformat()
+            started = datetime.now()
+            tournament_data['started_at'] = started.isoformat()
+            tournament_data['started_ts'] = int(started.timestamp())
             tournament_data['matches'] = matches
             tournament_data['current_round'] = 0
+            reset_standings(tournament_data, participants.keys())
             
             tournaments[tournament_id] = tournament_data
             await self.storage.save_tournaments(tournaments)
@@ -479,60 +485,11 @@ class TournamentManager:
             t_type = t.get('type', 'Олимпийская система')
 
             if t_type == 'Круговая':
-                # Подсчёт 3/1/0 и тай-брейк по разнице сетов между равными по очкам
-                def parse_sets(score_text: str) -> List[tuple[int, int]]:
-                    out: List[tuple[int, int]] = []
-                    for s in [x.strip() for x in str(score_text or '').split(',') if ':' in x]:
-                        try:
-                            a, b = s.split(':')
-                            out.append((int(a), int(b)))
-                        except Exception:
-                            continue
-                    return out
+                # Места берём из таблицы турнира: 3/1/0, затем очные встречи, сеты и геймы
+                standings = ensure_standings(t)
                 ids = [str(pid) for pid in participants.keys()]
-                points = {pid: 0 for pid in ids}
-                tie_sd = {pid: 0 for pid in ids}
-                res_map: Dict[tuple, Dict[str, Any]] = {}
-                for m in matches:
-                    p1 = str(m.get('player1_id')) if m.get('player1_id') is not None else None
-                    p2 = str(m.get('player2_id')) if m.get('player2_id') is not None else None
-                    if not p1 or not p2:
-                        continue
-                    sets = parse_sets(m.get('score'))
-                    a_sets = sum(1 for x, y in sets if x > y)
-                    b_sets = sum(1 for x, y in sets if y > x)
-                    key = tuple(sorted([p1, p2]))
-                    res_map[key] = {'a': p1, 'b': p2, 'a_sets': a_sets, 'b_sets': b_sets}
-                    # Очки 3/1/0
-                    if a_sets > b_sets:
-                        points[p1] += 3
-                    elif b_sets > a_sets:
-                        points[p2] += 3
-                    else:
-                        points[p1] += 1
-                        points[p2] += 1
-                # Тай-брейк внутри групп равных очков: сумма разницы сетов в очных
-                from collections import defaultdict
-                pts_groups = defaultdict(list)
-                for pid in ids:
-                    pts_groups[points[pid]].append(pid)
-                for grp in pts_groups.values():
-                    if len(grp) <= 1:
-                        continue
-                    for pid in grp:
-                        sd = 0
-                        for opp in grp:
-                            if opp == pid:
-                                continue
-                            rec = res_map.get(tuple(sorted([pid, opp])))
-                            if not rec:
-                                continue
-                            if rec['a'] == pid:
-                                sd += rec['a_sets'] - rec['b_sets']
-                            else:
-                                sd += rec['b_sets'] - rec['a_sets']
-                        tie_sd[pid] = sd
-                order = sorted(ids, key=lambda pid: (points.get(pid, 0), tie_sd.get(pid, 0)), reverse=True)
+                order = [pid for pid in standings['order'] if pid in ids]
+                order += [pid for pid in ids if pid not in order]
                 # Итоговые места
                 for idx, pid in enumerate(order, start=1):
                     places[pid] = f"{idx} место"
@@ -796,9 +753,7 @@ class TournamentManager:
         matches = tournament_data.get('matches', [])
         participants = tournament_data.get('participants', {})
         
-        print(f"DEBUG: tournament_id={tournament_id}, user_id={user_id}")
-        print(f"DEBUG: tournament_type={tournament_type}")
-        print(f"DEBUG: matches count={len(matches)}")
+        logger.debug(f"Поиск соперников: турнир {tournament_id} ({tournament_type}), пользователь {user_id}, матчей {len(matches)}")
         
         available_opponents = []
         
@@ -818,7 +773,6 @@ class TournamentManager:
         if tournament_type == "Олимпийская система":
             # В олимпийской системе ищем матч с этим пользователем
             for match in matches:
-                print(f"DEBUG: match={match}")
                 if match['status'] == 'pending' and not match.get('is_bye', False):
                     if match['player1_id'] == user_id:
                         # Пользователь играет против player2
@@ -829,7 +783,6 @@ class TournamentManager:
                             'match_number': match['match_number']
                         }
                         available_opponents.append(opponent_data)
-                        print(f"DEBUG: Added opponent1: {opponent_data}")
                     elif match['player2_id'] == user_id:
                         # Пользователь играет против player1
                         opponent_data = {
@@ -839,12 +792,10 @@ class TournamentManager:
                             'match_number': match['match_number']
                         }
                         available_opponents.append(opponent_data)
-                        print(f"DEBUG: Added opponent2: {opponent_data}")
                         
         elif tournament_type == "Круговая":
             # В круговой системе ищем все незавершенные матчи с этим пользователем
             for match in matches:
-                print(f"DEBUG: match={match}")
                 if match['status'] == 'pending' and not match.get('is_bye', False):
                     if match['player1_id'] == user_id:
                         opponent_data = {
@@ -855,7 +806,6 @@ class TournamentManager:
                         }
                         if opponent_data['user_id'] and str(opponent_data['user_id']) != str(user_id):
                             available_opponents.append(opponent_data)
-                        print(f"DEBUG: Added opponent1: {opponent_data}")
                     elif match['player2_id'] == user_id:
                         opponent_data = {
                             'user_id': match['player1_id'],
@@ -865,13 +815,17 @@ class TournamentManager:
                         }
                         if opponent_data['user_id'] and str(opponent_data['user_id']) != str(user_id):
                             available_opponents.append(opponent_data)
-                        print(f"DEBUG: Added opponent2: {opponent_data}")
         
-        print(f"DEBUG: available_opponents={available_opponents}")
+        logger.debug(f"Доступные соперники для {user_id} в турнире {tournament_id}: {len(available_opponents)}")
         return available_opponents
     
-    async def update_match_result(self, match_id: str, winner_id: str, score: str, bot: Bot | None = None) -> bool:
-        """Обновляет результат матча"""
+    async def update_match_result(self, match_id: str, winner_id: str, score: str, bot: Bot | None = None, score_data: Optional[Dict[str, Any]] = None,
+                                  reporter_id: Optional[str] = None) -> bool:
+        """
+        Обновляет результат матча (score_data — уже разобранный счёт, если есть).
+        Счёт в матче хранится со стороны player1; если его ввёл reporter_id,
+        а тот записан в матче вторым игроком, счёт переворачивается.
+        """
         try:
             tournaments = await self.storage.load_tournaments()
             
@@ -881,9 +835,14 @@ class TournamentManager:
                 for match in matches:
                     if match['id'] == match_id:
                         match['winner_id'] = winner_id
-                        match['score'] = score
+                        if reporter_id is not None and str(match.get('player2_id')) == str(reporter_id):
+                            score_data = score_data if score_data is not None else parse_score(score)
+                            score = format_score(score_data, flip=True) or score
+                            score_data = flip_score(score_data)
+                        attach_score(match, score, score_data)
                         match['status'] = 'completed'
                         match['completed_at'] = datetime.now().isoformat()
+                        record_match(tournament_data, match)
                         
                         # Сохраняем изменения
                         tournaments[tournament_id] = tournament_data
@@ -1202,47 +1161,34 @@ class TournamentManager:
             return False
     
     async def get_tournament_standings(self, tournament_id: str) -> Dict[str, Any]:
-        """Получает таблицу результатов турнира"""
+        """Получает таблицу результатов турнира (в порядке мест)"""
         tournaments = await self.storage.load_tournaments()
         tournament_data = tournaments.get(tournament_id, {})
+        if not tournament_data:
+            return {}
         participants = tournament_data.get('participants', {})
-        matches = tournament_data.get('matches', [])
-        
+        had_standings = 'standings' in tournament_data
+        table = ensure_standings(tournament_data)
+        if not had_standings:
+            # Ленивая миграция турниров, начатых до появления таблицы
+            tournaments[tournament_id] = tournament_data
+            await self.storage.save_tournaments(tournaments)
+
         standings = {}
-        
-        # Инициализируем статистику для каждого участника
-        for user_id in participants.keys():
+        for place, user_id in enumerate(table['order'], start=1):
+            if user_id not in participants:
+                continue
+            stats = table['players'][user_id]
             standings[user_id] = {
                 'name': participants[user_id].get('name', 'Неизвестно'),
-                'matches_played': 0,
-                'matches_won': 0,
-                'matches_lost': 0,
-                'points': 0
+                'matches_played': stats['played'],
+                'matches_won': stats['wins'],
+                'matches_lost': stats['losses'],
+                'points': stats['points'],
+                'sets_diff': stats['sets_won'] - stats['sets_lost'],
+                'games_diff': stats['games_won'] - stats['games_lost'],
+                'place': place,
             }
-        
-        # Подсчитываем результаты
-        for match in matches:
-            if match['status'] == 'completed' and not match['is_bye']:
-                player1_id = match['player1_id']
-                player2_id = match['player2_id']
-                winner_id = match['winner_id']
-                
-                if player1_id in standings:
-                    standings[player1_id]['matches_played'] += 1
-                    if winner_id == player1_id:
-                        standings[player1_id]['matches_won'] += 1
-                        standings[player1_id]['points'] += 1
-                    else:
-                        standings[player1_id]['matches_lost'] += 1
-                
-                if player2_id in standings:
-                    standings[player2_id]['matches_played'] += 1
-                    if winner_id == player2_id:
-                        standings[player2_id]['matches_won'] += 1
-                        standings[player2_id]['points'] += 1
-                    else:
-                        standings[player2_id]['matches_lost'] += 1
-        
         return standings
 
 
@@ -13,7 +13,10 @@ from utils.bracket_image_generator import (
     build_tournament_bracket_image_bytes,
     create_simple_text_image_bytes,
 )
+from utils.bracket.encoding import image_filename
 from utils.round_robin_image_generator import build_round_robin_table
+from utils.round_robin_standings import ensure_standings
+from utils.tournament_images import fingerprint, tournament_images
 from config.tournament_config import MIN_PARTICIPANTS
 from config.config import BOT_USERNAME
 
@@ -111,6 +114,7 @@ class TournamentNotifications:
                     norm_game = {
                         'tournament_id': tournament_id,
                         'score': g.get('score') or (', '.join(g.get('sets', []) or [])),
+                        'score_data': g.get('score_data'),
                         'players': {
                             'team1': team1_list,
                             'team2': team2_list,
@@ -126,13 +130,21 @@ class TournamentNotifications:
             except Exception as e:
                 logger.error(f"Ошибка при загрузке игр: {e}")
 
-            # Генерируем изображение сетки
+            # Генерируем изображение сетки (та же картинка, что в хендлерах, — из общего кэша)
             if tournament_type == 'Круговая':
                 table_players = [{"id": p.id, "name": p.name, "photo_path": getattr(p, 'photo_url', None)} for p in players]
-                image_bytes = build_round_robin_table(table_players, completed_games, tournament_data.get('name', 'Турнир'))
+                tour_name = tournament_data.get('name', 'Турнир')
+                standings = ensure_standings(tournament_data)
+                image_bytes, _ = await tournament_images.get(
+                    tournament_id, fingerprint(tournament_data, players, completed_games, tour_name),
+                    lambda: (build_round_robin_table(table_players, completed_games, tour_name, standings=standings), ""),
+                )
                 return image_bytes, "Круговая таблица"
             else:
-                return build_tournament_bracket_image_bytes(tournament_data, players, completed_games)
+                return await tournament_images.get(
+                    tournament_id, fingerprint(tournament_data, players, completed_games),
+                    lambda: build_tournament_bracket_image_bytes(tournament_data, players, completed_games),
+                )
                 
         except Exception as e:
             logger.error(f"Ошибка при генерации изображения сетки: {e}", exc_info=True)
@@ -154,7 +166,7 @@ class TournamentNotifications:
             try:
                 logger.info(f"Генерация изображения сетки турнира {tournament_id}")
                 bracket_image_bytes, caption_suffix = await self._generate_bracket_image(tournament_data, tournament_id)
-                bracket_photo = BufferedInputFile(bracket_image_bytes, filename=f"tournament_{tournament_id}_bracket.png")
+                bracket_photo = BufferedInputFile(bracket_image_bytes, filename=image_filename(bracket_image_bytes, f"tournament_{tournament_id}_bracket"))
                 logger.info(f"Изображение сетки успешно сгенерировано: {len(bracket_image_bytes)} байт")
             except Exception as e:
                 logger.error(f"Ошибка генерации изображения сетки: {e}", exc_info=True)
@@ -277,14 +289,15 @@ class TournamentNotifications:
                     # Отправляем с фото сетки, если оно есть
                     if bracket_photo:
                         try:
-                            # Создаем новый BufferedInputFile для каждого пользователя
-                            user_photo = BufferedInputFile(bracket_image_bytes, filename=f"tournament_{tournament_id}_bracket.png")
-                            await self.bot.send_photo(
+                            # Картинка загружается один раз, остальным участникам уходит по file_id
+                            user_photo = tournament_images.photo(bracket_image_bytes, f"tournament_{tournament_id}_bracket")
+                            sent = await self.bot.send_photo(
                                 chat_id=user_id,
                                 photo=user_photo,
                                 caption=message,
                                 parse_mode='HTML'
                             )
+                            tournament_images.remember_upload(bracket_image_bytes, sent)
                         except Exception as photo_error:
                             logger.error(f"Ошибка отправки фото участнику {user_id}: {photo_error}")
                             # Если не удалось отправить с фото, отправляем просто текст
@@ -0,0 +1,85 @@
+"""
+Общая основа индексов в памяти по профилям users.json (рейтинговые
+таблицы, предложения игр, анкеты знакомств, имена).
+
+Индекс подписывается на запись users.json в storage и при каждом
+сохранении просматривает только изменившиеся профили (storage передаёт
+их id). В кластерном режиме users.json пишут и другие процессы, поэтому
+перед чтением индекс сверяет версию файла и при расхождении
+синхронизируется со всем файлом.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional, Set
+
+from services.storage import storage
+
+
+class UsersIndex:
+    """
+    Подкласс задаёт запись индекса по профилю (_entry) и её добавление
+    и удаление (_insert, _remove); _insert кладёт запись в self._entries,
+    _remove её оттуда забирает.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Any] = {}
+        self._loaded = False
+        # Версия users.json, которой соответствует индекс (storage.file_version)
+        self._version: Optional[tuple] = None
+
+    def _entry(self, user_id: str, profile: Dict[str, Any]) -> Any:
+        """Запись индекса для профиля; None — профиль в индекс не попадает."""
+        raise NotImplementedError
+
+    def _insert(self, user_id: str, entry: Any) -> None:
+        raise NotImplementedError
+
+    def _remove(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    def _on_loaded(self) -> None:
+        """Вызывается после первого построения индекса."""
+
+    def sync(self, users: Dict[str, Any], user_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Приводит индекс к переданным профилям (только к профилям user_ids,
+        если заданы); возвращает число изменённых записей.
+        """
+        changed = 0
+        for user_id in (users if user_ids is None else user_ids):
+            profile = users.get(user_id)
+            user_id = str(user_id)
+            entry = self._entry(user_id, profile) if isinstance(profile, dict) else None
+            if self._entries.get(user_id) == entry:
+                continue
+            self._remove(user_id)
+            if entry is not None:
+                self._insert(user_id, entry)
+            changed += 1
+        if user_ids is None:
+            for user_id in [uid for uid in self._entries if uid not in users]:
+                self._remove(user_id)
+                changed += 1
+        self._loaded = True
+        return changed
+
+    def _on_users_saved(self, users: Dict[str, Any], changed: Optional[Set[str]] = None) -> None:
+        if not self._loaded:
+            # Индекс ещё строится — его построят из уже записанного файла
+            return
+        self.sync(users, changed)
+        self._version = storage.file_version(storage.config.users_file)
+
+    async def ensure_loaded(self) -> None:
+        """Строит индекс из users.json и подписывается на его изменения (однократно)."""
+        storage.add_users_listener(self._on_users_saved)
+        if not self._loaded:
+            users, self._version = await storage.load_users_with_version()
+            self.sync(users)
+            self._on_loaded()
+        elif storage.config.process_lock and storage.file_version(storage.config.users_file) != self._version:
+            # Файл записал другой процесс — какие профили он менял, неизвестно
+            users, self._version = await storage.load_users_with_version()
+            self.sync(users)
@@ -5,6 +5,8 @@ from collections import defaultdict
 from config.config import BOT_USERNAME
 from config.profile import get_sport_config
 from services.storage import storage
+from utils.dates import age_from_ordinal, birth_ordinal, parse_date
+from utils.name_index import name_index
 
 async def get_users_by_location(search_type=None, country=None, city=None, sport_type=None, 
                                exclude_user_id=None, limit=20) -> Dict[str, int]:
@@ -228,20 +230,8 @@ async def get_top_countries(search_type=None, sport_type=None, limit=7, exclude_
     return result[:limit]
 
 async def calculate_age(birth_date_str: str) -> int:
-    try:
-        birth_date = datetime.strptime(birth_date_str, "%d.%m.%Y")
-        today = datetime.now()
-        age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-        return age
-    except ValueError:
-        try:
-            # Формат ДД.ММ (текущий год)
-            birth_date = datetime.strptime(birth_date_str, "%d.%m")
-            today = datetime.now()
-            age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-            return age
-        except ValueError:
-            return 0
+    """Возраст по дате рождения ДД.ММ.ГГГГ (разбор кэширован); 0 — дату не разобрать."""
+    return age_from_ordinal(birth_ordinal(birth_date_str))
 
 async def level_to_points(level: str) -> int:
     level_points = {
@@ -252,32 +242,22 @@ async def level_to_points(level: str) -> int:
     }
     return level_points.get(level, 0)
 
+# Доля рейтинга соперника за каждый гейм разницы (см. также utils/rating_replay.py)
+RATING_STEP = 0.004
+
 async def calculate_new_ratings(winner_points: int, loser_points: int, game_difference: int) -> tuple:
-    points_change = game_difference * 0.004
+    points_change = game_difference * RATING_STEP
     winner_new = winner_points + (loser_points * points_change)
     loser_new = loser_points - (winner_points * points_change)
     return round(winner_new), round(loser_new)
 
 async def search_users(query: str, exclude_ids: List[str] = None) -> List[tuple]:
+    """(user_id, профиль) пользователей, в имени или фамилии которых есть query, от лучших совпадений."""
+    user_ids = await name_index.search(query, exclude_ids or ())
+    if not user_ids:
+        return []
     users = await storage.load_users()
-    results = []
-    query = query.lower().strip()
-    
-    if exclude_ids is None:
-        exclude_ids = []
-    
-    for user_id, user_data in users.items():
-        if user_id in exclude_ids:
-            continue
-            
-        first_name = user_data.get('first_name', '').lower()
-        last_name = user_data.get('last_name', '').lower()
-        
-        if (query in first_name or query in last_name or 
-            query in f"{first_name} {last_name}"):
-            results.append((user_id, user_data))
-    
-    return results
+    return [(user_id, users[user_id]) for user_id in user_ids if user_id in users]
 
 async def count_users_by_filters(search_type, country=None, city=None, sport=None, gender=None, level=None):
     """
@@ -363,39 +343,16 @@ def parse_date_flexible(date_str: str):
     Парсит дату в форматах DD.MM.YYYY, YYYY-MM-DD, DD.MM (текущий год), DD/MM/YYYY.
     Возвращает объект date или None при ошибке.
     """
-    if not date_str or not isinstance(date_str, str):
-        return None
-    date_str = date_str.strip()
-    for fmt in ["%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y"]:
-        try:
-            return datetime.strptime(date_str, fmt).date()
-        except ValueError:
-            continue
-    # ДД.ММ без года — считаем текущий год
-    try:
-        dt = datetime.strptime(date_str, "%d.%m")
-        return dt.replace(year=datetime.now().year).date()
-    except ValueError:
-        pass
-    return None
+    return parse_date(date_str)
 
 
 async def format_tour_date(date_str):
     if not date_str or date_str == '-':
         return '-'
-    try:
-        # Пробуем разные форматы дат
-        for fmt in ["%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y"]:
-            try:
-                dt = datetime.strptime(date_str, fmt)
-                return dt.strftime("%d.%m.%y")  # 25.08.25
-            except ValueError:
-                continue
-        # Если ни один формат не подошел, возвращаем как есть
-        return date_str
-    except:
-        return date_str
-            
+    parsed = parse_date(date_str)
+    # Если ни один формат не подошел, возвращаем как есть
+    return parsed.strftime("%d.%m.%y") if parsed else date_str  # 25.08.25
+
 def get_sort_key(offer):
     try:
         if offer.get('date') is None: